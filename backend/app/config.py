@@ -28,6 +28,24 @@ class Settings(BaseSettings):
 
     # S3
     s3_bucket_name: Optional[str] = None
+    # Endpoint compatible con S3 (p. ej. MinIO local); None usa AWS
+    s3_endpoint_url: Optional[str] = None
+    # Conexiones del pool del cliente compartido e hilos del executor de llamadas al SDK
+    s3_max_connections: int = 32
+    # URLs prefirmadas que se reutilizan por (clave, método) mientras no estén cerca de vencer
+    s3_presigned_url_cache_size: int = 10000
+
+    # Almacenamiento de archivos: "s3" o "local" (disco, para instalaciones sin nube y pruebas).
+    # En local los archivos se guardan por contenido bajo local_storage_path y se descargan
+    # por /api/archivos con URLs firmadas con local_storage_secret (obligatorio fuera de
+    # desarrollo). local_storage_public_url es la base de esas URLs. Con
+    # local_storage_accel_redirect (p. ej. "/_archivos", un location internal de nginx con
+    # alias a local_storage_path/claves) la API solo valida la firma y nginx envía el archivo.
+    storage_backend: str = "s3"
+    local_storage_path: str = "almacenamiento"
+    local_storage_secret: Optional[str] = None
+    local_storage_public_url: str = "http://localhost:8000"
+    local_storage_accel_redirect: Optional[str] = None
 
     # Cognito
     cognito_user_pool_id: Optional[str] = None
@@ -58,6 +76,107 @@ class Settings(BaseSettings):
 
     # Email
     from_email: Optional[str] = None
+    # Con smtp_host se envía por SMTP; si no, por SES (producción, credenciales AWS o
+    # ses_endpoint_url, p. ej. moto) o solo se loggea. email_send_rate_per_second es la
+    # cuota de SES de la cuenta; cada proceso usa la parte que le toca entre los
+    # email_send_processes procesos que consumen la cola emails (p. ej. las réplicas
+    # de worker). email_max_concurrency acota los envíos en curso. Los errores transitorios se
+    # reintentan por destinatario hasta email_max_attempts con backoff y jitter.
+    ses_endpoint_url: Optional[str] = None
+    smtp_host: Optional[str] = None
+    smtp_port: int = 587
+    smtp_username: Optional[str] = None
+    smtp_password: Optional[str] = None
+    smtp_use_tls: bool = True
+    email_send_rate_per_second: float = 14.0
+    email_send_processes: int = 1
+    email_max_concurrency: int = 10
+    email_max_attempts: int = 4
+    email_retry_base_seconds: float = 1.0
+    email_retry_max_seconds: float = 30.0
+    # Bandeja de salida (tabla email_outbox): la vacía el worker que consume la cola
+    # emails, de a email_outbox_batch_size emails por reclamo. Un email reclamado no
+    # se vuelve a tomar durante email_outbox_lease_seconds; tras
+    # email_outbox_max_attempts reclamos fallidos queda FALLIDO.
+    email_outbox_batch_size: int = 200
+    email_outbox_lease_seconds: float = 300.0
+    email_outbox_max_attempts: int = 8
+
+    # Mapa en memoria de preferencias de notificación para filtrar destinatarios en
+    # bloque: se relee por deltas como mucho cada preferencias_refresh_seconds; cada
+    # delta vuelve a leer preferencias_refresh_margin_seconds hacia atrás por las
+    # transacciones que confirman después de fijar su actualizado_en.
+    preferencias_refresh_seconds: float = 30.0
+    preferencias_refresh_margin_seconds: float = 60.0
+
+    # Eventos en vivo (LISTEN/NOTIFY, ver app.services.eventos_service). Cada flujo SSE
+    # envía un comentario cada eventos_keepalive_seconds para que los proxies no lo
+    # corten y se cierra tras certificado_eventos_timeout_seconds (el cliente se
+    # reconecta). eventos_queue_size acota los eventos pendientes por suscriptor.
+    eventos_queue_size: int = 100
+    eventos_keepalive_seconds: float = 15.0
+    certificado_eventos_timeout_seconds: float = 300.0
+    # Flujo del foro de una lección: al reconectarse con Last-Event-ID se reenvían
+    # como mucho foro_eventos_max_reanudacion comentarios nuevos (y otros tantos
+    # editados); si hay más, el cliente debe releer el hilo.
+    foro_eventos_timeout_seconds: float = 300.0
+    foro_eventos_max_reanudacion: int = 200
+
+    # Búsqueda en el foro por trigramas (ver ForoService.buscar_comentarios).
+    # foro_busqueda_umbral es el word_similarity mínimo para coincidir; un comentario
+    # foro_busqueda_recencia_dias más reciente que otro suma 0.1 a su puntaje.
+    foro_busqueda_umbral: float = 0.5
+    foro_busqueda_recencia_dias: float = 30.0
+
+    # Verificación pública de certificados por folio (ver
+    # app.services.verificacion_service). Cada proceso guarda hasta
+    # certificado_verificacion_cache_size resultados; las revocaciones los invalidan
+    # al momento y el TTL acota lo que pudiera perderse al reconectar la escucha.
+    # El TTL negativo es corto porque un folio inexistente aparece al emitirse.
+    certificado_verificacion_cache_size: int = 100000
+    certificado_verificacion_ttl_seconds: float = 300.0
+    certificado_verificacion_negativo_ttl_seconds: float = 30.0
+    certificado_verificacion_reconexion_seconds: float = 5.0
+
+    # Autoguardado de respuestas en borrador (buffer write-behind por worker).
+    # max_pending dimensionado para una cohorte completa: ~2000 alumnos x 25 preguntas.
+    # Los intentos finalizados en cualquier proceso salen de la caché al momento;
+    # al reconectar la escucha se vacía la caché entera.
+    autosave_flush_interval_seconds: float = 2.0
+    autosave_flush_batch_size: int = 500
+    autosave_max_pending: int = 50000
+    autosave_invalidacion_reconexion_seconds: float = 5.0
+
+    # Barrido de intentos con tiempo límite vencido. El margen deja que los
+    # borradores pendientes de otros workers se vuelquen antes de calificar.
+    intento_sweep_interval_seconds: float = 30.0
+    intento_sweep_batch_size: int = 200
+    intento_sweep_grace_seconds: float = 10.0
+
+    # Limpieza de datos antiguos: lotes pequeños, presupuesto de tiempo por ejecución
+    # y pausa entre lotes mientras el lag de réplica supere el máximo.
+    retention_batch_size: int = 500
+    retention_time_budget_seconds: float = 300.0
+    retention_batch_pause_seconds: float = 0.2
+    retention_max_replication_lag_seconds: float = 5.0
+    retention_archive_dir: str = "archivo"
+
+    # Worker de la cola durable (python -m app.worker). worker_queues: "cola:concurrencia,...".
+    # El bloqueo de cada tarea se renueva cada tercio de worker_lease_seconds; si vence,
+    # otro worker la retoma. Los reintentos esperan base * 2^(intento-1), con tope y jitter.
+    worker_queues: str = "certificados:2,emails:8,admin:1"
+    worker_poll_interval_seconds: float = 1.0
+    worker_lease_seconds: float = 120.0
+    worker_retry_base_seconds: float = 10.0
+    worker_retry_max_seconds: float = 3600.0
+    worker_shutdown_timeout_seconds: float = 30.0
+
+    # Renderizado de certificados en un pool de procesos (None: un proceso por núcleo).
+    # certificate_render_max_pending acota la cola de certificados en espera de un proceso;
+    # certificate_batch_size es cuántos se leen y guardan por transacción en la emisión por curso.
+    certificate_render_processes: Optional[int] = None
+    certificate_render_max_pending: int = 32
+    certificate_batch_size: int = 100
 
     @property
     def cors_origins_list(self) -> List[str]:
@@ -129,9 +248,12 @@ class Settings(BaseSettings):
                 logger.warning("COGNITO_REDIRECT_URI not set - OAuth flows will not work")
         else:
             # En producción/staging, validar estrictamente
-            if not self.s3_bucket_name:
+            if self.storage_backend == "s3" and not self.s3_bucket_name:
                 errors.append("S3_BUCKET_NAME is required")
 
+            if self.storage_backend == "local" and not self.local_storage_secret:
+                errors.append("LOCAL_STORAGE_SECRET is required with STORAGE_BACKEND=local")
+
             if not self.cognito_user_pool_id:
                 errors.append("COGNITO_USER_POOL_ID is required")
 
@@ -145,6 +267,9 @@ class Settings(BaseSettings):
         if not self.database_url and self.environment != "development":
             errors.append("DATABASE_URL is required in non-development environments")
 
+        if self.storage_backend not in ["s3", "local"]:
+            errors.append("STORAGE_BACKEND must be one of: s3, local")
+
         if self.environment not in ["development", "staging", "production"]:
             errors.append("ENVIRONMENT must be one of: development, staging, production")
 
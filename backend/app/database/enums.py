@@ -35,3 +35,19 @@ class TipoPregunta(str, Enum):
     OPCION_MULTIPLE = "OPCION_MULTIPLE"
     VERDADERO_FALSO = "VERDADERO_FALSO"
 
+
+
+class EstadoJob(str, Enum):
+    """Estado de una tarea en background"""
+    PENDIENTE = "PENDIENTE"
+    EN_PROCESO = "EN_PROCESO"
+    COMPLETADO = "COMPLETADO"
+    FALLIDO = "FALLIDO"
+    CANCELADO = "CANCELADO"
+
+
+class EstadoEmail(str, Enum):
+    """Estado de un email de la bandeja de salida"""
+    PENDIENTE = "PENDIENTE"
+    ENVIADO = "ENVIADO"
+    FALLIDO = "FALLIDO"
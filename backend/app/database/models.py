@@ -1,9 +1,9 @@
 from sqlalchemy import (
     String, Text, Boolean, Integer, Numeric, Date,
     DateTime, ForeignKey, UniqueConstraint, CheckConstraint,
-    Index, func
+    Index, func, text
 )
-from sqlalchemy.dialects.postgresql import UUID, ENUM
+from sqlalchemy.dialects.postgresql import UUID, ENUM, JSONB
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from datetime import datetime, date
 from typing import Optional, List
@@ -12,7 +12,7 @@ import uuid
 from app.database.session import Base
 from app.database.enums import (
     TipoContenido, EstadoInscripcion,
-    ResultadoIntento, TipoPregunta
+    ResultadoIntento, TipoPregunta, EstadoJob, EstadoEmail
 )
 
 
@@ -41,6 +41,10 @@ class Usuario(Base):
     intentos: Mapped[List["Intento"]] = relationship("Intento", back_populates="usuario")
     comentarios: Mapped[List["ForoComentario"]] = relationship("ForoComentario", back_populates="usuario", cascade="all, delete-orphan")
     preferencias: Mapped[Optional["PreferenciaNotificacion"]] = relationship("PreferenciaNotificacion", back_populates="usuario", uselist=False, cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index("idx_usuario_creado_id", "creado_en", "id"),
+    )
 
 
 class Rol(Base):
@@ -101,6 +105,10 @@ class Curso(Base):
     inscripciones: Mapped[List["InscripcionCurso"]] = relationship("InscripcionCurso", back_populates="curso")
     reglas_acreditacion: Mapped[List["ReglaAcreditacion"]] = relationship("ReglaAcreditacion", back_populates="curso", cascade="all, delete-orphan")
     comentarios: Mapped[List["ForoComentario"]] = relationship("ForoComentario", back_populates="curso", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index("idx_curso_titulo_id", "titulo", "id"),
+    )
 
 
 class Modulo(Base):
@@ -212,6 +220,7 @@ class Quiz(Base):
     publicado: Mapped[Optional[bool]] = mapped_column(Boolean, nullable=True, index=True)
     aleatorio: Mapped[Optional[bool]] = mapped_column(Boolean, nullable=True)
     guarda_calificacion: Mapped[Optional[bool]] = mapped_column(Boolean, nullable=True)
+    tiempo_limite_minutos: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     creado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     actualizado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -233,6 +242,7 @@ class ExamenFinal(Base):
     publicado: Mapped[Optional[bool]] = mapped_column(Boolean, nullable=True, index=True)
     aleatorio: Mapped[Optional[bool]] = mapped_column(Boolean, nullable=True)
     guarda_calificacion: Mapped[Optional[bool]] = mapped_column(Boolean, nullable=True)
+    tiempo_limite_minutos: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     creado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     actualizado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -357,6 +367,8 @@ class InscripcionCurso(Base):
         UniqueConstraint("usuario_id", "curso_id", name="uq_usuario_curso"),
         CheckConstraint("fecha_conclusion IS NULL OR fecha_conclusion >= fecha_inscripcion", name="chk_fechas_inscripcion"),
         Index("idx_inscripcion_usuario_curso", "usuario_id", "curso_id"),
+        Index("idx_inscripcion_curso_creado_id", "creado_en", "id"),
+        Index("idx_inscripcion_curso_usuario_fecha", "usuario_id", "fecha_inscripcion", "id"),
     )
 
 
@@ -374,6 +386,7 @@ class Intento(Base):
     resultado: Mapped[Optional[ResultadoIntento]] = mapped_column(ENUM(ResultadoIntento, name="resultado_intento", create_type=False), nullable=True, index=True)
     iniciado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     finalizado_en: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    expira_en: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     permitir_nuevo_intento: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False, server_default="false")
     creado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     actualizado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -392,8 +405,18 @@ class Intento(Base):
             name="chk_intento_quiz_o_examen"
         ),
         UniqueConstraint("usuario_id", "quiz_id", "inscripcion_curso_id", "numero_intento", name="uq_intento_usuario_quiz_inscripcion"),
+        # Índices únicos parciales que dan atomicidad a IntentoService.create_intento
+        Index("uq_intento_numero_quiz", "inscripcion_curso_id", "quiz_id", "numero_intento", unique=True, postgresql_where=text("quiz_id IS NOT NULL")),
+        Index("uq_intento_numero_examen", "inscripcion_curso_id", "examen_final_id", "numero_intento", unique=True, postgresql_where=text("examen_final_id IS NOT NULL")),
+        Index("uq_intento_activo_quiz", "inscripcion_curso_id", "quiz_id", unique=True, postgresql_where=text("quiz_id IS NOT NULL AND finalizado_en IS NULL")),
+        Index("uq_intento_activo_examen", "inscripcion_curso_id", "examen_final_id", unique=True, postgresql_where=text("examen_final_id IS NOT NULL AND finalizado_en IS NULL")),
+        # Intentos activos con tiempo límite, para el barrido de intentos expirados
+        Index("idx_intento_expira_activo", "expira_en", postgresql_where=text("finalizado_en IS NULL AND expira_en IS NOT NULL")),
         Index("idx_intento_usuario_quiz", "usuario_id", "quiz_id"),
         Index("idx_intento_usuario_examen", "usuario_id", "examen_final_id"),
+        Index("idx_intento_creado_id", "creado_en", "id"),
+        Index("idx_intento_quiz_numero", "quiz_id", "numero_intento", "id"),
+        Index("idx_intento_examen_final_numero", "examen_final_id", "numero_intento", "id"),
         Index("idx_intento_activo", "usuario_id", "quiz_id", "inscripcion_curso_id", "finalizado_en"),
         Index("idx_intento_activo_examen", "usuario_id", "examen_final_id", "inscripcion_curso_id", "finalizado_en"),
     )
@@ -475,11 +498,11 @@ class Certificado(Base):
     __tablename__ = "certificado"
     
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    inscripcion_curso_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("inscripcion_curso.id", ondelete="CASCADE", onupdate="CASCADE"), nullable=False, index=True)
+    inscripcion_curso_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("inscripcion_curso.id", ondelete="CASCADE", onupdate="CASCADE"), nullable=False, unique=True)
     quiz_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), ForeignKey("quiz.id", ondelete="SET NULL", onupdate="CASCADE"), nullable=True, index=True)
     examen_final_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), ForeignKey("examen_final.id", ondelete="SET NULL", onupdate="CASCADE"), nullable=True, index=True)
     intento_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), ForeignKey("intento.id", ondelete="SET NULL", onupdate="CASCADE"), nullable=True, index=True)
-    folio: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
+    folio: Mapped[Optional[str]] = mapped_column(String(50), unique=True, nullable=True)
     hash_verificacion: Mapped[Optional[str]] = mapped_column(String(128), unique=True, nullable=True, index=True)
     s3_key: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
     emitido_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -517,6 +540,7 @@ class ForoComentario(Base):
     
     __table_args__ = (
         Index("idx_foro_comentario_curso_leccion", "curso_id", "leccion_id"),
+        Index("idx_foro_comentario_curso_leccion_creado", "curso_id", "leccion_id", "creado_en", "id"),
     )
 
 
@@ -534,3 +558,66 @@ class PreferenciaNotificacion(Base):
     # Relationships
     usuario: Mapped["Usuario"] = relationship("Usuario", back_populates="preferencias")
 
+
+
+# =====================================================
+# Tablas de Operación
+# =====================================================
+
+class Job(Base):
+    """Modelo de una tarea de la cola durable, con su estado y progreso"""
+    __tablename__ = "job"
+    
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    tipo: Mapped[str] = mapped_column(String(100), nullable=False)
+    estado: Mapped[EstadoJob] = mapped_column(ENUM(EstadoJob, name="estado_job", create_type=False), nullable=False, default=EstadoJob.PENDIENTE, server_default="PENDIENTE")
+    parametros: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    total: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    procesados: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    cancelacion_solicitada: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False, server_default="false")
+    checkpoint: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    resultado: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    cola: Mapped[str] = mapped_column(String(50), nullable=False, default="default", server_default="default")
+    intentos: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    max_intentos: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
+    disponible_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    bloqueado_por: Mapped[Optional[str]] = mapped_column(String(200), nullable=True)
+    bloqueado_hasta: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    clave_unica: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    creado_por: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), ForeignKey("usuario.id", ondelete="SET NULL", onupdate="CASCADE"), nullable=True)
+    creado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    iniciado_en: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finalizado_en: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    actualizado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("idx_job_tipo_creado", "tipo", "creado_en"),
+        Index("idx_job_estado_creado", "estado", "creado_en", "id"),
+        Index("idx_job_cola_disponible", "cola", "disponible_en", postgresql_where=text("estado = 'PENDIENTE'")),
+        Index("idx_job_bloqueo_vencido", "bloqueado_hasta", postgresql_where=text("estado = 'EN_PROCESO'")),
+        Index("idx_job_clave_unica_activa", "clave_unica", unique=True, postgresql_where=text("estado IN ('PENDIENTE', 'EN_PROCESO')")),
+        CheckConstraint("max_intentos >= 1", name="chk_job_max_intentos"),
+    )
+
+
+class EmailOutbox(Base):
+    """Modelo de un email pendiente de envío, registrado junto con el cambio que lo origina"""
+    __tablename__ = "email_outbox"
+    
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    plantilla: Mapped[str] = mapped_column(String(100), nullable=False)
+    destinatario: Mapped[str] = mapped_column(String(255), nullable=False)
+    parametros: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict, server_default="{}")
+    clave_idempotencia: Mapped[str] = mapped_column(String(255), nullable=False, unique=True)
+    estado: Mapped[EstadoEmail] = mapped_column(ENUM(EstadoEmail, name="estado_email", create_type=False), nullable=False, default=EstadoEmail.PENDIENTE, server_default="PENDIENTE")
+    intentos: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    disponible_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    message_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    creado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    enviado_en: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    
+    __table_args__ = (
+        Index("idx_email_outbox_disponible", "disponible_en", postgresql_where=text("estado = 'PENDIENTE'")),
+    )
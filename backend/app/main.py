@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
@@ -35,8 +36,16 @@ from app.routes.foro import router as foro_router
 from app.routes.preferencias import router as preferencias_router
 from app.routes.certificados import router as certificados_router
 from app.routes.admin import router as admin_router
+from app.routes.archivos import router as archivos_router
+from app.services.autosave_service import get_autosave_service, loop_invalidacion_intentos
+from app.services.email_service import cerrar_email_service
+from app.services.eventos_service import cerrar_bus_eventos
+from app.services.s3_service import cerrar_cliente_s3
+from app.services.verificacion_service import loop_invalidacion_verificaciones
+from app.tasks.intento_tasks import loop_barrido_intentos_expirados
 from app.utils.exceptions import EBSException
 from app.utils.error_codes import ValidationErrorCodes, InternalErrorCodes
+from app.utils.pagination import HEADER_CURSOR_SIGUIENTE
 
 
 @asynccontextmanager
@@ -48,10 +57,25 @@ async def lifespan(_: FastAPI):
         logger.info(f"Database URL configured: {settings.database_url[:20]}...")
     else:
         logger.warning("Database URL not configured - running without database connection")
+    autosave_service = get_autosave_service()
+    await autosave_service.start()
+    barrido_intentos = asyncio.create_task(loop_barrido_intentos_expirados())
+    invalidacion_verificaciones = asyncio.create_task(loop_invalidacion_verificaciones())
+    invalidacion_intentos = asyncio.create_task(loop_invalidacion_intentos())
     try:
         yield
     finally:
         logger.info("Shutting down EBS API")
+        for tarea in (barrido_intentos, invalidacion_verificaciones, invalidacion_intentos):
+            tarea.cancel()
+            try:
+                await tarea
+            except asyncio.CancelledError:
+                pass
+        await autosave_service.stop()
+        await cerrar_bus_eventos()
+        await asyncio.to_thread(cerrar_cliente_s3)
+        await asyncio.to_thread(cerrar_email_service)
 
 
 app = FastAPI(
@@ -69,6 +93,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[HEADER_CURSOR_SIGUIENTE],
 )
 
 # Register auth router (Cognito routes: /api/auth/login, /api/auth/callback, /api/auth/refresh, /api/auth/logout)
@@ -88,6 +113,10 @@ app.include_router(preferencias_router, prefix="/api")
 app.include_router(certificados_router, prefix="/api")
 app.include_router(admin_router, prefix="/api")
 
+# Descargas y subidas firmadas del almacenamiento en disco (con S3 las sirve el bucket)
+if settings.storage_backend == "local":
+    app.include_router(archivos_router, prefix="/api")
+
 
 @app.exception_handler(EBSException)
 async def ebs_exception_handler(request: Request, exc: EBSException):
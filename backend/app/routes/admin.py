@@ -1,16 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Header, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Literal, Optional
 import uuid
 
 from app.database.session import get_db
-from app.database.models import Usuario, InscripcionCurso, Intento, ReglaAcreditacion, EstadoInscripcion
+from app.database.models import Curso, Usuario, InscripcionCurso, Intento, ReglaAcreditacion, EstadoInscripcion
+from app.database.enums import EstadoJob
 from app.schemas.usuario import UsuarioResponse
 from app.schemas.inscripcion import InscripcionResponse
 from app.schemas.intento import IntentoResponse
 from app.schemas.regla_acreditacion import ReglaAcreditacionResponse, ReglaAcreditacionBase
-from app.services.admin_service import AdminService
+from app.schemas.guia_estudio import GuiaEstudioResponse, SubidaDirectaGuiaRequest, SubidaDirectaGuiaResponse
+from app.schemas.job import JobResponse, ColaResumenResponse, ResetIntentosMasivoRequest, LimpiezaDatosRequest, ReporteInscripcionesRequest, RecordatorioProgresoRequest
+from app.services.admin_service import AdminService, KEYSET_USUARIOS, KEYSET_INSCRIPCIONES, KEYSET_INTENTOS
+from app.services.curso_service import CursoService, EXPIRACION_SUBIDA_DIRECTA
+from app.services.job_service import JobService, KEYSET_JOBS
+from app.services.reporte_service import ReporteService
+from app.services.s3_service import MAX_FILE_SIZE
 from app.services.regla_acreditacion_service import ReglaAcreditacionService
+from app.services.verificacion_service import VerificacionService
+from app.tasks.cola import encolar
+from app.utils.background_tasks import get_background_db_session
+from app.utils.export_stream import MEDIA_TYPES
+from app.utils.exceptions import ValidationError
+from app.utils.jwt_auth import get_current_user
+from app.utils.pagination import agregar_cursor_siguiente
+from app.utils.query_helpers import get_or_404
 from app.utils.roles import require_role, UserRole
 
 router = APIRouter(
@@ -25,19 +42,22 @@ router = APIRouter(
     status_code=status.HTTP_200_OK
 )
 async def listar_usuarios(
-    skip: int = Query(0, ge=0, description="Número de registros a omitir"),
+    response: Response,
+    skip: int = Query(0, ge=0, description="Número de registros a omitir (si no se envía cursor)"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (encabezado X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Listar todos los usuarios con paginación.
     
     - **Permisos**: Requiere rol de administrador
-    - **Paginación**: Usa skip/limit para paginación
+    - **Paginación**: Por cursor (`X-Next-Cursor`) o skip/limit
     - **Respuesta**: Lista paginada de usuarios
     """
     admin_service = AdminService(db)
-    usuarios = await admin_service.get_usuarios(skip, limit)
+    usuarios = await admin_service.get_usuarios(skip, limit, cursor)
+    agregar_cursor_siguiente(response, KEYSET_USUARIOS, usuarios, limit)
     return [UsuarioResponse.from_orm(usuario) for usuario in usuarios]
 
 @router.put(
@@ -67,19 +87,22 @@ async def actualizar_roles_usuario(
     status_code=status.HTTP_200_OK
 )
 async def listar_inscripciones(
-    skip: int = Query(0, ge=0, description="Número de registros a omitir"),
+    response: Response,
+    skip: int = Query(0, ge=0, description="Número de registros a omitir (si no se envía cursor)"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (encabezado X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Listar todas las inscripciones con paginación.
     
     - **Permisos**: Requiere rol de administrador
-    - **Paginación**: Usa skip/limit para paginación
+    - **Paginación**: Por cursor (`X-Next-Cursor`) o skip/limit
     - **Respuesta**: Lista paginada de inscripciones
     """
     admin_service = AdminService(db)
-    inscripciones = await admin_service.get_inscripciones(skip, limit)
+    inscripciones = await admin_service.get_inscripciones(skip, limit, cursor)
+    agregar_cursor_siguiente(response, KEYSET_INSCRIPCIONES, inscripciones, limit)
     return [InscripcionResponse.from_orm(inscripcion) for inscripcion in inscripciones]
 
 @router.put(
@@ -109,19 +132,22 @@ async def actualizar_estado_inscripcion(
     status_code=status.HTTP_200_OK
 )
 async def listar_intentos(
-    skip: int = Query(0, ge=0, description="Número de registros a omitir"),
+    response: Response,
+    skip: int = Query(0, ge=0, description="Número de registros a omitir (si no se envía cursor)"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (encabezado X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Listar todos los intentos con paginación.
     
     - **Permisos**: Requiere rol de administrador
-    - **Paginación**: Usa skip/limit para paginación
+    - **Paginación**: Por cursor (`X-Next-Cursor`) o skip/limit
     - **Respuesta**: Lista paginada de intentos
     """
     admin_service = AdminService(db)
-    intentos = await admin_service.get_intentos(skip, limit)
+    intentos = await admin_service.get_intentos(skip, limit, cursor)
+    agregar_cursor_siguiente(response, KEYSET_INTENTOS, intentos, limit)
     return [IntentoResponse.from_orm(intento) for intento in intentos]
 
 @router.put(
@@ -225,3 +251,383 @@ async def eliminar_regla(
     """
     regla_service = ReglaAcreditacionService(db)
     await regla_service.delete_regla(regla_id)
+
+# Certificados
+
+@router.post(
+    "/certificados/{certificado_id}/revocar",
+    status_code=status.HTTP_204_NO_CONTENT
+)
+async def revocar_certificado(
+    certificado_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Revocar un certificado: deja de verificarse como válido en todas las instancias de la API.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Parámetros**: `certificado_id` - ID del certificado a revocar
+    - **Respuesta**: No content (204)
+    """
+    await VerificacionService(db).revocar(certificado_id)
+
+# Tareas masivas
+
+@router.post(
+    "/intentos/reset-masivo",
+    response_model=JobResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def reset_masivo_intentos(
+    payload: ResetIntentosMasivoRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Habilitar un nuevo intento en todos los intentos de un usuario, de un curso o de una lista.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Parámetros**: `intento_ids`, `usuario_id` o `curso_id` (en ese orden de prioridad)
+    - **Respuesta**: Job creado; consultar su progreso en `/admin/jobs/{job_id}`
+    """
+    if not (payload.intento_ids or payload.usuario_id or payload.curso_id):
+        raise ValidationError("Debe proporcionar intento_ids, usuario_id o curso_id")
+    
+    job = await encolar(
+        db,
+        "reset_intentos_masivo",
+        parametros=jsonable_encoder(payload, exclude_none=True),
+        creado_por=current_user.get("sub"),
+    )
+    return JobResponse.from_orm(job)
+
+@router.post(
+    "/limpieza",
+    response_model=JobResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def limpiar_datos(
+    payload: LimpiezaDatosRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Eliminar por lotes intentos e inscripciones pausadas más antiguos que `dias_antiguedad`.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Parámetros**: Qué eliminar, y si se archiva cada lote antes de borrarlo
+    - **Respuesta**: Job creado; si se agota el presupuesto de tiempo vuelve a la cola
+      y continúa desde su checkpoint
+    """
+    if not (payload.eliminar_intentos or payload.eliminar_inscripciones_inactivas):
+        raise ValidationError("Debe indicar eliminar_intentos o eliminar_inscripciones_inactivas")
+    
+    job = await encolar(
+        db,
+        "limpiar_datos_antiguos",
+        parametros=jsonable_encoder(payload),
+        creado_por=current_user.get("sub"),
+    )
+    return JobResponse.from_orm(job)
+
+@router.get(
+    "/reportes/inscripciones",
+    status_code=status.HTTP_200_OK
+)
+async def descargar_reporte_inscripciones(
+    curso_id: Optional[uuid.UUID] = Query(None, description="Filtrar por curso"),
+    formato: Literal["csv", "jsonl"] = Query("csv", description="Formato del reporte"),
+    comprimir: bool = Query(False, description="Comprimir el reporte con gzip")
+):
+    """
+    Descargar el reporte de inscripciones como flujo, sin cargarlo completo en memoria.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Parámetros**: `curso_id` opcional, `formato` (csv o jsonl), `comprimir`
+    - **Respuesta**: Archivo CSV/JSONL (o .gz) generado mientras se descarga
+    """
+    async def contenido():
+        # Sesión propia: la del request se cierra antes de terminar el streaming
+        async with get_background_db_session() as db:
+            async for bloque in ReporteService(db).exportar_inscripciones(curso_id, formato, comprimir):
+                yield bloque
+    
+    filename = f"inscripciones.{formato}{'.gz' if comprimir else ''}"
+    return StreamingResponse(
+        contenido(),
+        media_type="application/gzip" if comprimir else MEDIA_TYPES[formato],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post(
+    "/reportes/inscripciones",
+    response_model=JobResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def exportar_reporte_inscripciones(
+    payload: ReporteInscripcionesRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Exportar el reporte de inscripciones a S3 en background.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Parámetros**: `curso_id` opcional, `formato` (csv o jsonl), `comprimir`
+    - **Respuesta**: Job creado; al completarse, `resultado.s3_key` indica el archivo
+    """
+    job = await encolar(
+        db,
+        "generar_reporte_masivo",
+        parametros=jsonable_encoder(payload),
+        creado_por=current_user.get("sub"),
+    )
+    return JobResponse.from_orm(job)
+
+@router.post(
+    "/recordatorios/progreso",
+    response_model=JobResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def enviar_recordatorios_progreso(
+    payload: RecordatorioProgresoRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Enviar el recordatorio de progreso a los alumnos inactivos en background.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Parámetros**: `dias_inactividad`, `curso_id` opcional
+    - **Respuesta**: Job creado; `procesados` avanza con los envíos y, al completarse,
+      `resultado` indica enviados y fallidos. Solo reciben el recordatorio quienes
+      no lo desactivaron en sus preferencias.
+    """
+    job = await encolar(
+        db,
+        "campana_recordatorio_progreso",
+        parametros=jsonable_encoder(payload),
+        creado_por=current_user.get("sub"),
+    )
+    return JobResponse.from_orm(job)
+
+@router.post(
+    "/cursos/{curso_id}/certificados",
+    response_model=JobResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def emitir_certificados_curso(
+    curso_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Emitir en background los certificados de todos los alumnos acreditados de un curso.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Parámetros**: `curso_id` - ID del curso
+    - **Respuesta**: Job creado en la cola `certificados`; `procesados`/`total` indican el
+      avance y `resultado` los certificados emitidos y fallidos. Si ya hay una emisión
+      pendiente o en curso para el curso, retorna ese job
+    """
+    await get_or_404(db, Curso, curso_id, "Curso")
+    job = await encolar(
+        db,
+        "emitir_certificados_curso",
+        parametros={"curso_id": curso_id},
+        creado_por=current_user.get("sub"),
+        clave_unica=f"emitir_certificados_curso:{curso_id}",
+    )
+    return JobResponse.from_orm(job)
+
+@router.post(
+    "/cursos/{curso_id}/guias-estudio",
+    response_model=GuiaEstudioResponse,
+    status_code=status.HTTP_201_CREATED
+)
+async def subir_guia_estudio(
+    curso_id: uuid.UUID,
+    request: Request,
+    titulo: str = Query(..., min_length=1, max_length=200, description="Título de la guía de estudio"),
+    filename: str = Query(..., min_length=1, max_length=200, description="Nombre del archivo"),
+    content_type: str = Header(..., description="Tipo MIME del archivo"),
+    content_length: Optional[int] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Subir una guía de estudio enviando el archivo como cuerpo del request.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Parámetros**: `curso_id`, `titulo` y `filename`; el cuerpo es el archivo tal cual
+      (no multipart/form-data) con su tipo en `Content-Type`
+    - **Respuesta**: Guía creada. El archivo se sube a S3 por partes mientras llega y se
+      rechaza en cuanto supera el tamaño máximo, sin cargarlo completo en memoria
+    """
+    guia = await CursoService(db).subir_guia_estudio(
+        curso_id,
+        titulo,
+        filename,
+        content_type,
+        request.stream(),
+        content_length=content_length,
+    )
+    return GuiaEstudioResponse.from_orm(guia)
+
+@router.post(
+    "/cursos/{curso_id}/guias-estudio/subida-directa",
+    response_model=SubidaDirectaGuiaResponse,
+    status_code=status.HTTP_201_CREATED
+)
+async def iniciar_subida_directa_guia(
+    curso_id: uuid.UUID,
+    payload: SubidaDirectaGuiaRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Preparar la subida de una guía de estudio directo del navegador a S3.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Parámetros**: `titulo`, `filename` y `content_type` del archivo
+    - **Respuesta**: Formulario POST prefirmado (`url` y `fields`); S3 rechaza archivos de
+      otro tipo o de más de `max_size` bytes. Al terminar la subida, confirmar la guía
+    """
+    guia, formulario = await CursoService(db).iniciar_subida_directa_guia(
+        curso_id, payload.titulo, payload.filename, payload.content_type
+    )
+    return SubidaDirectaGuiaResponse(
+        guia_id=guia.id,
+        url=formulario["url"],
+        metodo=formulario.get("metodo", "POST"),
+        fields=formulario["fields"],
+        max_size=MAX_FILE_SIZE,
+        expira_en=EXPIRACION_SUBIDA_DIRECTA,
+    )
+
+@router.post(
+    "/cursos/{curso_id}/guias-estudio/{guia_id}/confirmar",
+    response_model=GuiaEstudioResponse,
+    status_code=status.HTTP_200_OK
+)
+async def confirmar_subida_directa_guia(
+    curso_id: uuid.UUID,
+    guia_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Activar una guía de estudio subida directo a S3.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Parámetros**: `curso_id` y `guia_id` devuelto por la subida directa
+    - **Respuesta**: Guía activa; error si el archivo aún no está en S3
+    """
+    guia = await CursoService(db).confirmar_subida_directa_guia(curso_id, guia_id)
+    return GuiaEstudioResponse.from_orm(guia)
+
+@router.get(
+    "/jobs",
+    response_model=List[JobResponse],
+    status_code=status.HTTP_200_OK
+)
+async def listar_jobs(
+    response: Response,
+    estado: Optional[EstadoJob] = Query(None, description="Filtrar por estado (FALLIDO: cola de mensajes muertos)"),
+    tipo: Optional[str] = Query(None, description="Filtrar por tipo de tarea"),
+    cola: Optional[str] = Query(None, description="Filtrar por cola"),
+    skip: int = Query(0, ge=0, description="Número de registros a omitir (si no se envía cursor)"),
+    limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (encabezado X-Next-Cursor)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Listar tareas de la cola, más recientes primero.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Paginación**: Por cursor (`X-Next-Cursor`) o skip/limit
+    - **Respuesta**: Lista paginada de tareas con su estado, intentos y último error
+    """
+    job_service = JobService(db)
+    jobs = await job_service.list_jobs(
+        estado=estado, tipo=tipo, cola=cola, skip=skip, limit=limit, cursor=cursor
+    )
+    agregar_cursor_siguiente(response, KEYSET_JOBS, jobs, limit)
+    return [JobResponse.from_orm(job) for job in jobs]
+
+@router.get(
+    "/colas",
+    response_model=List[ColaResumenResponse],
+    status_code=status.HTTP_200_OK
+)
+async def resumen_colas(
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Número de tareas por cola y estado.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Respuesta**: Una fila por combinación de cola y estado con tareas
+    """
+    job_service = JobService(db)
+    filas = await job_service.resumen_colas()
+    return [ColaResumenResponse(cola=fila.cola, estado=fila.estado, total=fila.total) for fila in filas]
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=JobResponse,
+    status_code=status.HTTP_200_OK
+)
+async def obtener_job(
+    job_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Consultar estado y progreso de una tarea en background.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Parámetros**: `job_id` - ID de la tarea
+    - **Respuesta**: Estado, total y elementos procesados
+    """
+    job_service = JobService(db)
+    job = await job_service.get_job(job_id)
+    return JobResponse.from_orm(job)
+
+@router.post(
+    "/jobs/{job_id}/cancelar",
+    response_model=JobResponse,
+    status_code=status.HTTP_200_OK
+)
+async def cancelar_job(
+    job_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Solicitar la cancelación de una tarea en background.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Parámetros**: `job_id` - ID de la tarea
+    - **Respuesta**: Tarea con `cancelacion_solicitada`; se detiene al terminar el lote en curso,
+      o queda CANCELADO de inmediato si ningún worker la había tomado
+    """
+    job_service = JobService(db)
+    job = await job_service.solicitar_cancelacion(job_id)
+    return JobResponse.from_orm(job)
+
+@router.post(
+    "/jobs/{job_id}/reanudar",
+    response_model=JobResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def reanudar_job(
+    job_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Volver a encolar una tarea fallida (cola de mensajes muertos) con sus intentos en cero.
+    
+    - **Permisos**: Requiere rol de administrador
+    - **Parámetros**: `job_id` - ID de la tarea
+    - **Respuesta**: Tarea PENDIENTE con sus parámetros originales; las que guardan
+      checkpoint continúan desde él
+    """
+    job_service = JobService(db)
+    job = await job_service.reencolar(job_id)
+    return JobResponse.from_orm(job)
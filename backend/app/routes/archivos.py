@@ -0,0 +1,90 @@
+"""
+Descarga y subida de archivos del almacenamiento local (STORAGE_BACKEND=local).
+
+Equivalen a las URLs prefirmadas de S3: no requieren sesión, solo una firma vigente
+generada por LocalStorageService. Solo se registran con el backend local.
+"""
+
+import mimetypes
+from typing import Optional
+
+from fastapi import APIRouter, Header, Query, Request, Response, status
+from fastapi.responses import FileResponse
+
+from app.config import settings
+from app.services.s3_service import get_s3_service
+from app.utils.exceptions import AuthorizationError, NotFoundError, ValidationError
+from app.utils.error_codes import StorageErrorCodes, ValidationErrorCodes
+
+router = APIRouter(prefix="/archivos", tags=["Archivos"])
+
+
+class _RespuestaArchivo(FileResponse):
+    # Bloques de 1 MB: menos lecturas (y saltos a hilos) por byte que los 64 KB por defecto
+    chunk_size = 1024 * 1024
+
+
+def _firma_invalida() -> AuthorizationError:
+    return AuthorizationError("Firma inválida o vencida", error_code=StorageErrorCodes.INVALID_SIGNATURE)
+
+
+@router.api_route("/{s3_key:path}", methods=["GET", "HEAD"], status_code=status.HTTP_200_OK)
+async def descargar_archivo(
+    s3_key: str,
+    expira: int = Query(..., description="Vencimiento de la URL (epoch)"),
+    firma: str = Query(..., description="Firma de la URL"),
+):
+    """
+    Descargar un archivo con una URL firmada.
+
+    - **Permisos**: URL firmada vigente
+    - **Respuesta**: El archivo; admite `Range` (respuestas 206) e `If-Range`
+    """
+    almacenamiento = get_s3_service()
+    if not almacenamiento.verificar_firma("GET", s3_key, expira, firma):
+        raise _firma_invalida()
+    try:
+        ruta = almacenamiento.ruta_clave(s3_key)
+    except ValueError:
+        raise NotFoundError("Archivo", s3_key, error_code=StorageErrorCodes.FILE_NOT_FOUND)
+    if not ruta.is_file():
+        raise NotFoundError("Archivo", s3_key, error_code=StorageErrorCodes.FILE_NOT_FOUND)
+
+    media_type = mimetypes.guess_type(ruta.name)[0] or "application/octet-stream"
+    if settings.local_storage_accel_redirect:
+        # La firma ya se comprobó: nginx envía el archivo (sendfile, rangos) desde su location interno
+        relativa = ruta.relative_to(almacenamiento.raiz / "claves").as_posix()
+        return Response(
+            media_type=media_type,
+            headers={"X-Accel-Redirect": f"{settings.local_storage_accel_redirect.rstrip('/')}/{relativa}"},
+        )
+    return _RespuestaArchivo(ruta, media_type=media_type)
+
+
+@router.put("/{s3_key:path}", status_code=status.HTTP_204_NO_CONTENT)
+async def subir_archivo(
+    s3_key: str,
+    request: Request,
+    expira: int = Query(..., description="Vencimiento de la URL (epoch)"),
+    tipo: str = Query(..., description="Tipo MIME firmado"),
+    max: int = Query(..., description="Tamaño máximo firmado en bytes"),
+    firma: str = Query(..., description="Firma de la URL"),
+    content_type: Optional[str] = Header(None),
+):
+    """
+    Subir un archivo con una URL firmada para PUT (equivalente local de la subida directa a S3).
+
+    - **Permisos**: URL firmada vigente
+    - **Parámetros**: El cuerpo es el archivo, con el `Content-Type` firmado
+    - **Respuesta**: 204; el archivo se rechaza en cuanto supera el tamaño firmado
+    """
+    almacenamiento = get_s3_service()
+    if not almacenamiento.verificar_firma("PUT", s3_key, expira, firma, tipo, max):
+        raise _firma_invalida()
+    if content_type != tipo:
+        raise ValidationError(
+            f"El Content-Type debe ser {tipo}",
+            error_code=ValidationErrorCodes.INVALID_FILE_TYPE,
+        )
+    await almacenamiento.upload_stream(request.stream(), s3_key, content_type=tipo, max_size=max)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
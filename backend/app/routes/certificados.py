@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, status, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, Request, status, Query
+from fastapi.responses import RedirectResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
@@ -7,24 +8,61 @@ import uuid
 
 from app.database.session import get_db
 from app.database.models import Certificado, InscripcionCurso, Usuario
-from app.schemas.certificado import CertificadoResponse, CertificadoCreate
-from app.services.certificate_service import CertificateService, get_certificate_service
+from app.schemas.certificado import (
+    CertificadoResponse,
+    CertificadoCreate,
+    VerificacionCertificadoResponse,
+    VerificacionLoteRequest,
+)
+from app.config import settings
+from app.services.certificate_service import (
+    CertificateService,
+    clave_certificado,
+    clave_generacion_certificado,
+    clave_usuario,
+    get_certificate_service,
+)
+from app.services.eventos_service import CANAL_CERTIFICADOS, get_bus_eventos
 from app.services.inscripcion_service import InscripcionService
-from app.tasks.certificate_tasks import generar_certificado_background
+from app.services.verificacion_service import VerificacionService, normalizar_folio, resultado_verificacion
+from app.tasks.cola import encolar
+from app.utils.background_tasks import get_background_db_session
 from app.utils.jwt_auth import get_current_user
 from app.utils.roles import is_admin, require_role, UserRole
 from app.utils.exceptions import NotFoundError, AuthorizationError, BusinessRuleError
 from app.utils.error_codes import NotFoundErrorCodes, CertificateErrorCodes
+from app.utils.sse import HEADERS_SSE, MEDIA_TYPE_SSE, evento_sse, flujo_sse
 
 router = APIRouter(prefix="/certificados", tags=["Certificados"])
 
 
+def _estado_certificado(certificado: Certificado) -> dict:
+    if certificado.s3_key:
+        return {
+            "certificado_id": str(certificado.id),
+            "status": "completed",
+            "folio": certificado.folio,
+            "emitido_en": certificado.emitido_en,
+            "s3_key": certificado.s3_key
+        }
+    return {
+        "certificado_id": str(certificado.id),
+        "status": "processing",
+        "mensaje": "El certificado está siendo generado"
+    }
+
+
+def _es_completado(estado: dict) -> bool:
+    return estado.get("status") == "completed"
+
+
 @router.get(
     "",
     response_model=List[CertificadoResponse],
     status_code=status.HTTP_200_OK
 )
 async def listar_certificados(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -32,7 +70,8 @@ async def listar_certificados(
     Listar certificados del usuario autenticado.
     
     - **Permisos**: Requiere autenticación
-    - **Respuesta**: Lista de certificados del usuario autenticado
+    - **Respuesta**: Lista de certificados del usuario autenticado. `download_url` es la ruta
+      estable `/{certificado_id}/descarga`, que firma la URL de S3 solo al usarse
     - **Nota**: Si es administrador, puede ver todos (por ahora solo propios)
     """
     usuario_id = current_user.get("sub")
@@ -45,13 +84,13 @@ async def listar_certificados(
     result = await db.execute(stmt)
     certificados = result.scalars().all()
     
-    certificate_service = get_certificate_service()
+    # La mayoría de los certificados listados nunca se descarga: en lugar de firmar una
+    # URL de S3 por certificado se entrega la ruta de descarga, que firma al usarse
+    base_url = str(request.url_for("listar_certificados"))
     result_list = []
     for cert in certificados:
         estado = "COMPLETED" if cert.s3_key else "PROCESSING"
-        download_url = None
-        if cert.s3_key:
-            download_url = certificate_service.get_certificate_download_url(cert.s3_key)
+        download_url = f"{base_url}/{cert.id}/descarga" if cert.s3_key else None
         result_list.append(CertificadoResponse(
             id=cert.id,
             inscripcion_curso_id=cert.inscripcion_curso_id,
@@ -114,7 +153,7 @@ async def obtener_certificado_inscripcion(
     estado = "COMPLETED" if certificado.s3_key else "PROCESSING"
     download_url = None
     if certificado.s3_key:
-        download_url = certificate_service.get_certificate_download_url(certificado.s3_key)
+        download_url = await certificate_service.get_certificate_download_url(certificado.s3_key)
     
     return CertificadoResponse(
         id=certificado.id,
@@ -131,6 +170,85 @@ async def obtener_certificado_inscripcion(
     )
 
 
+@router.get(
+    "/eventos",
+    status_code=status.HTTP_200_OK
+)
+async def eventos_certificados_usuario(
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Recibir por Server-Sent Events los certificados del usuario autenticado que se completan.
+    
+    - **Permisos**: Requiere autenticación
+    - **Respuesta**: Flujo `text/event-stream` con un evento `estado` (mismo contenido que
+      `/{certificado_id}/estado`) por cada certificado completado mientras está abierto.
+      Se cierra tras `certificado_eventos_timeout_seconds`; el cliente se reconecta. Para
+      no perder eventos, abrir el flujo antes de consultar la lista de certificados.
+    """
+    async def contenido():
+        async with get_bus_eventos().suscribir(CANAL_CERTIFICADOS, clave_usuario(current_user.get("sub"))) as cola:
+            async for texto in flujo_sse(
+                cola,
+                "estado",
+                settings.eventos_keepalive_seconds,
+                settings.certificado_eventos_timeout_seconds,
+            ):
+                yield texto
+    
+    return StreamingResponse(contenido(), media_type=MEDIA_TYPE_SSE, headers=HEADERS_SSE)
+
+
+@router.get(
+    "/verificar/{folio}",
+    response_model=VerificacionCertificadoResponse,
+    status_code=status.HTTP_200_OK
+)
+async def verificar_certificado_folio(
+    folio: str,
+    hash: Optional[str] = Query(None, max_length=128, description="Hash de verificación del certificado"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Verificar la validez de un certificado por su folio.
+    
+    - **Permisos**: Endpoint público (no requiere autenticación)
+    - **Parámetros**: 
+      - `folio` - Folio impreso en el certificado
+      - `hash` - Hash de verificación (opcional); si se envía, también debe coincidir
+    - **Respuesta**: Validez del certificado, folio y fecha de emisión. 404 si el folio no existe
+    """
+    folio = normalizar_folio(folio)
+    certificado = (await VerificacionService(db).buscar([folio]))[folio]
+    if certificado is None:
+        raise NotFoundError("Certificado", folio, error_code=NotFoundErrorCodes.CERTIFICATE_NOT_FOUND)
+    return resultado_verificacion(folio, certificado, hash)
+
+
+@router.post(
+    "/verificar",
+    response_model=List[VerificacionCertificadoResponse],
+    status_code=status.HTTP_200_OK
+)
+async def verificar_certificados_lote(
+    payload: VerificacionLoteRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Verificar varios certificados en una sola llamada.
+    
+    - **Permisos**: Endpoint público (no requiere autenticación)
+    - **Parámetros**: `certificados` - Lista de hasta 1000 `{folio, hash}`; `hash` es opcional
+    - **Respuesta**: Un resultado por elemento, en el mismo orden. Los folios inexistentes
+      se reportan con `valido: false` y el mensaje "Certificado no encontrado"
+    """
+    encontrados = await VerificacionService(db).buscar(item.folio for item in payload.certificados)
+    return [
+        resultado_verificacion(normalizar_folio(item.folio), encontrados[normalizar_folio(item.folio)], item.hash)
+        for item in payload.certificados
+    ]
+
+
 @router.get(
     "/{certificado_id}",
     response_model=CertificadoResponse,
@@ -173,7 +291,7 @@ async def obtener_certificado(
     download_url = None
     
     if certificado.s3_key:
-        download_url = certificate_service.get_certificate_download_url(certificado.s3_key)
+        download_url = await certificate_service.get_certificate_download_url(certificado.s3_key)
         if not download_url:
             raise NotFoundError(
                 "URL de descarga",
@@ -196,6 +314,54 @@ async def obtener_certificado(
     )
 
 
+@router.get(
+    "/{certificado_id}/descarga",
+    status_code=status.HTTP_307_TEMPORARY_REDIRECT
+)
+async def descargar_certificado(
+    certificado_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+    certificate_service: CertificateService = Depends(get_certificate_service)
+):
+    """
+    Descargar el PDF de un certificado: redirige a una URL temporal de S3.
+    
+    - **Permisos**: Requiere autenticación. El usuario debe ser propietario del certificado o administrador
+    - **Parámetros**: `certificado_id` - ID del certificado
+    - **Respuesta**: 307 hacia la URL prefirmada. La firma se reutiliza mientras le quede
+      al menos la mitad de su validez (ver S3Service.generate_presigned_url)
+    """
+    stmt = (
+        select(Certificado.s3_key, InscripcionCurso.usuario_id)
+        .join(InscripcionCurso)
+        .where(Certificado.id == certificado_id)
+    )
+    fila = (await db.execute(stmt)).one_or_none()
+    
+    if not fila:
+        raise NotFoundError("Certificado", str(certificado_id), error_code=NotFoundErrorCodes.CERTIFICATE_NOT_FOUND)
+    
+    if str(fila.usuario_id) != current_user.get("sub") and not is_admin(current_user):
+        raise AuthorizationError("No tienes acceso a este certificado")
+    
+    if not fila.s3_key:
+        raise BusinessRuleError(
+            "El certificado aún se está generando",
+            error_code=CertificateErrorCodes.CERTIFICATE_FILE_NOT_AVAILABLE
+        )
+    
+    download_url = await certificate_service.get_certificate_download_url(fila.s3_key)
+    if not download_url:
+        raise NotFoundError(
+            "URL de descarga",
+            str(certificado_id),
+            error_code=CertificateErrorCodes.CERTIFICATE_DOWNLOAD_ERROR
+        )
+    
+    return RedirectResponse(download_url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+
 @router.get(
     "/{certificado_id}/verificar",
     status_code=status.HTTP_200_OK
@@ -244,7 +410,7 @@ async def verificar_certificado(
 @router.post("", status_code=status.HTTP_202_ACCEPTED)
 async def crear_certificado(
     payload: CertificadoCreate,
-    background_tasks: BackgroundTasks,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -253,8 +419,10 @@ async def crear_certificado(
     
     - **Permisos**: Requiere autenticación. El usuario debe ser propietario de la inscripción o administrador
     - **Parámetros**: `inscripcion_id` - ID de la inscripción acreditada en el body
-    - **Respuesta**: Retorna 202 Accepted y procesa la generación del PDF en background
-    - **Nota**: Si el certificado ya está generado, retorna estado "completed" inmediatamente
+    - **Respuesta**: Retorna 202 Accepted y encola la generación del PDF en la cola `certificados`
+    - **Nota**: Si el certificado ya está generado, retorna estado "completed" inmediatamente con la
+      ruta de descarga, sin volver a generarlo ni consultar S3. Si ya se está generando, no se
+      encola otra generación
     """
     usuario_id = current_user.get("sub")
     is_admin_user = is_admin(current_user)
@@ -284,8 +452,8 @@ async def crear_certificado(
         )
     
     if certificado.s3_key:
-        certificate_service = get_certificate_service()
-        download_url = certificate_service.get_certificate_download_url(certificado.s3_key) if certificado.s3_key else None
+        # Ya generado: ni S3 ni renderizado; la ruta de descarga firma la URL al usarse
+        download_url = str(request.url_for("descargar_certificado", certificado_id=certificado.id))
         return CertificadoResponse(
             id=certificado.id,
             inscripcion_curso_id=certificado.inscripcion_curso_id,
@@ -300,7 +468,14 @@ async def crear_certificado(
             download_url=download_url
         )
     
-    background_tasks.add_task(generar_certificado_background, certificado.id)
+    # Pedidos repetidos mientras se genera comparten la misma tarea
+    await encolar(
+        db,
+        "generar_certificado",
+        parametros={"certificado_id": certificado.id},
+        creado_por=usuario_id,
+        clave_unica=clave_generacion_certificado(certificado.inscripcion_curso_id),
+    )
     
     return CertificadoResponse(
         id=certificado.id,
@@ -353,17 +528,61 @@ async def obtener_estado_certificado(
     if str(certificado.inscripcion_curso.usuario_id) != usuario_id and not is_admin(current_user):
         raise AuthorizationError("No tienes acceso a este certificado")
     
-    if certificado.s3_key:
-        return {
-            "certificado_id": str(certificado_id),
-            "status": "completed",
-            "folio": certificado.folio,
-            "emitido_en": certificado.emitido_en,
-            "s3_key": certificado.s3_key
-        }
-    else:
-        return {
-            "certificado_id": str(certificado_id),
-            "status": "processing",
-            "mensaje": "El certificado está siendo generado"
-        }
+    return _estado_certificado(certificado)
+
+
+@router.get(
+    "/{certificado_id}/eventos",
+    status_code=status.HTTP_200_OK
+)
+async def eventos_estado_certificado(
+    certificado_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Recibir el estado de generación de un certificado por Server-Sent Events, en lugar de consultar `/estado`.
+    
+    - **Permisos**: Requiere autenticación. El usuario debe ser propietario del certificado o administrador
+    - **Parámetros**: `certificado_id` - ID del certificado
+    - **Respuesta**: Flujo `text/event-stream` con eventos `estado` (mismo contenido que `/estado`):
+      el estado actual al conectarse y el aviso del worker cuando se completa. El flujo termina
+      con el certificado completado, o tras `certificado_eventos_timeout_seconds` (el cliente
+      se reconecta)
+    """
+    stmt = (
+        select(InscripcionCurso.usuario_id)
+        .join(Certificado, Certificado.inscripcion_curso_id == InscripcionCurso.id)
+        .where(Certificado.id == certificado_id)
+    )
+    propietario_id = (await db.execute(stmt)).scalar_one_or_none()
+    
+    if propietario_id is None:
+        raise NotFoundError(
+            "Certificado",
+            str(certificado_id),
+            error_code=NotFoundErrorCodes.CERTIFICATE_NOT_FOUND
+        )
+    
+    if str(propietario_id) != current_user.get("sub") and not is_admin(current_user):
+        raise AuthorizationError("No tienes acceso a este certificado")
+    
+    async def contenido():
+        # Suscribirse antes de leer el estado: un aviso publicado entre ambos no se pierde
+        async with get_bus_eventos().suscribir(CANAL_CERTIFICADOS, clave_certificado(certificado_id)) as cola:
+            # Sesión propia: la del request se cierra antes de terminar el streaming
+            async with get_background_db_session() as db_estado:
+                estado = _estado_certificado(await db_estado.get(Certificado, certificado_id))
+            yield evento_sse(estado, "estado")
+            if _es_completado(estado):
+                return
+            async for texto in flujo_sse(
+                cola,
+                "estado",
+                settings.eventos_keepalive_seconds,
+                settings.certificado_eventos_timeout_seconds,
+                es_ultimo=_es_completado,
+            ):
+                yield texto
+    
+    return StreamingResponse(contenido(), media_type=MEDIA_TYPE_SSE, headers=HEADERS_SSE)
@@ -2,15 +2,16 @@ import logging
 from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, status
+from fastapi import APIRouter, Depends, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.session import get_db
 from app.schemas.curso import CursoCreate, CursoDetailResponse, CursoResponse, CursoUpdate
 from app.schemas.guia_estudio import GuiaEstudioResponse
 from app.schemas.modulo import ModuloResponse
-from app.services.curso_service import CursoService
+from app.services.curso_service import CursoService, KEYSET_CURSOS
 from app.schemas.examen_final import ExamenFinalDetailResponse
+from app.utils.pagination import agregar_cursor_siguiente
 from app.utils.roles import UserRole, require_role
 
 logger = logging.getLogger(__name__)
@@ -20,11 +21,13 @@ router = APIRouter(prefix="/cursos", tags=["Cursos"])
 
 @router.get("", response_model=List[CursoResponse], status_code=status.HTTP_200_OK)
 async def list_cursos(
+	response: Response,
 	db: AsyncSession = Depends(get_db),
 	publicado: Optional[bool] = Query(None, description="Filtrar por estado publicado"),
 	modulo_id: Optional[UUID] = Query(None, description="Filtrar por módulo"),
-	skip: int = Query(0, ge=0, description="Número de registros a omitir"),
+	skip: int = Query(0, ge=0, description="Número de registros a omitir (si no se envía cursor)"),
 	limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
+	cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (encabezado X-Next-Cursor)"),
 ):
 	"""
 	Listar cursos (materias) disponibles, con filtros opcionales.
@@ -33,12 +36,14 @@ async def list_cursos(
 	- **Parámetros**:
 	  - `publicado`: Filtra cursos por estado de publicación.
 	  - `modulo_id`: Filtra cursos por módulo.
-	  - `skip`: Número de cursos a omitir para paginación.
+	  - `cursor`: Cursor de la página siguiente, tomado del encabezado `X-Next-Cursor`.
+	  - `skip`: Número de cursos a omitir para paginación (compatibilidad, sin cursor).
 	  - `limit`: Número máximo de cursos a retornar para paginación.
 	- **Respuesta**: Lista paginada de cursos.
 	"""
 	service = CursoService(db)
-	cursos = await service.list_cursos(publicado=publicado, modulo_id=modulo_id, skip=skip, limit=limit)
+	cursos = await service.list_cursos(publicado=publicado, modulo_id=modulo_id, skip=skip, limit=limit, cursor=cursor)
+	agregar_cursor_siguiente(response, KEYSET_CURSOS, cursos, limit)
 	return cursos
 
 
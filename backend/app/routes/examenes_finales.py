@@ -2,7 +2,7 @@ import logging
 from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, status
+from fastapi import APIRouter, Depends, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
 
@@ -10,12 +10,15 @@ from app.database.session import get_db
 from app.database import models
 from app.schemas.examen_final import ExamenFinalConPreguntas, ExamenFinalDetailResponse
 from app.schemas.quiz import PreguntaConOpciones, OpcionResponse, PreguntaConfigResponse
-from app.schemas.intento import IntentoResponse, IntentoSubmission, IntentoResult
+from app.schemas.intento import IntentoResponse, IntentoSubmission, IntentoResult, BorradorResponse
 from app.services.examen_final_service import ExamenFinalService
+from app.services.quiz_service import KEYSET_INTENTOS
 from app.services.usuario_service import UsuarioService
+from app.services.autosave_service import get_autosave_service
 from app.utils.jwt_auth import get_current_user
 from app.utils.roles import is_admin
 from app.utils.exceptions import AuthorizationError, NotFoundError
+from app.utils.pagination import agregar_cursor_siguiente
 
 logger = logging.getLogger(__name__)
 
@@ -98,6 +101,7 @@ async def get_examen_final(
 		publicado=examen.publicado,
 		aleatorio=examen.aleatorio,
 		guarda_calificacion=examen.guarda_calificacion,
+		tiempo_limite_minutos=examen.tiempo_limite_minutos,
 		creado_en=examen.creado_en,
 		actualizado_en=examen.actualizado_en,
 		numero_preguntas=len(examen.preguntas),
@@ -185,6 +189,44 @@ async def update_intento_examen(
 	return resultado
 
 
+@router.put(
+	"/{examen_final_id}/intentos/{intento_id}/borrador",
+	response_model=BorradorResponse,
+	status_code=status.HTTP_202_ACCEPTED,
+)
+async def autoguardar_intento_examen(
+	examen_final_id: UUID,
+	intento_id: UUID,
+	payload: IntentoSubmission,
+	db: AsyncSession = Depends(get_db),
+	token_payload: dict = Depends(get_current_user),
+):
+	"""
+	Autoguardar respuestas en borrador de un intento abierto de examen final.
+	
+	- **Permisos**: Requiere autenticación. El usuario debe ser propietario del intento
+	- **Parámetros**: 
+	  - `examen_final_id` - ID del examen final
+	  - `intento_id` - ID del intento
+	  - `respuestas` - Respuestas a guardar; reemplazan el borrador previo de cada pregunta
+	- **Respuesta**: 202. Los borradores se escriben en lotes y se incluyen al enviar el intento
+	"""
+	usuario_service = UsuarioService(db)
+	usuario = await usuario_service.get_by_cognito_id(token_payload.get("sub"))
+	if not usuario:
+		raise AuthorizationError("Usuario no encontrado")
+	
+	guardadas = await get_autosave_service().guardar_borrador(
+		db,
+		intento_id=intento_id,
+		usuario_id=usuario.id,
+		respuestas=[r.dict() for r in payload.respuestas],
+		examen_final_id=examen_final_id,
+	)
+	
+	return BorradorResponse(intento_id=intento_id, preguntas_guardadas=guardadas)
+
+
 @router.get(
 	"/{examen_final_id}/intentos",
 	response_model=List[IntentoResponse],
@@ -192,16 +234,18 @@ async def update_intento_examen(
 )
 async def list_intentos_examen(
 	examen_final_id: UUID,
+	response: Response,
 	db: AsyncSession = Depends(get_db),
 	token_payload: Optional[dict] = Depends(get_current_user),
-	skip: int = Query(0, ge=0, description="Número de registros a omitir"),
+	skip: int = Query(0, ge=0, description="Número de registros a omitir (si no se envía cursor)"),
 	limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
+	cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (encabezado X-Next-Cursor)"),
 ):
 	"""
 	Obtener historial de intentos de un examen final para el usuario autenticado.
 
 	- **Permisos**: Requiere autenticación.
-	- **Paginación**: Usa `skip` y `limit` para paginación.
+	- **Paginación**: Por `cursor` (encabezado `X-Next-Cursor` de la página anterior) o `skip` y `limit`.
 	- **Respuesta**: Lista paginada de intentos de examen final.
 	"""
 	service = ExamenFinalService(db)
@@ -213,6 +257,7 @@ async def list_intentos_examen(
 		if usuario:
 			usuario_id = usuario.id
 	
-	intentos = await service.list_intentos(examen_final_id, usuario_id=usuario_id, skip=skip, limit=limit)
+	intentos = await service.list_intentos(examen_final_id, usuario_id=usuario_id, skip=skip, limit=limit, cursor=cursor)
+	agregar_cursor_siguiente(response, KEYSET_INTENTOS, intentos, limit)
 	return [IntentoResponse.from_orm(intento) for intento in intentos]
 
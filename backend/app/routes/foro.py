@@ -1,26 +1,60 @@
 import logging
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, status
+from fastapi import APIRouter, Depends, Header, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.database.session import get_db
 from app.schemas.foro import (
+	ForoBusquedaResponse,
 	ForoComentarioCreate,
 	ForoComentarioResponse,
 	ForoComentarioUpdate,
 )
-from app.services.foro_service import ForoService
+from app.services.eventos_service import CANAL_FORO, get_bus_eventos
+from app.services.foro_service import (
+	COMENTARIO_CREADO,
+	COMENTARIO_EDITADO,
+	COMENTARIO_ELIMINADO,
+	ForoService,
+	KEYSET_BUSQUEDA,
+	KEYSET_COMENTARIOS,
+	clave_leccion,
+	fragmento_resaltado,
+)
 from app.services.usuario_service import UsuarioService
+from app.utils.background_tasks import get_background_db_session
 from app.utils.jwt_auth import get_current_user
 from app.utils.roles import is_admin
-from app.utils.exceptions import AuthorizationError
+from app.utils.exceptions import AuthorizationError, ValidationError
+from app.utils.pagination import agregar_cursor_siguiente
+from app.utils.sse import HEADERS_SSE, MEDIA_TYPE_SSE, evento_sse, flujo_sse
+from app.utils.vuelo_unico import VueloUnico
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/foro", tags=["Foro"])
 
+# Cada comentario creado o editado se lee una vez por proceso, no una por flujo abierto
+_lecturas_comentarios = VueloUnico()
+
+
+def _evento_comentario(tipo: str, comentario: ForoComentarioResponse) -> str:
+	# Solo los creados llevan id: es el último visto con el que el cliente se reconecta
+	return evento_sse(comentario, tipo, id=str(comentario.id) if tipo == COMENTARIO_CREADO else None)
+
+
+async def _leer_comentario(comentario_id: UUID, evento: Optional[str]) -> Optional[ForoComentarioResponse]:
+	async def leer() -> Optional[ForoComentarioResponse]:
+		async with get_background_db_session() as db:
+			comentarios = await ForoService(db).get_comentarios([comentario_id])
+			return ForoComentarioResponse.from_orm(comentarios[0]) if comentarios else None
+
+	return await _lecturas_comentarios.ejecutar((comentario_id, evento), leer)
+
 
 @router.get(
 	"/cursos/{curso_id}/lecciones/{leccion_id}/comentarios",
@@ -30,10 +64,12 @@ router = APIRouter(prefix="/foro", tags=["Foro"])
 async def list_comentarios(
 	curso_id: UUID,
 	leccion_id: UUID,
+	response: Response,
 	db: AsyncSession = Depends(get_db),
 	token_payload: dict = Depends(get_current_user),
-	skip: int = Query(0, ge=0, description="Número de registros a omitir"),
+	skip: int = Query(0, ge=0, description="Número de registros a omitir (si no se envía cursor)"),
 	limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
+	cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (encabezado X-Next-Cursor)"),
 ):
 	"""
 	Listar comentarios de una lección específica.
@@ -42,7 +78,8 @@ async def list_comentarios(
 	- **Parámetros**:
 	  - `curso_id`: ID del curso.
 	  - `leccion_id`: ID de la lección.
-	  - `skip`: Número de comentarios a omitir para paginación.
+	  - `cursor`: Cursor de la página siguiente, tomado del encabezado `X-Next-Cursor`.
+	  - `skip`: Número de comentarios a omitir para paginación (compatibilidad, sin cursor).
 	  - `limit`: Número máximo de comentarios a retornar para paginación.
 	- **Respuesta**: Lista paginada de comentarios del foro.
 	"""
@@ -53,10 +90,140 @@ async def list_comentarios(
 	if not usuario:
 		raise AuthorizationError("Usuario no encontrado")
 	
-	comentarios = await service.list_comentarios_by_leccion(curso_id, leccion_id, skip=skip, limit=limit)
+	comentarios = await service.list_comentarios_by_leccion(curso_id, leccion_id, skip=skip, limit=limit, cursor=cursor)
+	agregar_cursor_siguiente(response, KEYSET_COMENTARIOS, comentarios, limit)
 	return [ForoComentarioResponse.from_orm(comentario) for comentario in comentarios]
 
 
+@router.get(
+	"/cursos/{curso_id}/buscar",
+	response_model=List[ForoBusquedaResponse],
+	status_code=status.HTTP_200_OK,
+)
+async def buscar_comentarios(
+	curso_id: UUID,
+	response: Response,
+	q: str = Query(..., min_length=3, max_length=200, description="Texto a buscar"),
+	leccion_id: Optional[UUID] = Query(None, description="Limitar la búsqueda a una lección del curso"),
+	limit: int = Query(20, ge=1, le=100, description="Número máximo de resultados a retornar"),
+	cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (encabezado X-Next-Cursor)"),
+	db: AsyncSession = Depends(get_db),
+	token_payload: dict = Depends(get_current_user),
+):
+	"""
+	Buscar comentarios del foro de un curso o de una lección.
+
+	- **Permisos**: Requiere autenticación.
+	- **Parámetros**:
+	  - `curso_id`: ID del curso.
+	  - `q`: Texto a buscar (al menos 3 caracteres); tolera errores de escritura.
+	  - `leccion_id`: ID de la lección, para buscar solo en ella.
+	  - `cursor`: Cursor de la página siguiente, tomado del encabezado `X-Next-Cursor`.
+	  - `limit`: Número máximo de resultados a retornar.
+	- **Respuesta**: Comentarios ordenados por similitud con `q` y recencia, cada uno con
+	  un `fragmento` y las posiciones de las palabras coincidentes (`resaltados`).
+	"""
+	service = ForoService(db)
+	usuario_service = UsuarioService(db)
+	
+	usuario = await usuario_service.get_by_cognito_id(token_payload.get("sub"))
+	if not usuario:
+		raise AuthorizationError("Usuario no encontrado")
+	
+	filas = await service.buscar_comentarios(curso_id, q, leccion_id=leccion_id, limit=limit, cursor=cursor)
+	agregar_cursor_siguiente(response, KEYSET_BUSQUEDA, filas, limit)
+	resultados = []
+	for fila in filas:
+		fragmento, resaltados = fragmento_resaltado(fila.contenido, q)
+		resultados.append(ForoBusquedaResponse(**fila._mapping, fragmento=fragmento, resaltados=resaltados))
+	return resultados
+
+
+@router.get(
+	"/cursos/{curso_id}/lecciones/{leccion_id}/eventos",
+	status_code=status.HTTP_200_OK,
+)
+async def eventos_comentarios(
+	curso_id: UUID,
+	leccion_id: UUID,
+	db: AsyncSession = Depends(get_db),
+	token_payload: dict = Depends(get_current_user),
+	desde: Optional[UUID] = Query(None, description="ID del último comentario recibido (alternativa a Last-Event-ID)"),
+	last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+	"""
+	Recibir por Server-Sent Events los cambios en los comentarios de una lección, en lugar de consultar la lista.
+
+	- **Permisos**: Requiere autenticación.
+	- **Parámetros**:
+	  - `curso_id`: ID del curso.
+	  - `leccion_id`: ID de la lección.
+	  - `Last-Event-ID` (encabezado, lo envía EventSource al reconectarse) o `desde`: ID del
+	    último comentario recibido. Se envían primero los comentarios creados después de él
+	    y los anteriores editados desde entonces; los eliminados mientras tanto no.
+	- **Respuesta**: Flujo `text/event-stream` con eventos `creado` y `editado` (el comentario,
+	  como en la lista; `creado` lleva su ID como id del evento) y `eliminado` (`{"id": ...}`).
+	  Si no se puede reanudar (el comentario ya no existe o hay demasiados cambios) se envía
+	  `reiniciar` y el flujo termina: el cliente debe releer el hilo y volver a conectarse sin
+	  ID. El flujo se cierra tras `foro_eventos_timeout_seconds`; el cliente se reconecta.
+	"""
+	usuario_service = UsuarioService(db)
+	
+	usuario = await usuario_service.get_by_cognito_id(token_payload.get("sub"))
+	if not usuario:
+		raise AuthorizationError("Usuario no encontrado")
+	
+	if desde is None and last_event_id:
+		try:
+			desde = UUID(last_event_id)
+		except ValueError:
+			raise ValidationError("Last-Event-ID debe ser el ID de un comentario")
+	
+	# Comentarios ya enviados al reanudar; su evento `creado` puede llegar además por la cola
+	reenviados = set()
+	
+	async def formatear(datos: dict) -> Optional[str]:
+		if datos["tipo"] == COMENTARIO_ELIMINADO:
+			return evento_sse({"id": datos["id"]}, COMENTARIO_ELIMINADO)
+		comentario_id = UUID(datos["id"])
+		if datos["tipo"] == COMENTARIO_CREADO and comentario_id in reenviados:
+			return None
+		comentario = await _leer_comentario(comentario_id, datos.get("evento"))
+		# Si ya se eliminó, su evento llega después
+		return _evento_comentario(datos["tipo"], comentario) if comentario is not None else None
+	
+	async def contenido():
+		# Suscribirse antes de leer lo pendiente: un comentario publicado entre ambos no se pierde
+		async with get_bus_eventos().suscribir(CANAL_FORO, clave_leccion(curso_id, leccion_id)) as cola:
+			if desde is not None:
+				limite = settings.foro_eventos_max_reanudacion
+				# Sesión propia: la del request se cierra antes de terminar el streaming
+				async with get_background_db_session() as db_cambios:
+					cambios = await ForoService(db_cambios).list_cambios_desde(curso_id, leccion_id, desde, limit=limite)
+					if cambios is None or len(cambios[0]) >= limite or len(cambios[1]) >= limite:
+						yield evento_sse({"mensaje": "No se puede reanudar; vuelve a leer los comentarios"}, "reiniciar")
+						return
+					nuevos, editados = cambios
+					pendientes = [
+						*((COMENTARIO_EDITADO, ForoComentarioResponse.from_orm(c)) for c in editados),
+						*((COMENTARIO_CREADO, ForoComentarioResponse.from_orm(c)) for c in nuevos),
+					]
+				for tipo, comentario in pendientes:
+					if tipo == COMENTARIO_CREADO:
+						reenviados.add(comentario.id)
+					yield _evento_comentario(tipo, comentario)
+			async for texto in flujo_sse(
+				cola,
+				"comentario",
+				settings.eventos_keepalive_seconds,
+				settings.foro_eventos_timeout_seconds,
+				formatear=formatear,
+			):
+				yield texto
+	
+	return StreamingResponse(contenido(), media_type=MEDIA_TYPE_SSE, headers=HEADERS_SSE)
+
+
 @router.post(
 	"/cursos/{curso_id}/lecciones/{leccion_id}/comentarios",
 	response_model=ForoComentarioResponse,
@@ -84,7 +251,6 @@ async def create_comentario(
 		raise AuthorizationError("Usuario no encontrado")
 	
 	if payload.curso_id != curso_id or payload.leccion_id != leccion_id:
-		from app.utils.exceptions import ValidationError
 		raise ValidationError("Los IDs en la URL y el payload deben coincidir")
 	
 	comentario = await service.create_comentario(
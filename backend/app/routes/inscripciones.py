@@ -2,15 +2,16 @@ import logging
 from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, status
+from fastapi import APIRouter, Depends, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.session import get_db
 from app.schemas.inscripcion import InscripcionCreate, InscripcionResponse, InscripcionEstadoUpdate
-from app.services.inscripcion_service import InscripcionService
+from app.services.inscripcion_service import InscripcionService, KEYSET_INSCRIPCIONES_USUARIO
 from app.services.usuario_service import UsuarioService
 from app.utils.jwt_auth import get_current_user
 from app.utils.exceptions import AuthorizationError
+from app.utils.pagination import agregar_cursor_siguiente
 
 logger = logging.getLogger(__name__)
 
@@ -50,11 +51,13 @@ async def create_inscripcion(
 	status_code=status.HTTP_200_OK,
 )
 async def list_inscripciones(
+	response: Response,
 	db: AsyncSession = Depends(get_db),
 	token_payload: dict = Depends(get_current_user),
 	estado: Optional[str] = Query(None, description="Filtrar por estado"),
-	skip: int = Query(0, ge=0, description="Número de registros a omitir"),
+	skip: int = Query(0, ge=0, description="Número de registros a omitir (si no se envía cursor)"),
 	limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
+	cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (encabezado X-Next-Cursor)"),
 ):
 	"""
 	Listar inscripciones del usuario autenticado.
@@ -62,7 +65,8 @@ async def list_inscripciones(
 	- **Permisos**: Requiere autenticación.
 	- **Parámetros**:
 	  - `estado`: Filtra inscripciones por estado (ACTIVA, PAUSADA, CONCLUIDA, etc.).
-	  - `skip`: Número de inscripciones a omitir para paginación.
+	  - `cursor`: Cursor de la página siguiente, tomado del encabezado `X-Next-Cursor`.
+	  - `skip`: Número de inscripciones a omitir para paginación (compatibilidad, sin cursor).
 	  - `limit`: Número máximo de inscripciones a retornar para paginación.
 	- **Respuesta**: Lista paginada de inscripciones del usuario.
 	"""
@@ -87,7 +91,9 @@ async def list_inscripciones(
 		estado=estado_enum,
 		skip=skip,
 		limit=limit,
+		cursor=cursor,
 	)
+	agregar_cursor_siguiente(response, KEYSET_INSCRIPCIONES_USUARIO, inscripciones, limit)
 	
 	return [InscripcionResponse.from_orm(inscripcion) for inscripcion in inscripciones]
 
@@ -156,6 +156,7 @@ async def get_quiz_by_leccion(
 		publicado=quiz.publicado,
 		aleatorio=quiz.aleatorio,
 		guarda_calificacion=quiz.guarda_calificacion,
+		tiempo_limite_minutos=quiz.tiempo_limite_minutos,
 		creado_en=quiz.creado_en,
 		actualizado_en=quiz.actualizado_en,
 		numero_preguntas=numero_preguntas,
@@ -2,18 +2,20 @@ import logging
 from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, status
+from fastapi import APIRouter, Depends, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.session import get_db
 from app.schemas.quiz import QuizConPreguntas, QuizDetailResponse, PreguntaConOpciones, OpcionResponse, PreguntaConfigResponse
-from app.schemas.intento import IntentoResponse, IntentoSubmission, IntentoResult
-from app.services.quiz_service import QuizService
+from app.schemas.intento import IntentoResponse, IntentoSubmission, IntentoResult, BorradorResponse
+from app.services.quiz_service import QuizService, KEYSET_INTENTOS
 from app.services.usuario_service import UsuarioService
+from app.services.autosave_service import get_autosave_service
 from app.services.leccion_service import LeccionService
 from app.utils.jwt_auth import get_current_user
 from app.utils.roles import is_admin
 from app.utils.exceptions import AuthorizationError
+from app.utils.pagination import agregar_cursor_siguiente
 
 logger = logging.getLogger(__name__)
 
@@ -86,6 +88,7 @@ async def get_quiz(
 		publicado=quiz.publicado,
 		aleatorio=quiz.aleatorio,
 		guarda_calificacion=quiz.guarda_calificacion,
+		tiempo_limite_minutos=quiz.tiempo_limite_minutos,
 		creado_en=quiz.creado_en,
 		actualizado_en=quiz.actualizado_en,
 		numero_preguntas=len(quiz.preguntas),
@@ -173,6 +176,44 @@ async def update_intento_quiz(
 	return resultado
 
 
+@router.put(
+	"/{quiz_id}/intentos/{intento_id}/borrador",
+	response_model=BorradorResponse,
+	status_code=status.HTTP_202_ACCEPTED,
+)
+async def autoguardar_intento_quiz(
+	quiz_id: UUID,
+	intento_id: UUID,
+	payload: IntentoSubmission,
+	db: AsyncSession = Depends(get_db),
+	token_payload: dict = Depends(get_current_user),
+):
+	"""
+	Autoguardar respuestas en borrador de un intento abierto de quiz.
+	
+	- **Permisos**: Requiere autenticación. El usuario debe ser propietario del intento
+	- **Parámetros**: 
+	  - `quiz_id` - ID del quiz
+	  - `intento_id` - ID del intento
+	  - `respuestas` - Respuestas a guardar; reemplazan el borrador previo de cada pregunta
+	- **Respuesta**: 202. Los borradores se escriben en lotes y se incluyen al enviar el intento
+	"""
+	usuario_service = UsuarioService(db)
+	usuario = await usuario_service.get_by_cognito_id(token_payload.get("sub"))
+	if not usuario:
+		raise AuthorizationError("Usuario no encontrado")
+	
+	guardadas = await get_autosave_service().guardar_borrador(
+		db,
+		intento_id=intento_id,
+		usuario_id=usuario.id,
+		respuestas=[r.dict() for r in payload.respuestas],
+		quiz_id=quiz_id,
+	)
+	
+	return BorradorResponse(intento_id=intento_id, preguntas_guardadas=guardadas)
+
+
 @router.get(
 	"/{quiz_id}/intentos",
 	response_model=List[IntentoResponse],
@@ -180,16 +221,18 @@ async def update_intento_quiz(
 )
 async def list_intentos_quiz(
 	quiz_id: UUID,
+	response: Response,
 	db: AsyncSession = Depends(get_db),
 	token_payload: Optional[dict] = Depends(get_current_user),
-	skip: int = Query(0, ge=0, description="Número de registros a omitir"),
+	skip: int = Query(0, ge=0, description="Número de registros a omitir (si no se envía cursor)"),
 	limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
+	cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (encabezado X-Next-Cursor)"),
 ):
 	"""
 	Obtener historial de intentos de un quiz para el usuario autenticado.
 
 	- **Permisos**: Requiere autenticación.
-	- **Paginación**: Usa `skip` y `limit` para paginación.
+	- **Paginación**: Por `cursor` (encabezado `X-Next-Cursor` de la página anterior) o `skip` y `limit`.
 	- **Respuesta**: Lista paginada de intentos de quiz.
 	"""
 	service = QuizService(db)
@@ -201,6 +244,7 @@ async def list_intentos_quiz(
 		if usuario:
 			usuario_id = usuario.id
 	
-	intentos = await service.list_intentos(quiz_id, usuario_id=usuario_id, skip=skip, limit=limit)
+	intentos = await service.list_intentos(quiz_id, usuario_id=usuario_id, skip=skip, limit=limit, cursor=cursor)
+	agregar_cursor_siguiente(response, KEYSET_INTENTOS, intentos, limit)
 	return [IntentoResponse.from_orm(intento) for intento in intentos]
 
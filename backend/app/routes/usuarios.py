@@ -1,13 +1,14 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, status
+from fastapi import APIRouter, Depends, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.session import get_db
 from app.schemas.usuario import UsuarioResponse, UsuarioUpdate
-from app.services.usuario_service import UsuarioService
+from app.services.usuario_service import UsuarioService, KEYSET_USUARIOS
 from app.utils.jwt_auth import get_current_user
+from app.utils.pagination import agregar_cursor_siguiente
 from app.utils.roles import UserRole, require_any_role, require_role
 
 router = APIRouter(prefix="/usuarios", tags=["Usuarios"])
@@ -90,18 +91,21 @@ async def get_usuario_by_id(
 
 @router.get("", response_model=List[UsuarioResponse], status_code=status.HTTP_200_OK)
 async def list_usuarios(
+	response: Response,
 	_: dict = Depends(require_role([UserRole.ADMIN])),
 	db: AsyncSession = Depends(get_db),
-	skip: int = Query(0, ge=0, description="Número de registros a omitir"),
+	skip: int = Query(0, ge=0, description="Número de registros a omitir (si no se envía cursor)"),
 	limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
+	cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (encabezado X-Next-Cursor)"),
 ):
 	"""
 	Listar usuarios con paginación.
 	
 	- **Permisos**: Requiere rol de administrador
-	- **Paginación**: Usa skip/limit para paginación
+	- **Paginación**: Por cursor (`X-Next-Cursor`) o skip/limit
 	- **Respuesta**: Lista paginada de usuarios
 	"""
 	service = UsuarioService(db)
-	usuarios = await service.list(limit=limit, offset=skip)
+	usuarios = await service.list(limit=limit, offset=skip, cursor=cursor)
+	agregar_cursor_siguiente(response, KEYSET_USUARIOS, usuarios, limit)
 	return usuarios
@@ -84,6 +84,7 @@ from .intento import (
 from .certificado import (
     CertificadoBase,
     CertificadoResponse,
+    VerificacionCertificadoResponse,
 )
 from .foro import (
     ForoComentarioBase,
@@ -160,6 +161,7 @@ __all__ = [
     "RespuestaBase",
     "CertificadoBase",
     "CertificadoResponse",
+    "VerificacionCertificadoResponse",
     "ForoComentarioBase",
     "ForoComentarioResponse",
     "PreferenciaNotificacionBase",
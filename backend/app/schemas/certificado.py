@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Literal
+from typing import List, Optional, Literal
 import uuid
 from datetime import datetime
 
@@ -23,7 +23,29 @@ class CertificadoResponse(CertificadoBase):
     creado_en: Optional[datetime]
     actualizado_en: Optional[datetime]
     estado: Literal["PROCESSING", "COMPLETED"] = Field(..., description="Estado de generación del certificado")
-    download_url: Optional[str] = Field(None, description="URL temporal de descarga (solo si estado es COMPLETED)")
+    download_url: Optional[str] = Field(
+        None,
+        description="URL de descarga (solo si estado es COMPLETED): temporal, o en los listados la ruta estable que redirige a ella"
+    )
 
     class Config:
         from_attributes = True
+
+
+class VerificacionCertificadoItem(BaseModel):
+    folio: str = Field(..., min_length=1, max_length=50, description="Folio impreso en el certificado")
+    hash: Optional[str] = Field(None, max_length=128, description="Hash de verificación, si se cuenta con él (p. ej. del código QR)")
+
+
+class VerificacionLoteRequest(BaseModel):
+    """Schema para verificar varios certificados en una llamada"""
+    certificados: List[VerificacionCertificadoItem] = Field(
+        ..., min_length=1, max_length=1000, description="Certificados a verificar (hasta 1000)"
+    )
+
+
+class VerificacionCertificadoResponse(BaseModel):
+    folio: str
+    valido: bool = Field(..., description="El certificado existe, no fue revocado y el hash (si se envió) coincide")
+    emitido_en: Optional[datetime] = None
+    mensaje: str
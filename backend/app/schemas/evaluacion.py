@@ -13,6 +13,7 @@ class QuizBase(BaseModel):
     publicado: Optional[bool] = False
     aleatorio: Optional[bool] = False
     guarda_calificacion: Optional[bool] = False
+    tiempo_limite_minutos: Optional[int] = None
 
 
 class QuizCreate(QuizBase):
@@ -24,6 +25,7 @@ class QuizUpdate(BaseModel):
     publicado: Optional[bool] = None
     aleatorio: Optional[bool] = None
     guarda_calificacion: Optional[bool] = None
+    tiempo_limite_minutos: Optional[int] = None
 
 
 class QuizResponse(QuizBase):
@@ -43,6 +45,7 @@ class ExamenFinalBase(BaseModel):
     publicado: Optional[bool] = False
     aleatorio: Optional[bool] = False
     guarda_calificacion: Optional[bool] = False
+    tiempo_limite_minutos: Optional[int] = None
 
 
 class ExamenFinalCreate(ExamenFinalBase):
@@ -54,6 +57,7 @@ class ExamenFinalUpdate(BaseModel):
     publicado: Optional[bool] = None
     aleatorio: Optional[bool] = None
     guarda_calificacion: Optional[bool] = None
+    tiempo_limite_minutos: Optional[int] = None
 
 
 class ExamenFinalResponse(ExamenFinalBase):
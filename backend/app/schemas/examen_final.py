@@ -18,6 +18,7 @@ class ExamenFinalBase(BaseModel):
     publicado: Optional[bool] = Field(False, description="Indica si el examen está publicado")
     aleatorio: Optional[bool] = Field(False, description="Indica si las preguntas se muestran en orden aleatorio")
     guarda_calificacion: Optional[bool] = Field(False, description="Indica si se guarda la calificación del intento")
+    tiempo_limite_minutos: Optional[int] = Field(None, ge=1, description="Tiempo límite por intento en minutos (sin límite si es nulo)")
 
 
 class ExamenFinalCreate(ExamenFinalBase):
@@ -29,6 +30,7 @@ class ExamenFinalUpdate(BaseModel):
     publicado: Optional[bool] = Field(None, description="Indica si el examen está publicado")
     aleatorio: Optional[bool] = Field(None, description="Indica si las preguntas se muestran en orden aleatorio")
     guarda_calificacion: Optional[bool] = Field(None, description="Indica si se guarda la calificación del intento")
+    tiempo_limite_minutos: Optional[int] = Field(None, ge=1, description="Tiempo límite por intento en minutos (sin límite si es nulo)")
 
 
 class ExamenFinalResponse(ExamenFinalBase):
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional, Tuple
 import uuid
 from datetime import datetime
 
@@ -35,3 +35,12 @@ class ForoComentarioResponse(ForoComentarioBase):
 
     class Config:
         from_attributes = True
+
+
+class ForoBusquedaResponse(ForoComentarioResponse):
+    similitud: float = Field(..., description="Similitud de la consulta con el comentario (0 a 1)")
+    fragmento: str = Field(..., description="Fragmento del comentario alrededor de la coincidencia")
+    resaltados: List[Tuple[int, int]] = Field(
+        default_factory=list,
+        description="Posiciones [inicio, fin) de las palabras coincidentes dentro de `fragmento`"
+    )
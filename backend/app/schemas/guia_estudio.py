@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, Optional
 import uuid
 from datetime import datetime
 
@@ -18,3 +18,18 @@ class GuiaEstudioResponse(GuiaEstudioBase):
 
     class Config:
         from_attributes = True
+
+
+class SubidaDirectaGuiaRequest(BaseModel):
+    titulo: str = Field(..., min_length=1, max_length=200, description="Título de la guía de estudio")
+    filename: str = Field(..., min_length=1, max_length=200, description="Nombre del archivo a subir")
+    content_type: str = Field(..., description="Tipo MIME del archivo")
+
+
+class SubidaDirectaGuiaResponse(BaseModel):
+    guia_id: uuid.UUID = Field(..., description="ID de la guía creada (inactiva hasta confirmar)")
+    url: str = Field(..., description="URL a la que el navegador envía el archivo")
+    metodo: str = Field("POST", description="POST: formulario con `fields` y el campo `file` (S3); PUT: el archivo como cuerpo (almacenamiento local)")
+    fields: Dict[str, str] = Field(..., description="Campos del formulario, antes del campo `file`")
+    max_size: int = Field(..., description="Tamaño máximo aceptado en bytes")
+    expira_en: int = Field(..., description="Segundos de validez del formulario")
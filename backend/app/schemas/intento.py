@@ -37,6 +37,7 @@ class IntentoResponse(IntentoBase):
     resultado: Optional[ResultadoIntento] = None
     iniciado_en: Optional[datetime] = None
     finalizado_en: Optional[datetime] = None
+    expira_en: Optional[datetime] = None
     creado_en: Optional[datetime] = None
     actualizado_en: Optional[datetime] = None
 
@@ -79,6 +80,12 @@ class IntentoSubmission(BaseModel):
     respuestas: List[RespuestaCreate]
 
 
+class BorradorResponse(BaseModel):
+    """Schema de confirmación de autoguardado de respuestas en borrador"""
+    intento_id: uuid.UUID
+    preguntas_guardadas: int = 0
+
+
 class IntentoResult(BaseModel):
     """Schema para resultado de un intento"""
     intento_id: uuid.UUID
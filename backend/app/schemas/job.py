@@ -0,0 +1,62 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
+import uuid
+from datetime import datetime
+
+from app.database.enums import EstadoJob
+
+
+class JobResponse(BaseModel):
+    id: uuid.UUID
+    tipo: str = Field(..., description="Tipo de tarea")
+    estado: EstadoJob = Field(..., description="Estado actual de la tarea")
+    parametros: Optional[dict] = Field(None, description="Parámetros con los que se lanzó la tarea")
+    total: Optional[int] = Field(None, description="Total de elementos a procesar, si se conoce")
+    procesados: int = Field(0, description="Elementos procesados hasta ahora")
+    cancelacion_solicitada: bool = Field(False, description="Indica si se pidió detener la tarea")
+    checkpoint: Optional[dict] = Field(None, description="Punto desde el cual se reanuda la tarea")
+    resultado: Optional[dict] = Field(None, description="Resultado de la tarea al completarse")
+    error: Optional[str] = Field(None, description="Mensaje de error si la tarea falló")
+    cola: str = Field("default", description="Cola en la que se ejecuta la tarea")
+    intentos: int = Field(0, description="Veces que un worker ha tomado la tarea")
+    max_intentos: int = Field(1, description="Intentos antes de quedar FALLIDO")
+    disponible_en: Optional[datetime] = Field(None, description="Momento a partir del cual se puede (re)intentar")
+    clave_unica: Optional[str] = Field(None, description="Clave que impide encolar la misma tarea mientras esta sigue activa")
+    creado_por: Optional[uuid.UUID] = None
+    creado_en: Optional[datetime] = None
+    iniciado_en: Optional[datetime] = None
+    finalizado_en: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ColaResumenResponse(BaseModel):
+    cola: str
+    estado: EstadoJob
+    total: int
+
+
+class ResetIntentosMasivoRequest(BaseModel):
+    usuario_id: Optional[uuid.UUID] = Field(None, description="Resetear los intentos de un usuario")
+    curso_id: Optional[uuid.UUID] = Field(None, description="Resetear los intentos de un curso")
+    intento_ids: Optional[List[uuid.UUID]] = Field(None, description="Resetear una lista específica de intentos")
+
+
+class LimpiezaDatosRequest(BaseModel):
+    dias_antiguedad: int = Field(365, ge=1, description="Antigüedad mínima en días de los datos a eliminar")
+    eliminar_intentos: bool = Field(False, description="Eliminar intentos antiguos (con sus preguntas y respuestas)")
+    eliminar_inscripciones_inactivas: bool = Field(False, description="Eliminar inscripciones pausadas antiguas")
+    archivar: bool = Field(False, description="Archivar cada lote en archivos comprimidos antes de borrarlo")
+    formato_archivo: Literal["jsonl", "csv"] = Field("jsonl", description="Formato de los archivos de archivo")
+
+
+class ReporteInscripcionesRequest(BaseModel):
+    curso_id: Optional[uuid.UUID] = Field(None, description="Filtrar por curso; todas las inscripciones si es nulo")
+    formato: Literal["csv", "jsonl"] = Field("csv", description="Formato del reporte")
+    comprimir: bool = Field(True, description="Comprimir el reporte con gzip")
+
+
+class RecordatorioProgresoRequest(BaseModel):
+    dias_inactividad: int = Field(14, ge=1, description="Días sin finalizar intentos para recibir el recordatorio")
+    curso_id: Optional[uuid.UUID] = Field(None, description="Solo las inscripciones de este curso; todas si es nulo")
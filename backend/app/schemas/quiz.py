@@ -17,6 +17,7 @@ class QuizBase(BaseModel):
     publicado: Optional[bool] = Field(False, description="Indica si el quiz está publicado")
     aleatorio: Optional[bool] = Field(False, description="Indica si las preguntas se muestran en orden aleatorio")
     guarda_calificacion: Optional[bool] = Field(False, description="Indica si se guarda la calificación del intento")
+    tiempo_limite_minutos: Optional[int] = Field(None, ge=1, description="Tiempo límite por intento en minutos (sin límite si es nulo)")
 
 
 class QuizCreate(QuizBase):
@@ -28,6 +29,7 @@ class QuizUpdate(BaseModel):
     publicado: Optional[bool] = Field(None, description="Indica si el quiz está publicado")
     aleatorio: Optional[bool] = Field(None, description="Indica si las preguntas se muestran en orden aleatorio")
     guarda_calificacion: Optional[bool] = Field(None, description="Indica si se guarda la calificación del intento")
+    tiempo_limite_minutos: Optional[int] = Field(None, ge=1, description="Tiempo límite por intento en minutos (sin límite si es nulo)")
 
 
 class QuizResponse(QuizBase):
@@ -5,14 +5,20 @@ import uuid
 
 from app.database.models import Usuario, Rol, UsuarioRol, InscripcionCurso, Intento, EstadoInscripcion
 from app.utils.exceptions import EBSException
+from app.services.usuario_service import KEYSET_USUARIOS
+from app.utils.pagination import Keyset
+
+# Orden de los listados administrativos: más recientes primero
+KEYSET_INSCRIPCIONES = Keyset(InscripcionCurso.creado_en, InscripcionCurso.id, descendente=True)
+KEYSET_INTENTOS = Keyset(Intento.creado_en, Intento.id, descendente=True)
 
 class AdminService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def get_usuarios(self, skip: int = 0, limit: int = 100) -> List[Usuario]:
-        """Listar todos los usuarios"""
-        stmt = select(Usuario).offset(skip).limit(limit)
+    async def get_usuarios(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Usuario]:
+        """Listar todos los usuarios, por cursor o, sin él, por skip"""
+        stmt = KEYSET_USUARIOS.aplicar(select(Usuario), cursor=cursor, skip=skip, limit=limit)
         result = await self.db.execute(stmt)
         return result.scalars().all()
 
@@ -48,9 +54,9 @@ class AdminService:
         await self.db.refresh(usuario)
         return usuario
 
-    async def get_inscripciones(self, skip: int = 0, limit: int = 100) -> List[InscripcionCurso]:
-        """Listar todas las inscripciones"""
-        stmt = select(InscripcionCurso).offset(skip).limit(limit)
+    async def get_inscripciones(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[InscripcionCurso]:
+        """Listar todas las inscripciones, por cursor o, sin él, por skip"""
+        stmt = KEYSET_INSCRIPCIONES.aplicar(select(InscripcionCurso), cursor=cursor, skip=skip, limit=limit)
         result = await self.db.execute(stmt)
         return result.scalars().all()
 
@@ -67,9 +73,9 @@ class AdminService:
         await self.db.refresh(inscripcion)
         return inscripcion
 
-    async def get_intentos(self, skip: int = 0, limit: int = 100) -> List[Intento]:
-        """Listar todos los intentos"""
-        stmt = select(Intento).offset(skip).limit(limit)
+    async def get_intentos(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Intento]:
+        """Listar todos los intentos, por cursor o, sin él, por skip"""
+        stmt = KEYSET_INTENTOS.aplicar(select(Intento), cursor=cursor, skip=skip, limit=limit)
         result = await self.db.execute(stmt)
         return result.scalars().all()
 
@@ -0,0 +1,401 @@
+"""
+Autoguardado write-behind de respuestas en borrador.
+
+Las respuestas de un intento abierto se acumulan en memoria (por worker) y se
+escriben en `respuesta` en lotes: por temporizador, al alcanzar el tamaño de lote
+o al enviar el intento. Cada borrador reemplaza las respuestas previas de su
+pregunta, de modo que el último guardado gana.
+
+Los borradores de un worker solo se ven en la BD tras el siguiente volcado; el
+envío final espera al volcado en curso y escribe los borradores de su propio
+worker en su transacción. Cada volcado toma el intento FOR SHARE y el envío FOR
+UPDATE, así que un volcado concurrente de otro worker espera al envío y, al ver
+el intento finalizado, no escribe nada.
+
+Al finalizar un intento (envío o barrido) se publica un evento para que cada
+worker lo quite de su caché y descarte sus borradores; sin él, un worker que ya
+tenía el intento en caché seguiría aceptando borradores que nunca se escribirán.
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database.enums import TipoPregunta
+from app.services.eventos_service import CANAL_INTENTOS_FINALIZADOS, Evento, get_bus_eventos, publicar
+from app.utils.background_tasks import get_background_db_session
+from app.utils.exceptions import AuthorizationError, BusinessRuleError, NotFoundError, ValidationError
+
+logger = logging.getLogger(__name__)
+
+ClaveBorrador = Tuple[uuid.UUID, uuid.UUID]  # (intento_id, intento_pregunta_id)
+
+# Todos los workers escuchan todos los intentos finalizados
+_CLAVE_FINALIZADOS = "todos"
+# Ids por evento, para no pasar del límite de tamaño de NOTIFY
+_INTENTOS_POR_EVENTO = 100
+
+
+@dataclass
+class _IntentoAbierto:
+	"""Metadatos de un intento abierto, cacheados para validar borradores sin ir a la BD."""
+	usuario_id: uuid.UUID
+	quiz_id: Optional[uuid.UUID]
+	examen_final_id: Optional[uuid.UUID]
+	# pregunta_id -> (intento_pregunta_id, tipo de pregunta)
+	preguntas: Dict[uuid.UUID, Tuple[uuid.UUID, Optional[TipoPregunta]]] = field(default_factory=dict)
+	expira_en: Optional[datetime] = None
+
+
+_SQL_BLOQUEAR_INTENTOS = text("""
+	SELECT id FROM intento
+	WHERE id = ANY(CAST(:intento_ids AS uuid[])) AND finalizado_en IS NULL
+	ORDER BY id
+	FOR SHARE
+""")
+
+_SQL_BORRAR_RESPUESTAS = text("""
+	DELETE FROM respuesta r
+	USING intento_pregunta ip, intento i
+	WHERE r.intento_pregunta_id = ip.id
+		AND ip.intento_id = i.id
+		AND i.finalizado_en IS NULL
+		AND r.intento_pregunta_id = ANY(CAST(:intento_pregunta_ids AS uuid[]))
+""")
+
+_SQL_INSERTAR_RESPUESTAS = text("""
+	INSERT INTO respuesta (id, intento_pregunta_id, respuesta_texto, opcion_id, respuesta_bool)
+	SELECT d.id, d.intento_pregunta_id, d.respuesta_texto, d.opcion_id, d.respuesta_bool
+	FROM unnest(
+		CAST(:ids AS uuid[]),
+		CAST(:intento_pregunta_ids AS uuid[]),
+		CAST(:textos AS text[]),
+		CAST(:opciones AS uuid[]),
+		CAST(:bools AS boolean[])
+	) AS d(id, intento_pregunta_id, respuesta_texto, opcion_id, respuesta_bool)
+	JOIN intento_pregunta ip ON ip.id = d.intento_pregunta_id
+	JOIN intento i ON i.id = ip.intento_id
+	WHERE i.finalizado_en IS NULL
+""")
+
+
+class AutosaveService:
+	"""Buffer en memoria de respuestas en borrador con volcado por lotes a la BD."""
+
+	def __init__(
+		self,
+		intervalo_flush: float = 2.0,
+		tamano_lote: int = 500,
+		max_pendientes: int = 50000,
+	):
+		self.intervalo_flush = intervalo_flush
+		self.tamano_lote = tamano_lote
+		self.max_pendientes = max_pendientes
+		self._borradores: Dict[ClaveBorrador, List[dict]] = {}
+		self._intentos: "OrderedDict[uuid.UUID, _IntentoAbierto]" = OrderedDict()
+		self._flush_lock = asyncio.Lock()
+		self._tarea: Optional[asyncio.Task] = None
+		self._tareas_flush: Set[asyncio.Task] = set()
+
+	@property
+	def pendientes(self) -> int:
+		return len(self._borradores)
+
+	async def guardar_borrador(
+		self,
+		db: AsyncSession,
+		intento_id: uuid.UUID,
+		usuario_id: uuid.UUID,
+		respuestas: List[dict],
+		quiz_id: Optional[uuid.UUID] = None,
+		examen_final_id: Optional[uuid.UUID] = None,
+	) -> int:
+		"""
+		Registrar respuestas en borrador de un intento abierto.
+
+		Solo consulta la BD la primera vez que ve el intento en este worker.
+		Retorna el número de preguntas guardadas en borrador.
+		"""
+		intento = await self._get_intento_abierto(db, intento_id)
+
+		if intento.usuario_id != usuario_id:
+			raise AuthorizationError("No tienes permiso para modificar este intento")
+		if quiz_id is not None and intento.quiz_id != quiz_id:
+			raise AuthorizationError("El intento no pertenece a este quiz")
+		if examen_final_id is not None and intento.examen_final_id != examen_final_id:
+			raise AuthorizationError("El intento no pertenece a este examen final")
+		if intento.expira_en and intento.expira_en <= datetime.now(timezone.utc):
+			self._intentos.pop(intento_id, None)
+			raise BusinessRuleError("El tiempo límite de este intento ya expiró")
+
+		por_pregunta: Dict[uuid.UUID, List[dict]] = {}
+		for respuesta in respuestas:
+			pregunta_id = respuesta.get("pregunta_id")
+			if pregunta_id not in intento.preguntas:
+				raise ValidationError(f"Pregunta {pregunta_id} no pertenece a este intento")
+			intento_pregunta_id, tipo = intento.preguntas[pregunta_id]
+			self._validar_tipo(tipo, respuesta)
+			por_pregunta.setdefault(intento_pregunta_id, []).append(respuesta)
+
+		for intento_pregunta_id, lista in por_pregunta.items():
+			self._borradores[(intento_id, intento_pregunta_id)] = lista
+
+		if self.pendientes >= self.max_pendientes:
+			# Contrapresión: el buffer está lleno, volcar antes de responder
+			await self.flush()
+		elif self.pendientes >= self.tamano_lote and not self._flush_lock.locked():
+			tarea = asyncio.create_task(self.flush())
+			self._tareas_flush.add(tarea)
+			tarea.add_done_callback(self._tareas_flush.discard)
+
+		return len(por_pregunta)
+
+	async def volcar_intento(self, db: AsyncSession, intento_id: uuid.UUID) -> int:
+		"""
+		Escribir los borradores pendientes de un intento en la sesión dada, sin commit.
+
+		Se usa al enviar el intento para que los borradores queden en la misma
+		transacción que el envío final. Olvida el intento del buffer. Llamarlo antes
+		de bloquear el intento: espera a que termine el volcado en curso, que puede
+		haber tomado ya borradores anteriores del intento y necesita su FOR SHARE.
+		"""
+		async with self._flush_lock:
+			claves = [clave for clave in self._borradores if clave[0] == intento_id]
+			lote = {clave: self._borradores.pop(clave) for clave in claves}
+			self._intentos.pop(intento_id, None)
+		if lote:
+			await self._escribir_lote(db, lote)
+		return len(lote)
+
+	def olvidar_intentos(self, intento_ids: Iterable[uuid.UUID]) -> int:
+		"""
+		Quitar intentos finalizados de la caché y descartar sus borradores.
+
+		Retorna el número de borradores descartados.
+		"""
+		ids = set(intento_ids)
+		for intento_id in ids:
+			self._intentos.pop(intento_id, None)
+		claves = [clave for clave in self._borradores if clave[0] in ids]
+		for clave in claves:
+			del self._borradores[clave]
+		if claves:
+			logger.warning(f"Se descartan {len(claves)} borradores pendientes de intentos finalizados")
+		return len(claves)
+
+	def vaciar_cache(self) -> None:
+		"""Olvidar todos los intentos cacheados; los borradores pendientes se conservan."""
+		self._intentos.clear()
+
+	async def flush(self) -> int:
+		"""Volcar todos los borradores pendientes en lotes de `tamano_lote`."""
+		async with self._flush_lock:
+			total = 0
+			while self._borradores:
+				claves = list(self._borradores)[: self.tamano_lote]
+				lote = {clave: self._borradores.pop(clave) for clave in claves}
+				total += await self._volcar_lote(lote)
+			return total
+
+	async def start(self) -> None:
+		"""Iniciar el volcado periódico en el event loop actual."""
+		if self._tarea is None or self._tarea.done():
+			self._tarea = asyncio.create_task(self._loop_flush())
+
+	async def stop(self) -> None:
+		"""Detener el volcado periódico y volcar lo que quede pendiente."""
+		if self._tarea is not None:
+			self._tarea.cancel()
+			try:
+				await self._tarea
+			except asyncio.CancelledError:
+				pass
+			self._tarea = None
+		if self._tareas_flush:
+			await asyncio.gather(*self._tareas_flush, return_exceptions=True)
+		await self.flush()
+
+	async def _loop_flush(self) -> None:
+		while True:
+			await asyncio.sleep(self.intervalo_flush)
+			try:
+				await self.flush()
+			except Exception as e:
+				logger.error(f"Error en volcado periódico de borradores: {e}", exc_info=True)
+
+	async def _volcar_lote(self, lote: Dict[ClaveBorrador, List[dict]]) -> int:
+		"""Escribir un lote en su propia transacción; si falla, aislar por intento."""
+		try:
+			async with get_background_db_session() as db:
+				await self._escribir_lote(db, lote)
+				await db.commit()
+			return len(lote)
+		except Exception as e:
+			logger.warning(f"Falló el volcado de {len(lote)} borradores, reintentando por intento: {e}")
+
+		escritos = 0
+		por_intento: Dict[uuid.UUID, Dict[ClaveBorrador, List[dict]]] = {}
+		for clave, respuestas in lote.items():
+			por_intento.setdefault(clave[0], {})[clave] = respuestas
+		for intento_id, sublote in por_intento.items():
+			try:
+				async with get_background_db_session() as db:
+					await self._escribir_lote(db, sublote)
+					await db.commit()
+				escritos += len(sublote)
+			except Exception as e:
+				logger.error(f"Borradores del intento {intento_id} descartados: {e}", exc_info=True)
+				self._intentos.pop(intento_id, None)
+		return escritos
+
+	@staticmethod
+	async def _escribir_lote(db: AsyncSession, lote: Dict[ClaveBorrador, List[dict]]) -> None:
+		"""
+		Reemplazar las respuestas de cada pregunta del lote con dos sentencias.
+
+		Antes bloquea FOR SHARE los intentos del lote que sigan abiertos y descarta
+		los borradores de los demás: si el intento se está enviando, espera a que el
+		envío confirme y entonces ya lo ve finalizado.
+		"""
+		result = await db.execute(
+			_SQL_BLOQUEAR_INTENTOS,
+			{"intento_ids": list({clave[0] for clave in lote})},
+		)
+		abiertos = set(result.scalars().all())
+		descartados = sum(1 for clave in lote if clave[0] not in abiertos)
+		if descartados:
+			logger.warning(f"Se descartan {descartados} borradores de intentos ya finalizados")
+		lote = {clave: respuestas for clave, respuestas in lote.items() if clave[0] in abiertos}
+		if not lote:
+			return
+
+		ids, intento_pregunta_ids, textos, opciones, bools = [], [], [], [], []
+		for (_, intento_pregunta_id), respuestas in lote.items():
+			for respuesta in respuestas:
+				ids.append(uuid.uuid4())
+				intento_pregunta_ids.append(intento_pregunta_id)
+				textos.append(respuesta.get("respuesta_texto"))
+				opciones.append(respuesta.get("opcion_id"))
+				bools.append(respuesta.get("respuesta_bool"))
+
+		await db.execute(
+			_SQL_BORRAR_RESPUESTAS,
+			{"intento_pregunta_ids": [clave[1] for clave in lote]},
+		)
+		if ids:
+			await db.execute(
+				_SQL_INSERTAR_RESPUESTAS,
+				{
+					"ids": ids,
+					"intento_pregunta_ids": intento_pregunta_ids,
+					"textos": textos,
+					"opciones": opciones,
+					"bools": bools,
+				},
+			)
+
+	async def _get_intento_abierto(self, db: AsyncSession, intento_id: uuid.UUID) -> _IntentoAbierto:
+		intento = self._intentos.get(intento_id)
+		if intento is not None:
+			self._intentos.move_to_end(intento_id)
+			return intento
+
+		result = await db.execute(
+			text("""
+				SELECT i.usuario_id, i.quiz_id, i.examen_final_id, i.finalizado_en, i.expira_en,
+					ip.id AS intento_pregunta_id, ip.pregunta_id, pc.tipo
+				FROM intento i
+				LEFT JOIN intento_pregunta ip ON ip.intento_id = i.id
+				LEFT JOIN pregunta_config pc ON pc.pregunta_id = ip.pregunta_id
+				WHERE i.id = :intento_id
+			"""),
+			{"intento_id": intento_id},
+		)
+		rows = result.fetchall()
+		if not rows:
+			raise NotFoundError("Intento", str(intento_id))
+		if rows[0].finalizado_en is not None:
+			raise BusinessRuleError("Este intento ya fue finalizado")
+
+		intento = _IntentoAbierto(
+			usuario_id=rows[0].usuario_id,
+			quiz_id=rows[0].quiz_id,
+			examen_final_id=rows[0].examen_final_id,
+			expira_en=rows[0].expira_en,
+		)
+		for row in rows:
+			if row.intento_pregunta_id is not None:
+				tipo = TipoPregunta(row.tipo) if row.tipo else None
+				intento.preguntas[row.pregunta_id] = (row.intento_pregunta_id, tipo)
+
+		self._intentos[intento_id] = intento
+		while len(self._intentos) > self.max_pendientes:
+			self._intentos.popitem(last=False)
+		return intento
+
+	@staticmethod
+	def _validar_tipo(tipo: Optional[TipoPregunta], respuesta: dict) -> None:
+		"""Mismas reglas que trg_validar_respuesta_tipo, para no envenenar un lote."""
+		if tipo == TipoPregunta.ABIERTA and respuesta.get("respuesta_texto") is None:
+			raise ValidationError("Pregunta abierta requiere respuesta_texto")
+		if tipo == TipoPregunta.OPCION_MULTIPLE and respuesta.get("opcion_id") is None:
+			raise ValidationError("Pregunta de opción múltiple requiere opcion_id")
+		if tipo == TipoPregunta.VERDADERO_FALSO and respuesta.get("respuesta_bool") is None:
+			raise ValidationError("Pregunta verdadero/falso requiere respuesta_bool")
+
+
+_autosave_service_instance: Optional[AutosaveService] = None
+
+
+def get_autosave_service() -> AutosaveService:
+	"""Obtener instancia singleton (por worker) del servicio de autoguardado"""
+	global _autosave_service_instance
+	if _autosave_service_instance is None:
+		_autosave_service_instance = AutosaveService(
+			intervalo_flush=settings.autosave_flush_interval_seconds,
+			tamano_lote=settings.autosave_flush_batch_size,
+			max_pendientes=settings.autosave_max_pending,
+		)
+	return _autosave_service_instance
+
+
+async def publicar_intentos_finalizados(db: AsyncSession, intento_ids: Iterable[uuid.UUID]) -> None:
+	"""Avisar a todos los workers, al confirmar la transacción, que estos intentos se finalizaron."""
+	ids = [str(intento_id) for intento_id in intento_ids]
+	await publicar(
+		db,
+		CANAL_INTENTOS_FINALIZADOS,
+		[
+			Evento((_CLAVE_FINALIZADOS,), {"intento_ids": ids[i : i + _INTENTOS_POR_EVENTO]})
+			for i in range(0, len(ids), _INTENTOS_POR_EVENTO)
+		],
+	)
+
+
+async def loop_invalidacion_intentos() -> None:
+	"""Quitar de la caché del proceso los intentos finalizados en cualquier proceso; se cancela al apagar."""
+	while True:
+		try:
+			async with get_bus_eventos().suscribir(CANAL_INTENTOS_FINALIZADOS, _CLAVE_FINALIZADOS) as cola:
+				# Lo finalizado antes de suscribirse no llegará como evento
+				get_autosave_service().vaciar_cache()
+				while True:
+					datos = await cola.get()
+					if datos is None:
+						break
+					get_autosave_service().olvidar_intentos(uuid.UUID(i) for i in datos["intento_ids"])
+		except asyncio.CancelledError:
+			raise
+		except Exception as e:
+			logger.error(f"Error escuchando intentos finalizados: {e}", exc_info=True)
+		# Conexión perdida: pudo perderse algún intento finalizado
+		get_autosave_service().vaciar_cache()
+		await asyncio.sleep(settings.autosave_invalidacion_reconexion_seconds)
@@ -12,7 +12,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload, joinedload
 
 from app.utils.query_helpers import get_or_404, get_optional
-from app.utils.exceptions import NotFoundError
+from app.utils.exceptions import NotFoundError, ValidationError
+from app.utils.pagination import Keyset
 
 T = TypeVar("T")
 
@@ -69,31 +70,46 @@ class BaseService(Generic[T]):
         """
         return await get_optional(self.db, self.model, resource_id)
     
+    def keyset_por_defecto(self) -> Optional[Keyset]:
+        """Orden por defecto para paginar por cursor: creado_en desc, id desc."""
+        if hasattr(self.model, 'creado_en') and hasattr(self.model, 'id'):
+            return Keyset(self.model.creado_en, self.model.id, descendente=True)
+        return None
+    
     async def list_all(
         self,
         limit: int = 100,
         offset: int = 0,
-        order_by=None
+        order_by=None,
+        cursor: Optional[str] = None
     ) -> List[T]:
         """
         Listar todos los recursos con paginación.
         
         Args:
             limit: Número máximo de resultados
-            offset: Desplazamiento para paginación
-            order_by: Campo para ordenar (default: creado_en desc)
+            offset: Desplazamiento para paginación (se ignora si hay cursor)
+            order_by: Campo o Keyset para ordenar (default: creado_en desc, id desc)
+            cursor: Cursor opaco de la página anterior (ver Keyset.siguiente)
         
         Returns:
             Lista de instancias del modelo
+        
+        Raises:
+            ValidationError: Si se pide cursor con un orden que no es Keyset
         """
         stmt = select(self.model)
+        keyset = order_by if isinstance(order_by, Keyset) else None
+        if order_by is None:
+            keyset = self.keyset_por_defecto()
         
-        if order_by is None and hasattr(self.model, 'creado_en'):
-            stmt = stmt.order_by(self.model.creado_en.desc())
-        elif order_by:
-            stmt = stmt.order_by(order_by)
-        
-        stmt = stmt.limit(limit).offset(offset)
+        if keyset is not None:
+            stmt = keyset.aplicar(stmt, cursor=cursor, skip=offset, limit=limit)
+        else:
+            if cursor:
+                raise ValidationError("Este orden no admite paginación por cursor")
+            if order_by is not None:
+                stmt = stmt.order_by(order_by)
+            stmt = stmt.limit(limit).offset(offset)
         result = await self.db.execute(stmt)
         return list(result.scalars().all())
-
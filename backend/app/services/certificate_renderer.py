@@ -0,0 +1,201 @@
+"""
+Motor de renderizado de certificados PDF.
+
+Generar un PDF con reportlab es trabajo de CPU en Python puro: en hilos el GIL
+limita el throughput a un núcleo. El motor reparte el renderizado en un pool de
+procesos (uno por núcleo, por defecto) y lo alimenta desde una cola acotada, de
+modo que quien produce los datos (una consulta por lotes, por ejemplo) se pausa
+cuando el pool no da abasto en lugar de acumular trabajo en memoria.
+
+    motor = get_motor_renderizado()
+    pdf = await motor.renderizar(datos)
+    async for resultado in motor.renderizar_lote(generador_de_datos):
+        ...
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Optional, Union
+
+from app.config import settings
+from app.utils.iteracion import iterar
+from app.utils.pdf_generator import generar_pdf_certificado
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DatosCertificado:
+    """Datos que necesita el PDF; viajan serializados al proceso que lo renderiza."""
+    usuario_nombre: str
+    usuario_apellido: str
+    curso_titulo: str
+    folio: str
+    fecha_emision: Optional[datetime] = None
+    # Dato opaco para que quien encola identifique el resultado (no se renderiza)
+    referencia: Any = None
+
+
+@dataclass(frozen=True)
+class ResultadoRenderizado:
+    """PDF renderizado, o el error que impidió generarlo."""
+    datos: DatosCertificado
+    pdf: Optional[bytes] = None
+    error: Optional[BaseException] = None
+
+
+def _renderizar(datos: DatosCertificado) -> bytes:
+    # Función de módulo para que el pool de procesos la pueda serializar
+    return generar_pdf_certificado(
+        datos.usuario_nombre,
+        datos.usuario_apellido,
+        datos.curso_titulo,
+        datos.folio,
+        datos.fecha_emision,
+    )
+
+
+_FIN = object()
+
+
+class MotorRenderizado:
+    """
+    Pool de renderizado de certificados con cola acotada.
+
+    Args:
+        procesos: Tamaño del pool (default: settings.certificate_render_processes o núcleos disponibles)
+        max_pendientes: Capacidad de la cola de entrada y de la de resultados de un lote
+        usar_procesos: False para usar hilos (comparación en benchmarks, entornos sin fork/spawn)
+    """
+
+    def __init__(
+        self,
+        procesos: Optional[int] = None,
+        max_pendientes: Optional[int] = None,
+        usar_procesos: bool = True,
+    ):
+        self.procesos = procesos or settings.certificate_render_processes or os.cpu_count() or 1
+        self.max_pendientes = max_pendientes or settings.certificate_render_max_pending
+        self.usar_procesos = usar_procesos
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.usar_procesos:
+                # spawn: el proceso padre tiene hilos y un event loop que no deben heredarse con fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.procesos, thread_name_prefix="certificados")
+            logger.info(
+                f"Motor de certificados con {self.procesos} "
+                f"{'procesos' if self.usar_procesos else 'hilos'}"
+            )
+        return self._executor
+
+    async def renderizar(self, datos: DatosCertificado) -> bytes:
+        """
+        Renderizar un certificado en el pool.
+
+        Si un proceso del pool muere (p. ej. por falta de memoria) el pool queda
+        inservible: se descarta para que el siguiente uso cree otro, y los
+        certificados que estaban en él fallan con BrokenProcessPool.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            return await loop.run_in_executor(executor, _renderizar, datos)
+        except BrokenProcessPool:
+            self._descartar(executor)
+            raise
+
+    def _descartar(self, executor: Executor) -> None:
+        # Los demás certificados del pool roto llegan aquí también; solo el primero lo descarta
+        if self._executor is executor:
+            logger.error("Un proceso del motor de certificados terminó abruptamente; se recrea el pool")
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def renderizar_lote(
+        self,
+        items: Union[Iterable[DatosCertificado], AsyncIterable[DatosCertificado]],
+    ) -> AsyncIterator[ResultadoRenderizado]:
+        """
+        Renderizar todos los `items` y entregar los resultados a medida que terminan.
+
+        `items` se consume de a poco: la cola de entrada admite `max_pendientes`
+        elementos y, cuando se llena, el productor espera. La de resultados está
+        acotada igual, así que un consumidor lento (p. ej. subiendo a S3) también
+        frena la lectura de `items`. Un error al renderizar un elemento se entrega
+        en su resultado y no detiene el lote.
+        """
+        entrada: asyncio.Queue = asyncio.Queue(maxsize=self.max_pendientes)
+        salida: asyncio.Queue = asyncio.Queue(maxsize=self.max_pendientes)
+
+        async def producir() -> None:
+            try:
+                async for datos in iterar(items):
+                    await entrada.put(datos)
+            finally:
+                for _ in range(self.procesos):
+                    await entrada.put(_FIN)
+
+        async def consumir() -> None:
+            while (datos := await entrada.get()) is not _FIN:
+                try:
+                    resultado = ResultadoRenderizado(datos, pdf=await self.renderizar(datos))
+                except Exception as e:
+                    resultado = ResultadoRenderizado(datos, error=e)
+                await salida.put(resultado)
+            await salida.put(_FIN)
+
+        productor = asyncio.create_task(producir())
+        consumidores = [asyncio.create_task(consumir()) for _ in range(self.procesos)]
+        try:
+            terminados = 0
+            while terminados < len(consumidores):
+                resultado = await salida.get()
+                if resultado is _FIN:
+                    terminados += 1
+                else:
+                    yield resultado
+            # Propagar un error al leer `items`
+            await productor
+        finally:
+            for tarea in (productor, *consumidores):
+                tarea.cancel()
+            await asyncio.gather(productor, *consumidores, return_exceptions=True)
+
+    def cerrar(self) -> None:
+        """Terminar el pool; se vuelve a crear si se usa de nuevo."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+_motor: Optional[MotorRenderizado] = None
+
+
+def get_motor_renderizado() -> MotorRenderizado:
+    """Motor compartido por el proceso (los procesos del pool se crean al primer uso)."""
+    global _motor
+    if _motor is None:
+        _motor = MotorRenderizado()
+    return _motor
+
+
+def cerrar_motor_renderizado() -> None:
+    """Terminar el pool del motor compartido, si se creó."""
+    global _motor
+    if _motor is not None:
+        _motor.cerrar()
+        _motor = None
@@ -1,27 +1,16 @@
 import hashlib
 import uuid
-import asyncio
 from datetime import datetime
 from typing import Optional
-from io import BytesIO
 import logging
-from concurrent.futures import ThreadPoolExecutor
-
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
 
+from app.services.certificate_renderer import DatosCertificado, get_motor_renderizado
+from app.services.eventos_service import Evento
 from app.services.s3_service import S3Service, get_s3_service
 from app.utils.exceptions import EBSException
 
 logger = logging.getLogger(__name__)
 
-# ThreadPoolExecutor compartido para ejecutar trabajo bloqueante de reportlab
-executor = ThreadPoolExecutor(max_workers=3)
-
 
 class CertificateService:
     """Servicio para generación y gestión de certificados PDF"""
@@ -30,7 +19,7 @@ class CertificateService:
         """Inicializar servicio de certificados"""
         self.s3_service = s3_service or get_s3_service()
 
-    def _generar_pdf_sincrono(
+    async def generate_certificate(
         self,
         usuario_nombre: str,
         usuario_apellido: str,
@@ -39,177 +28,23 @@ class CertificateService:
         fecha_emision: Optional[datetime] = None
     ) -> bytes:
         """
-        Generar PDF de certificado
+        Generar PDF de certificado de forma asíncrona en el motor de renderizado.
         
-        Args:
-            usuario_nombre: Nombre del usuario
-            usuario_apellido: Apellido del usuario
-            curso_titulo: Título del curso
-            folio: Folio del certificado
-            fecha_emision: Fecha de emisión (default: ahora)
-            
-        Returns:
-            Contenido del PDF en bytes
+        El PDF se renderiza en un proceso del pool compartido (ver
+        certificate_renderer), sin bloquear el event loop ni competir por el GIL.
         """
         try:
-            fecha_emision = fecha_emision or datetime.now()
-            fecha_str = fecha_emision.strftime("%d de %B de %Y")
-            
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(
-                buffer,
-                pagesize=letter,
-                rightMargin=72,
-                leftMargin=72,
-                topMargin=72,
-                bottomMargin=18
-            )
-            
-            story = []
-            styles = getSampleStyleSheet()
-            
-            title_style = ParagraphStyle(
-                "CustomTitle",
-                parent=styles["Heading1"],
-                fontSize=24,
-                textColor=colors.HexColor("#1a472a"),
-                spaceAfter=30,
-                alignment=TA_CENTER,
-                fontName="Helvetica-Bold"
-            )
-            
-            subtitle_style = ParagraphStyle(
-                "CustomSubtitle",
-                parent=styles["Heading2"],
-                fontSize=16,
-                textColor=colors.HexColor("#2d5a3d"),
-                spaceAfter=20,
-                alignment=TA_CENTER,
-                fontName="Helvetica"
-            )
-            
-            body_style = ParagraphStyle(
-                "CustomBody",
-                parent=styles["Normal"],
-                fontSize=12,
-                textColor=colors.HexColor("#333333"),
-                spaceAfter=12,
-                alignment=TA_JUSTIFY,
-                fontName="Helvetica"
-            )
-            
-            center_style = ParagraphStyle(
-                "CustomCenter",
-                parent=body_style,
-                alignment=TA_CENTER,
-                spaceAfter=20
-            )
-            
-            name_style = ParagraphStyle(
-                "CustomName",
-                parent=styles["Heading1"],
-                fontSize=20,
-                textColor=colors.HexColor("#1a472a"),
-                spaceAfter=30,
-                alignment=TA_CENTER,
-                fontName="Helvetica-Bold",
-                textTransform="uppercase"
-            )
-            
-            story.append(Spacer(1, 0.5 * inch))
-            story.append(Paragraph("CERTIFICADO DE ACREDITACIÓN", title_style))
-            story.append(Spacer(1, 0.3 * inch))
-            story.append(Paragraph("Escuela Bíblica Salem", subtitle_style))
-            story.append(Spacer(1, 0.4 * inch))
-            
-            story.append(
-                Paragraph(
-                    "Por medio del presente se certifica que",
-                    center_style
-                )
-            )
-            story.append(Spacer(1, 0.2 * inch))
-            
-            nombre_completo = f"{usuario_nombre} {usuario_apellido}".strip()
-            story.append(Paragraph(nombre_completo, name_style))
-            story.append(Spacer(1, 0.2 * inch))
-            
-            story.append(
-                Paragraph(
-                    "ha completado exitosamente el curso",
-                    center_style
-                )
-            )
-            story.append(Spacer(1, 0.3 * inch))
-            
-            course_style = ParagraphStyle(
-                "CustomCourse",
-                parent=body_style,
-                fontSize=14,
-                textColor=colors.HexColor("#1a472a"),
-                alignment=TA_CENTER,
-                fontName="Helvetica-Bold",
-                spaceAfter=30
-            )
-            story.append(Paragraph(curso_titulo, course_style))
-            story.append(Spacer(1, 0.3 * inch))
-            
-            story.append(
-                Paragraph(
-                    "cumpliendo con todos los requisitos académicos establecidos.",
-                    center_style
-                )
-            )
-            story.append(Spacer(1, 0.4 * inch))
-            
-            fecha_data = [
-                ["Fecha de emisión:", fecha_str],
-                ["Folio:", folio]
-            ]
-            
-            fecha_table = Table(fecha_data, colWidths=[2 * inch, 3 * inch])
-            fecha_table.setStyle(
-                TableStyle([
-                    ("ALIGN", (0, 0), (0, -1), "RIGHT"),
-                    ("ALIGN", (1, 0), (1, -1), "LEFT"),
-                    ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
-                    ("FONTNAME", (1, 0), (1, -1), "Helvetica"),
-                    ("FONTSIZE", (0, 0), (-1, -1), 11),
-                    ("TEXTCOLOR", (0, 0), (-1, -1), colors.HexColor("#333333")),
-                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                    ("LEFTPADDING", (0, 0), (-1, -1), 12),
-                    ("RIGHTPADDING", (0, 0), (-1, -1), 12),
-                    ("TOPPADDING", (0, 0), (-1, -1), 6),
-                    ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-                ])
-            )
-            
-            story.append(fecha_table)
-            story.append(Spacer(1, 0.8 * inch))
-            
-            story.append(
-                Paragraph(
-                    "Este certificado es válido y puede ser verificado mediante "
-                    "el código de verificación proporcionado.",
-                    ParagraphStyle(
-                        "CustomFooter",
-                        parent=styles["Normal"],
-                        fontSize=9,
-                        textColor=colors.HexColor("#666666"),
-                        alignment=TA_CENTER,
-                        fontName="Helvetica-Oblique"
-                    )
+            pdf_bytes = await get_motor_renderizado().renderizar(
+                DatosCertificado(
+                    usuario_nombre=usuario_nombre,
+                    usuario_apellido=usuario_apellido,
+                    curso_titulo=curso_titulo,
+                    folio=folio,
+                    fecha_emision=fecha_emision
                 )
             )
-            
-            doc.build(story)
-            buffer.seek(0)
-            pdf_bytes = buffer.read()
-            buffer.close()
-            
             logger.info(f"Certificate PDF generated for folio: {folio}")
             return pdf_bytes
-            
         except Exception as e:
             logger.error(f"Error generating certificate PDF: {str(e)}", exc_info=True)
             raise EBSException(
@@ -218,32 +53,6 @@ class CertificateService:
                 error_code="CERTIFICATE_GENERATION_ERROR"
             )
 
-    async def generate_certificate(
-        self,
-        usuario_nombre: str,
-        usuario_apellido: str,
-        curso_titulo: str,
-        folio: str,
-        fecha_emision: Optional[datetime] = None
-    ) -> bytes:
-        """
-        Generar PDF de certificado de forma asíncrona usando ThreadPoolExecutor.
-        
-        Esto mueve el trabajo bloqueante de reportlab a un hilo separado,
-        evitando bloquear el event loop de asyncio.
-        """
-        loop = asyncio.get_running_loop()
-        resultado = await loop.run_in_executor(
-            executor,
-            self._generar_pdf_sincrono,
-            usuario_nombre,
-            usuario_apellido,
-            curso_titulo,
-            folio,
-            fecha_emision
-        )
-        return resultado
-
     def generate_hash_verification(
         self,
         certificado_id: str,
@@ -273,11 +82,15 @@ class CertificateService:
         """
         Generar folio único para certificado
         
+        La parte aleatoria tiene 48 bits: con decenas de miles de certificados en
+        un día la probabilidad de repetir un folio es despreciable, y si ocurre el
+        índice único lo rechaza y la emisión lo reintenta con otro.
+        
         Returns:
-            Folio en formato CERT-YYYYMMDD-XXXXXX
+            Folio en formato CERT-YYYYMMDD-XXXXXXXXXXXX
         """
         fecha_str = datetime.now().strftime("%Y%m%d")
-        unique_id = str(uuid.uuid4()).replace("-", "").upper()[:6]
+        unique_id = uuid.uuid4().hex.upper()[:12]
         return f"CERT-{fecha_str}-{unique_id}"
 
     async def create_and_upload_certificate(
@@ -319,7 +132,7 @@ class CertificateService:
             
             s3_key = S3Service.build_certificate_key(certificado_id)
             
-            self.s3_service.upload_file(
+            await self.s3_service.upload_file(
                 file_content=pdf_bytes,
                 s3_key=s3_key,
                 content_type="application/pdf",
@@ -361,7 +174,7 @@ class CertificateService:
                 error_code="CERTIFICATE_CREATION_ERROR"
             )
 
-    def get_certificate_download_url(
+    async def get_certificate_download_url(
         self,
         s3_key: str,
         expiration: int = 3600
@@ -376,7 +189,7 @@ class CertificateService:
         Returns:
             URL prefirmada o None si no existe
         """
-        return self.s3_service.get_file_url(s3_key, expiration=expiration)
+        return await self.s3_service.get_file_url(s3_key, expiration=expiration)
 
     def verify_certificate_hash(
         self,
@@ -415,3 +228,41 @@ def get_certificate_service() -> CertificateService:
     """Obtener instancia del servicio de certificados"""
     return CertificateService()
 
+
+
+def clave_generacion_certificado(inscripcion_curso_id: uuid.UUID) -> str:
+    """
+    Clave que impide generar dos veces el certificado de una inscripción: es la
+    clave única de su tarea en la cola y la del advisory lock que toma la generación.
+    """
+    return f"generar_certificado:{inscripcion_curso_id}"
+
+
+def clave_certificado(certificado_id: uuid.UUID) -> str:
+    """Clave de los suscriptores al estado de un certificado (ver app.services.eventos_service)."""
+    return f"certificado:{certificado_id}"
+
+
+def clave_usuario(usuario_id: uuid.UUID) -> str:
+    """Clave de los suscriptores al estado de todos los certificados de un usuario."""
+    return f"usuario:{usuario_id}"
+
+
+def evento_certificado_listo(
+    certificado_id: uuid.UUID,
+    usuario_id: uuid.UUID,
+    folio: str,
+    emitido_en: Optional[datetime],
+    s3_key: str,
+) -> Evento:
+    """Evento con el mismo contenido que GET /certificados/{id}/estado para un certificado completado."""
+    return Evento(
+        (clave_certificado(certificado_id), clave_usuario(usuario_id)),
+        {
+            "certificado_id": str(certificado_id),
+            "status": "completed",
+            "folio": folio,
+            "emitido_en": emitido_en,
+            "s3_key": s3_key,
+        },
+    )
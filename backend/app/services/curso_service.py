@@ -1,21 +1,49 @@
+import asyncio
 import logging
+import os
+import re
 import uuid
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.database import models
-from app.utils.exceptions import NotFoundError
+from app.utils.exceptions import NotFoundError, ValidationError
+from app.utils.error_codes import ValidationErrorCodes, StorageErrorCodes
+from app.utils.pagination import Keyset
 from app.schemas.guia_estudio import GuiaEstudioResponse
 from app.schemas.examen_final import ExamenFinalDetailResponse
-from app.services.s3_service import S3Service
+from app.services.s3_service import S3Service, get_s3_service, MAX_FILE_SIZE
 from app.services.examen_final_service import ExamenFinalService
 from sqlalchemy import func
 
 logger = logging.getLogger(__name__)
 
+# Cursos por título; id desempata títulos repetidos (idx_curso_titulo_id)
+KEYSET_CURSOS = Keyset(models.Curso.titulo, models.Curso.id)
+
+# Tipos de archivo aceptados para guías de estudio
+TIPOS_GUIA_ESTUDIO = frozenset({
+	"application/pdf",
+	"application/msword",
+	"application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+	"application/vnd.ms-powerpoint",
+	"application/vnd.openxmlformats-officedocument.presentationml.presentation",
+})
+
+# Las partes de 5 MB (mínimo de S3) limitan la memoria por subida de guía
+PARTE_GUIA_ESTUDIO = 5 * 1024 * 1024
+
+# Vigencia del formulario de subida directa a S3
+EXPIRACION_SUBIDA_DIRECTA = 900
+
+
+def _nombre_archivo_seguro(filename: str) -> str:
+	nombre = re.sub(r"[^A-Za-z0-9._-]", "_", os.path.basename(filename.replace("\\", "/")))
+	return nombre.strip("._") or "guia"
+
 
 class CursoService:
 	"""Lógica de negocio para cursos (materias)."""
@@ -30,6 +58,7 @@ class CursoService:
 		modulo_id: Optional[uuid.UUID] = None,
 		skip: int = 0,
 		limit: int = 100,
+		cursor: Optional[str] = None,
 	) -> List[models.Curso]:
 		stmt = select(models.Curso)
 		if publicado is not None:
@@ -41,7 +70,7 @@ class CursoService:
 				.where(models.ModuloCurso.modulo_id == modulo_id)
 			)
 
-		stmt = stmt.order_by(models.Curso.titulo.asc()).offset(skip).limit(limit)
+		stmt = KEYSET_CURSOS.aplicar(stmt, cursor=cursor, skip=skip, limit=limit)
 		result = await self.db.execute(stmt)
 		cursos = result.scalars().all()
 		logger.debug("Cursos recuperados: %s", len(cursos))
@@ -113,30 +142,145 @@ class CursoService:
 		Este método encapsula la lógica de transformación de URLs S3.
 		"""
 		guias = await self.list_guias_estudio(curso_id, activo=activo)
-		s3_service = S3Service()
+		s3_service = get_s3_service()
+		
+		async def url_guia(guia: models.GuiaEstudio) -> Optional[str]:
+			if not guia.url:
+				return guia.url
+			s3_key = None
+			if guia.url.startswith("s3://"):
+				s3_key = guia.url.replace("s3://", "").split("/", 1)[-1] if "/" in guia.url.replace("s3://", "") else guia.url.replace("s3://", "")
+			elif not guia.url.startswith("http"):
+				s3_key = guia.url
+			
+			if s3_key:
+				try:
+					return await s3_service.generate_presigned_url(s3_key, expiration=3600)
+				except Exception as e:
+					logger.warning(f"Error generando URL prefirmada para guía {guia.id}: {e}")
+			return guia.url
 		
+		# Las URLs se firman en paralelo en el executor de S3
+		urls = await asyncio.gather(*(url_guia(guia) for guia in guias))
 		guias_response = []
-		for guia in guias:
+		for guia, url in zip(guias, urls):
 			guia_data = GuiaEstudioResponse.from_orm(guia).dict()
-			
-			if guia.url:
-				s3_key = None
-				if guia.url.startswith("s3://"):
-					s3_key = guia.url.replace("s3://", "").split("/", 1)[-1] if "/" in guia.url.replace("s3://", "") else guia.url.replace("s3://", "")
-				elif not guia.url.startswith("http"):
-					s3_key = guia.url
-				
-				if s3_key:
-					try:
-						presigned_url = s3_service.generate_presigned_url(s3_key, expiration=3600)
-						guia_data["url"] = presigned_url
-					except Exception as e:
-						logger.warning(f"Error generando URL prefirmada para guía {guia.id}: {e}")
-			
+			guia_data["url"] = url
 			guias_response.append(GuiaEstudioResponse(**guia_data))
 		
 		return guias_response
 
+	def _nueva_guia(self, curso_id: uuid.UUID, titulo: str, filename: str, content_type: str, activo: bool) -> models.GuiaEstudio:
+		if content_type not in TIPOS_GUIA_ESTUDIO:
+			raise ValidationError(
+				f"Tipo de archivo no permitido para guías de estudio: {content_type}",
+				error_code=ValidationErrorCodes.INVALID_FILE_TYPE,
+			)
+		guia_id = uuid.uuid4()
+		s3_key = S3Service.build_guide_key(str(guia_id), _nombre_archivo_seguro(filename))
+		return models.GuiaEstudio(id=guia_id, curso_id=curso_id, titulo=titulo, url=s3_key, activo=activo)
+
+	async def subir_guia_estudio(
+		self,
+		curso_id: uuid.UUID,
+		titulo: str,
+		filename: str,
+		content_type: str,
+		chunks: AsyncIterator[bytes],
+		content_length: Optional[int] = None,
+	) -> models.GuiaEstudio:
+		"""
+		Crear una guía de estudio subiendo el archivo a S3 a medida que llega.
+
+		El archivo nunca se carga completo en memoria: se lee por bloques, el límite
+		de tamaño se aplica mientras llega (y de entrada si el Content-Length ya lo
+		excede) y se sube por partes. La guía se registra solo si la subida terminó.
+		"""
+		if content_length is not None and content_length > MAX_FILE_SIZE:
+			raise ValidationError(
+				f"El archivo excede el tamaño máximo permitido ({MAX_FILE_SIZE / (1024 * 1024):.1f} MB)",
+				error_code=ValidationErrorCodes.FILE_TOO_LARGE,
+			)
+		await self.get_curso(curso_id)
+		guia = self._nueva_guia(curso_id, titulo, filename, content_type, activo=True)
+		s3_service = get_s3_service()
+		archivo = await s3_service.upload_stream(
+			chunks,
+			guia.url,
+			content_type=content_type,
+			part_size=PARTE_GUIA_ESTUDIO,
+			max_size=MAX_FILE_SIZE,
+		)
+		try:
+			self.db.add(guia)
+			await self.db.commit()
+		except Exception:
+			await self.db.rollback()
+			await s3_service.delete_file(guia.url)
+			raise
+		await self.db.refresh(guia)
+		logger.info("Guía %s subida a %s (%s bytes, sha256 %s)", guia.id, guia.url, archivo.tamano, archivo.sha256)
+		return guia
+
+	async def iniciar_subida_directa_guia(
+		self,
+		curso_id: uuid.UUID,
+		titulo: str,
+		filename: str,
+		content_type: str,
+	) -> Tuple[models.GuiaEstudio, Dict[str, Any]]:
+		"""
+		Registrar una guía inactiva y firmar un formulario POST para que el navegador
+		suba el archivo directo a S3 (la política de S3 limita tipo y tamaño).
+		La guía se activa con confirmar_subida_directa_guia.
+		"""
+		await self.get_curso(curso_id)
+		guia = self._nueva_guia(curso_id, titulo, filename, content_type, activo=False)
+		formulario = await get_s3_service().generate_presigned_post(
+			guia.url,
+			content_type,
+			max_size=MAX_FILE_SIZE,
+			expiration=EXPIRACION_SUBIDA_DIRECTA,
+		)
+		self.db.add(guia)
+		await self.db.commit()
+		await self.db.refresh(guia)
+		return guia, formulario
+
+	async def confirmar_subida_directa_guia(self, curso_id: uuid.UUID, guia_id: uuid.UUID) -> models.GuiaEstudio:
+		"""Activar una guía cuya subida directa a S3 ya terminó."""
+		result = await self.db.execute(
+			select(models.GuiaEstudio).where(
+				models.GuiaEstudio.id == guia_id,
+				models.GuiaEstudio.curso_id == curso_id,
+			)
+		)
+		guia = result.scalar_one_or_none()
+		if not guia:
+			raise NotFoundError("Guía de estudio", str(guia_id))
+		if guia.activo:
+			return guia
+
+		s3_service = get_s3_service()
+		tamano = await s3_service.get_file_size(guia.url)
+		if tamano is None:
+			raise ValidationError(
+				"El archivo de la guía aún no se ha subido",
+				error_code=StorageErrorCodes.FILE_NOT_FOUND,
+			)
+		if tamano > MAX_FILE_SIZE:
+			await s3_service.delete_file(guia.url)
+			raise ValidationError(
+				f"El archivo excede el tamaño máximo permitido ({MAX_FILE_SIZE / (1024 * 1024):.1f} MB)",
+				error_code=ValidationErrorCodes.FILE_TOO_LARGE,
+			)
+
+		guia.activo = True
+		await self.db.commit()
+		await self.db.refresh(guia)
+		logger.info("Guía %s confirmada (%s bytes)", guia.id, tamano)
+		return guia
+
 	async def get_examen_final_con_conteo(
 		self,
 		curso_id: uuid.UUID,
@@ -162,6 +306,7 @@ class CursoService:
 			publicado=examen.publicado,
 			aleatorio=examen.aleatorio,
 			guarda_calificacion=examen.guarda_calificacion,
+			tiempo_limite_minutos=examen.tiempo_limite_minutos,
 			creado_en=examen.creado_en,
 			actualizado_en=examen.actualizado_en,
 			numero_preguntas=numero_preguntas,
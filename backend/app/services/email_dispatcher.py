@@ -0,0 +1,217 @@
+"""
+Despacho concurrente de emails con límite de tasa y reintentos por destinatario.
+
+Un envío masivo (p. ej. un recordatorio a todos los alumnos) no se hace uno a uno:
+`DespachadorEmails` mantiene hasta `concurrencia` envíos en curso, cada uno espera
+un token del `LimitadorTasa` (la cuota de envío por segundo de SES) y, si falla por
+un error transitorio, se reintenta con backoff exponencial y jitter sin frenar al
+resto. Los resultados se entregan por lotes a `al_registrar` para guardarlos con
+una sola escritura por lote.
+
+El envío en sí lo hace un transporte (SES, SMTP o log; ver app.services.email_service)
+con un método asíncrono `enviar(mensaje) -> message_id`.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable, List, Optional, Protocol, Union
+
+from app.utils.iteracion import iterar
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MensajeEmail:
+    """Email ya renderizado para un destinatario."""
+    destinatario: str
+    asunto: str
+    body_html: Optional[str] = None
+    body_text: Optional[str] = None
+    remitente: Optional[str] = None
+    # Dato opaco para que quien envía identifique el resultado (p. ej. el usuario)
+    referencia: Any = None
+
+
+@dataclass(frozen=True)
+class ResultadoEnvio:
+    """Resultado final de un mensaje tras sus reintentos."""
+    mensaje: MensajeEmail
+    message_id: Optional[str] = None
+    error: Optional[str] = None
+    intentos: int = 1
+    # El último error fue transitorio: el mensaje puede reintentarse más tarde
+    reintentable: bool = False
+
+    @property
+    def enviado(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class ResumenEnvio:
+    enviados: int = 0
+    fallidos: int = 0
+
+
+class ErrorEnvioEmail(Exception):
+    """
+    Error de un transporte al enviar un mensaje.
+
+    `reintentable` distingue los errores transitorios (throttling, servicio no
+    disponible, conexión) de los que no mejoran al reintentar (dirección inválida,
+    remitente no verificado, mensaje rechazado).
+    """
+
+    def __init__(self, detalle: str, reintentable: bool):
+        super().__init__(detalle)
+        self.reintentable = reintentable
+
+
+class TransporteEmail(Protocol):
+    async def enviar(self, mensaje: MensajeEmail) -> str: ...
+
+    def cerrar(self) -> None: ...
+
+
+class LimitadorTasa:
+    """
+    Token bucket: hasta `tasa` envíos por segundo, con ráfagas de `capacidad`.
+
+    Quienes esperan un token lo reciben en orden de llegada.
+    """
+
+    def __init__(self, tasa: float, capacidad: Optional[float] = None, reloj: Callable[[], float] = time.monotonic):
+        self.tasa = tasa
+        self.capacidad = capacidad or max(1.0, tasa)
+        self._reloj = reloj
+        self._tokens = self.capacidad
+        self._actualizado = reloj()
+        self._lock = asyncio.Lock()
+
+    async def adquirir(self) -> None:
+        async with self._lock:
+            while True:
+                ahora = self._reloj()
+                self._tokens = min(self.capacidad, self._tokens + (ahora - self._actualizado) * self.tasa)
+                self._actualizado = ahora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.tasa)
+
+
+_FIN = object()
+
+
+class DespachadorEmails:
+    """
+    Envío concurrente de mensajes sobre un transporte.
+
+    Args:
+        transporte: Transporte que envía cada mensaje
+        limitador: Limitador de tasa compartido por todos los envíos del proceso
+        concurrencia: Envíos en curso como máximo
+        max_intentos: Intentos por mensaje ante errores transitorios
+        base_reintento: Espera base en segundos; el intento n espera al azar hasta base * 2^(n-1)
+        max_reintento: Tope de la espera entre intentos
+    """
+
+    def __init__(
+        self,
+        transporte: TransporteEmail,
+        limitador: LimitadorTasa,
+        concurrencia: int,
+        max_intentos: int = 4,
+        base_reintento: float = 1.0,
+        max_reintento: float = 30.0,
+    ):
+        self.transporte = transporte
+        self.limitador = limitador
+        self.concurrencia = concurrencia
+        self.max_intentos = max_intentos
+        self.base_reintento = base_reintento
+        self.max_reintento = max_reintento
+
+    async def enviar_uno(self, mensaje: MensajeEmail) -> ResultadoEnvio:
+        """Enviar un mensaje respetando el límite de tasa, con reintentos."""
+        for intento in range(1, self.max_intentos + 1):
+            await self.limitador.adquirir()
+            try:
+                message_id = await self.transporte.enviar(mensaje)
+                return ResultadoEnvio(mensaje, message_id=message_id, intentos=intento)
+            except ErrorEnvioEmail as e:
+                if not e.reintentable or intento == self.max_intentos:
+                    logger.warning(f"Email to {mensaje.destinatario} failed after {intento} attempts: {e}")
+                    return ResultadoEnvio(mensaje, error=str(e), intentos=intento, reintentable=e.reintentable)
+                # Full jitter: los reintentos de muchos destinatarios no se sincronizan
+                espera = min(self.max_reintento, self.base_reintento * 2 ** (intento - 1))
+                await asyncio.sleep(random.uniform(0, espera))
+            except Exception as e:
+                logger.error(f"Unexpected error sending email to {mensaje.destinatario}: {e}", exc_info=True)
+                return ResultadoEnvio(mensaje, error=str(e), intentos=intento)
+
+    async def enviar(
+        self,
+        mensajes: Union[Iterable[MensajeEmail], AsyncIterable[MensajeEmail]],
+        al_registrar: Optional[Callable[[List[ResultadoEnvio]], Awaitable[None]]] = None,
+        tamano_registro: int = 100,
+    ) -> ResumenEnvio:
+        """
+        Enviar todos los `mensajes` con hasta `concurrencia` envíos en curso.
+
+        `mensajes` se consume de a poco (cola acotada), así que puede ser un generador
+        que lee destinatarios de la base de datos por lotes. Cada `tamano_registro`
+        resultados (y al final) se llama a `al_registrar` con el lote, de a uno por vez.
+        Un mensaje fallido no detiene el envío de los demás.
+        """
+        entrada: asyncio.Queue = asyncio.Queue(maxsize=self.concurrencia * 2)
+        resumen = ResumenEnvio()
+        pendientes: List[ResultadoEnvio] = []
+        registro = asyncio.Lock()
+
+        async def registrar(forzar: bool = False) -> None:
+            nonlocal pendientes
+            if registro.locked() and not forzar:
+                # Otro envío está registrando un lote; estos resultados van en el siguiente
+                return
+            async with registro:
+                if not pendientes or (len(pendientes) < tamano_registro and not forzar):
+                    return
+                lote, pendientes = pendientes, []
+                if al_registrar is not None:
+                    await al_registrar(lote)
+
+        async def producir() -> None:
+            try:
+                async for mensaje in iterar(mensajes):
+                    await entrada.put(mensaje)
+            finally:
+                for _ in range(self.concurrencia):
+                    await entrada.put(_FIN)
+
+        async def consumir() -> None:
+            while (mensaje := await entrada.get()) is not _FIN:
+                resultado = await self.enviar_uno(mensaje)
+                if resultado.enviado:
+                    resumen.enviados += 1
+                else:
+                    resumen.fallidos += 1
+                pendientes.append(resultado)
+                await registrar()
+
+        productor = asyncio.create_task(producir())
+        consumidores = [asyncio.create_task(consumir()) for _ in range(self.concurrencia)]
+        try:
+            await asyncio.gather(productor, *consumidores)
+            await registrar(forzar=True)
+        finally:
+            for tarea in (productor, *consumidores):
+                tarea.cancel()
+            await asyncio.gather(productor, *consumidores, return_exceptions=True)
+
+        logger.info(f"Bulk email finished: {resumen.enviados} sent, {resumen.fallidos} failed")
+        return resumen
@@ -0,0 +1,237 @@
+"""
+Bandeja de salida de emails (tabla email_outbox).
+
+Quien origina un email (p. ej. la emisión de un certificado) lo agrega con
+`agregar()` en su propia transacción, sin enviarlo: el email queda registrado si
+y solo si el cambio se confirma, y la clave de idempotencia evita duplicarlo si la
+operación se repite. El worker de la cola emails llama a `despachar_lote()`, que
+reclama un lote con FOR UPDATE SKIP LOCKED, lo renderiza agrupado por plantilla,
+lo envía con el despachador concurrente del servicio de email y marca cada email
+enviado (o lo reprograma si falló) a medida que llegan los resultados.
+
+La entrega es al menos una vez: si el worker cae entre el envío y la marca, el
+email se reenvía cuando vence su reclamo.
+"""
+
+import itertools
+import json
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.email_dispatcher import MensajeEmail, ResultadoEnvio
+from app.services.email_service import EmailService
+from app.utils.email_templates import (
+	BIENVENIDA,
+	CERTIFICADO_LISTO,
+	RECORDATORIO_PROGRESO,
+	PlantillaEmail,
+)
+
+logger = logging.getLogger(__name__)
+
+PLANTILLA_BIENVENIDA = "bienvenida"
+PLANTILLA_CERTIFICADO_LISTO = "certificado_listo"
+PLANTILLA_RECORDATORIO_PROGRESO = "recordatorio_progreso"
+
+# parametros de cada email = valores de los campos de su plantilla
+PLANTILLAS: Dict[str, PlantillaEmail] = {
+	PLANTILLA_BIENVENIDA: BIENVENIDA,
+	PLANTILLA_CERTIFICADO_LISTO: CERTIFICADO_LISTO,
+	PLANTILLA_RECORDATORIO_PROGRESO: RECORDATORIO_PROGRESO,
+}
+
+
+@dataclass(frozen=True)
+class EmailPendiente:
+	"""Email a registrar en la bandeja de salida."""
+	plantilla: str
+	destinatario: str
+	parametros: Dict[str, Any]
+	# Identifica el hecho que origina el email, p. ej. "certificado_listo:<id>"
+	clave_idempotencia: str
+
+
+def email_bienvenida(usuario_id: uuid.UUID, email: str, usuario_nombre: str) -> EmailPendiente:
+	return EmailPendiente(
+		PLANTILLA_BIENVENIDA,
+		email,
+		{"usuario_nombre": usuario_nombre},
+		f"{PLANTILLA_BIENVENIDA}:{usuario_id}",
+	)
+
+
+def email_certificado_listo(
+	certificado_id: uuid.UUID,
+	email: str,
+	usuario_nombre: str,
+	curso_titulo: str,
+	folio: str,
+) -> EmailPendiente:
+	return EmailPendiente(
+		PLANTILLA_CERTIFICADO_LISTO,
+		email,
+		{"usuario_nombre": usuario_nombre, "curso_titulo": curso_titulo, "folio": folio},
+		f"{PLANTILLA_CERTIFICADO_LISTO}:{certificado_id}",
+	)
+
+
+_SQL_AGREGAR = """
+	INSERT INTO email_outbox (id, plantilla, destinatario, parametros, clave_idempotencia)
+	VALUES (:id, :plantilla, :destinatario, CAST(:parametros AS JSONB), :clave_idempotencia)
+	ON CONFLICT (clave_idempotencia) DO NOTHING
+"""
+
+# Emails listos, en orden de llegada; el reclamo los difiere bloqueo_segundos para
+# que otro worker no los tome mientras se envían.
+_SQL_RECLAMAR = """
+	WITH siguientes AS (
+		SELECT id
+		FROM email_outbox
+		WHERE estado = 'PENDIENTE'
+			AND disponible_en <= CURRENT_TIMESTAMP
+		ORDER BY disponible_en
+		LIMIT :limite
+		FOR UPDATE SKIP LOCKED
+	)
+	UPDATE email_outbox e
+	SET intentos = e.intentos + 1,
+		disponible_en = CURRENT_TIMESTAMP + make_interval(secs => :bloqueo_segundos)
+	FROM siguientes
+	WHERE e.id = siguientes.id
+	RETURNING e.id, e.plantilla, e.destinatario, e.parametros, e.intentos
+"""
+
+# Idempotente: un email ya marcado (p. ej. por un reenvío tras un reclamo vencido) no cambia
+_SQL_MARCAR_ENVIADO = """
+	UPDATE email_outbox
+	SET estado = 'ENVIADO',
+		message_id = :message_id,
+		error = NULL,
+		enviado_en = CURRENT_TIMESTAMP
+	WHERE id = :id AND estado = 'PENDIENTE'
+"""
+
+# Solo si nadie lo reclamó de nuevo desde este intento
+_SQL_REGISTRAR_FALLO = """
+	UPDATE email_outbox
+	SET estado = CASE
+			WHEN :reintentar AND intentos < :max_intentos THEN 'PENDIENTE'::estado_email
+			ELSE 'FALLIDO'::estado_email
+		END,
+		error = :error,
+		disponible_en = CURRENT_TIMESTAMP + make_interval(secs => :reintentar_en)
+	WHERE id = :id AND estado = 'PENDIENTE' AND intentos = :intentos
+"""
+
+
+class EmailOutboxService:
+	"""
+	Registro y despacho de la bandeja de salida de emails.
+
+	`agregar` no hace commit: el email se confirma con la transacción de quien lo
+	origina. `despachar_lote` confirma el reclamo y cada lote de resultados.
+	"""
+
+	def __init__(self, db: AsyncSession):
+		self.db = db
+
+	async def agregar(self, emails: Iterable[EmailPendiente]) -> None:
+		"""Registrar emails en la transacción en curso; los ya registrados se ignoran."""
+		filas = [
+			{
+				"id": uuid.uuid4(),
+				"plantilla": email.plantilla,
+				"destinatario": email.destinatario,
+				"parametros": json.dumps(email.parametros, ensure_ascii=False, default=str),
+				"clave_idempotencia": email.clave_idempotencia,
+			}
+			for email in emails
+		]
+		if filas:
+			await self.db.execute(text(_SQL_AGREGAR), filas)
+
+	async def reclamar(self, limite: int, bloqueo_segundos: float) -> List[Row]:
+		"""Tomar hasta `limite` emails listos durante `bloqueo_segundos`. Cada reclamo cuenta como un intento."""
+		result = await self.db.execute(
+			text(_SQL_RECLAMAR),
+			{"limite": limite, "bloqueo_segundos": float(bloqueo_segundos)},
+		)
+		emails = result.all()
+		await self.db.commit()
+		return emails
+
+	async def despachar_lote(
+		self,
+		email_service: EmailService,
+		limite: int,
+		bloqueo_segundos: float,
+		max_intentos: int,
+		espera_reintento: Callable[[int], float],
+		tamano_registro: int = 50,
+	) -> int:
+		"""
+		Reclamar, enviar y marcar un lote de la bandeja de salida.
+
+		Un email cuyo envío falla por un error transitorio vuelve a quedar disponible
+		tras `espera_reintento(intentos)` segundos, hasta `max_intentos` reclamos; uno
+		que falla por un error permanente, o cuya plantilla no se puede renderizar,
+		queda FALLIDO.
+
+		Returns:
+			Cantidad de emails reclamados (menos que `limite` si la bandeja se vació)
+		"""
+		emails = await self.reclamar(limite, bloqueo_segundos)
+		if not emails:
+			return 0
+
+		mensajes: List[MensajeEmail] = []
+		no_renderizados: List[ResultadoEnvio] = []
+		# Agrupados por plantilla: cada grupo usa la misma plantilla compilada
+		for plantilla, grupo in itertools.groupby(sorted(emails, key=lambda e: e.plantilla), key=lambda e: e.plantilla):
+			compilada = PLANTILLAS.get(plantilla)
+			for email in grupo:
+				try:
+					if compilada is None:
+						raise KeyError(f"Plantilla de email no registrada: {plantilla}")
+					asunto, body_html, body_text = compilada.renderizar(email.parametros)
+					mensajes.append(email_service.mensaje(email.destinatario, asunto, body_html, body_text, referencia=email))
+				except Exception as e:
+					logger.error(f"No se pudo renderizar el email {email.id} ({plantilla}): {e!r}")
+					no_renderizados.append(ResultadoEnvio(MensajeEmail(email.destinatario, "", referencia=email), error=repr(e)))
+
+		async def registrar(resultados: List[ResultadoEnvio]) -> None:
+			enviados = [
+				{"id": r.mensaje.referencia.id, "message_id": r.message_id}
+				for r in resultados if r.enviado
+			]
+			fallidos = [
+				{
+					"id": r.mensaje.referencia.id,
+					"intentos": r.mensaje.referencia.intentos,
+					"error": r.error,
+					"reintentar": r.reintentable,
+					"max_intentos": max_intentos,
+					"reintentar_en": espera_reintento(r.mensaje.referencia.intentos) if r.reintentable else 0.0,
+				}
+				for r in resultados if not r.enviado
+			]
+			if enviados:
+				await self.db.execute(text(_SQL_MARCAR_ENVIADO), enviados)
+			if fallidos:
+				await self.db.execute(text(_SQL_REGISTRAR_FALLO), fallidos)
+			await self.db.commit()
+
+		if no_renderizados:
+			await registrar(no_renderizados)
+		resumen = await email_service.send_bulk_email(mensajes, al_registrar=registrar, tamano_registro=tamano_registro)
+		logger.info(
+			f"Bandeja de salida: {len(emails)} reclamados, {resumen.enviados} enviados, "
+			f"{resumen.fallidos + len(no_renderizados)} fallidos"
+		)
+		return len(emails)
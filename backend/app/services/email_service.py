@@ -3,44 +3,249 @@ Servicio para envío de emails.
 
 Soporta AWS SES y SMTP como métodos de envío.
 En producción usar SES, en desarrollo puede usar SMTP o simplemente loggear.
+
+Los clientes de SES y SMTP son bloqueantes: cada transporte ejecuta sus llamadas
+en un executor propio, con tantos hilos como envíos concurrentes permitidos. Todos
+los envíos del proceso (individuales y masivos) pasan por el mismo limitador de
+tasa (ver app.services.email_dispatcher).
 """
 
+import asyncio
+import functools
 import logging
-from typing import Optional, List
+import smtplib
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from typing import AsyncIterable, Awaitable, Callable, Iterable, List, Optional, Union
+
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError, BotoCoreError
 
 from app.config import settings
+from app.services.email_dispatcher import (
+    DespachadorEmails,
+    ErrorEnvioEmail,
+    LimitadorTasa,
+    MensajeEmail,
+    ResultadoEnvio,
+    ResumenEnvio,
+    TransporteEmail,
+)
 from app.utils.exceptions import EBSException
 
 logger = logging.getLogger(__name__)
 
+REMITENTE_DEFAULT = "noreply@ebs.salem"
+
+# Errores de SES que pueden resolverse solos al reintentar
+_ERRORES_SES_TRANSITORIOS = {
+    "Throttling",
+    "ThrottlingException",
+    "ServiceUnavailable",
+    "InternalFailure",
+    "RequestTimeout",
+    "TooManyRequestsException",
+}
+
+
+class TransporteSES:
+    """Envío por AWS SES con un cliente compartido y un executor acotado."""
+
+    def __init__(self, concurrencia: int, endpoint_url: Optional[str] = None):
+        session_params = {
+            "region_name": settings.aws_region,
+        }
+
+        if settings.aws_access_key_id and settings.aws_secret_access_key:
+            session_params["aws_access_key_id"] = settings.aws_access_key_id
+            session_params["aws_secret_access_key"] = settings.aws_secret_access_key
+
+        session = boto3.Session(**session_params)
+        self.ses_client = session.client(
+            "ses",
+            region_name=settings.aws_region,
+            endpoint_url=endpoint_url or settings.ses_endpoint_url or None,
+            # Los reintentos los hace el despachador, con jitter y por destinatario
+            config=Config(max_pool_connections=concurrencia, retries={"max_attempts": 1}),
+        )
+        self._executor = ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix="ses")
+        logger.info("EmailService initialized with AWS SES")
+
+    def _send_email(self, mensaje: MensajeEmail) -> str:
+        message = {
+            "Subject": {"Data": mensaje.asunto, "Charset": "UTF-8"},
+        }
+
+        body_dict = {}
+        if mensaje.body_html:
+            body_dict["Html"] = {"Data": mensaje.body_html, "Charset": "UTF-8"}
+        if mensaje.body_text:
+            body_dict["Text"] = {"Data": mensaje.body_text, "Charset": "UTF-8"}
+
+        message["Body"] = body_dict
+
+        response = self.ses_client.send_email(
+            Source=mensaje.remitente,
+            Destination={"ToAddresses": [mensaje.destinatario]},
+            Message=message
+        )
+        return response.get("MessageId")
+
+    async def enviar(self, mensaje: MensajeEmail) -> str:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(self._send_email, mensaje))
+        except ClientError as e:
+            error_code = e.response.get("Error", {}).get("Code", "Unknown")
+            error_message = e.response.get("Error", {}).get("Message", str(e))
+            raise ErrorEnvioEmail(
+                f"SES {error_code}: {error_message}",
+                reintentable=error_code in _ERRORES_SES_TRANSITORIOS,
+            )
+        except BotoCoreError as e:
+            # Errores de conexión o de credenciales temporales
+            raise ErrorEnvioEmail(f"SES connection error: {e}", reintentable=True)
+
+    def cerrar(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.ses_client.close()
+
+
+class TransporteSMTP:
+    """Envío por SMTP; cada hilo del executor mantiene su propia conexión abierta."""
+
+    def __init__(self, concurrencia: int):
+        self.host = settings.smtp_host
+        self.port = settings.smtp_port
+        self._executor = ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix="smtp")
+        self._local = threading.local()
+        self._conexiones: List[smtplib.SMTP] = []
+        self._lock = threading.Lock()
+        logger.info(f"EmailService initialized with SMTP {self.host}:{self.port}")
+
+    def _conexion(self) -> smtplib.SMTP:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = smtplib.SMTP(self.host, self.port, timeout=30)
+            if settings.smtp_use_tls:
+                conexion.starttls()
+            if settings.smtp_username:
+                conexion.login(settings.smtp_username, settings.smtp_password or "")
+            self._local.conexion = conexion
+            with self._lock:
+                self._conexiones.append(conexion)
+        return conexion
+
+    def _send_email(self, mensaje: MensajeEmail) -> str:
+        email = EmailMessage()
+        message_id = f"<{uuid.uuid4()}@ebs.salem>"
+        email["Message-ID"] = message_id
+        email["From"] = mensaje.remitente
+        email["To"] = mensaje.destinatario
+        email["Subject"] = mensaje.asunto
+        email.set_content(mensaje.body_text or "")
+        if mensaje.body_html:
+            email.add_alternative(mensaje.body_html, subtype="html")
+        try:
+            try:
+                self._conexion().send_message(email)
+            except smtplib.SMTPServerDisconnected:
+                # El servidor cerró la conexión inactiva: reconectar una vez
+                self._local.conexion = None
+                self._conexion().send_message(email)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            raise
+        except (smtplib.SMTPException, OSError):
+            # Conexión en estado desconocido: el próximo envío de este hilo abre otra
+            self._local.conexion = None
+            raise
+        return message_id
+
+    async def enviar(self, mensaje: MensajeEmail) -> str:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(self._send_email, mensaje))
+        except smtplib.SMTPRecipientsRefused as e:
+            raise ErrorEnvioEmail(f"SMTP recipient refused: {e.recipients}", reintentable=False)
+        except smtplib.SMTPResponseException as e:
+            # 4xx: rechazo temporal; 5xx: permanente
+            raise ErrorEnvioEmail(f"SMTP {e.smtp_code}: {e.smtp_error!r}", reintentable=400 <= e.smtp_code < 500)
+        except (smtplib.SMTPException, OSError) as e:
+            raise ErrorEnvioEmail(f"SMTP connection error: {e}", reintentable=True)
+
+    def cerrar(self) -> None:
+        self._executor.shutdown(wait=True)
+        for conexion in self._conexiones:
+            try:
+                conexion.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+
+
+class TransporteLog:
+    """Loggear emails en desarrollo (no enviar realmente)."""
+
+    def __init__(self):
+        logger.info("EmailService initialized in development mode (logging only)")
+
+    async def enviar(self, mensaje: MensajeEmail) -> str:
+        # Solo los encabezados y tamaños: en un envío masivo los cuerpos llenarían el log
+        logger.info(
+            f"[EMAIL DEV] From: {mensaje.remitente}, To: {mensaje.destinatario}, Subject: {mensaje.asunto}, "
+            f"text: {len(mensaje.body_text or '')} chars, HTML: {len(mensaje.body_html or '')} chars"
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[EMAIL DEV] Body (text) to {mensaje.destinatario}:\n{mensaje.body_text}")
+        return f"dev-{uuid.uuid4()}"
+
+    def cerrar(self) -> None:
+        pass
+
+
+def _crear_transporte() -> TransporteEmail:
+    concurrencia = settings.email_max_concurrency
+    if settings.smtp_host:
+        return TransporteSMTP(concurrencia)
+    if settings.is_production or settings.aws_access_key_id or settings.ses_endpoint_url:
+        return TransporteSES(concurrencia)
+    return TransporteLog()
+
 
 class EmailService:
     """Servicio para envío de emails usando SES o SMTP"""
 
-    def __init__(self):
-        """Inicializar servicio de email"""
-        self.use_ses = settings.is_production or bool(settings.aws_access_key_id)
-        self.from_email = settings.from_email if hasattr(settings, "from_email") else None
-        
-        if self.use_ses:
-            session_params = {
-                "region_name": settings.aws_region,
-            }
-            
-            if settings.aws_access_key_id and settings.aws_secret_access_key:
-                session_params["aws_access_key_id"] = settings.aws_access_key_id
-                session_params["aws_secret_access_key"] = settings.aws_secret_access_key
-            
-            session = boto3.Session(**session_params)
-            self.ses_client = session.client("ses", region_name=settings.aws_region)
-            logger.info("EmailService initialized with AWS SES")
-        else:
-            self.ses_client = None
-            logger.info("EmailService initialized in development mode (logging only)")
-
-    def send_email(
+    def __init__(self, transporte: Optional[TransporteEmail] = None, limitador: Optional[LimitadorTasa] = None):
+        """Inicializar servicio de email sobre el transporte configurado (o el indicado)"""
+        self.from_email = settings.from_email or REMITENTE_DEFAULT
+        self.transporte = transporte or _crear_transporte()
+        self.despachador = DespachadorEmails(
+            self.transporte,
+            # La cuota de SES es de la cuenta, no del proceso
+            limitador or LimitadorTasa(settings.email_send_rate_per_second / max(1, settings.email_send_processes)),
+            concurrencia=settings.email_max_concurrency,
+            max_intentos=settings.email_max_attempts,
+            base_reintento=settings.email_retry_base_seconds,
+            max_reintento=settings.email_retry_max_seconds,
+        )
+
+    def mensaje(
+        self,
+        to_email: str,
+        subject: str,
+        body_html: Optional[str] = None,
+        body_text: Optional[str] = None,
+        from_email: Optional[str] = None,
+        referencia=None
+    ) -> MensajeEmail:
+        """Construir un mensaje con el remitente por defecto."""
+        if not body_html and not body_text:
+            raise ValueError("Se debe proporcionar body_html o body_text")
+        return MensajeEmail(to_email, subject, body_html, body_text, from_email or self.from_email, referencia)
+
+    async def send_email(
         self,
         to_email: str,
         subject: str,
@@ -49,141 +254,54 @@ class EmailService:
         from_email: Optional[str] = None
     ) -> bool:
         """
-        Enviar email usando SES o SMTP.
-        
+        Enviar un email, reintentando los errores transitorios.
+
         Args:
             to_email: Email del destinatario
             subject: Asunto del email
             body_html: Cuerpo del email en HTML (opcional)
             body_text: Cuerpo del email en texto plano (requerido si no hay HTML)
             from_email: Email remitente (opcional, usa configuración por defecto)
-            
+
         Returns:
-            True si se envió exitosamente, False en caso contrario
-            
+            True si se envió exitosamente
+
         Raises:
-            EBSException: Si hay error crítico enviando el email
+            EBSException: Si el email no se pudo enviar
         """
-        if not body_html and not body_text:
-            raise ValueError("Se debe proporcionar body_html o body_text")
-        
-        from_email = from_email or self.from_email or "noreply@ebs.salem"
-        
-        if self.use_ses and self.ses_client:
-            return self._send_via_ses(to_email, subject, body_html, body_text, from_email)
-        else:
-            return self._log_email(to_email, subject, body_html, body_text, from_email)
-
-    def _send_via_ses(
-        self,
-        to_email: str,
-        subject: str,
-        body_html: Optional[str],
-        body_text: Optional[str],
-        from_email: str
-    ) -> bool:
-        """Enviar email usando AWS SES"""
-        try:
-            message = {
-                "Subject": {"Data": subject, "Charset": "UTF-8"},
-            }
-            
-            body_dict = {}
-            if body_html:
-                body_dict["Html"] = {"Data": body_html, "Charset": "UTF-8"}
-            if body_text:
-                body_dict["Text"] = {"Data": body_text, "Charset": "UTF-8"}
-            
-            message["Body"] = body_dict
-            
-            response = self.ses_client.send_email(
-                Source=from_email,
-                Destination={"ToAddresses": [to_email]},
-                Message=message
-            )
-            
-            logger.info(f"Email sent via SES to {to_email}, MessageId: {response.get('MessageId')}")
-            return True
-            
-        except ClientError as e:
-            error_code = e.response.get("Error", {}).get("Code", "Unknown")
-            error_message = e.response.get("Error", {}).get("Message", str(e))
-            logger.error(f"SES error sending email to {to_email}: {error_code} - {error_message}")
-            raise EBSException(
-                status_code=500,
-                detail=f"Error sending email: {error_message}",
-                error_code="EMAIL_SEND_ERROR"
-            )
-        except BotoCoreError as e:
-            logger.error(f"Boto3 error sending email to {to_email}: {str(e)}")
-            raise EBSException(
-                status_code=500,
-                detail=f"Error sending email: {str(e)}",
-                error_code="EMAIL_SEND_ERROR"
-            )
-        except Exception as e:
-            logger.error(f"Unexpected error sending email to {to_email}: {str(e)}", exc_info=True)
+        resultado = await self.despachador.enviar_uno(
+            self.mensaje(to_email, subject, body_html, body_text, from_email)
+        )
+        if not resultado.enviado:
             raise EBSException(
                 status_code=500,
-                detail=f"Unexpected error sending email: {str(e)}",
+                detail=f"Error sending email: {resultado.error}",
                 error_code="EMAIL_SEND_ERROR"
             )
-
-    def _log_email(
-        self,
-        to_email: str,
-        subject: str,
-        body_html: Optional[str],
-        body_text: Optional[str],
-        from_email: str
-    ) -> bool:
-        """Loggear email en desarrollo (no enviar realmente)"""
-        logger.info(
-            f"[EMAIL DEV] From: {from_email}, To: {to_email}, Subject: {subject}\n"
-            f"Body (text): {body_text}\n"
-            f"Body (HTML): {body_html}"
-        )
+        logger.info(f"Email sent to {to_email}, MessageId: {resultado.message_id}")
         return True
 
-    def send_bulk_email(
+    async def send_bulk_email(
         self,
-        to_emails: List[str],
-        subject: str,
-        body_html: Optional[str] = None,
-        body_text: Optional[str] = None,
-        from_email: Optional[str] = None
-    ) -> dict:
+        mensajes: Union[Iterable[MensajeEmail], AsyncIterable[MensajeEmail]],
+        al_registrar: Optional[Callable[[List[ResultadoEnvio]], Awaitable[None]]] = None,
+        tamano_registro: int = 100
+    ) -> ResumenEnvio:
         """
-        Enviar emails a múltiples destinatarios usando SES.
-        En desarrollo, solo loggea.
-        
+        Enviar muchos emails en paralelo, con el límite de tasa y reintentos por destinatario.
+
+        Args:
+            mensajes: Mensajes (ver `mensaje`), o un generador asíncrono que los produzca
+            al_registrar: Corrutina que recibe los resultados por lotes
+            tamano_registro: Resultados por lote
+
         Returns:
-            Dict con 'success_count' y 'failure_count'
+            Cantidad de emails enviados y fallidos
         """
-        from_email = from_email or self.from_email or "noreply@ebs.salem"
-        
-        if not self.use_ses or not self.ses_client:
-            for email in to_emails:
-                self._log_email(email, subject, body_html, body_text, from_email)
-            return {"success_count": len(to_emails), "failure_count": 0}
-        
-        success_count = 0
-        failure_count = 0
-        
-        for email in to_emails:
-            try:
-                if self.send_email(email, subject, body_html, body_text, from_email):
-                    success_count += 1
-                else:
-                    failure_count += 1
-            except Exception as e:
-                logger.error(f"Failed to send email to {email}: {str(e)}")
-                failure_count += 1
-        
-        return {
-            "success_count": success_count,
-            "failure_count": failure_count
-        }
+        return await self.despachador.enviar(mensajes, al_registrar, tamano_registro)
+
+    def cerrar(self) -> None:
+        self.transporte.cerrar()
 
 
 _email_service_instance: Optional[EmailService] = None
@@ -196,3 +314,10 @@ def get_email_service() -> EmailService:
         _email_service_instance = EmailService()
     return _email_service_instance
 
+
+def cerrar_email_service() -> None:
+    """Esperar los envíos en curso y liberar las conexiones del transporte, si se creó."""
+    global _email_service_instance
+    if _email_service_instance is not None:
+        _email_service_instance.cerrar()
+        _email_service_instance = None
@@ -0,0 +1,170 @@
+"""
+Eventos en vivo entre procesos, sobre LISTEN/NOTIFY de PostgreSQL.
+
+Quien produce un evento (p. ej. el worker que termina un certificado) lo publica
+con `publicar()` en su propia transacción: pg_notify lo entrega solo si la
+transacción se confirma. Cada proceso de la API mantiene una única conexión que
+escucha los canales con suscriptores y reparte cada evento, en memoria, a las
+colas de quienes están suscritos a alguna de sus claves (p. ej. un certificado o
+un usuario). Mil clientes esperando cuestan una conexión, no mil consultas
+periódicas.
+
+Los eventos no se guardan: un suscriptor recibe solo lo que se publica mientras
+está suscrito, así que debe suscribirse antes de leer el estado actual. Si la
+conexión de escucha se pierde, cada suscriptor recibe None para que cierre su
+flujo (el cliente se reconecta y vuelve a leer el estado).
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Set, Tuple
+
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database.session import get_database_url
+
+logger = logging.getLogger(__name__)
+
+CANAL_CERTIFICADOS = "certificados"
+CANAL_CERTIFICADOS_REVOCADOS = "certificados_revocados"
+CANAL_FORO = "foro"
+CANAL_INTENTOS_FINALIZADOS = "intentos_finalizados"
+
+
+@dataclass(frozen=True)
+class Evento:
+	"""Evento a publicar."""
+	# Claves de los suscriptores que lo reciben (ver BusEventos.suscribir)
+	claves: Tuple[str, ...]
+	# Contenido; debe ser pequeño (NOTIFY admite hasta 8000 bytes)
+	datos: Dict[str, Any]
+
+
+async def publicar(db: AsyncSession, canal: str, eventos: Iterable[Evento]) -> None:
+	"""Publicar eventos en `canal` en la transacción en curso; se entregan al confirmarla."""
+	filas = [
+		{
+			"canal": canal,
+			"payload": json.dumps({"claves": list(e.claves), "datos": e.datos}, ensure_ascii=False, default=str),
+		}
+		for e in eventos
+	]
+	if filas:
+		await db.execute(text("SELECT pg_notify(:canal, :payload)"), filas)
+
+
+class BusEventos:
+	"""
+	Reparto en memoria de los eventos de LISTEN/NOTIFY a los suscriptores del proceso.
+
+	La conexión de escucha se abre con el primer suscriptor y escucha cada canal
+	desde su primera suscripción. Solo se usa desde el event loop.
+	"""
+
+	def __init__(self, dsn: Optional[str] = None, capacidad_cola: int = 100):
+		self._dsn = dsn
+		self.capacidad_cola = capacidad_cola
+		self._suscriptores: Dict[Tuple[str, str], Set[asyncio.Queue]] = defaultdict(set)
+		self._conexion: Optional[asyncpg.Connection] = None
+		self._canales: Set[str] = set()
+		self._lock = asyncio.Lock()
+
+	@asynccontextmanager
+	async def suscribir(self, canal: str, clave: str) -> AsyncIterator[asyncio.Queue]:
+		"""
+		Recibir en una cola los datos de los eventos de `canal` publicados para `clave`.
+
+		La cola recibe None si se pierde la conexión de escucha. Si el suscriptor no
+		la vacía y se llena, los eventos siguientes se descartan para él.
+		"""
+		await self._escuchar(canal)
+		cola: asyncio.Queue = asyncio.Queue(maxsize=self.capacidad_cola)
+		self._suscriptores[(canal, clave)].add(cola)
+		try:
+			yield cola
+		finally:
+			colas = self._suscriptores.get((canal, clave))
+			if colas is not None:
+				colas.discard(cola)
+				if not colas:
+					del self._suscriptores[(canal, clave)]
+
+	async def _escuchar(self, canal: str) -> None:
+		async with self._lock:
+			if self._conexion is None or self._conexion.is_closed():
+				self._conexion = await asyncpg.connect(self._dsn or _dsn_asyncpg())
+				self._conexion.add_termination_listener(self._al_perder_conexion)
+				self._canales = set()
+			if canal not in self._canales:
+				await self._conexion.add_listener(canal, self._al_recibir)
+				self._canales.add(canal)
+
+	def _al_recibir(self, _conexion, _pid: int, canal: str, payload: str) -> None:
+		try:
+			evento = json.loads(payload)
+		except ValueError:
+			logger.warning(f"Evento con payload inválido en el canal {canal}: {payload[:200]!r}")
+			return
+		for clave in evento.get("claves", ()):
+			for cola in self._suscriptores.get((canal, clave), ()):
+				self._entregar(cola, evento.get("datos"))
+
+	def _al_perder_conexion(self, _conexion) -> None:
+		logger.warning("Se perdió la conexión de escucha de eventos; se cierran los flujos suscritos")
+		self._conexion = None
+		self._canales = set()
+		self._cerrar_suscripciones()
+
+	def _cerrar_suscripciones(self) -> None:
+		for colas in self._suscriptores.values():
+			for cola in colas:
+				self._entregar(cola, None)
+
+	@staticmethod
+	def _entregar(cola: asyncio.Queue, datos: Any) -> None:
+		try:
+			cola.put_nowait(datos)
+		except asyncio.QueueFull:
+			logger.warning("Cola de eventos llena; se descarta un evento para un suscriptor lento")
+
+	async def cerrar(self) -> None:
+		"""Cerrar la conexión de escucha y los flujos suscritos."""
+		async with self._lock:
+			if self._conexion is not None and not self._conexion.is_closed():
+				self._conexion.remove_termination_listener(self._al_perder_conexion)
+				await self._conexion.close()
+			self._conexion = None
+			self._canales = set()
+			self._cerrar_suscripciones()
+
+
+def _dsn_asyncpg() -> str:
+	"""URL de la base de datos de la aplicación en el formato de asyncpg."""
+	url = make_url(get_database_url()).set(drivername="postgresql")
+	return url.render_as_string(hide_password=False)
+
+
+_bus: Optional[BusEventos] = None
+
+
+def get_bus_eventos() -> BusEventos:
+	"""Obtener el bus de eventos del proceso."""
+	global _bus
+	if _bus is None:
+		_bus = BusEventos(capacidad_cola=settings.eventos_queue_size)
+	return _bus
+
+
+async def cerrar_bus_eventos() -> None:
+	global _bus
+	if _bus is not None:
+		await _bus.cerrar()
+		_bus = None
@@ -2,8 +2,9 @@ import logging
 import uuid
 from typing import Optional, List
 from decimal import Decimal
+from datetime import datetime, timezone
 
-from sqlalchemy import select, func, and_, or_, text
+from sqlalchemy import select, func, and_, or_, text, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -11,7 +12,8 @@ from app.database import models
 from app.database.enums import ResultadoIntento
 from app.utils.exceptions import NotFoundError, AuthorizationError, BusinessRuleError, ValidationError
 from app.services.intento_service import IntentoService
-from app.services.quiz_service import QuizService
+from app.services.autosave_service import get_autosave_service
+from app.services.quiz_service import QuizService, KEYSET_INTENTOS
 from app.services.inscripcion_service import InscripcionService
 from app.schemas.intento import IntentoResult, RespuestaResponse
 
@@ -98,6 +100,17 @@ class ExamenFinalService:
 		result = await self.db.execute(stmt)
 		return result.scalar_one_or_none()
 
+	async def get_min_score_aprobatorio(self, examen_final_id: uuid.UUID) -> Decimal:
+		"""Puntaje mínimo aprobatorio del examen según su regla de acreditación (80 por defecto)."""
+		examen = await self.get_examen_final(examen_final_id)
+		
+		regla = await self.get_regla_acreditacion(
+			examen.curso_id,
+			examen_final_id=examen_final_id,
+		)
+		
+		return regla.min_score_aprobatorio if regla else Decimal("80.00")
+
 	async def validate_quizzes_aprobados(
 		self,
 		curso_id: uuid.UUID,
@@ -269,6 +282,9 @@ class ExamenFinalService:
 		if intento.finalizado_en:
 			raise BusinessRuleError("Este intento ya fue finalizado")
 		
+		if intento.expira_en and intento.expira_en <= datetime.now(timezone.utc):
+			raise BusinessRuleError("El tiempo límite de este intento ya expiró")
+		
 		intento_preguntas = await self.db.execute(
 			select(models.IntentoPregunta)
 			.where(models.IntentoPregunta.intento_id == intento_id)
@@ -278,11 +294,32 @@ class ExamenFinalService:
 		preguntas_map = {ip.pregunta_id: ip for ip in intento_preguntas_list}
 		
 		for respuesta_data in respuestas:
-			pregunta_id = respuesta_data.get("pregunta_id")
-			if pregunta_id not in preguntas_map:
-				raise ValidationError(f"Pregunta {pregunta_id} no pertenece a este intento")
-			
-			intento_pregunta = preguntas_map[pregunta_id]
+			if respuesta_data.get("pregunta_id") not in preguntas_map:
+				raise ValidationError(f"Pregunta {respuesta_data.get('pregunta_id')} no pertenece a este intento")
+		
+		# Los borradores autoguardados entran en la misma transacción; lo enviado
+		# ahora reemplaza cualquier borrador de la misma pregunta.
+		await get_autosave_service().volcar_intento(self.db, intento_id)
+		
+		# Respuestas y finalizado_en se confirman juntas con el intento bloqueado: un
+		# volcado de borradores de otro worker espera y ya no lo encuentra abierto.
+		bloqueado = await self.db.execute(
+			select(models.Intento)
+			.where(models.Intento.id == intento_id)
+			.with_for_update()
+			.execution_options(populate_existing=True)
+		)
+		if bloqueado.scalar_one().finalizado_en:
+			raise BusinessRuleError("Este intento ya fue finalizado")
+		
+		preguntas_enviadas = {preguntas_map[r.get("pregunta_id")].id for r in respuestas}
+		if preguntas_enviadas:
+			await self.db.execute(
+				delete(models.Respuesta).where(models.Respuesta.intento_pregunta_id.in_(preguntas_enviadas))
+			)
+		
+		for respuesta_data in respuestas:
+			intento_pregunta = preguntas_map[respuesta_data.get("pregunta_id")]
 			
 			respuesta = models.Respuesta(
 				intento_pregunta_id=intento_pregunta.id,
@@ -292,18 +329,11 @@ class ExamenFinalService:
 			)
 			self.db.add(respuesta)
 		
-		await self.db.commit()
+		await self.db.flush()
 		
 		puntaje_total, puntaje_maximo, preguntas_correctas, total_preguntas = await self.calcular_puntaje(intento_id)
 		
-		examen = await self.get_examen_final(intento.examen_final_id)
-		
-		regla = await self.get_regla_acreditacion(
-			examen.curso_id,
-			examen_final_id=intento.examen_final_id,
-		)
-		
-		min_score = regla.min_score_aprobatorio if regla else Decimal("80.00")
+		min_score = await self.get_min_score_aprobatorio(intento.examen_final_id)
 		
 		porcentaje = (puntaje_total / puntaje_maximo * 100) if puntaje_maximo > 0 else Decimal("0")
 		aprobado = porcentaje >= min_score
@@ -330,14 +360,15 @@ class ExamenFinalService:
 		usuario_id: Optional[uuid.UUID] = None,
 		skip: int = 0,
 		limit: int = 100,
+		cursor: Optional[str] = None,
 	) -> List[models.Intento]:
-		"""Listar intentos de un examen final."""
+		"""Listar intentos de un examen final, por cursor o, sin él, por skip."""
 		stmt = select(models.Intento).where(models.Intento.examen_final_id == examen_final_id)
 		
 		if usuario_id:
 			stmt = stmt.where(models.Intento.usuario_id == usuario_id)
 		
-		stmt = stmt.order_by(models.Intento.numero_intento.desc()).offset(skip).limit(limit)
+		stmt = KEYSET_INTENTOS.aplicar(stmt, cursor=cursor, skip=skip, limit=limit)
 		result = await self.db.execute(stmt)
 		return result.scalars().all()
 
@@ -395,14 +426,7 @@ class ExamenFinalService:
 		"""
 		puntaje_total, puntaje_maximo, preguntas_correctas, total_preguntas = await self.calcular_puntaje(intento.id)
 		
-		examen = await self.get_examen_final(intento.examen_final_id)
-		
-		regla = await self.get_regla_acreditacion(
-			examen.curso_id,
-			examen_final_id=intento.examen_final_id,
-		)
-		
-		min_score = regla.min_score_aprobatorio if regla else Decimal("80.00")
+		min_score = await self.get_min_score_aprobatorio(intento.examen_final_id)
 		porcentaje = (puntaje_total / puntaje_maximo * 100) if puntaje_maximo > 0 else Decimal("0")
 		
 		respuestas_stmt = await self.db.execute(
@@ -1,17 +1,120 @@
 import logging
+import re
+import unicodedata
 import uuid
-from typing import List, Optional
+from difflib import SequenceMatcher
+from typing import Any, List, Optional, Sequence, Tuple
 
-from sqlalchemy import select, and_, delete
+from sqlalchemy import Float, column, select, and_, delete, text, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.database import models
+from app.config import settings
 from app.database.enums import EstadoInscripcion
+from app.services.eventos_service import CANAL_FORO, Evento, publicar
 from app.utils.exceptions import NotFoundError, AuthorizationError, BusinessRuleError
+from app.utils.pagination import Keyset
 
 logger = logging.getLogger(__name__)
 
+# Comentarios de una lección en orden cronológico (idx_foro_comentario_curso_leccion_creado)
+KEYSET_COMENTARIOS = Keyset(models.ForoComentario.creado_en, models.ForoComentario.id)
+
+# Resultados de búsqueda, por puntaje descendente (ver _SQL_BUSCAR)
+KEYSET_BUSQUEDA = Keyset(column("puntaje", Float), models.ForoComentario.id, descendente=True)
+
+# Búsqueda por trigramas sobre idx_foro_comentario_contenido_gin: `contenido %> :consulta`
+# (word_similarity sobre el umbral pg_trgm.word_similarity_threshold) se resuelve con el
+# índice, sin recorrer la tabla. El puntaje suma a la similitud 0.1 por cada
+# `segundos_por_decima` de antigüedad menos; como no depende de la hora actual, el orden
+# es estable entre páginas y sirve como clave del cursor.
+_SQL_BUSCAR = """
+	SELECT r.* FROM (
+		SELECT f.id, f.usuario_id, f.curso_id, f.leccion_id, f.contenido, f.creado_en, f.actualizado_en,
+			u.nombre AS usuario_nombre, u.apellido AS usuario_apellido,
+			word_similarity(CAST(:consulta AS TEXT), f.contenido) AS similitud,
+			word_similarity(CAST(:consulta AS TEXT), f.contenido)
+				+ EXTRACT(EPOCH FROM f.creado_en)::float8 / :segundos_por_decima * 0.1 AS puntaje
+		FROM foro_comentario f
+		JOIN usuario u ON u.id = f.usuario_id
+		WHERE f.curso_id = :curso_id
+			{filtro_leccion}
+			AND f.contenido %> CAST(:consulta AS TEXT)
+	) r
+	{filtro_cursor}
+	ORDER BY r.puntaje DESC, r.id DESC
+	LIMIT :limit
+"""
+
+_PALABRA = re.compile(r"\w+")
+
+
+def _normalizar(texto: str) -> str:
+	"""Minúsculas y sin acentos, carácter por carácter (conserva las posiciones)."""
+	return "".join(unicodedata.normalize("NFD", c)[0].lower()[:1] or c for c in texto)
+
+
+def _coincide(palabra: str, buscada: str) -> bool:
+	if palabra == buscada or (len(buscada) >= 3 and palabra.startswith(buscada)):
+		return True
+	return len(buscada) >= 4 and SequenceMatcher(None, buscada, palabra).ratio() >= 0.75
+
+
+def fragmento_resaltado(contenido: str, consulta: str, largo: int = 200) -> Tuple[str, List[Tuple[int, int]]]:
+	"""
+	Fragmento de `contenido` alrededor de la primera coincidencia con `consulta`.
+
+	Retorna el fragmento (con "…" si se recortó) y las posiciones [inicio, fin) de las
+	palabras que coinciden con alguna de la consulta, sin distinguir mayúsculas ni
+	acentos y tolerando errores de escritura. Las posiciones evitan devolver HTML
+	armado con contenido de usuarios.
+	"""
+	buscadas = _PALABRA.findall(_normalizar(consulta))
+	normalizado = _normalizar(contenido)
+	coincidencias = [
+		m.span() for m in _PALABRA.finditer(normalizado)
+		if any(_coincide(m.group(), b) for b in buscadas)
+	]
+	inicio = 0
+	if coincidencias and len(contenido) > largo:
+		inicio = max(0, coincidencias[0][0] - largo // 4)
+		# Empezar en el inicio de una palabra
+		while 0 < inicio < coincidencias[0][0] and not contenido[inicio - 1].isspace():
+			inicio += 1
+	fin = min(len(contenido), inicio + largo)
+	prefijo = "…" if inicio > 0 else ""
+	fragmento = prefijo + contenido[inicio:fin] + ("…" if fin < len(contenido) else "")
+	desplazamiento = len(prefijo) - inicio
+	resaltados = [
+		(a + desplazamiento, min(b, fin) + desplazamiento)
+		for a, b in coincidencias if a >= inicio and a < fin
+	]
+	return fragmento, resaltados
+
+COMENTARIO_CREADO = "creado"
+COMENTARIO_EDITADO = "editado"
+COMENTARIO_ELIMINADO = "eliminado"
+
+
+def clave_leccion(curso_id: uuid.UUID, leccion_id: uuid.UUID) -> str:
+	"""Clave de suscripción a los eventos del foro de una lección."""
+	return f"leccion:{curso_id}:{leccion_id}"
+
+
+def evento_comentario(tipo: str, comentario: models.ForoComentario) -> Evento:
+	"""
+	Evento del foro de la lección del comentario.
+
+	Lleva solo el id: el contenido puede superar el límite de NOTIFY y quien lo
+	reciba lo lee una vez por proceso (ver routes.foro).
+	"""
+	return Evento(
+		(clave_leccion(comentario.curso_id, comentario.leccion_id),),
+		# `evento` distingue dos cambios seguidos del mismo comentario al leerlo
+		{"tipo": tipo, "id": str(comentario.id), "evento": uuid.uuid4().hex},
+	)
+
 
 class ForoService:
 	"""Lógica de negocio para comentarios en foro."""
@@ -42,8 +145,9 @@ class ForoService:
 		leccion_id: uuid.UUID,
 		skip: int = 0,
 		limit: int = 100,
+		cursor: Optional[str] = None,
 	) -> List[models.ForoComentario]:
-		"""Listar comentarios de una lección."""
+		"""Listar comentarios de una lección, por cursor o, sin él, por skip."""
 		stmt = (
 			select(models.ForoComentario)
 			.options(
@@ -55,13 +159,104 @@ class ForoService:
 					models.ForoComentario.leccion_id == leccion_id,
 				)
 			)
-			.order_by(models.ForoComentario.creado_en.asc())
-			.offset(skip)
-			.limit(limit)
 		)
+		stmt = KEYSET_COMENTARIOS.aplicar(stmt, cursor=cursor, skip=skip, limit=limit)
 		result = await self.db.execute(stmt)
 		return result.scalars().all()
 
+	async def get_comentarios(self, comentario_ids: Sequence[uuid.UUID]) -> List[models.ForoComentario]:
+		"""Obtener los comentarios existentes de `comentario_ids`, con su autor."""
+		stmt = (
+			select(models.ForoComentario)
+			.options(selectinload(models.ForoComentario.usuario))
+			.where(models.ForoComentario.id.in_(comentario_ids))
+		)
+		result = await self.db.execute(stmt)
+		return result.scalars().all()
+
+	async def list_cambios_desde(
+		self,
+		curso_id: uuid.UUID,
+		leccion_id: uuid.UUID,
+		comentario_id: uuid.UUID,
+		limit: int = 100,
+	) -> Optional[Tuple[List[models.ForoComentario], List[models.ForoComentario]]]:
+		"""
+		Comentarios de una lección posteriores a `comentario_id` y anteriores editados después de él.
+
+		Permite a un cliente que se reconecta ponerse al día sin releer el hilo. Los
+		eliminados no se pueden recuperar. Retorna None si `comentario_id` no existe
+		(o no es de la lección); cada lista trae como mucho `limit` comentarios.
+		"""
+		referencia = (await self.db.execute(
+			select(models.ForoComentario.creado_en, models.ForoComentario.id).where(
+				and_(
+					models.ForoComentario.id == comentario_id,
+					models.ForoComentario.curso_id == curso_id,
+					models.ForoComentario.leccion_id == leccion_id,
+				)
+			)
+		)).one_or_none()
+		if referencia is None:
+			return None
+		nuevos = await self.list_comentarios_by_leccion(
+			curso_id, leccion_id, limit=limit, cursor=KEYSET_COMENTARIOS.codificar(referencia)
+		)
+		stmt = (
+			select(models.ForoComentario)
+			.options(selectinload(models.ForoComentario.usuario))
+			.where(
+				and_(
+					models.ForoComentario.curso_id == curso_id,
+					models.ForoComentario.leccion_id == leccion_id,
+					tuple_(models.ForoComentario.creado_en, models.ForoComentario.id) <= tuple_(*referencia),
+					models.ForoComentario.actualizado_en > referencia.creado_en,
+				)
+			)
+			.order_by(models.ForoComentario.actualizado_en)
+			.limit(limit)
+		)
+		editados = (await self.db.execute(stmt)).scalars().all()
+		return nuevos, editados
+
+	async def buscar_comentarios(
+		self,
+		curso_id: uuid.UUID,
+		consulta: str,
+		leccion_id: Optional[uuid.UUID] = None,
+		limit: int = 20,
+		cursor: Optional[str] = None,
+	) -> List[Any]:
+		"""
+		Buscar comentarios de un curso (o de una de sus lecciones) por similitud de texto.
+
+		Ordena por similitud con la consulta y recencia; pagina por cursor (KEYSET_BUSQUEDA).
+		Cada fila trae las columnas del comentario, el nombre del autor, `similitud` y `puntaje`.
+		"""
+		params = {
+			"curso_id": curso_id,
+			"consulta": consulta,
+			"segundos_por_decima": settings.foro_busqueda_recencia_dias * 86400,
+			"limit": limit,
+		}
+		filtro_leccion = filtro_cursor = ""
+		if leccion_id is not None:
+			filtro_leccion = "AND f.leccion_id = :leccion_id"
+			params["leccion_id"] = leccion_id
+		if cursor:
+			params["cursor_puntaje"], params["cursor_id"] = KEYSET_BUSQUEDA.decodificar(cursor)
+			filtro_cursor = "WHERE (r.puntaje, r.id) < (:cursor_puntaje, :cursor_id)"
+		# Umbral solo para esta transacción
+		await self.db.execute(
+			text("SELECT set_config('pg_trgm.word_similarity_threshold', :umbral, true)"),
+			{"umbral": str(settings.foro_busqueda_umbral)},
+		)
+		result = await self.db.execute(
+			text(_SQL_BUSCAR.format(filtro_leccion=filtro_leccion, filtro_cursor=filtro_cursor)),
+			params,
+		)
+		return result.all()
+
 	async def validate_usuario_inscrito(
 		self,
 		usuario_id: uuid.UUID,
@@ -135,6 +330,8 @@ class ForoService:
 		)
 		
 		self.db.add(comentario)
+		await self.db.flush()
+		await publicar(self.db, CANAL_FORO, [evento_comentario(COMENTARIO_CREADO, comentario)])
 		await self.db.commit()
 		await self.db.refresh(comentario)
 		logger.info(
@@ -163,6 +360,7 @@ class ForoService:
 		comentario.contenido = contenido.strip()
 		
 		self.db.add(comentario)
+		await publicar(self.db, CANAL_FORO, [evento_comentario(COMENTARIO_EDITADO, comentario)])
 		await self.db.commit()
 		await self.db.refresh(comentario)
 		logger.info("Comentario %s actualizado", comentario_id)
@@ -182,5 +380,6 @@ class ForoService:
 		
 		stmt = delete(models.ForoComentario).where(models.ForoComentario.id == comentario_id)
 		await self.db.execute(stmt)
+		await publicar(self.db, CANAL_FORO, [evento_comentario(COMENTARIO_ELIMINADO, comentario)])
 		await self.db.commit()
 		logger.info("Comentario %s eliminado", comentario_id)
@@ -11,9 +11,17 @@ from sqlalchemy.exc import IntegrityError
 from app.database import models
 from app.database.enums import EstadoInscripcion
 from app.utils.exceptions import NotFoundError, ValidationError, BusinessRuleError
+from app.utils.pagination import Keyset
 
 logger = logging.getLogger(__name__)
 
+# Inscripciones de un usuario, más recientes primero (idx_inscripcion_curso_usuario_fecha)
+KEYSET_INSCRIPCIONES_USUARIO = Keyset(
+	models.InscripcionCurso.fecha_inscripcion,
+	models.InscripcionCurso.id,
+	descendente=True,
+)
+
 
 class InscripcionService:
 	"""Lógica de negocio para inscripciones a cursos."""
@@ -63,8 +71,9 @@ class InscripcionService:
 		estado: Optional[EstadoInscripcion] = None,
 		skip: int = 0,
 		limit: int = 100,
+		cursor: Optional[str] = None,
 	) -> List[models.InscripcionCurso]:
-		"""Listar inscripciones de un usuario."""
+		"""Listar inscripciones de un usuario, por cursor o, sin él, por skip."""
 		stmt = (
 			select(models.InscripcionCurso)
 			.options(selectinload(models.InscripcionCurso.curso))
@@ -74,7 +83,7 @@ class InscripcionService:
 		if estado:
 			stmt = stmt.where(models.InscripcionCurso.estado == estado)
 		
-		stmt = stmt.order_by(models.InscripcionCurso.fecha_inscripcion.desc()).offset(skip).limit(limit)
+		stmt = KEYSET_INSCRIPCIONES_USUARIO.aplicar(stmt, cursor=cursor, skip=skip, limit=limit)
 		result = await self.db.execute(stmt)
 		return result.scalars().all()
 
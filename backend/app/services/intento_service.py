@@ -1,12 +1,13 @@
 import logging
 import uuid
 from typing import Optional
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, and_, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import DBAPIError, IntegrityError
 
 from app.database import models
+from app.services.autosave_service import publicar_intentos_finalizados
 from app.utils.exceptions import NotFoundError, ValidationError
 
 logger = logging.getLogger(__name__)
@@ -15,6 +16,9 @@ logger = logging.getLogger(__name__)
 class IntentoService:
 	"""Lógica de negocio para intentos de quiz y examen final con protección contra race conditions."""
 
+	# Reintentos cuando un intento concurrente ocupa el mismo numero_intento y ya fue finalizado
+	MAX_REINTENTOS_NUMERACION = 3
+
 	def __init__(self, db: AsyncSession):
 		self.db = db
 
@@ -26,10 +30,13 @@ class IntentoService:
 		examen_final_id: Optional[uuid.UUID] = None,
 	) -> models.Intento:
 		"""
-		Crear un nuevo intento con bloqueo pesimista para prevenir race conditions.
+		Crear un nuevo intento sin bloqueos explícitos.
 		
-		Usa SELECT FOR UPDATE para calcular el próximo numero_intento de forma atómica
-		y previene múltiples intentos activos simultáneos.
+		El próximo numero_intento se calcula e inserta en una sola sentencia
+		(INSERT ... SELECT COALESCE(MAX) + 1 ... ON CONFLICT DO NOTHING). La atomicidad
+		la garantizan los índices únicos parciales de intento: uno por número de intento
+		y otro que admite un solo intento activo (finalizado_en IS NULL) por inscripción
+		y quiz/examen. Si la inserción no produce fila, otro intento ganó la carrera.
 		"""
 		if not quiz_id and not examen_final_id:
 			raise ValidationError("Debe proporcionar quiz_id o examen_final_id")
@@ -37,78 +44,109 @@ class IntentoService:
 		if quiz_id and examen_final_id:
 			raise ValidationError("No puede proporcionar ambos quiz_id y examen_final_id")
 
-		# Bloqueo pesimista: calcular próximo numero_intento de forma atómica
-		# Usar SELECT FOR UPDATE para prevenir race conditions
-		# Verificar que no exista un intento activo (finalizado_en IS NULL)
-		stmt_activo = select(models.Intento).where(
-			and_(
-				models.Intento.usuario_id == usuario_id,
-				models.Intento.inscripcion_curso_id == inscripcion_curso_id,
-				models.Intento.finalizado_en.is_(None),
-				or_(
-					(quiz_id is not None and models.Intento.quiz_id == quiz_id),
-					(examen_final_id is not None and models.Intento.examen_final_id == examen_final_id)
-				)
-			)
-		).with_for_update()
-		
-		result_activo = await self.db.execute(stmt_activo)
-		intento_activo = result_activo.scalar_one_or_none()
-		
-		if intento_activo:
-			raise ValidationError(
-				"Ya existe un intento activo para este quiz/examen. "
-				"Debe finalizar el intento actual antes de crear uno nuevo."
-			)
+		columna = "quiz_id" if quiz_id else "examen_final_id"
+		evaluacion_id = quiz_id or examen_final_id
 
-		# Calcular próximo numero_intento de forma atómica
-		if quiz_id:
-			stmt_count = select(func.coalesce(func.max(models.Intento.numero_intento), 0)).where(
-				and_(
-					models.Intento.usuario_id == usuario_id,
-					models.Intento.quiz_id == quiz_id,
-					models.Intento.inscripcion_curso_id == inscripcion_curso_id
+		for _ in range(self.MAX_REINTENTOS_NUMERACION):
+			intento_id = uuid.uuid4()
+			try:
+				result = await self.db.execute(
+					self._build_insert_intento(columna),
+					{
+						"id": intento_id,
+						"usuario_id": usuario_id,
+						"inscripcion_curso_id": inscripcion_curso_id,
+						"quiz_id": quiz_id,
+						"examen_final_id": examen_final_id,
+						"evaluacion_id": evaluacion_id,
+					},
 				)
-			)
-		else:
-			stmt_count = select(func.coalesce(func.max(models.Intento.numero_intento), 0)).where(
-				and_(
-					models.Intento.usuario_id == usuario_id,
-					models.Intento.examen_final_id == examen_final_id,
-					models.Intento.inscripcion_curso_id == inscripcion_curso_id
+				row = result.fetchone()
+				await self.db.commit()
+			except IntegrityError as e:
+				await self.db.rollback()
+				logger.warning(f"IntegrityError al crear intento: {e}")
+				raise ValidationError(
+					"No se pudo crear el intento. Es posible que ya exista un intento con el mismo número."
+				) from e
+			except DBAPIError:
+				# Los triggers de intento (max intentos, permitir_nuevo_intento) se evalúan antes
+				# que ON CONFLICT; si ya hay un intento activo se reporta igual que un conflicto.
+				await self.db.rollback()
+				if await self._existe_intento_activo(inscripcion_curso_id, columna, evaluacion_id):
+					raise self._error_intento_activo()
+				raise
+
+			if row:
+				intento = await self.db.get(models.Intento, intento_id, populate_existing=True)
+				logger.info(
+					"Intento creado: usuario_id=%s, quiz_id=%s, examen_final_id=%s, numero_intento=%s",
+					usuario_id, quiz_id, examen_final_id, row.numero_intento
 				)
-			)
-		
-		result_count = await self.db.execute(stmt_count)
-		max_numero = result_count.scalar_one() or 0
-		proximo_numero = max_numero + 1
-
-		# Crear nuevo intento
-		intento = models.Intento(
-			usuario_id=usuario_id,
-			inscripcion_curso_id=inscripcion_curso_id,
-			quiz_id=quiz_id,
-			examen_final_id=examen_final_id,
-			numero_intento=proximo_numero,
+				return intento
+
+			# Conflicto: o bien ya hay un intento activo, o bien otro intento concurrente
+			# tomó el mismo número y ya fue finalizado. Solo el segundo caso se reintenta.
+			if await self._existe_intento_activo(inscripcion_curso_id, columna, evaluacion_id):
+				raise self._error_intento_activo()
+
+		raise ValidationError(
+			"No se pudo crear el intento. Es posible que ya exista un intento con el mismo número."
 		)
-		
-		self.db.add(intento)
-		
-		try:
-			await self.db.commit()
-			await self.db.refresh(intento)
-			logger.info(
-				"Intento creado: usuario_id=%s, quiz_id=%s, examen_final_id=%s, numero_intento=%s",
-				usuario_id, quiz_id, examen_final_id, proximo_numero
+
+	@staticmethod
+	def _error_intento_activo() -> ValidationError:
+		return ValidationError(
+			"Ya existe un intento activo para este quiz/examen. "
+			"Debe finalizar el intento actual antes de crear uno nuevo."
+		)
+
+	@staticmethod
+	def _build_insert_intento(columna: str):
+		"""
+		Sentencia de asignación de numero_intento para la columna de evaluación dada.
+
+		Fija también expira_en a partir de tiempo_limite_minutos del quiz/examen
+		(NULL si no tiene tiempo límite).
+		"""
+		tabla = "quiz" if columna == "quiz_id" else "examen_final"
+		return text(f"""
+			INSERT INTO intento (
+				id, usuario_id, inscripcion_curso_id, quiz_id, examen_final_id, numero_intento, expira_en
 			)
-			return intento
-		except IntegrityError as e:
-			await self.db.rollback()
-			logger.warning(f"IntegrityError al crear intento: {e}")
-			# Fallback: el constraint único previno el duplicado
-			raise ValidationError(
-				"No se pudo crear el intento. Es posible que ya exista un intento con el mismo número."
-			) from e
+			SELECT
+				CAST(:id AS uuid),
+				CAST(:usuario_id AS uuid),
+				CAST(:inscripcion_curso_id AS uuid),
+				CAST(:quiz_id AS uuid),
+				CAST(:examen_final_id AS uuid),
+				COALESCE(MAX(i.numero_intento), 0) + 1,
+				CURRENT_TIMESTAMP + make_interval(mins => (
+					SELECT e.tiempo_limite_minutos FROM {tabla} e WHERE e.id = CAST(:evaluacion_id AS uuid)
+				))
+			FROM intento i
+			WHERE i.inscripcion_curso_id = CAST(:inscripcion_curso_id AS uuid)
+				AND i.{columna} = CAST(:evaluacion_id AS uuid)
+			ON CONFLICT DO NOTHING
+			RETURNING id, numero_intento
+		""")
+
+	async def _existe_intento_activo(
+		self,
+		inscripcion_curso_id: uuid.UUID,
+		columna: str,
+		evaluacion_id: uuid.UUID,
+	) -> bool:
+		"""Verificar si existe un intento sin finalizar para la inscripción y evaluación."""
+		stmt = select(models.Intento.id).where(
+			and_(
+				models.Intento.inscripcion_curso_id == inscripcion_curso_id,
+				getattr(models.Intento, columna) == evaluacion_id,
+				models.Intento.finalizado_en.is_(None),
+			)
+		).limit(1)
+		result = await self.db.execute(stmt)
+		return result.scalar_one_or_none() is not None
 
 	async def get_intento(self, intento_id: uuid.UUID) -> models.Intento:
 		"""Obtener intento por ID con relaciones cargadas."""
@@ -149,6 +187,8 @@ class IntentoService:
 			intento.resultado = ResultadoIntento(resultado)
 		
 		self.db.add(intento)
+		# Los workers que tengan el intento en caché dejan de aceptar borradores
+		await publicar_intentos_finalizados(self.db, [intento_id])
 		await self.db.commit()
 		await self.db.refresh(intento)
 		
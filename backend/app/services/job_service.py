@@ -0,0 +1,416 @@
+import logging
+import uuid
+from typing import List, Optional
+
+from sqlalchemy import select, update, func, case, and_, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import models
+from app.database.enums import EstadoJob
+from app.utils.exceptions import NotFoundError, BusinessRuleError
+from app.utils.pagination import Keyset
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_TERMINALES = (EstadoJob.COMPLETADO, EstadoJob.FALLIDO, EstadoJob.CANCELADO)
+
+# Listado de tareas, más recientes primero (idx_job_estado_creado)
+KEYSET_JOBS = Keyset(models.Job.creado_en, models.Job.id, descendente=True)
+
+# Tareas listas de una cola, en orden de llegada; SKIP LOCKED deja que varios
+# workers reclamen a la vez sin esperarse ni tomar la misma tarea.
+_SQL_RECLAMAR = """
+	WITH siguientes AS (
+		SELECT id
+		FROM job
+		WHERE cola = :cola
+			AND estado = 'PENDIENTE'
+			AND disponible_en <= CURRENT_TIMESTAMP
+		ORDER BY disponible_en
+		LIMIT :limite
+		FOR UPDATE SKIP LOCKED
+	)
+	UPDATE job j
+	SET estado = 'EN_PROCESO',
+		intentos = j.intentos + 1,
+		bloqueado_por = :worker_id,
+		bloqueado_hasta = CURRENT_TIMESTAMP + make_interval(secs => :bloqueo_segundos),
+		iniciado_en = COALESCE(j.iniciado_en, CURRENT_TIMESTAMP),
+		finalizado_en = NULL
+	FROM siguientes
+	WHERE j.id = siguientes.id
+	RETURNING j.id, j.tipo, j.parametros, j.intentos, j.max_intentos
+"""
+
+# Solo el worker que tiene la tarea la libera; si la tarea misma dejó otro estado
+# (pausada, cancelada, fallida) se respeta.
+_SQL_COMPLETAR = """
+	UPDATE job
+	SET estado = CASE WHEN estado = 'EN_PROCESO' THEN 'COMPLETADO'::estado_job ELSE estado END,
+		finalizado_en = CASE WHEN estado = 'EN_PROCESO' THEN CURRENT_TIMESTAMP ELSE finalizado_en END,
+		bloqueado_por = NULL,
+		bloqueado_hasta = NULL
+	WHERE id = :job_id AND bloqueado_por = :worker_id
+"""
+
+_SQL_REGISTRAR_FALLO = """
+	WITH nuevo AS (
+		SELECT id,
+			CASE
+				WHEN cancelacion_solicitada THEN 'CANCELADO'::estado_job
+				WHEN NOT :reintentar OR intentos >= max_intentos THEN 'FALLIDO'::estado_job
+				ELSE 'PENDIENTE'::estado_job
+			END AS estado
+		FROM job
+		WHERE id = :job_id AND bloqueado_por = :worker_id
+	)
+	UPDATE job j
+	SET estado = nuevo.estado,
+		error = :error,
+		disponible_en = CURRENT_TIMESTAMP + make_interval(secs => :reintentar_en),
+		finalizado_en = CASE WHEN nuevo.estado = 'PENDIENTE' THEN NULL ELSE CURRENT_TIMESTAMP END,
+		bloqueado_por = NULL,
+		bloqueado_hasta = NULL
+	FROM nuevo
+	WHERE j.id = nuevo.id
+	RETURNING j.estado
+"""
+
+_SQL_LIBERAR_VENCIDOS = """
+	UPDATE job
+	SET estado = CASE WHEN intentos >= max_intentos THEN 'FALLIDO'::estado_job ELSE 'PENDIENTE'::estado_job END,
+		error = 'El worker dejó de responder mientras ejecutaba la tarea',
+		disponible_en = CURRENT_TIMESTAMP,
+		finalizado_en = CASE WHEN intentos >= max_intentos THEN CURRENT_TIMESTAMP END,
+		bloqueado_por = NULL,
+		bloqueado_hasta = NULL
+	WHERE estado = 'EN_PROCESO' AND bloqueado_hasta < CURRENT_TIMESTAMP
+	RETURNING id
+"""
+
+
+class JobService:
+	"""
+	Cola durable de tareas en background y registro de su estado y progreso.
+
+	Los métodos que usa la propia tarea (iniciar, registrar_progreso, pausar, finalizar)
+	no hacen commit: el progreso de cada lote se confirma en la misma transacción que
+	el lote, así el contador nunca adelanta ni atrasa al trabajo hecho. Los que usa el
+	worker (reclamar, renovar_bloqueo, completar, registrar_fallo, devolver,
+	liberar_bloqueos_vencidos) confirman de inmediato.
+	"""
+
+	def __init__(self, db: AsyncSession):
+		self.db = db
+
+	async def crear_job(
+		self,
+		tipo: str,
+		parametros: Optional[dict] = None,
+		creado_por: Optional[uuid.UUID] = None,
+		cola: str = "default",
+		max_intentos: int = 1,
+		clave_unica: Optional[str] = None,
+	) -> models.Job:
+		"""
+		Registrar una tarea pendiente en `cola`.
+
+		Con `clave_unica`, si ya hay una tarea pendiente o en proceso con esa clave no
+		se crea otra: se retorna la existente (idx_job_clave_unica_activa).
+		"""
+		if clave_unica is None:
+			job = models.Job(
+				tipo=tipo,
+				parametros=parametros,
+				creado_por=creado_por,
+				cola=cola,
+				max_intentos=max_intentos,
+			)
+			self.db.add(job)
+			await self.db.commit()
+			await self.db.refresh(job)
+			return job
+
+		while True:
+			job_id = (await self.db.execute(
+				pg_insert(models.Job)
+				.values(
+					id=uuid.uuid4(),
+					tipo=tipo,
+					parametros=parametros,
+					creado_por=creado_por,
+					cola=cola,
+					max_intentos=max_intentos,
+					clave_unica=clave_unica,
+				)
+				.on_conflict_do_nothing(
+					index_elements=[models.Job.clave_unica],
+					index_where=models.Job.estado.in_((EstadoJob.PENDIENTE, EstadoJob.EN_PROCESO)),
+				)
+				.returning(models.Job.id)
+			)).scalar_one_or_none()
+			if job_id is None:
+				job_id = (await self.db.execute(
+					select(models.Job.id).where(
+						models.Job.clave_unica == clave_unica,
+						models.Job.estado.in_((EstadoJob.PENDIENTE, EstadoJob.EN_PROCESO)),
+					)
+				)).scalar_one_or_none()
+				if job_id is not None:
+					logger.info("Tarea %s con clave %s ya encolada: %s", tipo, clave_unica, job_id)
+			await self.db.commit()
+			# Si la tarea activa terminó entre el insert y la consulta, se vuelve a intentar
+			if job_id is not None:
+				return await self.get_job(job_id)
+
+	async def get_job(self, job_id: uuid.UUID) -> models.Job:
+		"""Obtener tarea por ID."""
+		job = await self.db.get(models.Job, job_id, populate_existing=True)
+		if not job:
+			raise NotFoundError("Job", str(job_id))
+		return job
+
+	async def list_jobs(
+		self,
+		*,
+		estado: Optional[EstadoJob] = None,
+		tipo: Optional[str] = None,
+		cola: Optional[str] = None,
+		skip: int = 0,
+		limit: int = 100,
+		cursor: Optional[str] = None,
+	) -> List[models.Job]:
+		"""Listar tareas, por cursor o, sin él, por skip."""
+		stmt = select(models.Job)
+		if estado is not None:
+			stmt = stmt.where(models.Job.estado == estado)
+		if tipo is not None:
+			stmt = stmt.where(models.Job.tipo == tipo)
+		if cola is not None:
+			stmt = stmt.where(models.Job.cola == cola)
+		stmt = KEYSET_JOBS.aplicar(stmt, cursor=cursor, skip=skip, limit=limit)
+		result = await self.db.execute(stmt)
+		return result.scalars().all()
+
+	async def resumen_colas(self) -> List[Row]:
+		"""Número de tareas por cola y estado."""
+		result = await self.db.execute(
+			select(models.Job.cola, models.Job.estado, func.count().label("total"))
+			.group_by(models.Job.cola, models.Job.estado)
+			.order_by(models.Job.cola, models.Job.estado)
+		)
+		return result.all()
+
+	async def solicitar_cancelacion(self, job_id: uuid.UUID) -> models.Job:
+		"""
+		Marcar la tarea para que se detenga al terminar su lote actual.
+		Si aún no la toma ningún worker, queda cancelada de inmediato.
+		"""
+		job = await self.get_job(job_id)
+		if job.estado in ESTADOS_TERMINALES:
+			raise BusinessRuleError(f"La tarea ya terminó con estado {job.estado.value}")
+		job.cancelacion_solicitada = True
+		if job.estado == EstadoJob.PENDIENTE:
+			job.estado = EstadoJob.CANCELADO
+			job.finalizado_en = func.now()
+		await self.db.commit()
+		await self.db.refresh(job)
+		logger.info("Cancelación solicitada para job %s", job_id)
+		return job
+
+	async def reencolar(self, job_id: uuid.UUID) -> models.Job:
+		"""
+		Volver a poner en cola una tarea fallida (o pausada) con sus intentos en cero.
+		Las tareas que guardan checkpoint continúan desde él.
+		"""
+		job = await self.get_job(job_id)
+		if job.estado not in (EstadoJob.FALLIDO, EstadoJob.PENDIENTE):
+			raise BusinessRuleError(f"No se puede reencolar una tarea con estado {job.estado.value}")
+		job.estado = EstadoJob.PENDIENTE
+		job.intentos = 0
+		job.disponible_en = func.now()
+		job.finalizado_en = None
+		await self.db.commit()
+		await self.db.refresh(job)
+		logger.info("Job %s reencolado en la cola %s", job_id, job.cola)
+		return job
+
+	async def reclamar(
+		self,
+		cola: str,
+		worker_id: str,
+		limite: int,
+		bloqueo_segundos: float,
+	) -> List[Row]:
+		"""
+		Tomar hasta `limite` tareas listas de `cola` para `worker_id`, bloqueadas
+		durante `bloqueo_segundos`. Cada reclamo cuenta como un intento.
+		"""
+		result = await self.db.execute(
+			text(_SQL_RECLAMAR),
+			{
+				"cola": cola,
+				"limite": limite,
+				"worker_id": worker_id,
+				"bloqueo_segundos": float(bloqueo_segundos),
+			},
+		)
+		jobs = result.all()
+		await self.db.commit()
+		return jobs
+
+	def _bloqueado_por(self, job_id: uuid.UUID, worker_id: str):
+		return and_(
+			models.Job.id == job_id,
+			models.Job.estado == EstadoJob.EN_PROCESO,
+			models.Job.bloqueado_por == worker_id,
+		)
+
+	async def renovar_bloqueo(self, job_id: uuid.UUID, worker_id: str, bloqueo_segundos: float) -> bool:
+		"""Extender el bloqueo de la tarea. Retorna False si el worker ya no la tiene."""
+		result = await self.db.execute(
+			update(models.Job)
+			.where(self._bloqueado_por(job_id, worker_id))
+			.values(bloqueado_hasta=func.now() + func.make_interval(0, 0, 0, 0, 0, 0, float(bloqueo_segundos)))
+			.returning(models.Job.id)
+		)
+		renovado = result.scalar_one_or_none() is not None
+		await self.db.commit()
+		return renovado
+
+	async def completar(self, job_id: uuid.UUID, worker_id: str) -> None:
+		"""
+		Liberar la tarea al terminar sin error. Si la propia tarea no registró otro
+		estado (cancelada, pausada, fallida sin reintento), queda COMPLETADO.
+		"""
+		await self.db.execute(text(_SQL_COMPLETAR), {"job_id": job_id, "worker_id": worker_id})
+		await self.db.commit()
+
+	async def registrar_fallo(
+		self,
+		job_id: uuid.UUID,
+		worker_id: str,
+		error: str,
+		reintentar_en: float,
+		reintentar: bool = True,
+	) -> Optional[EstadoJob]:
+		"""
+		Registrar que la tarea falló. Vuelve a la cola tras `reintentar_en` segundos
+		mientras le queden intentos; si no, queda FALLIDO (cola de mensajes muertos).
+		Una tarea con cancelación solicitada no se reintenta. Retorna el nuevo estado,
+		o None si el worker ya no tenía la tarea.
+		"""
+		result = await self.db.execute(
+			text(_SQL_REGISTRAR_FALLO),
+			{
+				"job_id": job_id,
+				"worker_id": worker_id,
+				"error": error,
+				"reintentar_en": float(reintentar_en),
+				"reintentar": reintentar,
+			},
+		)
+		estado = result.scalar_one_or_none()
+		await self.db.commit()
+		return EstadoJob(estado) if estado else None
+
+	async def devolver(self, job_id: uuid.UUID, worker_id: str) -> None:
+		"""Devolver a la cola una tarea interrumpida por el apagado del worker, sin gastar un intento."""
+		await self.db.execute(
+			update(models.Job)
+			.where(self._bloqueado_por(job_id, worker_id))
+			.values(
+				estado=EstadoJob.PENDIENTE,
+				intentos=func.greatest(models.Job.intentos - 1, 0),
+				disponible_en=func.now(),
+				bloqueado_por=None,
+				bloqueado_hasta=None,
+			)
+		)
+		await self.db.commit()
+
+	async def liberar_bloqueos_vencidos(self) -> int:
+		"""
+		Liberar las tareas cuyo worker dejó de renovar el bloqueo (caída o reinicio):
+		vuelven a la cola, o quedan FALLIDO si ya agotaron sus intentos.
+		"""
+		result = await self.db.execute(text(_SQL_LIBERAR_VENCIDOS))
+		liberados = len(result.all())
+		await self.db.commit()
+		if liberados:
+			logger.warning("Liberadas %s tareas con bloqueo vencido", liberados)
+		return liberados
+
+	async def iniciar(self, job_id: uuid.UUID, total: Optional[int] = None) -> bool:
+		"""
+		Marcar la tarea en proceso. Retorna True si ya se solicitó su cancelación.
+		Una tarea sin checkpoint empieza de cero en cada intento, así que su progreso
+		se reinicia; con checkpoint conserva lo ya procesado.
+		"""
+		result = await self.db.execute(
+			update(models.Job)
+			.where(models.Job.id == job_id)
+			.values(
+				estado=EstadoJob.EN_PROCESO,
+				iniciado_en=func.coalesce(models.Job.iniciado_en, func.now()),
+				total=total,
+				procesados=case(
+					(models.Job.checkpoint.is_(None), 0),
+					else_=models.Job.procesados,
+				),
+			)
+			.returning(models.Job.cancelacion_solicitada)
+		)
+		return bool(result.scalar_one())
+
+	async def registrar_progreso(
+		self,
+		job_id: uuid.UUID,
+		procesados: int,
+		checkpoint: Optional[dict] = None,
+	) -> bool:
+		"""
+		Sumar elementos procesados y, si se indica, guardar el checkpoint de reanudación.
+		Retorna True si se solicitó cancelación.
+		"""
+		valores = {"procesados": models.Job.procesados + procesados}
+		if checkpoint is not None:
+			valores["checkpoint"] = checkpoint
+		result = await self.db.execute(
+			update(models.Job)
+			.where(models.Job.id == job_id)
+			.values(**valores)
+			.returning(models.Job.cancelacion_solicitada)
+		)
+		return bool(result.scalar_one())
+
+	async def pausar(self, job_id: uuid.UUID) -> None:
+		"""
+		Devolver la tarea a la cola para continuar desde su checkpoint.
+		Una pausa voluntaria no cuenta como intento.
+		"""
+		await self.db.execute(
+			update(models.Job)
+			.where(models.Job.id == job_id)
+			.values(
+				estado=EstadoJob.PENDIENTE,
+				intentos=func.greatest(models.Job.intentos - 1, 0),
+				disponible_en=func.now(),
+			)
+		)
+
+	async def finalizar(
+		self,
+		job_id: uuid.UUID,
+		estado: EstadoJob,
+		error: Optional[str] = None,
+		resultado: Optional[dict] = None,
+	) -> None:
+		"""Registrar el estado final de la tarea."""
+		await self.db.execute(
+			update(models.Job)
+			.where(models.Job.id == job_id)
+			.values(estado=estado, error=error, resultado=resultado, finalizado_en=func.now())
+		)
@@ -0,0 +1,317 @@
+"""
+Almacenamiento de archivos en disco local, con la misma interfaz asíncrona que S3Service.
+
+Para instalaciones sin nube y para pruebas (STORAGE_BACKEND=local). Los archivos se
+guardan por contenido: cada uno una sola vez en objetos/<sha[:2]>/<sha256>, y cada
+clave (la misma que se usaría en S3) es un hard link a ese archivo bajo claves/.
+Dos certificados o guías idénticos ocupan un solo archivo, leer una clave no requiere
+ningún índice y un archivo deja de existir cuando se borra su última clave. Altas y
+bajas de claves se serializan con flock sobre un archivo de la raíz, porque la API y
+el worker comparten el directorio.
+
+Las URLs "prefirmadas" apuntan a la ruta /archivos de la propia API y llevan una firma
+HMAC con vencimiento, igual que las de S3: quien tenga la URL puede descargar (o subir,
+si se firmó para PUT) hasta que vence, sin autenticarse.
+"""
+
+import asyncio
+import base64
+import fcntl
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator, Optional
+from urllib.parse import quote, urlencode
+
+from app.config import settings
+from app.services.s3_service import (
+    MAX_FILE_SIZE,
+    MULTIPART_PART_SIZE,
+    ArchivoSubido,
+    S3Service,
+    _error_tamano,
+)
+
+logger = logging.getLogger(__name__)
+
+# Prefijo de las rutas de descarga y subida firmadas (ver app.routes.archivos)
+RUTA_ARCHIVOS = "/api/archivos"
+
+
+def _b64(datos: bytes) -> str:
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode()
+
+
+class LocalStorageService:
+    """
+    Servicio de archivos en disco local.
+
+    Expone los mismos métodos asíncronos que S3Service; el I/O de disco se ejecuta
+    en hilos para no bloquear el event loop.
+    """
+
+    # Los constructores de claves son los mismos que en S3
+    build_s3_key = staticmethod(S3Service.build_s3_key)
+    build_certificate_key = staticmethod(S3Service.build_certificate_key)
+    build_guide_key = staticmethod(S3Service.build_guide_key)
+    build_report_key = staticmethod(S3Service.build_report_key)
+
+    def __init__(self, raiz: Optional[str] = None, secreto: Optional[str] = None, url_base: Optional[str] = None):
+        self.raiz = Path(raiz or settings.local_storage_path).resolve()
+        self._objetos = self.raiz / "objetos"
+        self._claves = self.raiz / "claves"
+        self._temporales = self.raiz / "tmp"
+        for directorio in (self._objetos, self._claves, self._temporales):
+            directorio.mkdir(parents=True, exist_ok=True)
+
+        secreto = secreto or settings.local_storage_secret
+        if not secreto:
+            # Solo en desarrollo (en otros entornos la configuración lo exige): las URLs
+            # firmadas dejan de valer al reiniciar y no sirven entre workers
+            logger.warning("LOCAL_STORAGE_SECRET not set - signed file URLs use a per-process key")
+            secreto = secrets.token_hex(32)
+        self._secreto = secreto.encode()
+        self.url_base = (url_base if url_base is not None else settings.local_storage_public_url).rstrip("/")
+        # Alta y baja de claves: evita que un borrado libere un objeto que otra
+        # operación, de este u otro proceso, está enlazando
+        self._archivo_bloqueo = self.raiz / ".bloqueo"
+
+    # Rutas y firmas
+
+    def ruta_clave(self, s3_key: str) -> Path:
+        """Ruta en disco de una clave; rechaza claves que salgan del directorio de claves."""
+        ruta = (self._claves / s3_key.lstrip("/")).resolve()
+        if not ruta.is_relative_to(self._claves) or ruta == self._claves:
+            raise ValueError(f"Clave de archivo inválida: {s3_key}")
+        return ruta
+
+    def _ruta_objeto(self, sha256: str) -> Path:
+        return self._objetos / sha256[:2] / sha256
+
+    def _firma(self, metodo: str, s3_key: str, expira: int, *extra: Any) -> str:
+        mensaje = "\n".join([metodo, s3_key, str(expira), *map(str, extra)])
+        return _b64(hmac.new(self._secreto, mensaje.encode(), hashlib.sha256).digest())
+
+    def verificar_firma(self, metodo: str, s3_key: str, expira: int, firma: str, *extra: Any) -> bool:
+        """True si la firma corresponde a la clave, método y parámetros, y no ha vencido."""
+        if expira < time.time():
+            return False
+        return hmac.compare_digest(firma, self._firma(metodo, s3_key, expira, *extra))
+
+    def _url_firmada(self, s3_key: str, parametros: Dict[str, Any]) -> str:
+        return f"{self.url_base}{RUTA_ARCHIVOS}/{quote(s3_key.lstrip('/'))}?{urlencode(parametros)}"
+
+    # Operaciones de disco (síncronas, se ejecutan en hilos)
+
+    def _nuevo_temporal(self) -> Path:
+        return self._temporales / uuid.uuid4().hex
+
+    @contextmanager
+    def _bloqueo(self) -> Iterator[None]:
+        """Bloqueo exclusivo entre hilos y procesos que usan la misma raíz."""
+        # Cada apertura es una descripción de archivo propia: flock excluye también
+        # a los demás hilos de este proceso
+        with open(self._archivo_bloqueo, "a") as archivo:
+            fcntl.flock(archivo, fcntl.LOCK_EX)
+            yield
+
+    def _publicar(self, temporal: Path, sha256: str, s3_key: str) -> None:
+        """Mover el temporal a su objeto (si no existía ya) y enlazar la clave a él."""
+        objeto = self._ruta_objeto(sha256)
+        clave = self.ruta_clave(s3_key)
+        with self._bloqueo():
+            objeto.parent.mkdir(exist_ok=True)
+            if objeto.exists():
+                temporal.unlink()
+            else:
+                os.replace(temporal, objeto)
+            clave.parent.mkdir(parents=True, exist_ok=True)
+            anterior = self._stat(clave)
+            if anterior is not None and anterior.st_ino == objeto.stat().st_ino:
+                return
+            # Enlace nuevo y reemplazo atómico: un lector ve el archivo anterior o el nuevo
+            enlace = self._nuevo_temporal()
+            os.link(objeto, enlace)
+            if anterior is not None:
+                self._liberar_objeto(clave, anterior)
+            os.replace(enlace, clave)
+
+    def _liberar_objeto(self, clave: Path, stat: os.stat_result) -> None:
+        # Si la clave es el último enlace del objeto (clave + objeto), borrar el objeto.
+        # Su nombre es su hash, que se recalcula: borrar es poco frecuente.
+        if stat.st_nlink == 2:
+            with open(clave, "rb") as archivo:
+                objeto = self._ruta_objeto(hashlib.file_digest(archivo, "sha256").hexdigest())
+            if objeto.exists() and objeto.stat().st_ino == stat.st_ino:
+                objeto.unlink()
+
+    def _eliminar(self, s3_key: str) -> None:
+        clave = self.ruta_clave(s3_key)
+        with self._bloqueo():
+            stat = self._stat(clave)
+            if stat is None:
+                return
+            self._liberar_objeto(clave, stat)
+            clave.unlink()
+
+    @staticmethod
+    def _stat(ruta: Path) -> Optional[os.stat_result]:
+        try:
+            return ruta.stat()
+        except FileNotFoundError:
+            return None
+
+    # Interfaz de S3Service
+
+    async def generate_presigned_url(
+        self,
+        s3_key: str,
+        expiration: int = 3600,
+        http_method: str = "GET"
+    ) -> str:
+        """
+        Generar URL firmada a /archivos para acceso temporal al archivo
+
+        Args:
+            s3_key: Clave del archivo
+            expiration: Tiempo de expiración en segundos (default: 1 hora)
+            http_method: Método HTTP (GET o PUT)
+
+        Returns:
+            URL firmada
+        """
+        expira = int(time.time()) + expiration
+        if http_method == "PUT":
+            return await self._url_subida(s3_key, "application/octet-stream", MAX_FILE_SIZE, expira)
+        return self._url_firmada(s3_key, {"expira": expira, "firma": self._firma("GET", s3_key, expira)})
+
+    async def _url_subida(self, s3_key: str, content_type: str, max_size: int, expira: int) -> str:
+        self.ruta_clave(s3_key)
+        firma = self._firma("PUT", s3_key, expira, content_type, max_size)
+        return self._url_firmada(
+            s3_key, {"expira": expira, "tipo": content_type, "max": max_size, "firma": firma}
+        )
+
+    async def generate_presigned_post(
+        self,
+        s3_key: str,
+        content_type: str,
+        max_size: int = MAX_FILE_SIZE,
+        expiration: int = 900
+    ) -> Dict[str, Any]:
+        """
+        Equivalente local del formulario POST prefirmado de S3.
+
+        La subida local se hace con PUT del archivo como cuerpo a la URL firmada, que
+        fija el tipo de contenido y el tamaño máximo; por eso se indica `metodo`.
+        """
+        url = await self._url_subida(s3_key, content_type, max_size, int(time.time()) + expiration)
+        return {"url": url, "fields": {"Content-Type": content_type}, "metodo": "PUT"}
+
+    async def upload_file(
+        self,
+        file_content: bytes,
+        s3_key: str,
+        content_type: str = "application/octet-stream",
+        metadata: Optional[dict] = None,
+        max_size: Optional[int] = None
+    ) -> str:
+        """
+        Guardar archivo en disco
+
+        Args:
+            file_content: Contenido del archivo en bytes
+            s3_key: Clave del archivo
+            content_type: Tipo MIME (se deduce de la extensión al descargar)
+            metadata: Ignorados en almacenamiento local
+            max_size: Tamaño máximo permitido en bytes (default: MAX_FILE_SIZE)
+
+        Returns:
+            Clave del archivo guardado
+
+        Raises:
+            ValidationError: Si el archivo excede el tamaño máximo
+        """
+        max_size = max_size or MAX_FILE_SIZE
+        if len(file_content) > max_size:
+            raise _error_tamano(len(file_content), max_size)
+
+        def guardar() -> None:
+            temporal = self._nuevo_temporal()
+            temporal.write_bytes(file_content)
+            self._publicar(temporal, hashlib.sha256(file_content).hexdigest(), s3_key)
+
+        await asyncio.to_thread(guardar)
+        logger.info(f"File stored locally: {s3_key}")
+        return s3_key
+
+    async def upload_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        s3_key: str,
+        content_type: str = "application/octet-stream",
+        part_size: int = MULTIPART_PART_SIZE,
+        max_size: Optional[int] = None,
+        metadata: Optional[dict] = None,
+    ) -> ArchivoSubido:
+        """
+        Guardar en disco un flujo de bytes, con el límite de tamaño aplicado mientras llega.
+
+        Los bloques se escriben a un temporal a medida que llegan (no se acumulan
+        `part_size` bytes en memoria) y el archivo se publica solo si el flujo termina
+        completo y dentro del límite.
+
+        Returns:
+            Clave, tamaño y SHA-256 del archivo guardado
+        """
+        self.ruta_clave(s3_key)
+        digest = hashlib.sha256()
+        total = 0
+        temporal = self._nuevo_temporal()
+        archivo: BinaryIO = await asyncio.to_thread(open, temporal, "wb")
+        try:
+            async for chunk in chunks:
+                total += len(chunk)
+                if max_size is not None and total > max_size:
+                    raise _error_tamano(total, max_size)
+                digest.update(chunk)
+                await asyncio.to_thread(archivo.write, chunk)
+            await asyncio.to_thread(archivo.close)
+            await asyncio.to_thread(self._publicar, temporal, digest.hexdigest(), s3_key)
+        except BaseException:
+            archivo.close()
+            temporal.unlink(missing_ok=True)
+            raise
+
+        logger.info(f"File stored locally: {s3_key} ({total} bytes)")
+        return ArchivoSubido(s3_key, total, digest.hexdigest())
+
+    async def delete_file(self, s3_key: str) -> bool:
+        """Eliminar la clave; el archivo se borra si era su última clave."""
+        await asyncio.to_thread(self._eliminar, s3_key)
+        logger.info(f"File deleted locally: {s3_key}")
+        return True
+
+    async def file_exists(self, s3_key: str) -> bool:
+        """Verificar si existe la clave"""
+        return await self.get_file_size(s3_key) is not None
+
+    async def get_file_size(self, s3_key: str) -> Optional[int]:
+        """Tamaño en bytes de la clave o None si no existe"""
+        try:
+            stat = await asyncio.to_thread(self._stat, self.ruta_clave(s3_key))
+        except ValueError:
+            return None
+        return stat.st_size if stat is not None else None
+
+    async def get_file_url(self, s3_key: str, expiration: int = 3600) -> Optional[str]:
+        """URL firmada de descarga o None si el archivo no existe"""
+        if not await self.file_exists(s3_key):
+            return None
+        return await self.generate_presigned_url(s3_key, expiration=expiration)
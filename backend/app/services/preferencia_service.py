@@ -1,16 +1,116 @@
+import asyncio
 import logging
+import time
 import uuid
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
 
-from sqlalchemy import select
+from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app.config import settings
 from app.database import models
 from app.utils.exceptions import NotFoundError
 
 logger = logging.getLogger(__name__)
 
+# Tipos de notificación configurables por el usuario (columnas de preferencia_notificacion).
+# Una preferencia nula es el valor por defecto: la notificación está activada.
+TIPOS_NOTIFICACION = ("email_recordatorios", "email_motivacion", "email_resultados")
+_BITS = {tipo: 1 << i for i, tipo in enumerate(TIPOS_NOTIFICACION)}
+
+# Carga inicial: solo los usuarios con algún tipo desactivado
+_SQL_DESACTIVADAS = """
+	SELECT usuario_id, email_recordatorios, email_motivacion, email_resultados
+	FROM preferencia_notificacion
+	WHERE email_recordatorios = FALSE OR email_motivacion = FALSE OR email_resultados = FALSE
+"""
+
+_SQL_DELTA = """
+	SELECT usuario_id, email_recordatorios, email_motivacion, email_resultados
+	FROM preferencia_notificacion
+	WHERE actualizado_en > :desde
+"""
+
+
+class MapaPreferencias:
+	"""
+	Tipos de notificación desactivados por usuario, en memoria del proceso.
+	
+	Cada usuario con algún tipo desactivado tiene una máscara de bits (un bit por
+	tipo de TIPOS_NOTIFICACION); los demás no ocupan lugar. Consultar a un
+	destinatario es buscarlo en un dict y probar un bit. La primera sincronización
+	carga las máscaras; las siguientes leen solo las filas cambiadas desde la
+	anterior (por actualizado_en, con un margen hacia atrás) y las actualizaciones
+	hechas en este proceso se aplican al confirmarse. Solo se usa desde el event loop.
+	"""
+
+	def __init__(self, intervalo_segundos: float, margen_segundos: float):
+		self.intervalo_segundos = intervalo_segundos
+		self.margen = timedelta(seconds=margen_segundos)
+		self._desactivados: Dict[uuid.UUID, int] = {}
+		# Hora de la base de datos de la última lectura; None antes de la carga inicial
+		self._leido_hasta: Optional[datetime] = None
+		self._sincronizado_en = 0.0
+		self._lock = asyncio.Lock()
+
+	def aplicar(
+		self,
+		usuario_id: uuid.UUID,
+		email_recordatorios: Optional[bool],
+		email_motivacion: Optional[bool],
+		email_resultados: Optional[bool],
+	) -> None:
+		"""Registrar las preferencias vigentes de un usuario."""
+		mascara = 0
+		if email_recordatorios is False:
+			mascara |= _BITS["email_recordatorios"]
+		if email_motivacion is False:
+			mascara |= _BITS["email_motivacion"]
+		if email_resultados is False:
+			mascara |= _BITS["email_resultados"]
+		if mascara:
+			self._desactivados[usuario_id] = mascara
+		else:
+			self._desactivados.pop(usuario_id, None)
+
+	def acepta(self, usuario_id: uuid.UUID, tipo: str) -> bool:
+		return not self._desactivados.get(usuario_id, 0) & _BITS[tipo]
+
+	def preferencias(self, usuario_id: uuid.UUID) -> Dict[str, bool]:
+		mascara = self._desactivados.get(usuario_id, 0)
+		return {tipo: not mascara & bit for tipo, bit in _BITS.items()}
+
+	async def sincronizar(self, db: AsyncSession, forzar: bool = False) -> None:
+		"""Leer los cambios de la base de datos si pasó el intervalo desde la última lectura."""
+		if not forzar and time.monotonic() - self._sincronizado_en < self.intervalo_segundos:
+			return
+		async with self._lock:
+			if not forzar and time.monotonic() - self._sincronizado_en < self.intervalo_segundos:
+				return
+			# La hora se toma antes de leer: lo que se confirme durante la lectura entra en el próximo delta
+			leido_hasta = (await db.execute(text("SELECT CURRENT_TIMESTAMP"))).scalar_one()
+			if self._leido_hasta is None:
+				result = await db.execute(text(_SQL_DESACTIVADAS))
+			else:
+				result = await db.execute(text(_SQL_DELTA), {"desde": self._leido_hasta - self.margen})
+			filas = result.all()
+			for fila in filas:
+				self.aplicar(fila.usuario_id, fila.email_recordatorios, fila.email_motivacion, fila.email_resultados)
+			logger.debug(
+				"Mapa de preferencias sincronizado: %s filas leídas, %s usuarios con tipos desactivados",
+				len(filas), len(self._desactivados),
+			)
+			self._leido_hasta = leido_hasta
+			self._sincronizado_en = time.monotonic()
+
+
+mapa_preferencias = MapaPreferencias(
+	settings.preferencias_refresh_seconds,
+	settings.preferencias_refresh_margin_seconds,
+)
+
 
 class PreferenciaService:
 	"""Lógica de negocio para preferencias de notificación."""
@@ -72,6 +172,36 @@ class PreferenciaService:
 		self.db.add(preferencias)
 		await self.db.commit()
 		await self.db.refresh(preferencias)
+		mapa_preferencias.aplicar(
+			usuario_id,
+			preferencias.email_recordatorios,
+			preferencias.email_motivacion,
+			preferencias.email_resultados,
+		)
 		logger.info("Preferencias actualizadas para usuario %s", usuario_id)
 		return preferencias
 
+	async def get_preferencias_para(
+		self,
+		usuario_ids: Iterable[uuid.UUID],
+	) -> Dict[uuid.UUID, Dict[str, bool]]:
+		"""
+		Preferencias efectivas de varios usuarios (nula = activada), sin una consulta por usuario.
+		
+		Se resuelven con el mapa en memoria del proceso, que se pone al día con los
+		cambios de otros procesos como mucho cada `preferencias_refresh_seconds`.
+		"""
+		await mapa_preferencias.sincronizar(self.db)
+		return {usuario_id: mapa_preferencias.preferencias(usuario_id) for usuario_id in usuario_ids}
+
+	async def filtrar_suscritos(
+		self,
+		usuario_ids: Iterable[uuid.UUID],
+		tipo: str,
+	) -> List[uuid.UUID]:
+		"""Usuarios de `usuario_ids` que reciben notificaciones de `tipo` (ver TIPOS_NOTIFICACION)."""
+		if tipo not in _BITS:
+			raise ValueError(f"Tipo de notificación desconocido: {tipo}")
+		await mapa_preferencias.sincronizar(self.db)
+		return [usuario_id for usuario_id in usuario_ids if mapa_preferencias.acepta(usuario_id, tipo)]
+
@@ -1,6 +1,6 @@
 import logging
 import uuid
-from typing import Optional, List
+from typing import AsyncIterator, Mapping, Optional, List
 from decimal import Decimal
 from datetime import datetime, date
 
@@ -21,6 +21,78 @@ from app.schemas.progress import (
 
 logger = logging.getLogger(__name__)
 
+# Filas por lote leído del cursor del servidor
+TAMANO_CHUNK_RECORDATORIOS = 1000
+
+# Inscripciones activas sin actividad desde :limite (último intento finalizado o,
+# si no hay intentos, la fecha de inscripción) cuyo alumno acepta recordatorios
+# (sin preferencia registrada se considera que sí), con su progreso calculado como
+# en get_progreso_curso: 40 % lecciones completadas y 60 % quizzes aprobados del
+# módulo del curso. Un solo recorrido: los totales se calculan una vez por curso y
+# la última actividad sale de idx_intento_inscripcion_finalizado. Ordenadas por
+# curso para renderizar cada curso como un lote.
+_SQL_INSCRIPCIONES_INACTIVAS = """
+	WITH modulo_de_curso AS (
+		SELECT DISTINCT ON (mc.curso_id) mc.curso_id, mc.modulo_id
+		FROM modulo_curso mc
+		ORDER BY mc.curso_id, mc.slot, mc.id
+	),
+	totales AS (
+		SELECT mdc.curso_id, mdc.modulo_id,
+			COUNT(DISTINCT l.id) FILTER (WHERE l.publicado) AS total_lecciones,
+			COUNT(DISTINCT q.id) FILTER (WHERE q.publicado) AS total_quizzes
+		FROM modulo_de_curso mdc
+		LEFT JOIN leccion l ON l.modulo_id = mdc.modulo_id
+		LEFT JOIN quiz q ON q.leccion_id = l.id
+		GROUP BY mdc.curso_id, mdc.modulo_id
+	),
+	inactivas AS (
+		SELECT ic.id, ic.curso_id, u.email, u.nombre, actividad.ultima
+		FROM inscripcion_curso ic
+		JOIN usuario u ON u.id = ic.usuario_id
+		LEFT JOIN preferencia_notificacion p ON p.usuario_id = ic.usuario_id
+		CROSS JOIN LATERAL (
+			SELECT MAX(i.finalizado_en) AS ultima
+			FROM intento i
+			WHERE i.inscripcion_curso_id = ic.id
+		) actividad
+		WHERE ic.estado = 'ACTIVA'
+			AND NOT ic.acreditado
+			AND u.email IS NOT NULL
+			AND COALESCE(p.email_recordatorios, TRUE)
+			AND COALESCE(actividad.ultima, ic.fecha_inscripcion::timestamptz) < :limite
+			{filtro}
+	)
+	SELECT
+		ina.id AS inscripcion_id,
+		ina.email,
+		ina.nombre,
+		ina.curso_id,
+		c.titulo AS curso_titulo,
+		ina.ultima AS ultima_actividad,
+		CASE
+			WHEN COALESCE(t.total_quizzes, 0) > 0 THEN
+				0.4 * (CASE WHEN t.total_lecciones > 0 THEN 100.0 * avance.lecciones_completadas / t.total_lecciones ELSE 0 END)
+				+ 0.6 * (100.0 * avance.quizzes_aprobados / t.total_quizzes)
+			WHEN COALESCE(t.total_lecciones, 0) > 0 THEN 100.0 * avance.lecciones_completadas / t.total_lecciones
+			ELSE 0
+		END AS progreso_porcentaje
+	FROM inactivas ina
+	JOIN curso c ON c.id = ina.curso_id
+	LEFT JOIN totales t ON t.curso_id = ina.curso_id
+	CROSS JOIN LATERAL (
+		SELECT
+			COUNT(DISTINCT i.quiz_id) FILTER (WHERE i.resultado = 'APROBADO') AS quizzes_aprobados,
+			COUNT(DISTINCT l.id) FILTER (WHERE i.resultado = 'APROBADO' AND i.finalizado_en IS NOT NULL) AS lecciones_completadas
+		FROM intento i
+		JOIN quiz q ON q.id = i.quiz_id
+		JOIN leccion l ON l.id = q.leccion_id
+		WHERE i.inscripcion_curso_id = ina.id
+			AND l.modulo_id = t.modulo_id
+	) avance
+	ORDER BY ina.curso_id
+"""
+
 
 class ProgresoService:
 	"""Lógica de negocio para cálculo de progreso."""
@@ -503,3 +575,26 @@ class ProgresoService:
 			top_estudiantes=top_estudiantes,
 			percentil=percentil,
 		)
+
+	async def iterar_inscripciones_inactivas(
+		self,
+		inactivas_desde: datetime,
+		curso_id: Optional[uuid.UUID] = None,
+		tamano_chunk: int = TAMANO_CHUNK_RECORDATORIOS,
+	) -> AsyncIterator[List[Mapping]]:
+		"""
+		Recorrer, en lotes de `tamano_chunk` filas leídas de un cursor del servidor, las
+		inscripciones activas sin actividad desde `inactivas_desde` cuyos alumnos aceptan
+		recordatorios, con email, nombre, curso y porcentaje de progreso.
+		"""
+		filtro = "AND ic.curso_id = :curso_id" if curso_id else ""
+		params = {"limite": inactivas_desde}
+		if curso_id:
+			params["curso_id"] = curso_id
+		result = await self.db.stream(
+			text(_SQL_INSCRIPCIONES_INACTIVAS.format(filtro=filtro)),
+			params,
+			execution_options={"yield_per": tamano_chunk},
+		)
+		async for lote in result.mappings().partitions(tamano_chunk):
+			yield lote
@@ -4,19 +4,24 @@ from typing import Optional, List
 from decimal import Decimal
 from datetime import datetime, timezone
 
-from sqlalchemy import select, func, and_, or_, text
+from sqlalchemy import select, func, and_, or_, text, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.database import models
 from app.database.enums import ResultadoIntento, TipoPregunta
 from app.utils.exceptions import NotFoundError, AuthorizationError, BusinessRuleError, ValidationError
+from app.utils.pagination import Keyset
 from app.services.intento_service import IntentoService
+from app.services.autosave_service import get_autosave_service
 from app.services.inscripcion_service import InscripcionService
 from app.schemas.intento import IntentoResult, RespuestaResponse
 
 logger = logging.getLogger(__name__)
 
+# Intentos de una evaluación, el más reciente primero
+KEYSET_INTENTOS = Keyset(models.Intento.numero_intento, models.Intento.id, descendente=True)
+
 
 class QuizService:
 	"""Lógica de negocio para quizzes."""
@@ -98,6 +103,31 @@ class QuizService:
 		result = await self.db.execute(stmt)
 		return result.scalar_one_or_none()
 
+	async def get_min_score_aprobatorio(self, quiz_id: uuid.UUID) -> Decimal:
+		"""Puntaje mínimo aprobatorio del quiz según su regla de acreditación (80 por defecto)."""
+		quiz = await self.get_quiz(quiz_id)
+		leccion = await self.db.execute(
+			select(models.Leccion).where(models.Leccion.id == quiz.leccion_id)
+		)
+		leccion_obj = leccion.scalar_one()
+		
+		modulo_curso = await self.db.execute(
+			select(models.ModuloCurso)
+			.where(models.ModuloCurso.modulo_id == leccion_obj.modulo_id)
+			.limit(1)
+		)
+		modulo_curso_obj = modulo_curso.scalar_one_or_none()
+		
+		if not modulo_curso_obj:
+			raise ValidationError("No se encontró curso asociado")
+		
+		regla = await self.get_regla_acreditacion(
+			modulo_curso_obj.curso_id,
+			quiz_id=quiz_id,
+		)
+		
+		return regla.min_score_aprobatorio if regla else Decimal("80.00")
+
 	async def validate_max_intentos(
 		self,
 		usuario_id: uuid.UUID,
@@ -227,6 +257,9 @@ class QuizService:
 		if intento.finalizado_en:
 			raise BusinessRuleError("Este intento ya fue finalizado")
 		
+		if intento.expira_en and intento.expira_en <= datetime.now(timezone.utc):
+			raise BusinessRuleError("El tiempo límite de este intento ya expiró")
+		
 		intento_preguntas = await self.db.execute(
 			select(models.IntentoPregunta)
 			.where(models.IntentoPregunta.intento_id == intento_id)
@@ -236,11 +269,32 @@ class QuizService:
 		preguntas_map = {ip.pregunta_id: ip for ip in intento_preguntas_list}
 		
 		for respuesta_data in respuestas:
-			pregunta_id = respuesta_data.get("pregunta_id")
-			if pregunta_id not in preguntas_map:
-				raise ValidationError(f"Pregunta {pregunta_id} no pertenece a este intento")
-			
-			intento_pregunta = preguntas_map[pregunta_id]
+			if respuesta_data.get("pregunta_id") not in preguntas_map:
+				raise ValidationError(f"Pregunta {respuesta_data.get('pregunta_id')} no pertenece a este intento")
+		
+		# Los borradores autoguardados entran en la misma transacción; lo enviado
+		# ahora reemplaza cualquier borrador de la misma pregunta.
+		await get_autosave_service().volcar_intento(self.db, intento_id)
+		
+		# Respuestas y finalizado_en se confirman juntas con el intento bloqueado: un
+		# volcado de borradores de otro worker espera y ya no lo encuentra abierto.
+		bloqueado = await self.db.execute(
+			select(models.Intento)
+			.where(models.Intento.id == intento_id)
+			.with_for_update()
+			.execution_options(populate_existing=True)
+		)
+		if bloqueado.scalar_one().finalizado_en:
+			raise BusinessRuleError("Este intento ya fue finalizado")
+		
+		preguntas_enviadas = {preguntas_map[r.get("pregunta_id")].id for r in respuestas}
+		if preguntas_enviadas:
+			await self.db.execute(
+				delete(models.Respuesta).where(models.Respuesta.intento_pregunta_id.in_(preguntas_enviadas))
+			)
+		
+		for respuesta_data in respuestas:
+			intento_pregunta = preguntas_map[respuesta_data.get("pregunta_id")]
 			
 			respuesta = models.Respuesta(
 				intento_pregunta_id=intento_pregunta.id,
@@ -250,32 +304,11 @@ class QuizService:
 			)
 			self.db.add(respuesta)
 		
-		await self.db.commit()
+		await self.db.flush()
 		
 		puntaje_total, puntaje_maximo, preguntas_correctas, total_preguntas = await self.calcular_puntaje(intento_id)
 		
-		quiz = await self.get_quiz(intento.quiz_id)
-		leccion = await self.db.execute(
-			select(models.Leccion).where(models.Leccion.id == quiz.leccion_id)
-		)
-		leccion_obj = leccion.scalar_one()
-		
-		modulo_curso = await self.db.execute(
-			select(models.ModuloCurso)
-			.where(models.ModuloCurso.modulo_id == leccion_obj.modulo_id)
-			.limit(1)
-		)
-		modulo_curso_obj = modulo_curso.scalar_one_or_none()
-		
-		if not modulo_curso_obj:
-			raise ValidationError("No se encontró curso asociado")
-		
-		regla = await self.get_regla_acreditacion(
-			modulo_curso_obj.curso_id,
-			quiz_id=intento.quiz_id,
-		)
-		
-		min_score = regla.min_score_aprobatorio if regla else Decimal("80.00")
+		min_score = await self.get_min_score_aprobatorio(intento.quiz_id)
 		
 		porcentaje = (puntaje_total / puntaje_maximo * 100) if puntaje_maximo > 0 else Decimal("0")
 		aprobado = porcentaje >= min_score
@@ -302,14 +335,15 @@ class QuizService:
 		usuario_id: Optional[uuid.UUID] = None,
 		skip: int = 0,
 		limit: int = 100,
+		cursor: Optional[str] = None,
 	) -> List[models.Intento]:
-		"""Listar intentos de un quiz."""
+		"""Listar intentos de un quiz, por cursor o, sin él, por skip."""
 		stmt = select(models.Intento).where(models.Intento.quiz_id == quiz_id)
 		
 		if usuario_id:
 			stmt = stmt.where(models.Intento.usuario_id == usuario_id)
 		
-		stmt = stmt.order_by(models.Intento.numero_intento.desc()).offset(skip).limit(limit)
+		stmt = KEYSET_INTENTOS.aplicar(stmt, cursor=cursor, skip=skip, limit=limit)
 		result = await self.db.execute(stmt)
 		return result.scalars().all()
 
@@ -382,28 +416,7 @@ class QuizService:
 		"""
 		puntaje_total, puntaje_maximo, preguntas_correctas, total_preguntas = await self.calcular_puntaje(intento.id)
 		
-		quiz = await self.get_quiz(intento.quiz_id)
-		leccion = await self.db.execute(
-			select(models.Leccion).where(models.Leccion.id == quiz.leccion_id)
-		)
-		leccion_obj = leccion.scalar_one()
-		
-		modulo_curso = await self.db.execute(
-			select(models.ModuloCurso)
-			.where(models.ModuloCurso.modulo_id == leccion_obj.modulo_id)
-			.limit(1)
-		)
-		modulo_curso_obj = modulo_curso.scalar_one_or_none()
-		
-		if not modulo_curso_obj:
-			raise ValidationError("No se encontró curso asociado")
-		
-		regla = await self.get_regla_acreditacion(
-			modulo_curso_obj.curso_id,
-			quiz_id=intento.quiz_id,
-		)
-		
-		min_score = regla.min_score_aprobatorio if regla else Decimal("80.00")
+		min_score = await self.get_min_score_aprobatorio(intento.quiz_id)
 		porcentaje = (puntaje_total / puntaje_maximo * 100) if puntaje_maximo > 0 else Decimal("0")
 		
 		respuestas_stmt = await self.db.execute(
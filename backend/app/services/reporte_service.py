@@ -0,0 +1,88 @@
+import logging
+import uuid
+from typing import AsyncIterator, List, Mapping, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.utils.export_stream import codificar_filas, comprimir_gzip
+
+logger = logging.getLogger(__name__)
+
+# Filas por lote leído del cursor del servidor
+TAMANO_CHUNK_REPORTE = 5000
+
+COLUMNAS_REPORTE_INSCRIPCIONES = (
+    "inscripcion_id",
+    "usuario_id",
+    "nombre",
+    "apellido",
+    "email",
+    "curso_id",
+    "curso",
+    "estado",
+    "acreditado",
+    "acreditado_en",
+    "fecha_inscripcion",
+    "fecha_conclusion",
+)
+
+_SQL_REPORTE_INSCRIPCIONES = """
+    SELECT
+        ic.id AS inscripcion_id,
+        ic.usuario_id,
+        u.nombre,
+        u.apellido,
+        u.email,
+        ic.curso_id,
+        c.titulo AS curso,
+        ic.estado,
+        ic.acreditado,
+        ic.acreditado_en,
+        ic.fecha_inscripcion,
+        ic.fecha_conclusion
+    FROM inscripcion_curso ic
+    JOIN usuario u ON u.id = ic.usuario_id
+    JOIN curso c ON c.id = ic.curso_id
+    {filtro}
+"""
+
+
+class ReporteService:
+    """Reportes masivos leídos con cursor del servidor y codificados por lotes."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def iterar_inscripciones(
+        self,
+        curso_id: Optional[uuid.UUID] = None,
+        tamano_chunk: int = TAMANO_CHUNK_REPORTE,
+    ) -> AsyncIterator[List[Mapping]]:
+        """Recorrer inscripciones con su usuario y curso en lotes de `tamano_chunk` filas."""
+        filtro = "WHERE ic.curso_id = :curso_id" if curso_id else ""
+        result = await self.db.stream(
+            text(_SQL_REPORTE_INSCRIPCIONES.format(filtro=filtro)),
+            {"curso_id": curso_id} if curso_id else {},
+            execution_options={"yield_per": tamano_chunk},
+        )
+        async for lote in result.mappings().partitions(tamano_chunk):
+            yield lote
+
+    async def exportar_inscripciones(
+        self,
+        curso_id: Optional[uuid.UUID] = None,
+        formato: str = "csv",
+        comprimir: bool = False,
+        tamano_chunk: int = TAMANO_CHUNK_REPORTE,
+    ) -> AsyncIterator[bytes]:
+        """Reporte de inscripciones como flujo de bytes CSV o JSONL, opcionalmente gzip."""
+        bloques = codificar_filas(
+            self.iterar_inscripciones(curso_id, tamano_chunk),
+            COLUMNAS_REPORTE_INSCRIPCIONES,
+            formato,
+        )
+        if comprimir:
+            bloques = comprimir_gzip(bloques)
+        async for bloque in bloques:
+            yield bloque
@@ -1,39 +1,171 @@
+import asyncio
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError, BotoCoreError
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
 import logging
 
 from app.config import settings
 from app.utils.exceptions import EBSException, ValidationError
-from app.utils.error_codes import ValidationErrorCodes
+from app.utils.error_codes import ValidationErrorCodes, StorageErrorCodes
 
 logger = logging.getLogger(__name__)
 
 # Tamaño máximo de archivo: 10 MB (para certificados PDF y guías de estudio)
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB en bytes
 
+# Tamaño de parte para subidas multipart (S3 exige al menos 5 MB salvo en la última)
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+
+
+def _error_tamano(file_size: int, max_size: int) -> ValidationError:
+    size_mb = file_size / (1024 * 1024)
+    max_mb = max_size / (1024 * 1024)
+    return ValidationError(
+        f"El archivo excede el tamaño máximo permitido ({max_mb:.1f} MB). Tamaño del archivo: {size_mb:.1f} MB",
+        error_code=ValidationErrorCodes.FILE_TOO_LARGE
+    )
+
+
+@dataclass(frozen=True)
+class ArchivoSubido:
+    """Resultado de una subida en streaming."""
+    s3_key: str
+    tamano: int
+    # SHA-256 en hexadecimal, calculado mientras se leía el flujo
+    sha256: str
+
+
+# Cliente boto3 y executor compartidos por el proceso. El cliente es thread-safe y
+# mantiene un pool de conexiones HTTP; el executor tiene tantos hilos como conexiones,
+# así ninguna llamada al SDK bloquea el event loop ni espera una conexión libre.
+_cliente_lock = threading.Lock()
+_cliente = None
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _crear_cliente():
+    session_params = {
+        "region_name": settings.aws_region,
+    }
+    
+    if settings.aws_access_key_id and settings.aws_secret_access_key:
+        session_params["aws_access_key_id"] = settings.aws_access_key_id
+        session_params["aws_secret_access_key"] = settings.aws_secret_access_key
+    
+    session = boto3.Session(**session_params)
+    return session.client(
+        "s3",
+        # Endpoint compatible con S3 (MinIO, moto) para desarrollo y pruebas
+        endpoint_url=settings.s3_endpoint_url or None,
+        config=Config(
+            max_pool_connections=settings.s3_max_connections,
+            retries={"max_attempts": 3, "mode": "standard"},
+            signature_version="s3v4",
+        ),
+    )
+
+
+def get_cliente_s3():
+    """Cliente S3 compartido (se crea al primer uso)."""
+    global _cliente
+    if _cliente is None:
+        with _cliente_lock:
+            if _cliente is None:
+                _cliente = _crear_cliente()
+    return _cliente
+
+
+def get_executor_s3() -> ThreadPoolExecutor:
+    """Executor acotado donde corren las llamadas bloqueantes al SDK."""
+    global _executor
+    if _executor is None:
+        with _cliente_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.s3_max_connections,
+                    thread_name_prefix="s3",
+                )
+    return _executor
+
+
+def cerrar_cliente_s3() -> None:
+    """Esperar las llamadas en curso y liberar el executor y las conexiones del cliente."""
+    global _cliente, _executor, _servicio
+    with _cliente_lock:
+        _servicio = None
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+        if _cliente is not None:
+            _cliente.close()
+            _cliente = None
+
+
+class CacheUrlsPrefirmadas:
+    """
+    URLs prefirmadas ya generadas, por (s3_key, método), con su vencimiento.
+    
+    Una URL se reutiliza mientras le quede al menos la mitad de la validez que
+    pide quien la solicita; así nadie recibe una URL a punto de vencer. Es un LRU
+    acotado a `capacidad` entradas. Solo se usa desde el event loop.
+    """
+
+    def __init__(self, capacidad: int):
+        self.capacidad = capacidad
+        self._urls: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+
+    def obtener(self, s3_key: str, metodo: str, expiration: int) -> Optional[str]:
+        entrada = self._urls.get((s3_key, metodo))
+        if entrada is None:
+            return None
+        url, vence_en = entrada
+        if vence_en - time.time() < expiration / 2:
+            del self._urls[(s3_key, metodo)]
+            return None
+        self._urls.move_to_end((s3_key, metodo))
+        return url
+
+    def guardar(self, s3_key: str, metodo: str, url: str, vence_en: float) -> None:
+        self._urls[(s3_key, metodo)] = (url, vence_en)
+        self._urls.move_to_end((s3_key, metodo))
+        while len(self._urls) > self.capacidad:
+            self._urls.popitem(last=False)
+
+    def invalidar(self, s3_key: str) -> None:
+        for metodo in ("GET", "PUT"):
+            self._urls.pop((s3_key, metodo), None)
+
 
 class S3Service:
-    """Servicio para operaciones con Amazon S3"""
+    """
+    Servicio para operaciones con Amazon S3.
+    
+    La interfaz es asíncrona: cada llamada a boto3 se ejecuta en el executor
+    compartido del módulo con el cliente compartido.
+    """
 
-    def __init__(self):
-        """Inicializar cliente S3"""
+    def __init__(self, s3_client=None, executor: Optional[ThreadPoolExecutor] = None):
+        """Inicializar servicio sobre el cliente y executor compartidos (o los indicados)"""
         self.bucket_name = settings.s3_bucket_name
         self.region = settings.aws_region
-        
-        session_params = {
-            "region_name": self.region,
-        }
-        
-        if settings.aws_access_key_id and settings.aws_secret_access_key:
-            session_params["aws_access_key_id"] = settings.aws_access_key_id
-            session_params["aws_secret_access_key"] = settings.aws_secret_access_key
-        
-        session = boto3.Session(**session_params)
-        self.s3_client = session.client("s3")
-        self.s3_resource = session.resource("s3")
+        self.s3_client = s3_client or get_cliente_s3()
+        self._executor = executor or get_executor_s3()
+        self.urls_prefirmadas = CacheUrlsPrefirmadas(settings.s3_presigned_url_cache_size)
+
+    async def _ejecutar(self, funcion: Callable[..., Any], **kwargs) -> Any:
+        """Ejecutar una llamada bloqueante del SDK en el executor de S3."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(funcion, **kwargs))
 
-    def generate_presigned_url(
+    async def generate_presigned_url(
         self,
         s3_key: str,
         expiration: int = 3600,
@@ -42,6 +174,9 @@ class S3Service:
         """
         Generar URL prefirmada para acceso temporal a objeto S3
         
+        Si ya se generó una para la misma clave y método que aún no está cerca de
+        vencer, se devuelve esa sin llamar al SDK.
+        
         Args:
             s3_key: Clave del objeto en S3
             expiration: Tiempo de expiración en segundos (default: 1 hora)
@@ -53,6 +188,10 @@ class S3Service:
         Raises:
             EBSException: Si ocurre error al generar URL
         """
+        url = self.urls_prefirmadas.obtener(s3_key, http_method, expiration)
+        if url is not None:
+            return url
+        
         try:
             params = {
                 "Bucket": self.bucket_name,
@@ -62,13 +201,16 @@ class S3Service:
             if http_method == "PUT":
                 params["ContentType"] = "application/octet-stream"
             
-            url = self.s3_client.generate_presigned_url(
+            firmada_en = time.time()
+            url = await self._ejecutar(
+                self.s3_client.generate_presigned_url,
                 ClientMethod=f"{http_method.lower()}_object",
                 Params=params,
                 ExpiresIn=expiration
             )
+            self.urls_prefirmadas.guardar(s3_key, http_method, url, firmada_en + expiration)
             
-            logger.info(f"Generated presigned URL for {s3_key}, expires in {expiration}s")
+            logger.debug(f"Generated presigned URL for {s3_key}, expires in {expiration}s")
             return url
             
         except ClientError as e:
@@ -87,7 +229,7 @@ class S3Service:
                 error_code="S3_CONNECTION_ERROR"
             )
 
-    def upload_file(
+    async def upload_file(
         self,
         file_content: bytes,
         s3_key: str,
@@ -116,29 +258,33 @@ class S3Service:
         
         file_size = len(file_content)
         if file_size > max_size:
-            size_mb = file_size / (1024 * 1024)
-            max_mb = max_size / (1024 * 1024)
-            raise ValidationError(
-                f"El archivo excede el tamaño máximo permitido ({max_mb:.1f} MB). Tamaño del archivo: {size_mb:.1f} MB",
-                error_code=ValidationErrorCodes.FILE_TOO_LARGE
-            )
+            raise _error_tamano(file_size, max_size)
         
+        await self._put_object(file_content, s3_key, content_type, metadata)
+        logger.info(f"File uploaded to S3: {s3_key}")
+        return s3_key
+
+    async def _put_object(
+        self,
+        file_content: bytes,
+        s3_key: str,
+        content_type: str,
+        metadata: Optional[dict] = None
+    ) -> None:
         try:
             extra_args = {"ContentType": content_type}
             
             if metadata:
                 extra_args["Metadata"] = {str(k): str(v) for k, v in metadata.items()}
             
-            self.s3_client.put_object(
+            await self._ejecutar(
+                self.s3_client.put_object,
                 Bucket=self.bucket_name,
                 Key=s3_key,
                 Body=file_content,
                 **extra_args
             )
             
-            logger.info(f"File uploaded to S3: {s3_key}")
-            return s3_key
-            
         except ClientError as e:
             error_code = e.response.get("Error", {}).get("Code", "Unknown")
             logger.error(f"Error uploading file to S3 {s3_key}: {error_code}")
@@ -155,7 +301,182 @@ class S3Service:
                 error_code="S3_CONNECTION_ERROR"
             )
 
-    def delete_file(self, s3_key: str) -> bool:
+    async def upload_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        s3_key: str,
+        content_type: str = "application/octet-stream",
+        part_size: int = MULTIPART_PART_SIZE,
+        max_size: Optional[int] = None,
+        metadata: Optional[dict] = None,
+    ) -> ArchivoSubido:
+        """
+        Subir a S3 un flujo de bytes de tamaño desconocido.
+        
+        Solo se mantiene en memoria una parte a la vez. El tamaño se controla a medida
+        que llegan los bloques, así que un archivo demasiado grande se rechaza en cuanto
+        supera `max_size`, sin leer el resto. El SHA-256 del contenido se calcula en el
+        mismo recorrido. Si el flujo cabe en una parte se sube con un solo put_object;
+        si no, con multipart upload, que se aborta ante cualquier error para no dejar
+        partes huérfanas. Las llamadas al SDK (bloqueantes) se ejecutan en el executor de S3.
+        
+        Args:
+            chunks: Flujo asíncrono de bytes (p. ej. el cuerpo de un request)
+            s3_key: Clave del objeto en S3
+            content_type: Tipo MIME del contenido
+            part_size: Bytes acumulados antes de subir cada parte
+            max_size: Tamaño máximo permitido en bytes (default: sin límite)
+            metadata: Metadatos adicionales opcionales
+            
+        Returns:
+            Clave, tamaño y SHA-256 del archivo subido
+            
+        Raises:
+            ValidationError: Si el flujo excede el tamaño máximo
+            EBSException: Si ocurre error al subir archivo
+        """
+        iterador = chunks.__aiter__()
+        digest = hashlib.sha256()
+        buffer = bytearray()
+        total = 0
+        terminado = False
+        
+        async def llenar() -> None:
+            # Leer bloques hasta completar una parte o agotar el flujo
+            nonlocal total, terminado
+            while len(buffer) < part_size:
+                try:
+                    chunk = await iterador.__anext__()
+                except StopAsyncIteration:
+                    terminado = True
+                    return
+                total += len(chunk)
+                if max_size is not None and total > max_size:
+                    raise _error_tamano(total, max_size)
+                digest.update(chunk)
+                buffer.extend(chunk)
+        
+        await llenar()
+        if terminado:
+            await self._put_object(bytes(buffer), s3_key, content_type, metadata)
+            logger.info(f"File uploaded to S3: {s3_key} ({total} bytes)")
+            return ArchivoSubido(s3_key, total, digest.hexdigest())
+        
+        extra_args = {"ContentType": content_type}
+        if metadata:
+            extra_args["Metadata"] = {str(k): str(v) for k, v in metadata.items()}
+        try:
+            upload = await self._ejecutar(
+                self.s3_client.create_multipart_upload,
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                **extra_args
+            )
+        except (ClientError, BotoCoreError) as e:
+            logger.error(f"Error starting multipart upload {s3_key}: {str(e)}")
+            raise EBSException(
+                status_code=500,
+                detail="Error uploading file to S3",
+                error_code=StorageErrorCodes.S3_UPLOAD_ERROR
+            )
+        
+        upload_id = upload["UploadId"]
+        partes = []
+        
+        async def subir_parte(contenido: bytes) -> None:
+            numero = len(partes) + 1
+            respuesta = await self._ejecutar(
+                self.s3_client.upload_part,
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                UploadId=upload_id,
+                PartNumber=numero,
+                Body=contenido,
+            )
+            partes.append({"PartNumber": numero, "ETag": respuesta["ETag"]})
+        
+        try:
+            while buffer:
+                await subir_parte(bytes(buffer))
+                buffer.clear()
+                if not terminado:
+                    await llenar()
+            await self._ejecutar(
+                self.s3_client.complete_multipart_upload,
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": partes},
+            )
+        except BaseException as e:
+            try:
+                await self._ejecutar(
+                    self.s3_client.abort_multipart_upload,
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    UploadId=upload_id,
+                )
+            except (ClientError, BotoCoreError):
+                logger.warning(f"Could not abort multipart upload {upload_id} for {s3_key}")
+            if isinstance(e, (ClientError, BotoCoreError)):
+                logger.error(f"Error in multipart upload {s3_key}: {str(e)}")
+                raise EBSException(
+                    status_code=500,
+                    detail="Error uploading file to S3",
+                    error_code=StorageErrorCodes.S3_UPLOAD_ERROR
+                )
+            raise
+        
+        logger.info(f"File uploaded to S3 in {len(partes)} parts: {s3_key} ({total} bytes)")
+        return ArchivoSubido(s3_key, total, digest.hexdigest())
+
+    async def generate_presigned_post(
+        self,
+        s3_key: str,
+        content_type: str,
+        max_size: int = MAX_FILE_SIZE,
+        expiration: int = 900
+    ) -> Dict[str, Any]:
+        """
+        Generar un formulario POST prefirmado para que el navegador suba directo a S3.
+        
+        A diferencia de una URL PUT prefirmada, la política del POST limita el tamaño
+        (content-length-range) y el tipo de contenido: S3 rechaza el archivo sin que
+        sus bytes pasen por la API.
+        
+        Args:
+            s3_key: Clave del objeto en S3
+            content_type: Tipo MIME que debe enviar el navegador
+            max_size: Tamaño máximo aceptado por S3 en bytes
+            expiration: Tiempo de expiración en segundos (default: 15 minutos)
+            
+        Returns:
+            Diccionario con `url` y `fields` del formulario
+            
+        Raises:
+            EBSException: Si ocurre error al generar el formulario
+        """
+        try:
+            return await self._ejecutar(
+                self.s3_client.generate_presigned_post,
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                Fields={"Content-Type": content_type},
+                Conditions=[
+                    {"Content-Type": content_type},
+                    ["content-length-range", 1, max_size],
+                ],
+                ExpiresIn=expiration
+            )
+        except (ClientError, BotoCoreError) as e:
+            logger.error(f"Error generating presigned POST for {s3_key}: {str(e)}")
+            raise EBSException(
+                status_code=500,
+                detail="Error generating presigned URL",
+                error_code="S3_PRESIGNED_URL_ERROR"
+            )
+
+    async def delete_file(self, s3_key: str) -> bool:
         """
         Eliminar archivo de S3
         
@@ -169,10 +490,12 @@ class S3Service:
             EBSException: Si ocurre error al eliminar archivo
         """
         try:
-            self.s3_client.delete_object(
+            await self._ejecutar(
+                self.s3_client.delete_object,
                 Bucket=self.bucket_name,
                 Key=s3_key
             )
+            self.urls_prefirmadas.invalidar(s3_key)
             
             logger.info(f"File deleted from S3: {s3_key}")
             return True
@@ -193,7 +516,7 @@ class S3Service:
                 error_code="S3_CONNECTION_ERROR"
             )
 
-    def file_exists(self, s3_key: str) -> bool:
+    async def file_exists(self, s3_key: str) -> bool:
         """
         Verificar si un archivo existe en S3
         
@@ -204,7 +527,8 @@ class S3Service:
             True si el archivo existe, False en caso contrario
         """
         try:
-            self.s3_client.head_object(
+            await self._ejecutar(
+                self.s3_client.head_object,
                 Bucket=self.bucket_name,
                 Key=s3_key
             )
@@ -218,7 +542,30 @@ class S3Service:
         except Exception:
             return False
 
-    def get_file_url(self, s3_key: str, expiration: int = 3600) -> Optional[str]:
+    async def get_file_size(self, s3_key: str) -> Optional[int]:
+        """
+        Obtener el tamaño en bytes de un objeto de S3
+
+        Args:
+            s3_key: Clave del objeto en S3
+
+        Returns:
+            Tamaño en bytes o None si el archivo no existe
+        """
+        try:
+            respuesta = await self._ejecutar(
+                self.s3_client.head_object,
+                Bucket=self.bucket_name,
+                Key=s3_key
+            )
+            return respuesta["ContentLength"]
+        except ClientError as e:
+            error_code = e.response.get("Error", {}).get("Code", "Unknown")
+            if error_code != "404":
+                logger.warning(f"Error checking file size {s3_key}: {error_code}")
+            return None
+
+    async def get_file_url(self, s3_key: str, expiration: int = 3600) -> Optional[str]:
         """
         Obtener URL prefirmada para descarga de archivo
         
@@ -229,10 +576,15 @@ class S3Service:
         Returns:
             URL prefirmada o None si el archivo no existe
         """
-        if not self.file_exists(s3_key):
+        # Con una URL vigente en caché el archivo ya se verificó: no hace falta consultar S3
+        url = self.urls_prefirmadas.obtener(s3_key, "GET", expiration)
+        if url is not None:
+            return url
+        
+        if not await self.file_exists(s3_key):
             return None
         
-        return self.generate_presigned_url(s3_key, expiration=expiration, http_method="GET")
+        return await self.generate_presigned_url(s3_key, expiration=expiration, http_method="GET")
 
     @staticmethod
     def build_s3_key(folder: str, filename: str) -> str:
@@ -260,8 +612,28 @@ class S3Service:
         """Construir clave S3 para guía de estudio"""
         return S3Service.build_s3_key("guias-estudio", f"{guia_id}/{filename}")
 
+    @staticmethod
+    def build_report_key(nombre: str, filename: str) -> str:
+        """Construir clave S3 para reporte exportado"""
+        return S3Service.build_s3_key(f"reportes/{nombre}", filename)
+
+
+_servicio: Optional[S3Service] = None
+
 
 def get_s3_service() -> S3Service:
-    """Obtener instancia del servicio S3"""
-    return S3Service()
+    """
+    Obtener el servicio de archivos del proceso.
+    
+    Con STORAGE_BACKEND=local es un LocalStorageService (misma interfaz, en disco);
+    si no, el S3Service que comparte cliente, executor y caché de URLs.
+    """
+    global _servicio
+    if _servicio is None:
+        if settings.storage_backend == "local":
+            from app.services.local_storage_service import LocalStorageService
+            _servicio = LocalStorageService()
+        else:
+            _servicio = S3Service()
+    return _servicio
 
@@ -8,9 +8,13 @@ from sqlalchemy.orm import selectinload
 
 from app.database import models
 from app.utils.exceptions import NotFoundError, ValidationError
+from app.utils.pagination import Keyset
 
 logger = logging.getLogger(__name__)
 
+# Usuarios más recientes primero (idx_usuario_creado_id)
+KEYSET_USUARIOS = Keyset(models.Usuario.creado_en, models.Usuario.id, descendente=True)
+
 
 class UsuarioService:
 	"""Operaciones de acceso a datos para usuarios."""
@@ -18,16 +22,14 @@ class UsuarioService:
 	def __init__(self, db: AsyncSession):
 		self.db = db
 
-	async def list(self, *, limit: int = 100, offset: int = 0) -> List[models.Usuario]:
+	async def list(self, *, limit: int = 100, offset: int = 0, cursor: Optional[str] = None) -> List[models.Usuario]:
 		stmt = (
 			select(models.Usuario)
 			.options(
 				selectinload(models.Usuario.roles).selectinload(models.UsuarioRol.rol),
 			)
-			.order_by(models.Usuario.creado_en.desc())
-			.offset(offset)
-			.limit(limit)
 		)
+		stmt = KEYSET_USUARIOS.aplicar(stmt, cursor=cursor, skip=offset, limit=limit)
 		result = await self.db.execute(stmt)
 		usuarios = result.scalars().all()
 		logger.debug("Usuarios recuperados: %s", len(usuarios))
@@ -0,0 +1,210 @@
+"""
+Verificación pública de certificados por folio.
+
+Quienes verifican certificados (otras escuelas, empleadores) lo hacen en volumen,
+así que cada proceso guarda en un LRU acotado el resultado de cada folio
+consultado: positivo (el certificado con su hash y vigencia) o negativo (el folio
+no existe). Los faltantes de un lote se leen con una sola consulta por el índice
+único de folio. Revocar un certificado publica su folio (LISTEN/NOTIFY, ver
+app.services.eventos_service) y cada proceso lo quita de su caché; si se pierde
+la conexión de escucha se vacía la caché completa. Además cada entrada vence tras
+un TTL, más corto para los negativos porque un folio aparece al emitirse.
+"""
+
+import asyncio
+import hmac
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.services.eventos_service import CANAL_CERTIFICADOS_REVOCADOS, Evento, get_bus_eventos, publicar
+from app.utils.error_codes import NotFoundErrorCodes
+from app.utils.exceptions import NotFoundError
+
+logger = logging.getLogger(__name__)
+
+# Todos los procesos escuchan las revocaciones con la misma clave
+_CLAVE_REVOCACIONES = "todos"
+
+_SQL_POR_FOLIO = """
+	SELECT folio, hash_verificacion, valido, emitido_en
+	FROM certificado
+	WHERE folio = ANY(CAST(:folios AS TEXT[]))
+"""
+
+_SQL_REVOCAR = """
+	UPDATE certificado
+	SET valido = FALSE,
+		actualizado_en = CURRENT_TIMESTAMP
+	WHERE id = :id
+	RETURNING folio
+"""
+
+
+@dataclass(frozen=True)
+class CertificadoVerificable:
+	"""Datos de un certificado emitido necesarios para verificarlo."""
+	folio: str
+	hash_verificacion: Optional[str]
+	valido: bool
+	emitido_en: Optional[datetime]
+
+
+def normalizar_folio(folio: str) -> str:
+	return folio.strip().upper()
+
+
+def resultado_verificacion(
+	folio: str,
+	certificado: Optional[CertificadoVerificable],
+	hash: Optional[str] = None,
+) -> dict:
+	"""Respuesta pública de la verificación de `folio` (ver VerificacionCertificadoResponse)."""
+	if certificado is None:
+		return {"folio": folio, "valido": False, "emitido_en": None, "mensaje": "Certificado no encontrado"}
+	if not certificado.valido:
+		mensaje = "El certificado ha sido revocado o no es válido"
+	elif hash is not None and not hmac.compare_digest(
+		(certificado.hash_verificacion or "").encode(), hash.strip().lower().encode()
+	):
+		mensaje = "El hash de verificación no coincide"
+	else:
+		return {"folio": certificado.folio, "valido": True, "emitido_en": certificado.emitido_en, "mensaje": "Certificado válido"}
+	return {"folio": certificado.folio, "valido": False, "emitido_en": certificado.emitido_en, "mensaje": mensaje}
+
+
+class CacheVerificaciones:
+	"""
+	Resultados de verificación por folio: el certificado, o None si el folio no existe.
+
+	Es un LRU acotado a `capacidad` entradas; cada una vence a los `ttl_segundos`
+	(`ttl_negativo_segundos` para los folios inexistentes). Solo se usa desde el event loop.
+	"""
+
+	def __init__(self, capacidad: int, ttl_segundos: float, ttl_negativo_segundos: float):
+		self.capacidad = capacidad
+		self.ttl_segundos = ttl_segundos
+		self.ttl_negativo_segundos = ttl_negativo_segundos
+		self._entradas: "OrderedDict[str, Tuple[Optional[CertificadoVerificable], float]]" = OrderedDict()
+
+	def obtener(self, folio: str) -> Tuple[bool, Optional[CertificadoVerificable]]:
+		"""Retorna (si había entrada vigente, certificado o None)."""
+		entrada = self._entradas.get(folio)
+		if entrada is None:
+			return False, None
+		certificado, vence_en = entrada
+		if vence_en <= time.monotonic():
+			del self._entradas[folio]
+			return False, None
+		self._entradas.move_to_end(folio)
+		return True, certificado
+
+	def guardar(self, folio: str, certificado: Optional[CertificadoVerificable]) -> None:
+		ttl = self.ttl_segundos if certificado is not None else self.ttl_negativo_segundos
+		self._entradas[folio] = (certificado, time.monotonic() + ttl)
+		self._entradas.move_to_end(folio)
+		while len(self._entradas) > self.capacidad:
+			self._entradas.popitem(last=False)
+
+	def invalidar(self, folio: str) -> None:
+		self._entradas.pop(folio, None)
+
+	def vaciar(self) -> None:
+		self._entradas.clear()
+
+
+_cache: Optional[CacheVerificaciones] = None
+
+
+def get_cache_verificaciones() -> CacheVerificaciones:
+	"""Obtener la caché de verificaciones del proceso."""
+	global _cache
+	if _cache is None:
+		_cache = CacheVerificaciones(
+			settings.certificado_verificacion_cache_size,
+			settings.certificado_verificacion_ttl_seconds,
+			settings.certificado_verificacion_negativo_ttl_seconds,
+		)
+	return _cache
+
+
+class VerificacionService:
+	"""Verificación de certificados por folio y revocación."""
+
+	def __init__(self, db: AsyncSession, cache: Optional[CacheVerificaciones] = None):
+		self.db = db
+		self.cache = cache or get_cache_verificaciones()
+
+	async def buscar(self, folios: Iterable[str]) -> Dict[str, Optional[CertificadoVerificable]]:
+		"""
+		Certificado de cada folio (normalizado), o None si no existe.
+
+		Los folios que no están en la caché se leen con una sola consulta.
+		"""
+		encontrados: Dict[str, Optional[CertificadoVerificable]] = {}
+		faltantes = []
+		for folio in dict.fromkeys(normalizar_folio(f) for f in folios):
+			en_cache, certificado = self.cache.obtener(folio)
+			if en_cache:
+				encontrados[folio] = certificado
+			else:
+				faltantes.append(folio)
+		if faltantes:
+			result = await self.db.execute(text(_SQL_POR_FOLIO), {"folios": faltantes})
+			leidos = {fila.folio: CertificadoVerificable(**fila._mapping) for fila in result}
+			for folio in faltantes:
+				encontrados[folio] = leidos.get(folio)
+				self.cache.guardar(folio, encontrados[folio])
+		return encontrados
+
+	async def revocar(self, certificado_id: uuid.UUID) -> None:
+		"""
+		Marcar un certificado como no válido y quitarlo de las cachés de verificación.
+
+		Raises:
+			NotFoundError: Si el certificado no existe
+		"""
+		folio = (await self.db.execute(text(_SQL_REVOCAR), {"id": certificado_id})).scalar_one_or_none()
+		if folio is None and not (await self.db.execute(
+			text("SELECT 1 FROM certificado WHERE id = :id"), {"id": certificado_id}
+		)).scalar():
+			raise NotFoundError(
+				"Certificado",
+				str(certificado_id),
+				error_code=NotFoundErrorCodes.CERTIFICATE_NOT_FOUND
+			)
+		if folio is not None:
+			await publicar(self.db, CANAL_CERTIFICADOS_REVOCADOS, [Evento((_CLAVE_REVOCACIONES,), {"folio": folio})])
+		await self.db.commit()
+		if folio is not None:
+			self.cache.invalidar(folio)
+		logger.info("Certificado %s revocado (folio %s)", certificado_id, folio)
+
+
+async def loop_invalidacion_verificaciones() -> None:
+	"""Quitar de la caché del proceso los folios revocados en cualquier proceso; se cancela al apagar."""
+	while True:
+		try:
+			async with get_bus_eventos().suscribir(CANAL_CERTIFICADOS_REVOCADOS, _CLAVE_REVOCACIONES) as cola:
+				# Lo revocado antes de suscribirse no llegará como evento
+				get_cache_verificaciones().vaciar()
+				while True:
+					datos = await cola.get()
+					if datos is None:
+						break
+					get_cache_verificaciones().invalidar(datos["folio"])
+		except asyncio.CancelledError:
+			raise
+		except Exception as e:
+			logger.error(f"Error escuchando revocaciones de certificados: {e}", exc_info=True)
+		# Conexión perdida: pudo perderse alguna revocación
+		get_cache_verificaciones().vaciar()
+		await asyncio.sleep(settings.certificado_verificacion_reconexion_seconds)
@@ -1,8 +1,9 @@
 """
-Módulo de tareas de background para FastAPI BackgroundTasks.
+Módulo de tareas de background.
 
 Este módulo contiene todas las tareas asíncronas que se ejecutan en background,
-desacopladas del request-response cycle.
+desacopladas del request-response cycle. Se encolan en la tabla `job` con
+app.tasks.cola.encolar() y las ejecuta el worker (python -m app.worker).
 
 Importante: Todas las tareas deben crear su propia sesión de BD usando
 app.utils.background_tasks.get_background_db_session()
@@ -2,97 +2,145 @@
 Tareas administrativas pesadas que se ejecutan en background.
 
 Operaciones que pueden tomar tiempo y no deben bloquear la interfaz de administración.
+Corren en la cola durable `admin` (ver app.tasks.cola) y reportan su progreso en
+el mismo registro de job que las encoló.
 """
 
+import asyncio
+import csv
+import gzip
+import json
 import logging
+import os
+import time
 import uuid
-from typing import List, Optional
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
 
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
 from app.utils.background_tasks import get_background_db_session
-from app.database.models import Intento, Usuario, InscripcionCurso
-from sqlalchemy import select, delete, update, and_
+from app.database.enums import EstadoJob
+from app.services.job_service import JobService
+from app.services.reporte_service import ReporteService, COLUMNAS_REPORTE_INSCRIPCIONES
+from app.services.s3_service import S3Service, get_s3_service
+from app.utils.export_stream import codificar_filas, comprimir_gzip, MEDIA_TYPES
+from sqlalchemy import text
 
 logger = logging.getLogger(__name__)
 
 
+TAMANO_LOTE_RESET = 1000
+
+# Un lote de reset: recorre los intentos por id (keyset) y solo escribe los que
+# aún no tienen permitir_nuevo_intento, para no generar escrituras inútiles.
+_SQL_RESET_LOTE = """
+    WITH lote AS (
+        SELECT i.id
+        FROM intento i
+        JOIN inscripcion_curso ic ON ic.id = i.inscripcion_curso_id
+        WHERE {filtro}
+            AND i.id > CAST(:ultimo_id AS uuid)
+        ORDER BY i.id
+        LIMIT :tamano_lote
+    ),
+    actualizados AS (
+        UPDATE intento i
+        SET permitir_nuevo_intento = TRUE
+        FROM lote
+        WHERE i.id = lote.id
+            AND i.permitir_nuevo_intento = FALSE
+        RETURNING i.id
+    )
+    SELECT
+        (SELECT id FROM lote ORDER BY id DESC LIMIT 1) AS ultimo_id,
+        (SELECT COUNT(*) FROM lote) AS revisados,
+        (SELECT COUNT(*) FROM actualizados) AS actualizados
+"""
+
+_SQL_RESET_TOTAL = """
+    SELECT COUNT(*)
+    FROM intento i
+    JOIN inscripcion_curso ic ON ic.id = i.inscripcion_curso_id
+    WHERE {filtro}
+"""
+
+
 async def reset_intentos_masivo(
+    job_id: uuid.UUID,
     usuario_id: Optional[uuid.UUID] = None,
     curso_id: Optional[uuid.UUID] = None,
-    intento_ids: Optional[List[uuid.UUID]] = None
+    intento_ids: Optional[List[uuid.UUID]] = None,
+    tamano_lote: int = TAMANO_LOTE_RESET,
 ):
     """
     Reset masivo de intentos en background.
     
-    Puede resetear intentos por usuario, curso, o lista específica de intentos.
-    Esta operación puede ser lenta si hay muchos intentos.
+    Puede resetear intentos por usuario, curso, o lista específica de intentos
+    (en ese orden de prioridad). El UPDATE se ejecuta en el servidor por lotes de
+    `tamano_lote` intentos ordenados por id, cada uno en su propia transacción junto
+    con el progreso del job. Entre lotes se revisa si se solicitó la cancelación.
     
     Args:
+        job_id: ID del registro de job donde se reporta el progreso
         usuario_id: Opcional, resetear todos los intentos de un usuario
         curso_id: Opcional, resetear todos los intentos de un curso
         intento_ids: Opcional, lista específica de IDs de intentos a resetear
+        tamano_lote: Intentos por transacción
     """
+    if intento_ids:
+        filtro, valor = "i.id = ANY(CAST(:filtro AS uuid[]))", list(intento_ids)
+    elif usuario_id:
+        filtro, valor = "ic.usuario_id = CAST(:filtro AS uuid)", usuario_id
+    elif curso_id:
+        filtro, valor = "ic.curso_id = CAST(:filtro AS uuid)", curso_id
+    else:
+        filtro, valor = None, None
+    
     async with get_background_db_session() as db:
+        job_service = JobService(db)
         try:
-            logger.info(
-                f"Iniciando reset masivo de intentos: usuario_id={usuario_id}, "
-                f"curso_id={curso_id}, intento_ids={intento_ids}"
-            )
-            
-            conditions = []
-            
-            if intento_ids:
-                stmt = (
-                    update(Intento)
-                    .where(Intento.id.in_(intento_ids))
-                    .values(permitir_nuevo_intento=True)
+            if filtro is None:
+                logger.warning("No se especificaron criterios para reset de intentos")
+                await job_service.finalizar(
+                    job_id, EstadoJob.FALLIDO, error="No se especificaron criterios para reset de intentos"
                 )
-                result = await db.execute(stmt)
-                count = result.rowcount
                 await db.commit()
-                logger.info(f"Reseteados {count} intentos específicos")
                 return
             
-            if usuario_id:
-                stmt = (
-                    select(Intento.id)
-                    .join(InscripcionCurso)
-                    .where(InscripcionCurso.usuario_id == usuario_id)
-                )
-                result = await db.execute(stmt)
-                intento_ids_list = [row[0] for row in result.fetchall()]
-                
-                if intento_ids_list:
-                    stmt = (
-                        update(Intento)
-                        .where(Intento.id.in_(intento_ids_list))
-                        .values(permitir_nuevo_intento=True)
-                    )
-                    await db.execute(stmt)
-                    await db.commit()
-                    logger.info(f"Reseteados {len(intento_ids_list)} intentos del usuario {usuario_id}")
-                    return
+            logger.info(
+                f"Iniciando reset masivo de intentos (job {job_id}): usuario_id={usuario_id}, "
+                f"curso_id={curso_id}, intento_ids={len(intento_ids) if intento_ids else None}"
+            )
             
-            if curso_id:
-                stmt = (
-                    select(Intento.id)
-                    .join(InscripcionCurso)
-                    .where(InscripcionCurso.curso_id == curso_id)
-                )
-                result = await db.execute(stmt)
-                intento_ids_list = [row[0] for row in result.fetchall()]
-                
-                if intento_ids_list:
-                    stmt = (
-                        update(Intento)
-                        .where(Intento.id.in_(intento_ids_list))
-                        .values(permitir_nuevo_intento=True)
-                    )
-                    await db.execute(stmt)
-                    await db.commit()
-                    logger.info(f"Reseteados {len(intento_ids_list)} intentos del curso {curso_id}")
-                    return
+            total = (await db.execute(text(_SQL_RESET_TOTAL.format(filtro=filtro)), {"filtro": valor})).scalar_one()
+            cancelado = await job_service.iniciar(job_id, total=total)
+            await db.commit()
+            
+            sql_lote = text(_SQL_RESET_LOTE.format(filtro=filtro))
+            ultimo_id = uuid.UUID(int=0)
+            reseteados = 0
+            terminado = False
+            
+            while not terminado and not cancelado:
+                row = (await db.execute(
+                    sql_lote,
+                    {"filtro": valor, "ultimo_id": ultimo_id, "tamano_lote": tamano_lote},
+                )).one()
+                terminado = row.revisados < tamano_lote
+                if row.revisados:
+                    ultimo_id = row.ultimo_id
+                    reseteados += row.actualizados
+                    cancelado = await job_service.registrar_progreso(job_id, row.revisados)
+                await db.commit()
             
-            logger.warning("No se especificaron criterios para reset de intentos")
+            estado = EstadoJob.COMPLETADO if terminado else EstadoJob.CANCELADO
+            await job_service.finalizar(job_id, estado)
+            await db.commit()
+            logger.info(f"Reset masivo (job {job_id}) {estado.value}: {reseteados} intentos reseteados")
             
         except Exception as e:
             logger.error(
@@ -101,61 +149,187 @@ async def reset_intentos_masivo(
             )
             try:
                 await db.rollback()
+                await job_service.finalizar(job_id, EstadoJob.FALLIDO, error=str(e))
+                await db.commit()
             except Exception:
                 pass
             raise
 
 
+@dataclass(frozen=True)
+class _FaseRetencion:
+    """Tabla que se depura por lotes y las filas que su borrado elimina en cascada."""
+    tabla: str
+    filtro: str
+    # (tabla, consulta por ids del lote) de las filas dependientes, para archivarlas
+    dependientes: Tuple[Tuple[str, str], ...] = ()
+
+
+_FASES_RETENCION = {
+    "intentos": _FaseRetencion(
+        tabla="intento",
+        filtro="creado_en < :fecha_limite",
+        dependientes=(
+            ("intento_pregunta", """
+                SELECT ip.* FROM intento_pregunta ip
+                WHERE ip.intento_id = ANY(CAST(:ids AS uuid[]))
+            """),
+            ("respuesta", """
+                SELECT r.* FROM respuesta r
+                JOIN intento_pregunta ip ON ip.id = r.intento_pregunta_id
+                WHERE ip.intento_id = ANY(CAST(:ids AS uuid[]))
+            """),
+        ),
+    ),
+    # estado_inscripcion no tiene INACTIVA; PAUSADA es la inscripción sin actividad
+    "inscripciones": _FaseRetencion(
+        tabla="inscripcion_curso",
+        filtro="creado_en < :fecha_limite AND estado = 'PAUSADA'",
+        dependientes=(
+            ("intento", """
+                SELECT i.* FROM intento i
+                WHERE i.inscripcion_curso_id = ANY(CAST(:ids AS uuid[]))
+            """),
+            ("intento_pregunta", """
+                SELECT ip.* FROM intento_pregunta ip
+                JOIN intento i ON i.id = ip.intento_id
+                WHERE i.inscripcion_curso_id = ANY(CAST(:ids AS uuid[]))
+            """),
+            ("respuesta", """
+                SELECT r.* FROM respuesta r
+                JOIN intento_pregunta ip ON ip.id = r.intento_pregunta_id
+                JOIN intento i ON i.id = ip.intento_id
+                WHERE i.inscripcion_curso_id = ANY(CAST(:ids AS uuid[]))
+            """),
+            ("certificado", """
+                SELECT c.* FROM certificado c
+                WHERE c.inscripcion_curso_id = ANY(CAST(:ids AS uuid[]))
+            """),
+        ),
+    ),
+}
+
+# Lag de réplica en segundos; 0 si no hay réplicas o no hay permiso para verlas
+_SQL_LAG_REPLICACION = text("""
+    SELECT COALESCE(MAX(EXTRACT(EPOCH FROM replay_lag)), 0) FROM pg_stat_replication
+""")
+
+ID_INICIAL = str(uuid.UUID(int=0))
+
+
 async def limpiar_datos_antiguos(
+    job_id: uuid.UUID,
     dias_antiguedad: int = 365,
     eliminar_intentos: bool = False,
-    eliminar_inscripciones_inactivas: bool = False
+    eliminar_inscripciones_inactivas: bool = False,
+    archivar: bool = False,
+    formato_archivo: str = "jsonl",
+    tamano_lote: Optional[int] = None,
+    presupuesto_segundos: Optional[float] = None,
 ):
     """
-    Limpiar datos antiguos en background.
+    Limpiar datos antiguos en background, por lotes y de forma reanudable.
     
-    Esta operación puede ser muy lenta dependiendo del volumen de datos.
+    Cada lote (keyset por id) se borra en su propia transacción junto con el
+    checkpoint del job. Entre lotes se hace una pausa y se espera mientras el lag
+    de réplica supere el máximo configurado. Al agotar el presupuesto de tiempo el
+    job vuelve a la cola y el worker lo retoma desde el checkpoint, igual que tras
+    una caída.
     
     Args:
+        job_id: ID del registro de job donde se guardan progreso y checkpoint
         dias_antiguedad: Días de antigüedad mínima para considerar datos como antiguos
         eliminar_intentos: Si True, eliminar intentos antiguos
-        eliminar_inscripciones_inactivas: Si True, eliminar inscripciones inactivas antiguas
+        eliminar_inscripciones_inactivas: Si True, eliminar inscripciones pausadas antiguas
+        archivar: Si True, escribir cada lote (y sus filas dependientes) en archivos
+            comprimidos bajo settings.retention_archive_dir antes de borrarlo
+        formato_archivo: "jsonl" o "csv"
+        tamano_lote: Filas por transacción (por defecto settings.retention_batch_size)
+        presupuesto_segundos: Tiempo máximo de esta ejecución
+            (por defecto settings.retention_time_budget_seconds)
     """
+    tamano_lote = tamano_lote or settings.retention_batch_size
+    if presupuesto_segundos is None:
+        presupuesto_segundos = settings.retention_time_budget_seconds
+    limite = time.monotonic() + presupuesto_segundos
+    
+    fases = [
+        nombre for nombre, activa in (
+            ("intentos", eliminar_intentos),
+            ("inscripciones", eliminar_inscripciones_inactivas),
+        ) if activa
+    ]
+    
     async with get_background_db_session() as db:
+        job_service = JobService(db)
         try:
-            from datetime import datetime, timedelta
-            fecha_limite = datetime.now() - timedelta(days=dias_antiguedad)
-            
-            logger.info(f"Iniciando limpieza de datos antiguos anteriores a {fecha_limite}")
+            job = await job_service.get_job(job_id)
+            checkpoint = dict(job.checkpoint or {})
+            if "fecha_limite" not in checkpoint:
+                # La fecha límite se fija en la primera ejecución para que al reanudar
+                # se sigan depurando exactamente los mismos datos.
+                fecha_limite = datetime.now(timezone.utc) - timedelta(days=dias_antiguedad)
+                checkpoint = {
+                    "fecha_limite": fecha_limite.isoformat(),
+                    "fase": fases[0] if fases else None,
+                    "ultimo_id": ID_INICIAL,
+                    "lote": 0,
+                }
+            fecha_limite = datetime.fromisoformat(checkpoint["fecha_limite"])
             
-            total_eliminados = 0
+            cancelado = await job_service.iniciar(job_id)
+            await db.commit()
+            logger.info(
+                f"Iniciando limpieza de datos antiguos (job {job_id}) anteriores a {fecha_limite}, "
+                f"fase={checkpoint['fase']}, lote={checkpoint['lote']}"
+            )
             
-            if eliminar_intentos:
-                stmt = delete(Intento).where(
-                    Intento.creado_en < fecha_limite
+            while checkpoint["fase"] is not None and not cancelado:
+                if time.monotonic() >= limite:
+                    await job_service.pausar(job_id)
+                    await db.commit()
+                    logger.info(f"Limpieza (job {job_id}) pausada por presupuesto de tiempo en {checkpoint}")
+                    return
+                
+                fase = _FASES_RETENCION[checkpoint["fase"]]
+                result = await db.execute(
+                    text(f"""
+                        SELECT id FROM {fase.tabla}
+                        WHERE {fase.filtro} AND id > CAST(:ultimo_id AS uuid)
+                        ORDER BY id
+                        LIMIT :tamano_lote
+                    """),
+                    {"fecha_limite": fecha_limite, "ultimo_id": checkpoint["ultimo_id"], "tamano_lote": tamano_lote},
                 )
-                result = await db.execute(stmt)
-                count = result.rowcount
-                total_eliminados += count
-                logger.info(f"Eliminados {count} intentos antiguos")
-            
-            if eliminar_inscripciones_inactivas:
-                stmt = (
-                    delete(InscripcionCurso)
-                    .where(
-                        and_(
-                            InscripcionCurso.creado_en < fecha_limite,
-                            InscripcionCurso.estado == "INACTIVA"
-                        )
+                ids = [row[0] for row in result]
+                
+                if not ids:
+                    siguiente = fases.index(checkpoint["fase"]) + 1
+                    checkpoint.update(
+                        fase=fases[siguiente] if siguiente < len(fases) else None,
+                        ultimo_id=ID_INICIAL,
                     )
+                    cancelado = await job_service.registrar_progreso(job_id, 0, checkpoint)
+                    await db.commit()
+                    continue
+                
+                if archivar:
+                    await _archivar_lote(db, job_id, checkpoint["fase"], fase, ids, checkpoint["lote"], formato_archivo)
+                
+                await db.execute(
+                    text(f"DELETE FROM {fase.tabla} WHERE id = ANY(CAST(:ids AS uuid[]))"),
+                    {"ids": ids},
                 )
-                result = await db.execute(stmt)
-                count = result.rowcount
-                total_eliminados += count
-                logger.info(f"Eliminadas {count} inscripciones inactivas antiguas")
+                checkpoint.update(ultimo_id=str(ids[-1]), lote=checkpoint["lote"] + 1)
+                cancelado = await job_service.registrar_progreso(job_id, len(ids), checkpoint)
+                await db.commit()
+                
+                await _esperar_replicacion(db, limite)
             
+            estado = EstadoJob.CANCELADO if checkpoint["fase"] is not None else EstadoJob.COMPLETADO
+            await job_service.finalizar(job_id, estado)
             await db.commit()
-            logger.info(f"Limpieza completada. Total eliminado: {total_eliminados}")
+            logger.info(f"Limpieza de datos antiguos (job {job_id}) {estado.value}")
             
         except Exception as e:
             logger.error(
@@ -164,49 +338,144 @@ async def limpiar_datos_antiguos(
             )
             try:
                 await db.rollback()
+                await job_service.finalizar(job_id, EstadoJob.FALLIDO, error=str(e))
+                await db.commit()
             except Exception:
                 pass
             raise
 
 
+async def _esperar_replicacion(db: AsyncSession, limite: float) -> None:
+    """Pausa entre lotes; se alarga mientras el lag de réplica supere el máximo."""
+    pausa = settings.retention_batch_pause_seconds
+    max_lag = settings.retention_max_replication_lag_seconds
+    await asyncio.sleep(pausa)
+    while time.monotonic() < limite:
+        lag = float((await db.execute(_SQL_LAG_REPLICACION)).scalar_one())
+        # No mantener la transacción abierta mientras se espera
+        await db.commit()
+        if lag <= max_lag:
+            return
+        logger.info(f"Lag de réplica {lag:.1f}s supera {max_lag:.1f}s, esperando")
+        await asyncio.sleep(max(pausa, min(lag - max_lag, max_lag)))
+
+
+async def _archivar_lote(
+    db: AsyncSession,
+    job_id: uuid.UUID,
+    nombre_fase: str,
+    fase: _FaseRetencion,
+    ids: List[uuid.UUID],
+    lote: int,
+    formato: str,
+) -> None:
+    """
+    Escribir las filas del lote y sus dependientes en archivos gzip, uno por tabla.
+    
+    El nombre depende solo del número de lote, así que al reanudar un lote que no
+    llegó a confirmarse su archivo se reescribe en lugar de duplicarse.
+    """
+    directorio = Path(settings.retention_archive_dir) / str(job_id)
+    consultas = ((fase.tabla, f"SELECT * FROM {fase.tabla} WHERE id = ANY(CAST(:ids AS uuid[]))"),) + fase.dependientes
+    for tabla, consulta in consultas:
+        result = await db.execute(text(consulta), {"ids": ids})
+        filas = [dict(fila) for fila in result.mappings()]
+        if filas:
+            ruta = directorio / f"{nombre_fase}-{lote:06d}-{tabla}.{formato}.gz"
+            await asyncio.to_thread(_escribir_archivo, ruta, filas, formato)
+
+
+def _escribir_archivo(ruta: Path, filas: List[dict], formato: str) -> None:
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    temporal = ruta.with_name(ruta.name + ".tmp")
+    with gzip.open(temporal, "wt", encoding="utf-8", newline="") as archivo:
+        if formato == "csv":
+            writer = csv.DictWriter(archivo, fieldnames=list(filas[0]))
+            writer.writeheader()
+            writer.writerows(filas)
+        else:
+            for fila in filas:
+                archivo.write(json.dumps(fila, default=str, ensure_ascii=False) + "\n")
+    os.replace(temporal, ruta)
+
+
+class _ReporteCancelado(Exception):
+    """Se solicitó cancelar el job mientras se exportaba el reporte."""
+
+
 async def generar_reporte_masivo(
+    job_id: uuid.UUID,
     curso_id: Optional[uuid.UUID] = None,
-    formato: str = "json"
+    formato: str = "csv",
+    comprimir: bool = True,
 ):
     """
-    Generar reporte masivo de datos en background.
+    Exportar el reporte de inscripciones a S3 en background.
     
-    Esta operación puede ser lenta si hay muchos datos.
+    Las filas se leen con un cursor del servidor por lotes, se codifican de forma
+    incremental y se suben con multipart upload, así que la memoria no crece con el
+    número de inscripciones. El progreso se registra por lote en una sesión aparte
+    (la del cursor mantiene su transacción abierta) y una cancelación aborta la subida.
     
     Args:
+        job_id: ID del registro de job; al completar, su resultado incluye la clave S3
         curso_id: Opcional, filtrar por curso específico
-        formato: Formato del reporte ("json", "csv", etc.)
+        formato: "csv" o "jsonl"
+        comprimir: Si True, el reporte se sube comprimido con gzip
     """
-    async with get_background_db_session() as db:
+    s3_key = S3Service.build_report_key(
+        "inscripciones", f"{job_id}.{formato}{'.gz' if comprimir else ''}"
+    )
+    filas = 0
+    
+    async with get_background_db_session() as db, get_background_db_session() as db_job:
+        job_service = JobService(db_job)
         try:
-            logger.info(f"Iniciando generación de reporte masivo: curso_id={curso_id}, formato={formato}")
+            logger.info(f"Iniciando reporte masivo (job {job_id}): curso_id={curso_id}, formato={formato}")
+            if await job_service.iniciar(job_id):
+                raise _ReporteCancelado()
+            await db_job.commit()
             
-            if curso_id:
-                stmt = (
-                    select(InscripcionCurso, Usuario)
-                    .join(Usuario)
-                    .where(InscripcionCurso.curso_id == curso_id)
-                )
-            else:
-                stmt = (
-                    select(InscripcionCurso, Usuario)
-                    .join(Usuario)
-                )
+            async def lotes_con_progreso():
+                nonlocal filas
+                async for lote in ReporteService(db).iterar_inscripciones(curso_id):
+                    filas += len(lote)
+                    cancelado = await job_service.registrar_progreso(job_id, len(lote))
+                    await db_job.commit()
+                    if cancelado:
+                        raise _ReporteCancelado()
+                    yield lote
+            
+            bloques = codificar_filas(lotes_con_progreso(), COLUMNAS_REPORTE_INSCRIPCIONES, formato)
+            if comprimir:
+                bloques = comprimir_gzip(bloques)
+            content_type = "application/gzip" if comprimir else MEDIA_TYPES[formato]
             
-            result = await db.execute(stmt)
-            rows = result.fetchall()
+            archivo = await get_s3_service().upload_stream(bloques, s3_key, content_type=content_type)
+            
+            await job_service.finalizar(
+                job_id,
+                EstadoJob.COMPLETADO,
+                resultado={"s3_key": s3_key, "filas": filas, "bytes": archivo.tamano, "sha256": archivo.sha256},
+            )
+            await db_job.commit()
+            logger.info(f"Generado reporte con {filas} registros en {s3_key}")
             
-            logger.info(f"Generado reporte con {len(rows)} registros")
+        except _ReporteCancelado:
+            await db_job.rollback()
+            await job_service.finalizar(job_id, EstadoJob.CANCELADO)
+            await db_job.commit()
+            logger.info(f"Reporte masivo (job {job_id}) cancelado tras {filas} registros")
             
         except Exception as e:
             logger.error(
                 f"Error generando reporte masivo: {str(e)}",
                 exc_info=True
             )
+            try:
+                await db_job.rollback()
+                await job_service.finalizar(job_id, EstadoJob.FALLIDO, error=str(e))
+                await db_job.commit()
+            except Exception:
+                pass
             raise
-
@@ -1,42 +1,91 @@
 """
 Tareas de background para generación de certificados.
 
-Usa asyncio.to_thread() para ejecutar la generación de PDF en un thread separado,
-evitando bloquear el event loop mientras se genera el documento.
+Los PDFs se renderizan en el motor de certificados (pool de procesos, ver
+app.services.certificate_renderer) para no bloquear el event loop ni quedar
+limitados por el GIL. Se ejecutan en la cola durable `certificados` (ver
+app.tasks.cola), que reintenta si fallan. El email de certificado listo se
+registra en la bandeja de salida, y el aviso a los flujos de estado se publica,
+en la misma transacción que guarda el PDF.
+
+La generación es idempotente por inscripción: toma un advisory lock de
+transacción con la clave de la inscripción (la generación individual lo espera;
+la emisión por curso salta los certificados bloqueados) y no hace nada si el
+certificado ya tiene PDF, así que no se renderiza ni se sube dos veces ni cambia
+el folio de un certificado emitido.
 """
 
 import logging
 import uuid
 import asyncio
+from contextlib import aclosing
+from dataclasses import replace
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, List, Optional, Tuple
 
+from app.config import settings
+from app.database.enums import EstadoJob
 from app.utils.background_tasks import get_background_db_session
-from app.utils.pdf_generator import generar_pdf_certificado
+from app.services.certificate_renderer import DatosCertificado, MotorRenderizado, ResultadoRenderizado, get_motor_renderizado
+from app.services.email_outbox_service import EmailOutboxService, email_certificado_listo
+from app.services.eventos_service import CANAL_CERTIFICADOS, publicar
+from app.services.job_service import JobService
 from app.services.s3_service import S3Service, get_s3_service
-from app.services.certificate_service import CertificateService, get_certificate_service
+from app.services.certificate_service import (
+    CertificateService,
+    clave_generacion_certificado,
+    evento_certificado_listo,
+    get_certificate_service,
+)
 from app.database.models import Certificado, InscripcionCurso
+from app.utils.exceptions import EBSException
 from app.utils.query_helpers import get_or_404
-from sqlalchemy import select
+from app.utils.vuelo_unico import VueloUnico
+from sqlalchemy import select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 logger = logging.getLogger(__name__)
 
+# Espera a que nadie más genere el certificado de la inscripción; se libera con la transacción
+_SQL_BLOQUEAR_GENERACION = "SELECT pg_advisory_xact_lock(hashtextextended(:clave, 0))"
+
+# Generaciones individuales en curso en este proceso, por certificado
+_generaciones = VueloUnico()
+
 
 async def generar_certificado_background(certificado_id: uuid.UUID):
     """
     Tarea de background para generar y subir un certificado PDF.
     
     Esta función crea su propia sesión de BD, obtiene los datos necesarios,
-    genera el PDF en un thread separado, lo sube a S3 y actualiza el certificado.
+    genera el PDF en el motor de certificados, lo sube a S3 y actualiza el certificado.
+    Si el certificado ya tiene PDF no hace nada. Las llamadas concurrentes para el
+    mismo certificado en este proceso esperan una sola generación; entre procesos
+    las serializa el advisory lock de la inscripción.
     
     Args:
         certificado_id: ID del certificado que se va a generar
     """
+    await _generaciones.ejecutar(certificado_id, lambda: _generar_certificado(certificado_id))
+
+
+async def _generar_certificado(certificado_id: uuid.UUID) -> None:
     async with get_background_db_session() as db:
         try:
             logger.info(f"Iniciando generación de certificado en background: {certificado_id}")
             
+            inscripcion_curso_id = (await db.execute(
+                select(Certificado.inscripcion_curso_id).where(Certificado.id == certificado_id)
+            )).scalar_one_or_none()
+            if inscripcion_curso_id is None:
+                raise ValueError(f"Certificado {certificado_id} no encontrado")
+            await db.execute(
+                text(_SQL_BLOQUEAR_GENERACION),
+                {"clave": clave_generacion_certificado(inscripcion_curso_id)},
+            )
+            
             stmt = (
                 select(Certificado)
                 .options(
@@ -51,6 +100,11 @@ async def generar_certificado_background(certificado_id: uuid.UUID):
             if not certificado:
                 raise ValueError(f"Certificado {certificado_id} no encontrado")
             
+            if certificado.s3_key:
+                logger.info(f"Certificado {certificado_id} ya generado ({certificado.s3_key}); no se vuelve a generar")
+                await db.rollback()
+                return
+            
             inscripcion = certificado.inscripcion_curso
             usuario = inscripcion.usuario
             curso = inscripcion.curso
@@ -58,17 +112,18 @@ async def generar_certificado_background(certificado_id: uuid.UUID):
             certificate_service = get_certificate_service()
             
             fecha_emision = certificado.emitido_en or datetime.now()
-            folio = certificate_service.generate_folio()
+            folio = certificado.folio or certificate_service.generate_folio()
             
             logger.info(f"Generando PDF para certificado {certificado_id}, folio: {folio}")
             
-            pdf_bytes = await asyncio.to_thread(
-                generar_pdf_certificado,
-                usuario.nombre,
-                usuario.apellido,
-                curso.titulo,
-                folio,
-                fecha_emision
+            pdf_bytes = await get_motor_renderizado().renderizar(
+                DatosCertificado(
+                    usuario_nombre=usuario.nombre,
+                    usuario_apellido=usuario.apellido,
+                    curso_titulo=curso.titulo,
+                    folio=folio,
+                    fecha_emision=fecha_emision
+                )
             )
             
             logger.info(f"PDF generado para certificado {certificado_id}, tamaño: {len(pdf_bytes)} bytes")
@@ -76,7 +131,7 @@ async def generar_certificado_background(certificado_id: uuid.UUID):
             s3_service = get_s3_service()
             s3_key = S3Service.build_certificate_key(str(certificado_id))
             
-            s3_service.upload_file(
+            await s3_service.upload_file(
                 file_content=pdf_bytes,
                 s3_key=s3_key,
                 content_type="application/pdf",
@@ -104,6 +159,14 @@ async def generar_certificado_background(certificado_id: uuid.UUID):
             certificado.s3_key = s3_key
             certificado.valido = True
             
+            if usuario.email:
+                await EmailOutboxService(db).agregar([
+                    email_certificado_listo(certificado_id, usuario.email, usuario.nombre, curso.titulo, folio)
+                ])
+            await publicar(db, CANAL_CERTIFICADOS, [
+                evento_certificado_listo(certificado_id, usuario.id, folio, certificado.emitido_en, s3_key)
+            ])
+            
             await db.commit()
             await db.refresh(certificado)
             
@@ -123,3 +186,316 @@ async def generar_certificado_background(certificado_id: uuid.UUID):
                 pass
             raise
 
+
+
+# Crea el certificado (aún sin PDF) de cada inscripción acreditada del curso que no tenga uno.
+# ON CONFLICT: otra emisión concurrente puede haberlo creado después de NOT EXISTS
+_SQL_CREAR_PENDIENTES = """
+    INSERT INTO certificado (id, inscripcion_curso_id, valido)
+    SELECT gen_random_uuid(), ic.id, FALSE
+    FROM inscripcion_curso ic
+    WHERE ic.curso_id = :curso_id
+        AND ic.acreditado
+        AND NOT EXISTS (
+            SELECT 1 FROM certificado c WHERE c.inscripcion_curso_id = ic.id
+        )
+    ON CONFLICT (inscripcion_curso_id) DO NOTHING
+"""
+
+_SQL_PENDIENTES = """
+    FROM certificado c
+    JOIN inscripcion_curso ic ON ic.id = c.inscripcion_curso_id
+    JOIN usuario u ON u.id = ic.usuario_id
+    JOIN curso cu ON cu.id = ic.curso_id
+    WHERE ic.curso_id = :curso_id
+        AND ic.acreditado
+        AND c.s3_key IS NULL
+"""
+
+_SQL_TOTAL_PENDIENTES = "SELECT COUNT(*) " + _SQL_PENDIENTES
+
+_SQL_PENDIENTES_LOTE = """
+    SELECT c.id, c.inscripcion_curso_id, c.folio, c.emitido_en, u.id AS usuario_id, u.nombre, u.apellido, u.email,
+        cu.id AS curso_id, cu.titulo
+""" + _SQL_PENDIENTES + """
+        AND c.id > :ultimo_id
+    ORDER BY c.id
+    LIMIT :tamano_lote
+"""
+
+# Sin esperar: las claves que otra generación tiene bloqueadas se saltan
+_SQL_BLOQUEAR_LIBRES = """
+    SELECT clave
+    FROM unnest(CAST(:claves AS TEXT[])) AS clave
+    WHERE pg_try_advisory_xact_lock(hashtextextended(clave, 0))
+"""
+
+# En otra sentencia, después de bloquear, para ver lo que otra generación confirmó antes
+_SQL_SIN_PDF = "SELECT id FROM certificado WHERE id = ANY(CAST(:ids AS UUID[])) AND s3_key IS NULL"
+
+_SQL_GUARDAR_EMITIDO = """
+    UPDATE certificado
+    SET folio = :folio,
+        hash_verificacion = :hash_verificacion,
+        s3_key = :s3_key,
+        valido = TRUE,
+        actualizado_en = CURRENT_TIMESTAMP
+    WHERE id = :id
+"""
+
+# Veces que se vuelve a emitir con otro folio un certificado cuyo folio ya existe
+MAX_REINTENTOS_FOLIO = 3
+
+
+async def _leer_pendientes(
+    db: AsyncSession,
+    curso_id: uuid.UUID,
+    tamano_lote: int,
+    certificate_service: CertificateService,
+) -> AsyncIterator[DatosCertificado]:
+    """Certificados sin PDF del curso, leídos por lotes de id (keyset) a medida que el motor los pide."""
+    ultimo_id = uuid.UUID(int=0)
+    while True:
+        filas = (await db.execute(
+            text(_SQL_PENDIENTES_LOTE),
+            {"curso_id": curso_id, "ultimo_id": ultimo_id, "tamano_lote": tamano_lote},
+        )).all()
+        # Cerrar la transacción de lectura mientras el motor consume el lote
+        await db.commit()
+        for fila in filas:
+            yield DatosCertificado(
+                usuario_nombre=fila.nombre,
+                usuario_apellido=fila.apellido,
+                curso_titulo=fila.titulo,
+                folio=fila.folio or certificate_service.generate_folio(),
+                fecha_emision=fila.emitido_en,
+                referencia=fila,
+            )
+        if len(filas) < tamano_lote:
+            return
+        ultimo_id = filas[-1].id
+
+
+async def _reservar_sin_pdf(db: AsyncSession, filas: List) -> set:
+    """
+    Bloquear hasta el fin de la transacción las inscripciones de `filas` que nadie
+    más está generando y retornar los ids de sus certificados que siguen sin PDF.
+    """
+    if not filas:
+        return set()
+    por_clave = {clave_generacion_certificado(f.inscripcion_curso_id): f.id for f in filas}
+    bloqueadas = (await db.execute(text(_SQL_BLOQUEAR_LIBRES), {"claves": list(por_clave)})).scalars().all()
+    if not bloqueadas:
+        return set()
+    ids = [por_clave[clave] for clave in bloqueadas]
+    return set((await db.execute(text(_SQL_SIN_PDF), {"ids": ids})).scalars().all())
+
+
+async def _subir_emitido(
+    s3_service: S3Service,
+    certificate_service: CertificateService,
+    resultado: ResultadoRenderizado,
+) -> dict:
+    """Subir el PDF a S3 y devolver los valores con los que se actualiza el certificado."""
+    datos, fila = resultado.datos, resultado.datos.referencia
+    s3_key = S3Service.build_certificate_key(str(fila.id))
+    await s3_service.upload_file(
+        file_content=resultado.pdf,
+        s3_key=s3_key,
+        content_type="application/pdf",
+        metadata={
+            "certificado_id": str(fila.id),
+            "folio": datos.folio,
+            "usuario_id": str(fila.usuario_id),
+            "curso_id": str(fila.curso_id),
+            "fecha_emision": fila.emitido_en.isoformat(),
+        },
+    )
+    return {
+        "id": fila.id,
+        "folio": datos.folio,
+        "s3_key": s3_key,
+        "hash_verificacion": certificate_service.generate_hash_verification(
+            certificado_id=str(fila.id),
+            usuario_id=str(fila.usuario_id),
+            curso_id=str(fila.curso_id),
+            folio=datos.folio,
+            fecha_emision=fila.emitido_en,
+        ),
+    }
+
+
+def _restriccion_violada(e: IntegrityError) -> Optional[str]:
+    """Nombre del índice o restricción violada (asyncpg lo expone en la causa del error)."""
+    return getattr(e.orig.__cause__, "constraint_name", None) or getattr(e.orig, "constraint_name", None)
+
+
+async def _actualizar_emitidos(db: AsyncSession, pares: List[Tuple[DatosCertificado, dict]]) -> Tuple[list, list]:
+    """
+    Guardar los certificados subidos en un savepoint. Si alguno viola una
+    restricción se guardan fila por fila; retorna los que chocaron por folio
+    (idx_certificado_folio) y los que fallaron por otra restricción.
+    """
+    try:
+        async with db.begin_nested():
+            await db.execute(text(_SQL_GUARDAR_EMITIDO), [emitido for _, emitido in pares])
+        return [], []
+    except IntegrityError:
+        pass
+    choques, fallidos = [], []
+    for par in pares:
+        try:
+            async with db.begin_nested():
+                await db.execute(text(_SQL_GUARDAR_EMITIDO), par[1])
+        except IntegrityError as e:
+            if _restriccion_violada(e) == "idx_certificado_folio":
+                logger.warning(f"Folio {par[0].folio} repetido para el certificado {par[1]['id']}")
+                choques.append(par)
+            else:
+                logger.error(f"No se pudo guardar el certificado {par[1]['id']}: {e.orig!r}")
+                fallidos.append(par)
+    return choques, fallidos
+
+
+async def _guardar_emitidos(
+    db: AsyncSession,
+    motor: MotorRenderizado,
+    s3_service: S3Service,
+    certificate_service: CertificateService,
+    pares: List[Tuple[DatosCertificado, dict]],
+) -> List[Tuple[DatosCertificado, dict]]:
+    """
+    Guardar los certificados subidos y retornar los que quedaron guardados.
+
+    Solo los que chocan por folio se renderizan y suben de nuevo con otro folio,
+    hasta MAX_REINTENTOS_FOLIO veces; cualquier otra violación no se arregla
+    reintentando y cuenta como falla. Los que no se guardan siguen sin PDF y los
+    procesa el reintento del job.
+    """
+    guardados = []
+    for intento in range(MAX_REINTENTOS_FOLIO + 1):
+        choques, fallidos = await _actualizar_emitidos(db, pares)
+        guardados += [par for par in pares if not any(par is otro for otro in choques + fallidos)]
+        if not choques or intento == MAX_REINTENTOS_FOLIO:
+            break
+        pares = []
+        for datos, _ in choques:
+            datos = replace(datos, folio=certificate_service.generate_folio())
+            try:
+                pdf = await motor.renderizar(datos)
+                pares.append((datos, await _subir_emitido(
+                    s3_service, certificate_service, ResultadoRenderizado(datos=datos, pdf=pdf)
+                )))
+            except Exception as e:
+                logger.warning(f"No se pudo volver a emitir el certificado {datos.referencia.id}: {e!r}")
+    return guardados
+
+
+async def emitir_certificados_curso(
+    job_id: uuid.UUID,
+    curso_id: uuid.UUID,
+    tamano_lote: Optional[int] = None,
+):
+    """
+    Emitir los certificados de todas las inscripciones acreditadas de un curso.
+    
+    Crea el certificado que falte y luego lee por lotes los que no tienen PDF;
+    el motor los renderiza en paralelo y la lectura se pausa cuando su cola está
+    llena. Cada `tamano_lote` resultados se suben a S3 en paralelo (acotado por
+    el executor de S3) y se guardan, junto con el progreso del job y los emails
+    de certificado listo, en una transacción. Un certificado que falla no detiene el lote; si hubo fallas la
+    tarea termina con error y el reintento de la cola solo procesa los que siguen
+    sin PDF. Antes de subir, el lote bloquea sus inscripciones; las que otra
+    generación tiene bloqueadas o que ya tienen PDF se omiten.
+    
+    Args:
+        job_id: ID del registro de job donde se reporta el progreso
+        curso_id: Curso cuyos alumnos acreditados reciben certificado
+        tamano_lote: Certificados por transacción (default: settings.certificate_batch_size)
+    """
+    tamano_lote = tamano_lote or settings.certificate_batch_size
+    resultado = {"emitidos": 0, "errores": 0, "omitidos": 0}
+    
+    async with get_background_db_session() as db, get_background_db_session() as lectura:
+        job_service = JobService(db)
+        outbox = EmailOutboxService(db)
+        try:
+            creados = (await db.execute(text(_SQL_CREAR_PENDIENTES), {"curso_id": curso_id})).rowcount
+            total = (await db.execute(text(_SQL_TOTAL_PENDIENTES), {"curso_id": curso_id})).scalar_one()
+            cancelado = await job_service.iniciar(job_id, total=total)
+            await db.commit()
+            logger.info(
+                f"Emitiendo certificados del curso {curso_id} (job {job_id}): "
+                f"{total} pendientes, {creados} creados"
+            )
+            
+            certificate_service = get_certificate_service()
+            s3_service = certificate_service.s3_service
+            motor = get_motor_renderizado()
+            lote: List[ResultadoRenderizado] = []
+            
+            async def guardar_lote() -> bool:
+                renderizados = [r for r in lote if r.error is None]
+                reservados = await _reservar_sin_pdf(db, [r.datos.referencia for r in renderizados])
+                exitosos = [r for r in renderizados if r.datos.referencia.id in reservados]
+                omitidos = len(renderizados) - len(exitosos)
+                subidas = await asyncio.gather(
+                    *(_subir_emitido(s3_service, certificate_service, r) for r in exitosos),
+                    return_exceptions=True,
+                )
+                subidos = [(r.datos, s) for r, s in zip(exitosos, subidas) if not isinstance(s, BaseException)]
+                for fallo in [r.error for r in lote if r.error is not None] + [s for s in subidas if isinstance(s, BaseException)]:
+                    logger.warning(f"Certificado no emitido (job {job_id}): {fallo!r}")
+                emitidos = await _guardar_emitidos(db, motor, s3_service, certificate_service, subidos) if subidos else []
+                if emitidos:
+                    await outbox.agregar(
+                        email_certificado_listo(d.referencia.id, d.referencia.email, d.referencia.nombre, d.referencia.titulo, d.folio)
+                        for d, _ in emitidos if d.referencia.email
+                    )
+                    await publicar(db, CANAL_CERTIFICADOS, (
+                        evento_certificado_listo(s["id"], d.referencia.usuario_id, d.folio, d.referencia.emitido_en, s["s3_key"])
+                        for d, s in emitidos
+                    ))
+                resultado["emitidos"] += len(emitidos)
+                resultado["omitidos"] += omitidos
+                resultado["errores"] += len(lote) - len(emitidos) - omitidos
+                se_cancelo = await job_service.registrar_progreso(job_id, len(lote))
+                await db.commit()
+                lote.clear()
+                return se_cancelo
+            
+            if not cancelado:
+                pendientes = _leer_pendientes(lectura, curso_id, tamano_lote, certificate_service)
+                async with aclosing(motor.renderizar_lote(pendientes)) as resultados:
+                    async for renderizado in resultados:
+                        lote.append(renderizado)
+                        if len(lote) >= tamano_lote and await guardar_lote():
+                            cancelado = True
+                            break
+                if lote:
+                    cancelado = await guardar_lote() or cancelado
+            
+            if resultado["errores"]:
+                raise EBSException(
+                    status_code=500,
+                    detail=f"No se pudieron emitir {resultado['errores']} certificados del curso {curso_id}",
+                    error_code="CERTIFICATE_GENERATION_ERROR"
+                )
+            
+            estado = EstadoJob.CANCELADO if cancelado else EstadoJob.COMPLETADO
+            await job_service.finalizar(job_id, estado, resultado=resultado)
+            await db.commit()
+            logger.info(f"Emisión de certificados (job {job_id}) {estado.value}: {resultado}")
+            
+        except Exception as e:
+            logger.error(
+                f"Error emitiendo certificados del curso {curso_id}: {str(e)}",
+                exc_info=True
+            )
+            try:
+                await db.rollback()
+                await job_service.finalizar(job_id, EstadoJob.FALLIDO, error=str(e), resultado=resultado)
+                await db.commit()
+            except Exception:
+                pass
+            raise
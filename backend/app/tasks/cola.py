@@ -0,0 +1,92 @@
+"""
+Registro de tareas de la cola durable.
+
+Cada tipo de tarea indica la función que la ejecuta, la cola en la que corre y
+cuántas veces se intenta antes de quedar FALLIDO. Las rutas encolan con
+`encolar()`, que solo inserta la fila en `job`; la ejecuta el worker
+(`python -m app.worker`), fuera del proceso de la API.
+"""
+
+import uuid
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import validate_call
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import models
+from app.services.job_service import JobService
+from app.tasks.admin_tasks import generar_reporte_masivo, limpiar_datos_antiguos, reset_intentos_masivo
+from app.tasks.certificate_tasks import emitir_certificados_curso, generar_certificado_background
+from app.tasks.email_tasks import (
+    campana_recordatorio_progreso,
+    enviar_email_bienvenida,
+    enviar_email_certificado_listo,
+    enviar_email_recordatorio_progreso,
+)
+
+COLA_CERTIFICADOS = "certificados"
+COLA_EMAILS = "emails"
+COLA_ADMIN = "admin"
+
+
+@dataclass(frozen=True)
+class Tarea:
+    """Tipo de tarea encolable."""
+    funcion: Callable[..., Awaitable[Any]]
+    cola: str
+    max_intentos: int = 1
+    # Las tareas administrativas reportan progreso en su propio job y lo reciben
+    # como primer argumento
+    recibe_job_id: bool = False
+
+    async def ejecutar(self, job_id: uuid.UUID, parametros: Optional[dict]) -> None:
+        """Ejecutar la función con los parámetros guardados en el job (JSON)."""
+        # validate_call convierte los valores JSON a los tipos anotados (UUID, listas, ...)
+        funcion = validate_call(self.funcion)
+        args = (job_id,) if self.recibe_job_id else ()
+        await funcion(*args, **(parametros or {}))
+
+
+TAREAS: Dict[str, Tarea] = {
+    "generar_certificado": Tarea(generar_certificado_background, COLA_CERTIFICADOS, max_intentos=5),
+    "emitir_certificados_curso": Tarea(emitir_certificados_curso, COLA_CERTIFICADOS, max_intentos=3, recibe_job_id=True),
+    "enviar_email_bienvenida": Tarea(enviar_email_bienvenida, COLA_EMAILS, max_intentos=8),
+    "enviar_email_certificado_listo": Tarea(enviar_email_certificado_listo, COLA_EMAILS, max_intentos=8),
+    "enviar_email_recordatorio_progreso": Tarea(enviar_email_recordatorio_progreso, COLA_EMAILS, max_intentos=8),
+    # Un solo intento: reintentar la campaña completa volvería a escribir a quienes ya la recibieron
+    "campana_recordatorio_progreso": Tarea(campana_recordatorio_progreso, COLA_EMAILS, max_intentos=1, recibe_job_id=True),
+    "reset_intentos_masivo": Tarea(reset_intentos_masivo, COLA_ADMIN, max_intentos=3, recibe_job_id=True),
+    "limpiar_datos_antiguos": Tarea(limpiar_datos_antiguos, COLA_ADMIN, max_intentos=5, recibe_job_id=True),
+    "generar_reporte_masivo": Tarea(generar_reporte_masivo, COLA_ADMIN, max_intentos=3, recibe_job_id=True),
+}
+
+
+async def encolar(
+    db: AsyncSession,
+    tipo: str,
+    parametros: Optional[dict] = None,
+    creado_por: Optional[uuid.UUID] = None,
+    clave_unica: Optional[str] = None,
+) -> models.Job:
+    """
+    Registrar una tarea en su cola. Confirma la transacción de `db`.
+
+    Con `clave_unica`, mientras haya una tarea pendiente o en proceso con esa
+    clave se retorna esa tarea en lugar de encolar otra.
+
+    Raises:
+        ValueError: Si el tipo de tarea no está registrado
+    """
+    tarea = TAREAS.get(tipo)
+    if tarea is None:
+        raise ValueError(f"Tipo de tarea no registrado: {tipo}")
+    return await JobService(db).crear_job(
+        tipo=tipo,
+        parametros=jsonable_encoder(parametros) if parametros else None,
+        creado_por=creado_por,
+        cola=tarea.cola,
+        max_intentos=tarea.max_intentos,
+        clave_unica=clave_unica,
+    )
@@ -1,21 +1,34 @@
 """
 Tareas de background para envío de emails.
 
-Incluye retry logic simple (3 intentos con backoff exponencial).
+Se ejecutan en la cola durable `emails` (ver app.tasks.cola): un envío fallido
+lanza la excepción y la cola reintenta con backoff exponencial. Los casos que no
+mejoran al reintentar (usuario sin email, certificado sin folio) solo se registran.
+
+Los emails de bienvenida y de certificado listo no se envían aquí: se registran
+en la bandeja de salida (ver app.services.email_outbox_service) con su clave de
+idempotencia, así que encolar la tarea dos veces no duplica el email.
+
+La campaña de recordatorios de progreso lee a los alumnos inactivos con una sola
+consulta y un cursor del servidor, y los envía con el despachador concurrente a
+medida que llegan los lotes.
 """
 
+import itertools
 import logging
-import asyncio
 import uuid
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional
 
 from app.utils.background_tasks import get_background_db_session
+from app.services.email_dispatcher import MensajeEmail, ResultadoEnvio
 from app.services.email_service import get_email_service
-from app.utils.email_templates import (
-    template_bienvenida,
-    template_certificado_listo,
-    template_recordatorio_progreso
-)
+from app.services.email_outbox_service import EmailOutboxService, email_bienvenida, email_certificado_listo
+from app.services.job_service import JobService
+from app.services.preferencia_service import PreferenciaService
+from app.services.progreso_service import ProgresoService, TAMANO_CHUNK_RECORDATORIOS
+from app.utils.email_templates import RECORDATORIO_PROGRESO
+from app.database.enums import EstadoJob
 from app.database.models import Usuario, InscripcionCurso, Certificado, Curso
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
@@ -23,64 +36,24 @@ from sqlalchemy.orm import selectinload
 logger = logging.getLogger(__name__)
 
 
-async def _send_email_with_retry(
-    to_email: str,
-    subject: str,
-    body_html: str,
-    body_text: str,
-    max_retries: int = 3,
-    initial_delay: float = 1.0
-) -> bool:
+async def _send_email(to_email: str, subject: str, body_html: str, body_text: str) -> None:
     """
-    Enviar email con retry logic simple.
+    Enviar un email con el servicio compartido (límite de tasa y reintentos con jitter).
     
-    Args:
-        to_email: Email del destinatario
-        subject: Asunto
-        body_html: Cuerpo HTML
-        body_text: Cuerpo texto
-        max_retries: Número máximo de intentos
-        initial_delay: Delay inicial en segundos (se duplica en cada intento)
-        
-    Returns:
-        True si se envió exitosamente, False si falló después de todos los intentos
+    Raises:
+        EBSException: Si el envío falla; la cola reintenta la tarea con backoff
     """
-    email_service = get_email_service()
-    
-    for attempt in range(1, max_retries + 1):
-        try:
-            success = email_service.send_email(
-                to_email=to_email,
-                subject=subject,
-                body_html=body_html,
-                body_text=body_text
-            )
-            if success:
-                logger.info(f"Email sent successfully to {to_email} (attempt {attempt})")
-                return True
-            else:
-                logger.warning(f"Email service returned False for {to_email} (attempt {attempt})")
-        except Exception as e:
-            logger.warning(
-                f"Error sending email to {to_email} (attempt {attempt}/{max_retries}): {str(e)}"
-            )
-            
-            if attempt < max_retries:
-                delay = initial_delay * (2 ** (attempt - 1))
-                logger.info(f"Retrying email to {to_email} in {delay} seconds...")
-                await asyncio.sleep(delay)
-            else:
-                logger.error(
-                    f"Failed to send email to {to_email} after {max_retries} attempts: {str(e)}",
-                    exc_info=True
-                )
-    
-    return False
+    await get_email_service().send_email(
+        to_email=to_email,
+        subject=subject,
+        body_html=body_html,
+        body_text=body_text
+    )
 
 
 async def enviar_email_bienvenida(usuario_id: uuid.UUID):
     """
-    Enviar email de bienvenida a un nuevo usuario.
+    Registrar el email de bienvenida de un nuevo usuario en la bandeja de salida.
     
     Args:
         usuario_id: ID del usuario
@@ -99,25 +72,20 @@ async def enviar_email_bienvenida(usuario_id: uuid.UUID):
                 logger.warning(f"Usuario {usuario_id} no tiene email configurado")
                 return
             
-            body_html, body_text = template_bienvenida(usuario.nombre)
-            
-            await _send_email_with_retry(
-                to_email=usuario.email,
-                subject="¡Bienvenido a Escuela Bíblica Salem!",
-                body_html=body_html,
-                body_text=body_text
-            )
+            await EmailOutboxService(db).agregar([email_bienvenida(usuario.id, usuario.email, usuario.nombre)])
+            await db.commit()
             
         except Exception as e:
             logger.error(
                 f"Error en tarea de email de bienvenida para usuario {usuario_id}: {str(e)}",
                 exc_info=True
             )
+            raise
 
 
 async def enviar_email_certificado_listo(certificado_id: uuid.UUID, certificado_url: Optional[str] = None):
     """
-    Enviar email notificando que un certificado está listo.
+    Registrar el email de certificado listo en la bandeja de salida.
     
     Args:
         certificado_id: ID del certificado
@@ -152,25 +120,18 @@ async def enviar_email_certificado_listo(certificado_id: uuid.UUID, certificado_
                 logger.warning(f"Certificado {certificado_id} no tiene folio asignado")
                 return
             
-            body_html, body_text = template_certificado_listo(
-                usuario_nombre=usuario.nombre,
-                curso_titulo=curso.titulo,
-                folio=certificado.folio,
-                certificado_url=certificado_url
-            )
-            
-            await _send_email_with_retry(
-                to_email=usuario.email,
-                subject=f"Tu certificado de {curso.titulo} está listo",
-                body_html=body_html,
-                body_text=body_text
-            )
+            email = email_certificado_listo(certificado.id, usuario.email, usuario.nombre, curso.titulo, certificado.folio)
+            if certificado_url:
+                email.parametros["certificado_url"] = certificado_url
+            await EmailOutboxService(db).agregar([email])
+            await db.commit()
             
         except Exception as e:
             logger.error(
                 f"Error en tarea de email de certificado listo para certificado {certificado_id}: {str(e)}",
                 exc_info=True
             )
+            raise
 
 
 async def enviar_email_recordatorio_progreso(inscripcion_id: uuid.UUID, progreso_porcentaje: float):
@@ -205,15 +166,19 @@ async def enviar_email_recordatorio_progreso(inscripcion_id: uuid.UUID, progreso
                 logger.warning(f"Usuario {usuario.id} no tiene email configurado")
                 return
             
-            body_html, body_text = template_recordatorio_progreso(
-                usuario_nombre=usuario.nombre,
-                curso_titulo=curso.titulo,
-                progreso_porcentaje=progreso_porcentaje
-            )
+            if not await PreferenciaService(db).filtrar_suscritos([usuario.id], "email_recordatorios"):
+                logger.info(f"Usuario {usuario.id} desactivó los recordatorios; no se envía")
+                return
             
-            await _send_email_with_retry(
+            subject, body_html, body_text = RECORDATORIO_PROGRESO.renderizar({
+                "usuario_nombre": usuario.nombre,
+                "curso_titulo": curso.titulo,
+                "progreso_porcentaje": progreso_porcentaje
+            })
+            
+            await _send_email(
                 to_email=usuario.email,
-                subject=f"Continúa tu progreso en {curso.titulo}",
+                subject=subject,
                 body_html=body_html,
                 body_text=body_text
             )
@@ -223,4 +188,99 @@ async def enviar_email_recordatorio_progreso(inscripcion_id: uuid.UUID, progreso
                 f"Error en tarea de email de recordatorio para inscripción {inscripcion_id}: {str(e)}",
                 exc_info=True
             )
+            raise
+
+
+class _CampanaCancelada(Exception):
+    pass
+
 
+async def campana_recordatorio_progreso(
+    job_id: uuid.UUID,
+    dias_inactividad: int = 14,
+    curso_id: Optional[uuid.UUID] = None,
+    tamano_chunk: int = TAMANO_CHUNK_RECORDATORIOS,
+):
+    """
+    Enviar el recordatorio de progreso a todos los alumnos inactivos.
+    
+    Una sola consulta (ver ProgresoService.iterar_inscripciones_inactivas) trae las
+    inscripciones activas sin intentos finalizados en `dias_inactividad` días, ya
+    filtradas por la preferencia email_recordatorios y con su progreso calculado;
+    se lee con un cursor del servidor por lotes. Cada lote se renderiza por curso
+    (el curso se fija una vez en la plantilla) y alimenta al despachador, que envía
+    en paralelo con el límite de tasa; la lectura avanza a medida que se envía. El
+    progreso del job se registra por lote de resultados en una sesión aparte (la
+    del cursor mantiene su transacción abierta) y una cancelación detiene el envío.
+    
+    Args:
+        job_id: ID del registro de job; al terminar, su resultado indica enviados y fallidos
+        dias_inactividad: Días sin actividad para recibir el recordatorio
+        curso_id: Opcional, solo las inscripciones de este curso
+        tamano_chunk: Filas por lote leído
+    """
+    inactivas_desde = datetime.now(timezone.utc) - timedelta(days=dias_inactividad)
+    resultado = {"enviados": 0, "fallidos": 0}
+    email_service = get_email_service()
+    
+    async with get_background_db_session() as db, get_background_db_session() as db_job:
+        job_service = JobService(db_job)
+        try:
+            logger.info(
+                f"Iniciando campaña de recordatorios (job {job_id}): "
+                f"dias_inactividad={dias_inactividad}, curso_id={curso_id}"
+            )
+            if await job_service.iniciar(job_id):
+                raise _CampanaCancelada()
+            await db_job.commit()
+            
+            async def mensajes() -> AsyncIterator[MensajeEmail]:
+                lotes = ProgresoService(db).iterar_inscripciones_inactivas(inactivas_desde, curso_id, tamano_chunk)
+                async for lote in lotes:
+                    for _, filas in itertools.groupby(lote, key=lambda f: f["curso_id"]):
+                        filas = list(filas)
+                        renderizados = RECORDATORIO_PROGRESO.renderizar_lote(
+                            (
+                                {"usuario_nombre": f["nombre"], "progreso_porcentaje": f["progreso_porcentaje"]}
+                                for f in filas
+                            ),
+                            comunes={"curso_titulo": filas[0]["curso_titulo"]},
+                        )
+                        for fila, (asunto, body_html, body_text) in zip(filas, renderizados):
+                            yield email_service.mensaje(
+                                fila["email"], asunto, body_html, body_text, referencia=fila["inscripcion_id"]
+                            )
+            
+            async def registrar(resultados: List[ResultadoEnvio]) -> None:
+                enviados = sum(1 for r in resultados if r.enviado)
+                resultado["enviados"] += enviados
+                resultado["fallidos"] += len(resultados) - enviados
+                cancelado = await job_service.registrar_progreso(job_id, len(resultados))
+                await db_job.commit()
+                if cancelado:
+                    raise _CampanaCancelada()
+            
+            await email_service.send_bulk_email(mensajes(), al_registrar=registrar, tamano_registro=tamano_chunk)
+            
+            await job_service.finalizar(job_id, EstadoJob.COMPLETADO, resultado=resultado)
+            await db_job.commit()
+            logger.info(f"Campaña de recordatorios (job {job_id}) terminada: {resultado}")
+            
+        except _CampanaCancelada:
+            await db_job.rollback()
+            await job_service.finalizar(job_id, EstadoJob.CANCELADO, resultado=resultado)
+            await db_job.commit()
+            logger.info(f"Campaña de recordatorios (job {job_id}) cancelada: {resultado}")
+            
+        except Exception as e:
+            logger.error(
+                f"Error en la campaña de recordatorios (job {job_id}): {str(e)}",
+                exc_info=True
+            )
+            try:
+                await db_job.rollback()
+                await job_service.finalizar(job_id, EstadoJob.FALLIDO, error=str(e), resultado=resultado)
+                await db_job.commit()
+            except Exception:
+                pass
+            raise
@@ -0,0 +1,155 @@
+"""
+Barrido de intentos abandonados.
+
+Los intentos de un quiz/examen con tiempo límite tienen `expira_en`. Si el alumno
+no los envía, este barrido los finaliza con las respuestas guardadas hasta ese
+momento, calificándolos con las mismas reglas que el envío normal.
+
+El barrido recorre el índice parcial idx_intento_expira_activo en lotes y toma
+los intentos con FOR UPDATE SKIP LOCKED, de modo que varios workers pueden
+ejecutarlo a la vez sin bloquearse ni finalizar dos veces el mismo intento.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database.enums import ResultadoIntento
+from app.database.models import Intento
+from app.services.autosave_service import get_autosave_service, publicar_intentos_finalizados
+from app.utils.background_tasks import get_background_db_session
+from app.utils.exceptions import EBSException
+
+logger = logging.getLogger(__name__)
+
+MIN_SCORE_POR_DEFECTO = Decimal("80.00")
+
+# Misma agregación que QuizService.calcular_puntaje, para todo el lote a la vez
+_SQL_PUNTAJES_LOTE = text("""
+    SELECT
+        ip.intento_id,
+        COALESCE(SUM(rce.puntos_otorgados), 0) AS puntaje_total,
+        COALESCE(SUM(ip.puntos_maximos), 0) AS puntaje_maximo
+    FROM intento_pregunta ip
+    LEFT JOIN respuesta r ON r.intento_pregunta_id = ip.id
+    LEFT JOIN respuesta_con_evaluacion rce ON rce.id = r.id
+    WHERE ip.intento_id = ANY(CAST(:intento_ids AS uuid[]))
+    GROUP BY ip.intento_id
+""")
+
+
+async def _puntajes_lote(db: AsyncSession, intento_ids: List[uuid.UUID]) -> Dict[uuid.UUID, Tuple[Decimal, Decimal]]:
+    result = await db.execute(_SQL_PUNTAJES_LOTE, {"intento_ids": intento_ids})
+    return {
+        row.intento_id: (Decimal(str(row.puntaje_total)), Decimal(str(row.puntaje_maximo)))
+        for row in result
+    }
+
+
+async def _min_score(
+    db: AsyncSession,
+    intento: Intento,
+    cache: Dict[uuid.UUID, Decimal],
+) -> Decimal:
+    """Puntaje mínimo aprobatorio del quiz/examen del intento, cacheado durante el barrido."""
+    evaluacion_id = intento.quiz_id or intento.examen_final_id
+    if evaluacion_id in cache:
+        return cache[evaluacion_id]
+
+    # Importación diferida: los servicios de evaluación importan el de autoguardado
+    from app.services.quiz_service import QuizService
+    from app.services.examen_final_service import ExamenFinalService
+
+    try:
+        if intento.quiz_id:
+            min_score = await QuizService(db).get_min_score_aprobatorio(intento.quiz_id)
+        else:
+            min_score = await ExamenFinalService(db).get_min_score_aprobatorio(intento.examen_final_id)
+    except EBSException as e:
+        logger.warning(f"Sin regla de acreditación para {evaluacion_id}, se usa el mínimo por defecto: {e}")
+        min_score = MIN_SCORE_POR_DEFECTO
+
+    cache[evaluacion_id] = min_score
+    return min_score
+
+
+async def finalizar_intentos_expirados(
+    tamano_lote: int = 200,
+    margen_segundos: float = 0.0,
+) -> int:
+    """
+    Finalizar y calificar los intentos abiertos cuyo tiempo límite ya venció.
+
+    Args:
+        tamano_lote: Intentos tomados y confirmados por transacción
+        margen_segundos: Espera adicional tras expira_en para que los borradores
+            pendientes de otros workers lleguen a la BD
+
+    Returns:
+        Número de intentos finalizados
+    """
+    # Los borradores de este worker deben estar en la BD antes de calificar
+    await get_autosave_service().flush()
+
+    total = 0
+    min_scores: Dict[uuid.UUID, Decimal] = {}
+
+    while True:
+        async with get_background_db_session() as db:
+            corte = datetime.now(timezone.utc) - timedelta(seconds=margen_segundos)
+            stmt = (
+                select(Intento)
+                .where(
+                    Intento.finalizado_en.is_(None),
+                    Intento.expira_en <= corte,
+                )
+                .order_by(Intento.expira_en)
+                .limit(tamano_lote)
+                .with_for_update(skip_locked=True)
+            )
+            intentos = (await db.execute(stmt)).scalars().all()
+            if not intentos:
+                break
+
+            puntajes = await _puntajes_lote(db, [intento.id for intento in intentos])
+            ahora = datetime.now(timezone.utc)
+
+            for intento in intentos:
+                puntaje_total, puntaje_maximo = puntajes.get(intento.id, (Decimal("0"), Decimal("0")))
+                porcentaje = (puntaje_total / puntaje_maximo * 100) if puntaje_maximo > 0 else Decimal("0")
+                aprobado = porcentaje >= await _min_score(db, intento, min_scores)
+
+                intento.finalizado_en = ahora
+                intento.puntaje = float(porcentaje)
+                intento.resultado = ResultadoIntento.APROBADO if aprobado else ResultadoIntento.NO_APROBADO
+
+            await publicar_intentos_finalizados(db, [intento.id for intento in intentos])
+            await db.commit()
+            total += len(intentos)
+
+        if len(intentos) < tamano_lote:
+            break
+
+    if total:
+        logger.info(f"Barrido de intentos expirados: {total} intentos finalizados")
+    return total
+
+
+async def loop_barrido_intentos_expirados() -> None:
+    """Ejecutar el barrido periódicamente; se cancela al apagar la aplicación."""
+    while True:
+        await asyncio.sleep(settings.intento_sweep_interval_seconds)
+        try:
+            await finalizar_intentos_expirados(
+                tamano_lote=settings.intento_sweep_batch_size,
+                margen_segundos=settings.intento_sweep_grace_seconds,
+            )
+        except Exception as e:
+            logger.error(f"Error en barrido de intentos expirados: {e}", exc_info=True)
@@ -0,0 +1,205 @@
+"""
+Pruebas de las tareas administrativas masivas.
+
+Requieren una base de datos PostgreSQL inicializada con database/init.sql y
+database/trigger.init.sql, indicada en TEST_DATABASE_URL.
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import models
+from app.database.enums import EstadoJob
+from app.services.job_service import JobService
+from app.tasks import admin_tasks
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+ALUMNOS = 25
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL,
+    reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL",
+)
+
+
+async def _crear_curso_con_intentos(session_factory) -> dict:
+    """Curso con un quiz y ALUMNOS inscripciones, cada una con un intento finalizado."""
+    ids = {
+        "curso_id": uuid.uuid4(),
+        "modulo_id": uuid.uuid4(),
+        "leccion_id": uuid.uuid4(),
+        "quiz_id": uuid.uuid4(),
+        "usuario_ids": [uuid.uuid4() for _ in range(ALUMNOS)],
+    }
+    async with session_factory() as db:
+        db.add(models.Curso(id=ids["curso_id"], titulo="Curso reset", publicado=True))
+        db.add(models.Modulo(
+            id=ids["modulo_id"],
+            titulo="Módulo reset",
+            fecha_inicio=date(2020, 1, 1),
+            fecha_fin=date(2099, 1, 1),
+            publicado=True,
+        ))
+        for usuario_id in ids["usuario_ids"]:
+            db.add(models.Usuario(id=usuario_id, nombre="Reset", apellido="Test", email=f"reset-{usuario_id}@example.com"))
+        await db.flush()
+        db.add(models.ModuloCurso(modulo_id=ids["modulo_id"], curso_id=ids["curso_id"], slot=1))
+        db.add(models.Leccion(id=ids["leccion_id"], modulo_id=ids["modulo_id"], titulo="Lección reset", orden=1))
+        await db.flush()
+        db.add(models.Quiz(id=ids["quiz_id"], leccion_id=ids["leccion_id"], titulo="Quiz reset", publicado=True))
+        for usuario_id in ids["usuario_ids"]:
+            inscripcion_id = uuid.uuid4()
+            db.add(models.InscripcionCurso(
+                id=inscripcion_id,
+                usuario_id=usuario_id,
+                curso_id=ids["curso_id"],
+                fecha_inscripcion=date.today(),
+            ))
+            await db.flush()
+            db.add(models.Intento(
+                usuario_id=usuario_id,
+                inscripcion_curso_id=inscripcion_id,
+                quiz_id=ids["quiz_id"],
+                numero_intento=1,
+                finalizado_en=datetime.now(timezone.utc),
+            ))
+        await db.commit()
+    return ids
+
+
+async def _eliminar_curso(session_factory, ids: dict) -> None:
+    async with session_factory() as db:
+        await db.execute(delete(models.Intento).where(models.Intento.quiz_id == ids["quiz_id"]))
+        await db.execute(delete(models.InscripcionCurso).where(models.InscripcionCurso.curso_id == ids["curso_id"]))
+        await db.execute(delete(models.Quiz).where(models.Quiz.id == ids["quiz_id"]))
+        await db.execute(delete(models.Leccion).where(models.Leccion.id == ids["leccion_id"]))
+        await db.execute(delete(models.ModuloCurso).where(models.ModuloCurso.modulo_id == ids["modulo_id"]))
+        await db.execute(delete(models.Modulo).where(models.Modulo.id == ids["modulo_id"]))
+        await db.execute(delete(models.Curso).where(models.Curso.id == ids["curso_id"]))
+        await db.execute(delete(models.Job).where(models.Job.parametros["curso_id"].astext == str(ids["curso_id"])))
+        await db.execute(delete(models.Usuario).where(models.Usuario.id.in_(ids["usuario_ids"])))
+        await db.commit()
+
+
+def _run_con_curso(escenario, monkeypatch) -> None:
+    async def runner() -> None:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        monkeypatch.setattr(admin_tasks, "get_background_db_session", session_factory)
+        ids = await _crear_curso_con_intentos(session_factory)
+        try:
+            await escenario(session_factory, ids)
+        finally:
+            await _eliminar_curso(session_factory, ids)
+            await engine.dispose()
+
+    asyncio.run(runner())
+
+
+async def _crear_job(session_factory, ids: dict) -> uuid.UUID:
+    async with session_factory() as db:
+        job = await JobService(db).crear_job("reset_intentos_masivo", {"curso_id": str(ids["curso_id"])})
+        return job.id
+
+
+def test_reset_por_curso_en_lotes_reporta_progreso(monkeypatch) -> None:
+    async def escenario(session_factory, ids: dict) -> None:
+        job_id = await _crear_job(session_factory, ids)
+        await admin_tasks.reset_intentos_masivo(job_id, curso_id=ids["curso_id"], tamano_lote=10)
+
+        async with session_factory() as db:
+            job = await JobService(db).get_job(job_id)
+            assert job.estado == EstadoJob.COMPLETADO
+            assert (job.total, job.procesados) == (ALUMNOS, ALUMNOS)
+            permitidos = (await db.execute(
+                select(models.Intento.permitir_nuevo_intento).where(models.Intento.quiz_id == ids["quiz_id"])
+            )).scalars().all()
+            assert permitidos == [True] * ALUMNOS
+
+    _run_con_curso(escenario, monkeypatch)
+
+
+def test_reset_cancelado_no_modifica_intentos(monkeypatch) -> None:
+    async def escenario(session_factory, ids: dict) -> None:
+        job_id = await _crear_job(session_factory, ids)
+        async with session_factory() as db:
+            await JobService(db).solicitar_cancelacion(job_id)
+
+        await admin_tasks.reset_intentos_masivo(job_id, curso_id=ids["curso_id"], tamano_lote=10)
+
+        async with session_factory() as db:
+            job = await JobService(db).get_job(job_id)
+            assert job.estado == EstadoJob.CANCELADO
+            assert job.procesados == 0
+            permitidos = (await db.execute(
+                select(models.Intento.permitir_nuevo_intento).where(models.Intento.quiz_id == ids["quiz_id"])
+            )).scalars().all()
+            assert not any(permitidos)
+
+    _run_con_curso(escenario, monkeypatch)
+
+
+def test_limpieza_reanuda_desde_checkpoint_y_archiva(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(admin_tasks.settings, "retention_archive_dir", str(tmp_path))
+    monkeypatch.setattr(admin_tasks.settings, "retention_batch_pause_seconds", 0)
+
+    llamadas = []
+
+    async def caida_tras_primer_lote(db, limite) -> None:
+        llamadas.append(1)
+        if len(llamadas) == 1:
+            raise RuntimeError("caída simulada")
+
+    async def escenario(session_factory, ids: dict) -> None:
+        async with session_factory() as db:
+            await db.execute(
+                update(models.Intento)
+                .where(models.Intento.quiz_id == ids["quiz_id"])
+                .values(creado_en=datetime.now(timezone.utc) - timedelta(days=400))
+            )
+            job = await JobService(db).crear_job("limpiar_datos_antiguos")
+            job_id = job.id
+            await db.commit()
+
+        parametros = dict(dias_antiguedad=365, eliminar_intentos=True, archivar=True, tamano_lote=10)
+        monkeypatch.setattr(admin_tasks, "_esperar_replicacion", caida_tras_primer_lote)
+        with pytest.raises(RuntimeError):
+            await admin_tasks.limpiar_datos_antiguos(job_id, **parametros)
+
+        async with session_factory() as db:
+            job = await JobService(db).get_job(job_id)
+            assert job.estado == EstadoJob.FALLIDO
+            assert (job.procesados, job.checkpoint["lote"]) == (10, 1)
+
+        await admin_tasks.limpiar_datos_antiguos(job_id, **parametros)
+
+        async with session_factory() as db:
+            job = await JobService(db).get_job(job_id)
+            assert job.estado == EstadoJob.COMPLETADO
+            assert job.procesados == ALUMNOS
+            restantes = (await db.execute(
+                select(models.Intento.id).where(models.Intento.quiz_id == ids["quiz_id"])
+            )).scalars().all()
+            assert restantes == []
+            await db.execute(delete(models.Job).where(models.Job.id == job_id))
+            await db.commit()
+
+        archivos = sorted((tmp_path / str(job_id)).iterdir())
+        assert [a.name for a in archivos] == [
+            f"intentos-{lote:06d}-intento.jsonl.gz" for lote in range(3)
+        ]
+        archivados = set()
+        for archivo in archivos:
+            with gzip.open(archivo, "rt", encoding="utf-8") as f:
+                archivados.update(json.loads(linea)["id"] for linea in f)
+        assert len(archivados) == ALUMNOS
+
+    _run_con_curso(escenario, monkeypatch)
@@ -0,0 +1,92 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.database.enums import TipoPregunta
+from app.services.autosave_service import AutosaveService, _IntentoAbierto
+from app.utils.exceptions import AuthorizationError, BusinessRuleError, ValidationError
+
+
+def _servicio_con_intento(usuario_id: uuid.UUID, intento_id: uuid.UUID, preguntas: dict) -> AutosaveService:
+    """AutosaveService con el intento ya cacheado, para no requerir BD."""
+    service = AutosaveService(tamano_lote=10_000, max_pendientes=10_000)
+    service._intentos[intento_id] = _IntentoAbierto(
+        usuario_id=usuario_id,
+        quiz_id=None,
+        examen_final_id=uuid.uuid4(),
+        preguntas=preguntas,
+    )
+    return service
+
+
+def test_last_draft_per_question_wins() -> None:
+    usuario_id, intento_id = uuid.uuid4(), uuid.uuid4()
+    pregunta_id, intento_pregunta_id = uuid.uuid4(), uuid.uuid4()
+    service = _servicio_con_intento(
+        usuario_id, intento_id, {pregunta_id: (intento_pregunta_id, TipoPregunta.VERDADERO_FALSO)}
+    )
+
+    async def escenario() -> None:
+        for valor in (True, False, True):
+            guardadas = await service.guardar_borrador(
+                None, intento_id, usuario_id, [{"pregunta_id": pregunta_id, "respuesta_bool": valor}]
+            )
+            assert guardadas == 1
+
+    asyncio.run(escenario())
+    assert service.pendientes == 1
+    assert service._borradores[(intento_id, intento_pregunta_id)] == [
+        {"pregunta_id": pregunta_id, "respuesta_bool": True}
+    ]
+
+
+def test_draft_rejected_for_other_user() -> None:
+    intento_id, pregunta_id = uuid.uuid4(), uuid.uuid4()
+    service = _servicio_con_intento(uuid.uuid4(), intento_id, {pregunta_id: (uuid.uuid4(), None)})
+
+    with pytest.raises(AuthorizationError):
+        asyncio.run(service.guardar_borrador(
+            None, intento_id, uuid.uuid4(), [{"pregunta_id": pregunta_id, "respuesta_texto": "x"}]
+        ))
+    assert service.pendientes == 0
+
+
+def test_draft_validated_against_question_type() -> None:
+    usuario_id, intento_id, pregunta_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    service = _servicio_con_intento(
+        usuario_id, intento_id, {pregunta_id: (uuid.uuid4(), TipoPregunta.OPCION_MULTIPLE)}
+    )
+
+    with pytest.raises(ValidationError):
+        asyncio.run(service.guardar_borrador(
+            None, intento_id, usuario_id, [{"pregunta_id": pregunta_id, "respuesta_texto": "x"}]
+        ))
+    assert service.pendientes == 0
+
+
+def test_finalized_attempt_leaves_cache_and_drops_its_drafts() -> None:
+    usuario_id, intento_id, otro_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    pregunta_id, intento_pregunta_id = uuid.uuid4(), uuid.uuid4()
+    service = _servicio_con_intento(
+        usuario_id, intento_id, {pregunta_id: (intento_pregunta_id, TipoPregunta.VERDADERO_FALSO)}
+    )
+    service._borradores[(intento_id, intento_pregunta_id)] = [{"pregunta_id": pregunta_id, "respuesta_bool": True}]
+    service._borradores[(otro_id, uuid.uuid4())] = [{"respuesta_bool": False}]
+
+    assert service.olvidar_intentos([intento_id]) == 1
+    assert intento_id not in service._intentos
+    assert service.pendientes == 1
+
+    class _DB:
+        async def execute(self, *args, **kwargs) -> SimpleNamespace:
+            return SimpleNamespace(fetchall=lambda: [SimpleNamespace(finalizado_en=datetime.now(timezone.utc))])
+
+    # Sin caché, el siguiente borrador vuelve a leer el intento y lo ve finalizado
+    with pytest.raises(BusinessRuleError):
+        asyncio.run(service.guardar_borrador(
+            _DB(), intento_id, usuario_id, [{"pregunta_id": pregunta_id, "respuesta_bool": False}]
+        ))
+    assert service.pendientes == 1
@@ -0,0 +1,444 @@
+"""
+Pruebas del motor de renderizado de certificados y de la emisión por curso.
+
+La prueba de emisión requiere PostgreSQL inicializado con database/init.sql,
+indicado en TEST_DATABASE_URL; S3 se reemplaza por un almacenamiento en memoria.
+"""
+
+import asyncio
+import os
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import models
+from app.database.enums import EstadoJob, ResultadoIntento
+from app.services import certificate_renderer
+from app.services.certificate_renderer import DatosCertificado, MotorRenderizado
+from app.services.certificate_service import CertificateService
+from app.services.job_service import JobService
+from app.tasks import certificate_tasks
+from app.utils.exceptions import EBSException
+from app.utils.vuelo_unico import VueloUnico
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def _datos(n: int):
+    return [
+        DatosCertificado("Alumno", f"Número {i}", "Curso de prueba", f"CERT-TEST-{i:04d}", referencia=i)
+        for i in range(n)
+    ]
+
+
+def test_lote_en_procesos_entrega_todos_los_pdfs() -> None:
+    async def escenario():
+        motor = MotorRenderizado(procesos=2, max_pendientes=2)
+        try:
+            return [r async for r in motor.renderizar_lote(_datos(4))]
+        finally:
+            motor.cerrar()
+
+    resultados = asyncio.run(escenario())
+    assert sorted(r.datos.referencia for r in resultados) == [0, 1, 2, 3]
+    assert all(r.error is None and r.pdf.startswith(b"%PDF") for r in resultados)
+
+
+def test_lote_aplica_contrapresion_y_aisla_errores(monkeypatch) -> None:
+    generar = certificate_renderer.generar_pdf_certificado
+
+    def falla_en_el_tercero(nombre, apellido, curso, folio, fecha):
+        if folio == "CERT-TEST-0003":
+            raise RuntimeError("plantilla rota")
+        return generar(nombre, apellido, curso, folio, fecha)
+
+    monkeypatch.setattr(certificate_renderer, "generar_pdf_certificado", falla_en_el_tercero)
+    max_pendientes, procesos = 2, 2
+    producidos = []
+    adelanto_maximo = 0
+
+    def productor():
+        for datos in _datos(20):
+            producidos.append(datos)
+            yield datos
+
+    async def escenario():
+        nonlocal adelanto_maximo
+        motor = MotorRenderizado(procesos=procesos, max_pendientes=max_pendientes, usar_procesos=False)
+        resultados = []
+        try:
+            async for resultado in motor.renderizar_lote(productor()):
+                resultados.append(resultado)
+                adelanto_maximo = max(adelanto_maximo, len(producidos) - len(resultados))
+                # Consumidor lento: el productor debe esperar en lugar de adelantarse
+                await asyncio.sleep(0.01)
+        finally:
+            motor.cerrar()
+        return resultados
+
+    resultados = asyncio.run(escenario())
+    assert len(resultados) == 20
+    # Cola de entrada + elementos en el pool + cola de resultados (+1 esperando lugar)
+    assert adelanto_maximo <= 2 * max_pendientes + procesos + 1
+    fallidos = [r for r in resultados if r.error is not None]
+    assert [r.datos.referencia for r in fallidos] == [3]
+    assert "plantilla rota" in str(fallidos[0].error)
+
+
+def test_proceso_muerto_falla_su_certificado_y_recrea_el_pool() -> None:
+    async def escenario():
+        motor = MotorRenderizado(procesos=1)
+        try:
+            await motor.renderizar(_datos(1)[0])
+            roto = motor._executor
+            for proceso in list(roto._processes.values()):
+                proceso.kill()
+            with pytest.raises(BrokenProcessPool):
+                await motor.renderizar(_datos(1)[0])
+            # El siguiente certificado (p. ej. el reintento) usa un pool nuevo
+            pdf = await motor.renderizar(_datos(1)[0])
+            return roto, motor._executor, pdf
+        finally:
+            motor.cerrar()
+
+    roto, nuevo, pdf = asyncio.run(escenario())
+    assert nuevo is not roto and pdf.startswith(b"%PDF")
+
+
+async def _sembrar_curso(db, curso_id: uuid.UUID, usuario_ids: list, acreditadas: list) -> dict:
+    """Curso con examen final, una inscripción por usuario y las de `acreditadas` acreditadas."""
+    db.add(models.Curso(id=curso_id, titulo="Curso emisión", publicado=True))
+    for usuario_id in usuario_ids:
+        db.add(models.Usuario(id=usuario_id, nombre="Emisión", apellido="Test", email=f"emision-{usuario_id}@example.com"))
+    await db.flush()
+    examen_id = uuid.uuid4()
+    db.add(models.ExamenFinal(id=examen_id, curso_id=curso_id, titulo="Examen emisión", publicado=True))
+    inscripciones = {usuario_id: uuid.uuid4() for usuario_id in usuario_ids}
+    for usuario_id, inscripcion_id in inscripciones.items():
+        db.add(models.InscripcionCurso(
+            id=inscripcion_id, usuario_id=usuario_id, curso_id=curso_id, fecha_inscripcion=date.today()
+        ))
+    await db.flush()
+    # La acreditación exige un intento aprobado del examen final
+    for usuario_id in acreditadas:
+        db.add(models.Intento(
+            usuario_id=usuario_id,
+            examen_final_id=examen_id,
+            inscripcion_curso_id=inscripciones[usuario_id],
+            numero_intento=1,
+            puntaje=95,
+            resultado=ResultadoIntento.APROBADO,
+            finalizado_en=datetime.now(timezone.utc),
+        ))
+    await db.flush()
+    await db.execute(
+        update(models.InscripcionCurso)
+        .where(models.InscripcionCurso.usuario_id.in_(acreditadas), models.InscripcionCurso.curso_id == curso_id)
+        .values(acreditado=True)
+    )
+    return inscripciones
+
+
+async def _limpiar_curso(session_factory, curso_id: uuid.UUID, usuario_ids: list, job_id=None) -> None:
+    async with session_factory() as db:
+        if job_id:
+            await db.execute(delete(models.Job).where(models.Job.id == job_id))
+        await db.execute(delete(models.InscripcionCurso).where(models.InscripcionCurso.curso_id == curso_id))
+        await db.execute(delete(models.ExamenFinal).where(models.ExamenFinal.curso_id == curso_id))
+        await db.execute(delete(models.Curso).where(models.Curso.id == curso_id))
+        await db.execute(delete(models.Usuario).where(models.Usuario.id.in_(usuario_ids)))
+        await db.execute(delete(models.EmailOutbox).where(
+            models.EmailOutbox.destinatario.in_([f"emision-{u}@example.com" for u in usuario_ids])
+        ))
+        await db.commit()
+
+
+class _S3EnMemoria:
+    def __init__(self):
+        self.objetos = {}
+
+    async def upload_file(self, file_content, s3_key, content_type="application/octet-stream", metadata=None, max_size=None):
+        self.objetos[s3_key] = file_content
+        return s3_key
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL")
+def test_emitir_certificados_curso_solo_acreditados_pendientes(monkeypatch) -> None:
+    async def escenario() -> None:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        @asynccontextmanager
+        async def sesion():
+            async with session_factory() as db:
+                yield db
+
+        s3 = _S3EnMemoria()
+        monkeypatch.setattr(certificate_tasks, "get_background_db_session", sesion)
+        monkeypatch.setattr(certificate_tasks, "get_certificate_service", lambda: CertificateService(s3_service=s3))
+        monkeypatch.setattr(
+            certificate_tasks, "get_motor_renderizado", lambda: MotorRenderizado(procesos=2, usar_procesos=False)
+        )
+
+        curso_id = uuid.uuid4()
+        usuario_ids = [uuid.uuid4() for _ in range(7)]
+        # 5 acreditadas (una ya con certificado emitido) y 2 sin acreditar
+        acreditadas = usuario_ids[:5]
+        job_id = None
+        try:
+            async with session_factory() as db:
+                inscripciones = await _sembrar_curso(db, curso_id, usuario_ids, acreditadas)
+                db.add(models.Certificado(inscripcion_curso_id=inscripciones[acreditadas[0]], folio="CERT-PREVIO", s3_key="previo.pdf"))
+                # Pendiente de un intento fallido: conserva su folio
+                db.add(models.Certificado(inscripcion_curso_id=inscripciones[acreditadas[1]], folio="CERT-ASIGNADO", valido=False))
+                job = await JobService(db).crear_job("emitir_certificados_curso", {"curso_id": str(curso_id)})
+                job_id = job.id
+
+            await certificate_tasks.emitir_certificados_curso(job_id, curso_id, tamano_lote=3)
+
+            async with session_factory() as db:
+                job = await JobService(db).get_job(job_id)
+                assert job.estado == EstadoJob.COMPLETADO
+                assert (job.total, job.procesados) == (4, 4)
+                assert job.resultado == {"emitidos": 4, "errores": 0, "omitidos": 0}
+                certificados = (await db.execute(
+                    select(models.Certificado)
+                    .join(models.InscripcionCurso)
+                    .where(models.InscripcionCurso.curso_id == curso_id)
+                )).scalars().all()
+                emails = (await db.execute(
+                    select(models.EmailOutbox).where(
+                        models.EmailOutbox.destinatario.in_([f"emision-{u}@example.com" for u in usuario_ids])
+                    )
+                )).scalars().all()
+
+            assert len(certificados) == 5
+            nuevos = [c for c in certificados if c.folio != "CERT-PREVIO"]
+            assert all(c.valido and c.hash_verificacion and c.s3_key in s3.objetos for c in nuevos)
+            assert all(pdf.startswith(b"%PDF") for pdf in s3.objetos.values())
+            assert len({c.folio for c in nuevos}) == 4 and "CERT-ASIGNADO" in {c.folio for c in nuevos}
+            # Un email de certificado listo por cada certificado emitido, en la misma transacción
+            assert sorted(e.clave_idempotencia for e in emails) == sorted(f"certificado_listo:{c.id}" for c in nuevos)
+        finally:
+            await _limpiar_curso(session_factory, curso_id, usuario_ids, job_id)
+            await engine.dispose()
+
+    asyncio.run(escenario())
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL")
+def test_emision_vuelve_a_emitir_solo_los_folios_repetidos(monkeypatch) -> None:
+    async def escenario() -> None:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        @asynccontextmanager
+        async def sesion():
+            async with session_factory() as db:
+                yield db
+
+        s3 = _S3EnMemoria()
+        motor = _MotorContado()
+        certificate_service = CertificateService(s3_service=s3)
+        folios = iter(["CERT-REPETIDO", "CERT-NUEVO-1", "CERT-REPETIDO", "CERT-NUEVO-2", "CERT-NUEVO-3", "CERT-NUEVO-4"])
+        monkeypatch.setattr(certificate_service, "generate_folio", lambda: next(folios))
+        generar_hash = certificate_service.generate_hash_verification
+        # Otra restricción violada (hash ya usado): reintentar con otro folio no la arregla
+        monkeypatch.setattr(
+            certificate_service,
+            "generate_hash_verification",
+            lambda **kw: "HASH-REPETIDO" if kw["folio"] == "CERT-NUEVO-1" else generar_hash(**kw),
+        )
+        monkeypatch.setattr(certificate_tasks, "get_background_db_session", sesion)
+        monkeypatch.setattr(certificate_tasks, "get_certificate_service", lambda: certificate_service)
+        monkeypatch.setattr(certificate_tasks, "get_motor_renderizado", lambda: motor)
+
+        curso_id = uuid.uuid4()
+        usuario_ids = [uuid.uuid4() for _ in range(4)]
+        job_id = None
+        try:
+            async with session_factory() as db:
+                inscripciones = await _sembrar_curso(db, curso_id, usuario_ids, usuario_ids[:3])
+                # Otro certificado ya emitido con el folio que se va a repetir
+                db.add(models.Certificado(
+                    inscripcion_curso_id=inscripciones[usuario_ids[3]], folio="CERT-REPETIDO",
+                    hash_verificacion="HASH-REPETIDO", s3_key="previo.pdf",
+                ))
+                job = await JobService(db).crear_job("emitir_certificados_curso", {"curso_id": str(curso_id)})
+                job_id = job.id
+
+            with pytest.raises(EBSException):
+                await certificate_tasks.emitir_certificados_curso(job_id, curso_id, tamano_lote=10)
+
+            async with session_factory() as db:
+                job = await JobService(db).get_job(job_id)
+                certificados = (await db.execute(
+                    select(models.Certificado)
+                    .join(models.InscripcionCurso)
+                    .where(models.InscripcionCurso.usuario_id.in_(usuario_ids[:3]))
+                )).scalars().all()
+
+            assert job.resultado == {"emitidos": 2, "errores": 1, "omitidos": 0}
+            emitidos = [c for c in certificados if c.s3_key]
+            assert sorted(c.folio for c in emitidos) == ["CERT-NUEVO-2", "CERT-NUEVO-3"]
+            assert all(c.s3_key in s3.objetos for c in emitidos)
+            # Los dos que chocaron por folio se renderizaron otra vez; el del hash, no
+            assert motor.renderizados == 5
+        finally:
+            await _limpiar_curso(session_factory, curso_id, usuario_ids, job_id)
+            await engine.dispose()
+
+    asyncio.run(escenario())
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL")
+def test_emisiones_concurrentes_crean_un_certificado_por_inscripcion() -> None:
+    async def escenario() -> None:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        curso_id = uuid.uuid4()
+        usuario_ids = [uuid.uuid4() for _ in range(3)]
+        try:
+            async with session_factory() as db:
+                await _sembrar_curso(db, curso_id, usuario_ids, usuario_ids)
+                await db.commit()
+
+            # Dos emisiones crean los pendientes a la vez: la segunda no ve los de la
+            # primera (sin confirmar) al evaluar NOT EXISTS
+            async with session_factory() as primera, session_factory() as segunda:
+                creados = (await primera.execute(text(certificate_tasks._SQL_CREAR_PENDIENTES), {"curso_id": curso_id})).rowcount
+                insercion = asyncio.create_task(
+                    segunda.execute(text(certificate_tasks._SQL_CREAR_PENDIENTES), {"curso_id": curso_id})
+                )
+                await asyncio.sleep(0.2)
+                await primera.commit()
+                duplicados = (await insercion).rowcount
+                await segunda.commit()
+
+            async with session_factory() as db:
+                certificados = (await db.execute(
+                    select(models.Certificado.inscripcion_curso_id)
+                    .join(models.InscripcionCurso)
+                    .where(models.InscripcionCurso.curso_id == curso_id)
+                )).scalars().all()
+            assert (creados, duplicados) == (3, 0)
+            assert len(certificados) == len(set(certificados)) == 3
+        finally:
+            await _limpiar_curso(session_factory, curso_id, usuario_ids)
+            await engine.dispose()
+
+    asyncio.run(escenario())
+
+
+class _MotorContado(MotorRenderizado):
+    def __init__(self):
+        super().__init__(procesos=1, usar_procesos=False)
+        self.renderizados = 0
+
+    async def renderizar(self, datos):
+        self.renderizados += 1
+        await asyncio.sleep(0.05)
+        return await super().renderizar(datos)
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL")
+def test_generar_certificado_una_sola_vez_por_inscripcion(monkeypatch) -> None:
+    async def escenario() -> None:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        @asynccontextmanager
+        async def sesion():
+            async with session_factory() as db:
+                yield db
+
+        s3 = _S3EnMemoria()
+        motor = _MotorContado()
+        monkeypatch.setattr(certificate_tasks, "get_background_db_session", sesion)
+        monkeypatch.setattr(certificate_tasks, "get_s3_service", lambda: s3)
+        monkeypatch.setattr(certificate_tasks, "get_certificate_service", lambda: CertificateService(s3_service=s3))
+        monkeypatch.setattr(certificate_tasks, "get_motor_renderizado", lambda: motor)
+
+        curso_id, usuario_id, examen_id, inscripcion_id = (uuid.uuid4() for _ in range(4))
+        try:
+            async with session_factory() as db:
+                db.add(models.Curso(id=curso_id, titulo="Curso único", publicado=True))
+                db.add(models.Usuario(id=usuario_id, nombre="Única", apellido="Test", email=f"unica-{usuario_id}@example.com"))
+                await db.flush()
+                db.add(models.ExamenFinal(id=examen_id, curso_id=curso_id, titulo="Examen único", publicado=True))
+                db.add(models.InscripcionCurso(
+                    id=inscripcion_id, usuario_id=usuario_id, curso_id=curso_id, fecha_inscripcion=date.today()
+                ))
+                await db.flush()
+                db.add(models.Intento(
+                    usuario_id=usuario_id,
+                    examen_final_id=examen_id,
+                    inscripcion_curso_id=inscripcion_id,
+                    numero_intento=1,
+                    puntaje=95,
+                    resultado=ResultadoIntento.APROBADO,
+                    finalizado_en=datetime.now(timezone.utc),
+                ))
+                await db.flush()
+                await db.execute(
+                    update(models.InscripcionCurso).where(models.InscripcionCurso.id == inscripcion_id).values(acreditado=True)
+                )
+                certificado = models.Certificado(inscripcion_curso_id=inscripcion_id, valido=False)
+                db.add(certificado)
+                await db.commit()
+
+            # Como desde procesos distintos (sin el single-flight): el advisory lock las serializa
+            # y la segunda encuentra el PDF ya generado
+            await asyncio.gather(*(certificate_tasks._generar_certificado(certificado.id) for _ in range(2)))
+            assert motor.renderizados == 1
+            async with session_factory() as db:
+                folio = (await db.get(models.Certificado, certificado.id)).folio
+
+            # Un pedido posterior no renderiza ni sube de nuevo
+            await certificate_tasks.generar_certificado_background(certificado.id)
+            assert motor.renderizados == 1
+            async with session_factory() as db:
+                generado = await db.get(models.Certificado, certificado.id)
+            assert generado.folio == folio and generado.valido and generado.s3_key in s3.objetos
+        finally:
+            async with session_factory() as db:
+                await db.execute(delete(models.InscripcionCurso).where(models.InscripcionCurso.curso_id == curso_id))
+                await db.execute(delete(models.ExamenFinal).where(models.ExamenFinal.curso_id == curso_id))
+                await db.execute(delete(models.Curso).where(models.Curso.id == curso_id))
+                await db.execute(delete(models.EmailOutbox).where(models.EmailOutbox.destinatario == f"unica-{usuario_id}@example.com"))
+                await db.execute(delete(models.Usuario).where(models.Usuario.id == usuario_id))
+                await db.commit()
+            await engine.dispose()
+
+    asyncio.run(escenario())
+
+
+def test_vuelo_unico_comparte_la_ejecucion_en_curso() -> None:
+    async def escenario():
+        vuelo = VueloUnico()
+        llamadas = []
+
+        async def generar(clave):
+            llamadas.append(clave)
+            await asyncio.sleep(0.02)
+            if clave == "falla":
+                raise RuntimeError("sin plantilla")
+            return f"pdf-{clave}"
+
+        resultados = await asyncio.gather(
+            *(vuelo.ejecutar(clave, lambda clave=clave: generar(clave)) for clave in ["a", "a", "b", "a"]),
+            *(vuelo.ejecutar("falla", lambda: generar("falla")) for _ in range(2)),
+            return_exceptions=True,
+        )
+        # Terminada la ejecución, la clave se puede volver a ejecutar
+        return resultados, llamadas, await vuelo.ejecutar("a", lambda: generar("a"))
+
+    resultados, llamadas, otra = asyncio.run(escenario())
+    assert resultados[:4] == ["pdf-a", "pdf-a", "pdf-b", "pdf-a"]
+    assert all(isinstance(r, RuntimeError) for r in resultados[4:])
+    assert sorted(llamadas) == ["a", "a", "b", "falla"] and otra == "pdf-a"
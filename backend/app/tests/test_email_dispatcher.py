@@ -0,0 +1,194 @@
+"""
+Pruebas del despacho masivo de emails.
+
+La prueba contra SES requiere un endpoint compatible (moto_server) indicado en
+TEST_SES_ENDPOINT_URL; la de SMTP levanta un servidor SMTP mínimo en un hilo.
+"""
+
+import asyncio
+import os
+import socketserver
+import threading
+import time
+
+import boto3
+import pytest
+
+from app.config import settings
+from app.services.email_dispatcher import (
+    DespachadorEmails,
+    ErrorEnvioEmail,
+    LimitadorTasa,
+    MensajeEmail,
+)
+from app.services.email_service import EmailService, TransporteSES, TransporteSMTP
+
+TEST_SES_ENDPOINT_URL = os.getenv("TEST_SES_ENDPOINT_URL")
+
+
+def _mensajes(n: int):
+    return [MensajeEmail(f"alumno{i}@example.com", "Recordatorio", body_text="Hola", referencia=i) for i in range(n)]
+
+
+class _TransporteSimulado:
+    def __init__(self, demora: float = 0.01, fallas=None):
+        self.demora = demora
+        # destinatario -> lista de errores a lanzar en orden antes de enviar
+        self.fallas = fallas or {}
+        self.en_curso = 0
+        self.max_en_curso = 0
+        self.intentos = {}
+
+    async def enviar(self, mensaje: MensajeEmail) -> str:
+        self.intentos[mensaje.destinatario] = self.intentos.get(mensaje.destinatario, 0) + 1
+        self.en_curso += 1
+        self.max_en_curso = max(self.max_en_curso, self.en_curso)
+        try:
+            await asyncio.sleep(self.demora)
+            pendientes = self.fallas.get(mensaje.destinatario)
+            if pendientes:
+                raise pendientes.pop(0)
+            return f"id-{mensaje.referencia}"
+        finally:
+            self.en_curso -= 1
+
+    def cerrar(self) -> None:
+        pass
+
+
+def test_limitador_respeta_la_tasa() -> None:
+    async def escenario():
+        limitador = LimitadorTasa(tasa=100, capacidad=5)
+        inicio = time.perf_counter()
+        await asyncio.gather(*(limitador.adquirir() for _ in range(45)))
+        return time.perf_counter() - inicio
+
+    # 5 de ráfaga y 40 a 100/s
+    assert 0.35 < asyncio.run(escenario()) < 0.8
+
+
+def test_envio_concurrente_con_reintentos_y_registro_por_lotes() -> None:
+    transitorio = ErrorEnvioEmail("Throttling", reintentable=True)
+    permanente = ErrorEnvioEmail("MessageRejected", reintentable=False)
+    transporte = _TransporteSimulado(fallas={
+        "alumno3@example.com": [transitorio, transitorio],
+        "alumno7@example.com": [permanente],
+        "alumno9@example.com": [transitorio] * 10,
+    })
+    lotes = []
+
+    async def registrar(lote):
+        lotes.append(lote)
+
+    async def escenario():
+        despachador = DespachadorEmails(
+            transporte, LimitadorTasa(tasa=10_000), concurrencia=4, max_intentos=3, base_reintento=0.01
+        )
+        return await despachador.enviar(_mensajes(50), al_registrar=registrar, tamano_registro=10)
+
+    resumen = asyncio.run(escenario())
+    assert (resumen.enviados, resumen.fallidos) == (48, 2)
+    assert transporte.max_en_curso == 4
+    assert (transporte.intentos["alumno3@example.com"], transporte.intentos["alumno7@example.com"]) == (3, 1)
+    assert transporte.intentos["alumno9@example.com"] == 3
+
+    resultados = [r for lote in lotes for r in lote]
+    assert sorted(r.mensaje.referencia for r in resultados) == list(range(50))
+    assert all(len(lote) >= 10 for lote in lotes[:-1]) and len(lotes) <= 5
+    fallidos = {r.mensaje.referencia: r for r in resultados if not r.enviado}
+    assert set(fallidos) == {7, 9} and "MessageRejected" in fallidos[7].error
+
+
+def test_cuota_de_ses_se_reparte_entre_procesos(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "email_send_rate_per_second", 14.0)
+    monkeypatch.setattr(settings, "email_send_processes", 4)
+
+    service = EmailService(transporte=_TransporteSimulado())
+    assert service.despachador.limitador.tasa == 3.5
+
+
+@pytest.mark.skipif(not TEST_SES_ENDPOINT_URL, reason="TEST_SES_ENDPOINT_URL no configurada; se requiere un SES compatible local")
+def test_envio_masivo_contra_ses_local(monkeypatch) -> None:
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "prueba")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "prueba")
+    credenciales = {"aws_access_key_id": "prueba", "aws_secret_access_key": "prueba", "region_name": "us-east-1"}
+    ses = boto3.client("ses", endpoint_url=TEST_SES_ENDPOINT_URL, **credenciales)
+    ses.verify_email_identity(EmailAddress="noreply@ebs.salem")
+    enviados_antes = ses.get_send_quota()["SentLast24Hours"]
+
+    async def escenario():
+        transporte = TransporteSES(concurrencia=4, endpoint_url=TEST_SES_ENDPOINT_URL)
+        service = EmailService(transporte=transporte, limitador=LimitadorTasa(tasa=1000))
+        try:
+            mensajes = [service.mensaje(m.destinatario, m.asunto, body_text=m.body_text) for m in _mensajes(20)]
+            # Remitente no verificado: error permanente, sin reintentos
+            mensajes.append(service.mensaje("x@example.com", "x", body_text="x", from_email="otro@example.com"))
+            return await service.send_bulk_email(mensajes)
+        finally:
+            service.cerrar()
+
+    resumen = asyncio.run(escenario())
+    assert (resumen.enviados, resumen.fallidos) == (20, 1)
+    assert ses.get_send_quota()["SentLast24Hours"] - enviados_antes == 20
+
+
+class _ServidorSMTP(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        self.recibidos = []
+        super().__init__(("127.0.0.1", 0), _SesionSMTP)
+
+
+class _SesionSMTP(socketserver.StreamRequestHandler):
+    """Lo mínimo de SMTP que usa smtplib; rechaza destinatarios que empiezan con 'rechazado'."""
+
+    def _responder(self, linea: str) -> None:
+        self.wfile.write(f"{linea}\r\n".encode())
+
+    def handle(self) -> None:
+        self._responder("220 prueba")
+        while linea := self.rfile.readline().decode().strip():
+            comando = linea.split(" ", 1)[0].upper()
+            if comando in ("EHLO", "HELO"):
+                self._responder("250 prueba")
+            elif comando == "RCPT" and "<rechazado" in linea:
+                self._responder("550 no existe")
+            elif comando == "DATA":
+                self._responder("354 fin con .")
+                datos = []
+                while (linea := self.rfile.readline().decode()) != ".\r\n":
+                    datos.append(linea)
+                self.server.recibidos.append("".join(datos))
+                self._responder("250 ok")
+            elif comando == "QUIT":
+                self._responder("221 adios")
+                return
+            else:
+                self._responder("250 ok")
+
+
+def test_envio_masivo_por_smtp_local(monkeypatch) -> None:
+    servidor = _ServidorSMTP()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    monkeypatch.setattr(settings, "smtp_host", "127.0.0.1")
+    monkeypatch.setattr(settings, "smtp_port", servidor.server_address[1])
+    monkeypatch.setattr(settings, "smtp_use_tls", False)
+
+    async def escenario():
+        service = EmailService(transporte=TransporteSMTP(concurrencia=3), limitador=LimitadorTasa(tasa=1000))
+        try:
+            mensajes = [service.mensaje(m.destinatario, m.asunto, body_text="Hola", body_html="<p>Hola</p>") for m in _mensajes(12)]
+            mensajes.append(service.mensaje("rechazado@example.com", "x", body_text="x"))
+            return await service.send_bulk_email(mensajes)
+        finally:
+            service.cerrar()
+
+    try:
+        resumen = asyncio.run(escenario())
+    finally:
+        servidor.shutdown()
+    assert (resumen.enviados, resumen.fallidos) == (12, 1)
+    assert len(servidor.recibidos) == 12
+    assert all("<p>Hola</p>" in datos for datos in servidor.recibidos)
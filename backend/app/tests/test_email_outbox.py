@@ -0,0 +1,146 @@
+"""
+Pruebas de la bandeja de salida de emails.
+
+Requieren una base de datos PostgreSQL inicializada con database/init.sql,
+indicada en TEST_DATABASE_URL.
+"""
+
+import asyncio
+import os
+import uuid
+
+import pytest
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.database import models
+from app.database.enums import EstadoEmail
+from app.services.email_dispatcher import ErrorEnvioEmail, LimitadorTasa, MensajeEmail
+from app.services.email_outbox_service import EmailOutboxService, EmailPendiente, email_certificado_listo
+from app.services.email_service import EmailService
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytest_db = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL")
+
+
+def _con_base_de_datos(escenario):
+    """Ejecutar `escenario(session_factory, dominio)` y borrar los emails a ese dominio al terminar."""
+    async def ejecutar() -> None:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        dominio = f"{uuid.uuid4().hex[:8]}.example.com"
+        try:
+            await escenario(session_factory, dominio)
+        finally:
+            async with session_factory() as db:
+                await db.execute(delete(models.EmailOutbox).where(models.EmailOutbox.destinatario.like(f"%@{dominio}")))
+                await db.commit()
+            await engine.dispose()
+
+    asyncio.run(ejecutar())
+
+
+class _TransporteSimulado:
+    def __init__(self, fallas=None):
+        # destinatario -> error que se lanza en cada envío
+        self.fallas = fallas or {}
+        self.enviados = []
+
+    async def enviar(self, mensaje: MensajeEmail) -> str:
+        if mensaje.destinatario in self.fallas:
+            raise self.fallas[mensaje.destinatario]
+        self.enviados.append(mensaje)
+        return f"id-{len(self.enviados)}"
+
+    def cerrar(self) -> None:
+        pass
+
+
+@pytest_db
+def test_agregar_es_idempotente_y_respeta_la_transaccion() -> None:
+    async def escenario(session_factory, dominio: str) -> None:
+        certificado_id = uuid.uuid4()
+        email = email_certificado_listo(certificado_id, f"ana@{dominio}", "Ana", "Romanos", "EBS-1")
+
+        async with session_factory() as db:
+            await EmailOutboxService(db).agregar([email])
+            await db.rollback()
+        async with session_factory() as db:
+            await EmailOutboxService(db).agregar([email])
+            await db.commit()
+            await EmailOutboxService(db).agregar([email, email])
+            await db.commit()
+            filas = (await db.execute(
+                select(models.EmailOutbox).where(models.EmailOutbox.destinatario == f"ana@{dominio}")
+            )).scalars().all()
+        assert [(f.clave_idempotencia, f.estado) for f in filas] == [
+            (f"certificado_listo:{certificado_id}", EstadoEmail.PENDIENTE)
+        ]
+
+    _con_base_de_datos(escenario)
+
+
+@pytest_db
+def test_reclamar_concurrente_no_repite_emails() -> None:
+    async def escenario(session_factory, dominio: str) -> None:
+        async with session_factory() as db:
+            await EmailOutboxService(db).agregar(
+                EmailPendiente("bienvenida", f"u{i}@{dominio}", {"usuario_nombre": f"U{i}"}, f"prueba:{dominio}:{i}")
+                for i in range(30)
+            )
+            await db.commit()
+
+        async def reclamar():
+            async with session_factory() as db:
+                return await EmailOutboxService(db).reclamar(10, 60)
+
+        lotes = await asyncio.gather(*(reclamar() for _ in range(5)))
+        propios = [e.destinatario for lote in lotes for e in lote if e.destinatario.endswith(dominio)]
+        assert len(propios) == len(set(propios)) == 30
+
+    _con_base_de_datos(escenario)
+
+
+@pytest_db
+def test_despachar_marca_enviados_y_reprograma_fallidos(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "email_retry_base_seconds", 0.001)
+
+    async def escenario(session_factory, dominio: str) -> None:
+        transporte = _TransporteSimulado(fallas={
+            f"rebota@{dominio}": ErrorEnvioEmail("dirección inválida", reintentable=False),
+            f"lento@{dominio}": ErrorEnvioEmail("Throttling", reintentable=True),
+        })
+        service = EmailService(transporte=transporte, limitador=LimitadorTasa(tasa=1000))
+        nombres = ["a", "b", "c", "rebota", "lento"]
+        async with session_factory() as db:
+            await EmailOutboxService(db).agregar(
+                [EmailPendiente("bienvenida", f"{n}@{dominio}", {"usuario_nombre": n}, f"prueba:{dominio}:{n}") for n in nombres]
+                + [EmailPendiente("desconocida", f"x@{dominio}", {}, f"prueba:{dominio}:x")]
+            )
+            await db.commit()
+
+        async with session_factory() as db:
+            await EmailOutboxService(db).despachar_lote(
+                service, limite=1000, bloqueo_segundos=60, max_intentos=3,
+                espera_reintento=lambda intento: 3600, tamano_registro=2,
+            )
+            filas = {
+                f.destinatario.split("@")[0]: f
+                for f in (await db.execute(
+                    select(models.EmailOutbox).where(models.EmailOutbox.destinatario.like(f"%@{dominio}"))
+                )).scalars()
+            }
+
+        assert sorted(m.destinatario.split("@")[0] for m in transporte.enviados) == ["a", "b", "c"]
+        assert all(filas[n].estado == EstadoEmail.ENVIADO and filas[n].message_id for n in "abc")
+        assert filas["rebota"].estado == EstadoEmail.FALLIDO
+        assert filas["x"].estado == EstadoEmail.FALLIDO
+        # Error transitorio: vuelve a la bandeja, diferido
+        assert filas["lento"].estado == EstadoEmail.PENDIENTE
+        assert filas["lento"].intentos == 1 and "Throttling" in filas["lento"].error
+        async with session_factory() as db:
+            assert not [e for e in await EmailOutboxService(db).reclamar(1000, 60) if e.destinatario.endswith(dominio)]
+
+    _con_base_de_datos(escenario)
@@ -0,0 +1,53 @@
+"""
+Pruebas de las plantillas de email compiladas.
+"""
+
+import pytest
+
+from app.utils.email_templates import (
+    CERTIFICADO_LISTO,
+    RECORDATORIO_PROGRESO,
+    PlantillaEmail,
+    template_certificado_listo,
+)
+
+
+def test_valores_se_escapan_solo_en_html() -> None:
+    asunto, html, texto = CERTIFICADO_LISTO.renderizar({
+        "usuario_nombre": "Ana <script>",
+        "curso_titulo": "Romanos & Gálatas",
+        "folio": "EBS-1",
+        "certificado_url": "https://ebs.example/c?a=1&b=2",
+    })
+    assert asunto == "Tu certificado de Romanos & Gálatas está listo"
+    assert "Hola Ana &lt;script&gt;," in html and "<script>" not in html
+    assert '<a href="https://ebs.example/c?a=1&amp;b=2"' in html
+    assert "Hola Ana <script>," in texto
+    assert "Puedes descargar tu certificado en: https://ebs.example/c?a=1&b=2" in texto
+
+
+def test_campos_con_filtro_son_opcionales() -> None:
+    html, texto = template_certificado_listo("Ana", "Hechos", "EBS-2")
+    assert "Descargar Certificado" not in html
+    assert "Puedes descargar" not in texto
+    with pytest.raises(KeyError):
+        CERTIFICADO_LISTO.renderizar({"usuario_nombre": "Ana", "curso_titulo": "Hechos"})
+
+
+def test_lote_con_campos_comunes_equivale_a_renderizar_uno_por_uno() -> None:
+    destinatarios = [
+        {"usuario_nombre": f"Alumno {i} <{i}>", "progreso_porcentaje": i * 12.5}
+        for i in range(5)
+    ]
+    comunes = {"curso_titulo": "Éxodo & Levítico"}
+    lote = RECORDATORIO_PROGRESO.renderizar_lote(destinatarios, comunes=comunes)
+    assert lote == [RECORDATORIO_PROGRESO.renderizar({**d, **comunes}) for d in destinatarios]
+    assert "37.5%" in lote[3][2]
+    # La versión con el curso fijado se compila una sola vez
+    assert RECORDATORIO_PROGRESO.fijar(tuple(comunes.items())) is RECORDATORIO_PROGRESO.fijar(tuple(comunes.items()))
+    assert RECORDATORIO_PROGRESO.fijar(tuple(comunes.items())).campos == {"usuario_nombre", "progreso_porcentaje"}
+
+
+def test_filtro_desconocido_falla_al_compilar() -> None:
+    with pytest.raises(ValueError):
+        PlantillaEmail("Hola", "{{ nombre|mayusculas }}", "{{ nombre }}")
@@ -0,0 +1,179 @@
+"""
+Pruebas de los eventos en vivo (bus de LISTEN/NOTIFY y flujos SSE).
+
+La prueba del bus requiere una base de datos PostgreSQL, indicada en TEST_DATABASE_URL.
+"""
+
+import asyncio
+import os
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import models
+from app.services.autosave_service import publicar_intentos_finalizados
+from app.services.certificate_service import clave_certificado, clave_usuario, evento_certificado_listo
+from app.services.eventos_service import (
+    CANAL_CERTIFICADOS,
+    CANAL_FORO,
+    CANAL_INTENTOS_FINALIZADOS,
+    BusEventos,
+    publicar,
+)
+from app.services.foro_service import ForoService, clave_leccion
+from app.utils.sse import flujo_sse
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def test_flujo_sse_envia_keepalive_y_termina_con_el_ultimo_evento() -> None:
+    async def escenario() -> list:
+        cola: asyncio.Queue = asyncio.Queue()
+        asyncio.get_running_loop().call_later(0.05, cola.put_nowait, {"status": "processing"})
+        asyncio.get_running_loop().call_later(0.06, cola.put_nowait, {"status": "completed"})
+        asyncio.get_running_loop().call_later(0.07, cola.put_nowait, {"status": "otro"})
+        return [
+            texto async for texto in flujo_sse(
+                cola, "estado", keepalive_segundos=0.03, duracion_segundos=5,
+                es_ultimo=lambda datos: datos["status"] == "completed",
+            )
+        ]
+
+    textos = asyncio.run(escenario())
+    assert textos[0] == ": keepalive\n\n"
+    assert textos[-2:] == [
+        'event: estado\ndata: {"status": "processing"}\n\n',
+        'event: estado\ndata: {"status": "completed"}\n\n',
+    ]
+
+
+def test_flujo_sse_termina_al_vencer_la_duracion() -> None:
+    async def escenario() -> list:
+        return [texto async for texto in flujo_sse(asyncio.Queue(), "estado", 0.02, 0.05)]
+
+    textos = asyncio.run(escenario())
+    assert textos and set(textos) == {": keepalive\n\n"}
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL")
+def test_bus_entrega_solo_eventos_confirmados_a_sus_claves() -> None:
+    async def escenario() -> None:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        bus = BusEventos(make_url(TEST_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False))
+        certificado_id, otro_id, usuario_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        try:
+            async with bus.suscribir(CANAL_CERTIFICADOS, clave_certificado(certificado_id)) as del_certificado, \
+                    bus.suscribir(CANAL_CERTIFICADOS, clave_usuario(usuario_id)) as del_usuario:
+                async with session_factory() as db:
+                    await publicar(db, CANAL_CERTIFICADOS, [
+                        evento_certificado_listo(certificado_id, usuario_id, "EBS-DESCARTADO", None, "k")
+                    ])
+                    await db.rollback()
+                async with session_factory() as db:
+                    await publicar(db, CANAL_CERTIFICADOS, [
+                        evento_certificado_listo(certificado_id, usuario_id, "EBS-1", None, "certificados/1.pdf"),
+                        evento_certificado_listo(otro_id, usuario_id, "EBS-2", None, "certificados/2.pdf"),
+                    ])
+                    await db.commit()
+
+                evento = await asyncio.wait_for(del_certificado.get(), 5)
+                assert evento["folio"] == "EBS-1" and evento["status"] == "completed"
+                assert [(await asyncio.wait_for(del_usuario.get(), 5))["folio"] for _ in range(2)] == ["EBS-1", "EBS-2"]
+                assert del_certificado.empty()
+
+                await bus.cerrar()
+                assert await asyncio.wait_for(del_certificado.get(), 5) is None
+            assert not bus._suscriptores
+        finally:
+            await bus.cerrar()
+            await engine.dispose()
+
+    asyncio.run(escenario())
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL")
+def test_foro_publica_cambios_y_reanuda_desde_el_ultimo_comentario() -> None:
+    async def escenario() -> None:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        bus = BusEventos(make_url(TEST_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False))
+        curso_id, modulo_id, leccion_id, usuario_id = (uuid.uuid4() for _ in range(4))
+        try:
+            async with session_factory() as db:
+                db.add(models.Curso(id=curso_id, titulo="Curso foro", publicado=True))
+                db.add(models.Modulo(
+                    id=modulo_id, titulo="Módulo foro", fecha_inicio=date(2020, 1, 1), fecha_fin=date(2099, 1, 1), publicado=True
+                ))
+                db.add(models.Usuario(id=usuario_id, nombre="Foro", apellido="Test", email=f"foro-{usuario_id}@example.com"))
+                await db.flush()
+                db.add(models.ModuloCurso(modulo_id=modulo_id, curso_id=curso_id, slot=1))
+                db.add(models.Leccion(id=leccion_id, modulo_id=modulo_id, titulo="Lección foro", orden=1))
+                db.add(models.InscripcionCurso(usuario_id=usuario_id, curso_id=curso_id, fecha_inscripcion=date.today()))
+                await db.commit()
+
+            async with bus.suscribir(CANAL_FORO, clave_leccion(curso_id, leccion_id)) as cola:
+                async with session_factory() as db:
+                    service = ForoService(db)
+                    visto = await service.create_comentario(usuario_id, curso_id, leccion_id, "Primero")
+                    nuevo = await service.create_comentario(usuario_id, curso_id, leccion_id, "Segundo")
+                    await service.update_comentario(visto.id, usuario_id, "Primero (editado)")
+                    await service.delete_comentario(nuevo.id, usuario_id)
+
+                eventos = [await asyncio.wait_for(cola.get(), 5) for _ in range(4)]
+                assert [(e["tipo"], e["id"]) for e in eventos] == [
+                    ("creado", str(visto.id)),
+                    ("creado", str(nuevo.id)),
+                    ("editado", str(visto.id)),
+                    ("eliminado", str(nuevo.id)),
+                ]
+
+            async with session_factory() as db:
+                service = ForoService(db)
+                ultimo = await service.create_comentario(usuario_id, curso_id, leccion_id, "Tercero")
+                nuevos, editados = await service.list_cambios_desde(curso_id, leccion_id, visto.id)
+                assert [c.id for c in nuevos] == [ultimo.id]
+                # La edición del primero fue después de crearlo
+                assert [c.contenido for c in editados] == ["Primero (editado)"]
+                assert await service.list_cambios_desde(curso_id, leccion_id, nuevo.id) is None
+        finally:
+            await bus.cerrar()
+            async with session_factory() as db:
+                await db.execute(delete(models.ForoComentario).where(models.ForoComentario.curso_id == curso_id))
+                await db.execute(delete(models.InscripcionCurso).where(models.InscripcionCurso.curso_id == curso_id))
+                await db.execute(delete(models.Leccion).where(models.Leccion.id == leccion_id))
+                await db.execute(delete(models.ModuloCurso).where(models.ModuloCurso.modulo_id == modulo_id))
+                await db.execute(delete(models.Modulo).where(models.Modulo.id == modulo_id))
+                await db.execute(delete(models.Curso).where(models.Curso.id == curso_id))
+                await db.execute(delete(models.Usuario).where(models.Usuario.id == usuario_id))
+                await db.commit()
+            await engine.dispose()
+
+    asyncio.run(escenario())
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL")
+def test_intentos_finalizados_se_publican_en_eventos_pequenos() -> None:
+    async def escenario() -> None:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        bus = BusEventos(make_url(TEST_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False))
+        intento_ids = [uuid.uuid4() for _ in range(250)]
+        try:
+            async with bus.suscribir(CANAL_INTENTOS_FINALIZADOS, "todos") as cola:
+                async with session_factory() as db:
+                    await publicar_intentos_finalizados(db, intento_ids)
+                    await db.commit()
+
+                eventos = [await asyncio.wait_for(cola.get(), 5) for _ in range(3)]
+                assert [len(e["intento_ids"]) for e in eventos] == [100, 100, 50]
+                assert [uuid.UUID(i) for e in eventos for i in e["intento_ids"]] == intento_ids
+        finally:
+            await bus.cerrar()
+            await engine.dispose()
+
+    asyncio.run(escenario())
@@ -0,0 +1,46 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from app.utils.export_stream import codificar_filas, comprimir_gzip
+
+COLUMNAS = ("id", "nombre", "acreditado")
+LOTES = [
+    [{"id": 1, "nombre": "Ana, María", "acreditado": True}],
+    [{"id": 2, "nombre": "José \"Pepe\"", "acreditado": None}, {"id": 3, "nombre": "Ñandú", "acreditado": False}],
+]
+
+
+async def _lotes():
+    for lote in LOTES:
+        yield lote
+
+
+async def _unir(bloques) -> bytes:
+    return b"".join([bloque async for bloque in bloques])
+
+
+def test_csv_incremental_equals_single_pass() -> None:
+    contenido = asyncio.run(_unir(codificar_filas(_lotes(), COLUMNAS, "csv"))).decode("utf-8")
+    filas = list(csv.reader(io.StringIO(contenido)))
+    assert filas == [
+        ["id", "nombre", "acreditado"],
+        ["1", "Ana, María", "True"],
+        ["2", "José \"Pepe\"", ""],
+        ["3", "Ñandú", "False"],
+    ]
+
+
+def test_jsonl_gzip_roundtrip() -> None:
+    comprimido = asyncio.run(_unir(comprimir_gzip(codificar_filas(_lotes(), COLUMNAS, "jsonl"))))
+    lineas = gzip.decompress(comprimido).decode("utf-8").splitlines()
+    assert [json.loads(linea) for linea in lineas] == [fila for lote in LOTES for fila in lote]
+
+
+def test_unknown_format_rejected() -> None:
+    with pytest.raises(ValueError):
+        asyncio.run(_unir(codificar_filas(_lotes(), COLUMNAS, "xml")))
@@ -0,0 +1,100 @@
+"""
+Pruebas de la búsqueda en el foro por trigramas.
+
+La prueba de búsqueda requiere PostgreSQL con la extensión pg_trgm, inicializado con
+database/init.sql e indicado en TEST_DATABASE_URL.
+"""
+
+import asyncio
+import os
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import models
+from app.services.foro_service import KEYSET_BUSQUEDA, ForoService, fragmento_resaltado
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def test_fragmento_resalta_sin_acentos_ni_mayusculas_y_con_errores() -> None:
+    contenido = "Introducción. " + "relleno " * 40 + "Pablo escribe a los Corintios sobre la GRACÍA de Dios. " + "fin " * 40
+    fragmento, resaltados = fragmento_resaltado(contenido, "gracia corintos", largo=80)
+    assert fragmento.startswith("…") and fragmento.endswith("…")
+    assert [fragmento[a:b] for a, b in resaltados] == ["Corintios", "GRACÍA"]
+
+    assert fragmento_resaltado("Corto", "gracia") == ("Corto", [])
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL")
+def test_busqueda_ordena_por_similitud_y_recencia_y_pagina_por_cursor() -> None:
+    async def escenario() -> bool:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_factory() as db:
+            if not (await db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"))).scalar():
+                await engine.dispose()
+                return False
+        curso_id, modulo_id, usuario_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        lecciones = [uuid.uuid4(), uuid.uuid4()]
+        ahora = datetime.now(timezone.utc)
+        try:
+            async with session_factory() as db:
+                db.add(models.Curso(id=curso_id, titulo="Curso búsqueda", publicado=True))
+                db.add(models.Modulo(
+                    id=modulo_id, titulo="Módulo búsqueda", fecha_inicio=date(2020, 1, 1), fecha_fin=date(2099, 1, 1), publicado=True
+                ))
+                db.add(models.Usuario(id=usuario_id, nombre="Busca", apellido="Test", email=f"busca-{usuario_id}@example.com"))
+                await db.flush()
+                db.add(models.ModuloCurso(modulo_id=modulo_id, curso_id=curso_id, slot=1))
+                for orden, leccion_id in enumerate(lecciones, start=1):
+                    db.add(models.Leccion(id=leccion_id, modulo_id=modulo_id, titulo=f"Lección {orden}", orden=orden))
+                await db.flush()
+                textos = [
+                    ("La parábola del hijo pródigo", lecciones[0], 400),
+                    ("Otra pregunta sobre la parabola del sembrador", lecciones[0], 1),
+                    ("Nada que ver con el tema", lecciones[0], 1),
+                ] + [(f"Comentario {i} sobre la parábola", lecciones[1], i) for i in range(5)]
+                for contenido, leccion_id, dias in textos:
+                    db.add(models.ForoComentario(
+                        usuario_id=usuario_id, curso_id=curso_id, leccion_id=leccion_id, contenido=contenido,
+                        creado_en=ahora - timedelta(days=dias),
+                    ))
+                await db.commit()
+
+            async with session_factory() as db:
+                service = ForoService(db)
+                # Con error de escritura; a igual similitud gana el más reciente
+                filas = await service.buscar_comentarios(curso_id, "parabola", leccion_id=lecciones[0])
+                assert [f.contenido for f in filas][-1] == "La parábola del hijo pródigo"
+                assert "Nada que ver con el tema" not in [f.contenido for f in filas]
+                assert filas[0].usuario_nombre == "Busca"
+
+                paginas, cursor = [], None
+                while True:
+                    pagina = await service.buscar_comentarios(curso_id, "parabola", limit=3, cursor=cursor)
+                    paginas.append(pagina)
+                    cursor = KEYSET_BUSQUEDA.siguiente(pagina, 3)
+                    if cursor is None:
+                        break
+                ids = [f.id for pagina in paginas for f in pagina]
+                assert len(ids) == len(set(ids)) == 7
+                puntajes = [f.puntaje for pagina in paginas for f in pagina]
+                assert puntajes == sorted(puntajes, reverse=True)
+        finally:
+            async with session_factory() as db:
+                await db.execute(delete(models.ForoComentario).where(models.ForoComentario.curso_id == curso_id))
+                await db.execute(delete(models.Leccion).where(models.Leccion.modulo_id == modulo_id))
+                await db.execute(delete(models.ModuloCurso).where(models.ModuloCurso.modulo_id == modulo_id))
+                await db.execute(delete(models.Modulo).where(models.Modulo.id == modulo_id))
+                await db.execute(delete(models.Curso).where(models.Curso.id == curso_id))
+                await db.execute(delete(models.Usuario).where(models.Usuario.id == usuario_id))
+                await db.commit()
+            await engine.dispose()
+        return True
+
+    if not asyncio.run(escenario()):
+        pytest.skip("La base de datos de prueba no tiene la extensión pg_trgm")
@@ -0,0 +1,204 @@
+"""
+Pruebas de la cola durable de tareas y del worker.
+
+Requieren una base de datos PostgreSQL inicializada con database/init.sql,
+indicada en TEST_DATABASE_URL.
+"""
+
+import asyncio
+import os
+import uuid
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import worker as worker_module
+from app.database import models
+from app.database.enums import EstadoJob
+from app.services.job_service import JobService
+from app.tasks.cola import Tarea
+from app.worker import Worker, parsear_colas
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def test_parsear_colas() -> None:
+    assert parsear_colas("certificados:2, emails:8,admin") == {"certificados": 2, "emails": 8, "admin": 1}
+    with pytest.raises(ValueError):
+        parsear_colas("emails:0")
+
+
+def test_espera_reintento_crece_con_tope() -> None:
+    worker = Worker({"x": 1}, reintento_base=10, reintento_max=60)
+    assert 5 <= worker.espera_reintento(1) <= 10
+    assert 20 <= worker.espera_reintento(3) <= 40
+    assert 30 <= worker.espera_reintento(10) <= 60
+
+
+def _con_base_de_datos(escenario):
+    """Ejecutar `escenario(session_factory, cola)` con una cola propia y borrar sus jobs al terminar."""
+    async def ejecutar() -> None:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        cola = f"test-{uuid.uuid4().hex[:8]}"
+        try:
+            await escenario(session_factory, cola)
+        finally:
+            async with session_factory() as db:
+                await db.execute(delete(models.Job).where(models.Job.cola == cola))
+                await db.commit()
+            await engine.dispose()
+
+    asyncio.run(ejecutar())
+
+
+pytest_db = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL")
+
+
+@pytest_db
+def test_reclamar_concurrente_no_repite_jobs() -> None:
+    async def escenario(session_factory, cola: str) -> None:
+        async with session_factory() as db:
+            creados = {
+                (await JobService(db).crear_job("prueba", cola=cola)).id
+                for _ in range(20)
+            }
+
+        async def reclamar(worker_id: str):
+            async with session_factory() as db:
+                return await JobService(db).reclamar(cola, worker_id, 6, 60)
+
+        lotes = await asyncio.gather(*(reclamar(f"w{i}") for i in range(5)))
+        reclamados = [job.id for lote in lotes for job in lote]
+        assert len(reclamados) == len(set(reclamados)) == len(creados)
+        assert set(reclamados) == creados
+
+    _con_base_de_datos(escenario)
+
+
+@pytest_db
+def test_worker_reintenta_y_deja_fallido(monkeypatch) -> None:
+    async def escenario(session_factory, cola: str) -> None:
+        llamadas = {"falla": 0, "exito": 0}
+
+        async def falla() -> None:
+            llamadas["falla"] += 1
+            raise RuntimeError("falla de prueba")
+
+        async def exito(valor: int) -> None:
+            assert valor == 3
+            llamadas["exito"] += 1
+
+        @asynccontextmanager
+        async def sesion():
+            async with session_factory() as db:
+                yield db
+
+        monkeypatch.setattr(worker_module, "get_background_db_session", sesion)
+        monkeypatch.setattr(worker_module, "TAREAS", {
+            "falla": Tarea(falla, cola, max_intentos=2),
+            "exito": Tarea(exito, cola),
+        })
+
+        async with session_factory() as db:
+            service = JobService(db)
+            fallido = await service.crear_job("falla", cola=cola, max_intentos=2)
+            exitoso = await service.crear_job("exito", {"valor": "3"}, cola=cola)
+            desconocido = await service.crear_job("no_registrado", cola=cola, max_intentos=3)
+
+        worker = Worker({cola: 2}, intervalo_sondeo=0.05, bloqueo_segundos=30, reintento_base=0)
+        ejecucion = asyncio.create_task(worker.ejecutar(timeout_apagado=5))
+
+        async def terminados() -> bool:
+            async with session_factory() as db:
+                estados = (await db.execute(
+                    select(models.Job.estado).where(models.Job.cola == cola)
+                )).scalars().all()
+            return all(estado in (EstadoJob.COMPLETADO, EstadoJob.FALLIDO) for estado in estados)
+
+        for _ in range(100):
+            if await terminados():
+                break
+            await asyncio.sleep(0.05)
+        worker.detener()
+        await ejecucion
+
+        async with session_factory() as db:
+            service = JobService(db)
+            fallido = await service.get_job(fallido.id)
+            exitoso = await service.get_job(exitoso.id)
+            desconocido = await service.get_job(desconocido.id)
+
+        assert fallido.estado == EstadoJob.FALLIDO
+        assert fallido.intentos == 2
+        assert "falla de prueba" in fallido.error
+        assert fallido.bloqueado_por is None
+        assert llamadas == {"falla": 2, "exito": 1}
+        assert exitoso.estado == EstadoJob.COMPLETADO
+        # Un tipo desconocido no se reintenta
+        assert desconocido.estado == EstadoJob.FALLIDO
+        assert desconocido.intentos == 1
+
+        # Dead-letter: reencolar lo deja disponible de nuevo con los intentos en cero
+        async with session_factory() as db:
+            job = await JobService(db).reencolar(fallido.id)
+        assert job.estado == EstadoJob.PENDIENTE
+        assert job.intentos == 0
+
+    _con_base_de_datos(escenario)
+
+
+@pytest_db
+def test_bloqueo_vencido_vuelve_a_la_cola() -> None:
+    async def escenario(session_factory, cola: str) -> None:
+        async with session_factory() as db:
+            service = JobService(db)
+            reintentable = await service.crear_job("prueba", cola=cola, max_intentos=2)
+            agotado = await service.crear_job("prueba", cola=cola, max_intentos=1)
+            reclamados = await service.reclamar(cola, "worker-caido", 10, 60)
+            assert len(reclamados) == 2
+            # Simular que el worker dejó de renovar el bloqueo
+            await db.execute(
+                update(models.Job)
+                .where(models.Job.cola == cola)
+                .values(bloqueado_hasta=models.Job.iniciado_en)
+            )
+            await db.commit()
+            assert not await service.renovar_bloqueo(reintentable.id, "otro-worker", 60)
+            assert await service.liberar_bloqueos_vencidos() >= 2
+
+        async with session_factory() as db:
+            service = JobService(db)
+            reintentable = await service.get_job(reintentable.id)
+            agotado = await service.get_job(agotado.id)
+            assert reintentable.estado == EstadoJob.PENDIENTE
+            assert reintentable.bloqueado_por is None
+            assert agotado.estado == EstadoJob.FALLIDO
+            # El job devuelto lo toma otro worker
+            reclamados = await service.reclamar(cola, "worker-nuevo", 10, 60)
+            assert [job.id for job in reclamados] == [reintentable.id]
+
+    _con_base_de_datos(escenario)
+
+
+@pytest_db
+def test_clave_unica_no_duplica_tareas_activas() -> None:
+    async def escenario(session_factory, cola: str) -> None:
+        clave = f"prueba:{cola}"
+
+        async def crear():
+            async with session_factory() as db:
+                return (await JobService(db).crear_job("prueba", cola=cola, clave_unica=clave)).id
+
+        ids = await asyncio.gather(*(crear() for _ in range(5)))
+        assert len(set(ids)) == 1
+
+        async with session_factory() as db:
+            await JobService(db).finalizar(ids[0], EstadoJob.COMPLETADO)
+            await db.commit()
+        # Terminada la tarea, la misma clave encola una nueva
+        assert await crear() != ids[0]
+
+    _con_base_de_datos(escenario)
@@ -0,0 +1,149 @@
+"""
+Pruebas del almacenamiento en disco local y de sus URLs firmadas.
+"""
+
+import asyncio
+import hashlib
+import multiprocessing
+import time
+from urllib.parse import urlsplit
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.main import ebs_exception_handler
+from app.routes import archivos
+from app.services.local_storage_service import LocalStorageService
+from app.utils.exceptions import EBSException, ValidationError
+
+
+@pytest.fixture
+def almacenamiento(tmp_path) -> LocalStorageService:
+    return LocalStorageService(raiz=str(tmp_path), secreto="secreto-de-prueba", url_base="")
+
+
+def _objetos(almacenamiento: LocalStorageService):
+    return sorted(p for p in (almacenamiento.raiz / "objetos").rglob("*") if p.is_file())
+
+
+def test_archivos_por_contenido_se_comparten_y_se_liberan(almacenamiento: LocalStorageService) -> None:
+    async def escenario():
+        await almacenamiento.upload_file(b"%PDF-igual", "certificados/a.pdf")
+        await almacenamiento.upload_file(b"%PDF-igual", "certificados/b.pdf")
+        await almacenamiento.upload_file(b"%PDF-otro", "certificados/c.pdf")
+        objetos = _objetos(almacenamiento)
+        assert [o.name for o in objetos] == sorted(
+            hashlib.sha256(c).hexdigest() for c in (b"%PDF-igual", b"%PDF-otro")
+        )
+        assert await almacenamiento.get_file_size("certificados/a.pdf") == len(b"%PDF-igual")
+
+        # Sobrescribir c con el contenido de a libera el objeto que solo usaba c
+        await almacenamiento.upload_file(b"%PDF-igual", "certificados/c.pdf")
+        assert len(_objetos(almacenamiento)) == 1
+
+        await almacenamiento.delete_file("certificados/a.pdf")
+        await almacenamiento.delete_file("certificados/b.pdf")
+        assert len(_objetos(almacenamiento)) == 1
+        await almacenamiento.delete_file("certificados/c.pdf")
+        assert _objetos(almacenamiento) == []
+        assert not await almacenamiento.file_exists("certificados/c.pdf")
+        assert await almacenamiento.get_file_url("certificados/c.pdf") is None
+
+    asyncio.run(escenario())
+
+
+def _subir_y_borrar(raiz: str, proceso: int, veces: int) -> None:
+    almacenamiento = LocalStorageService(raiz=raiz, secreto="secreto-de-prueba", url_base="")
+
+    async def ciclo():
+        for i in range(veces):
+            await almacenamiento.upload_file(b"%PDF-compartido", f"certificados/{proceso}-{i}.pdf")
+            await almacenamiento.delete_file(f"certificados/{proceso}-{i}.pdf")
+
+    asyncio.run(ciclo())
+
+
+def test_procesos_que_comparten_la_raiz_no_pierden_objetos(tmp_path) -> None:
+    # Como la API y el worker: mientras uno enlaza el objeto compartido, otro borra su última clave
+    contexto = multiprocessing.get_context("spawn")
+    procesos = [contexto.Process(target=_subir_y_borrar, args=(str(tmp_path), n, 200)) for n in range(4)]
+    for proceso in procesos:
+        proceso.start()
+    for proceso in procesos:
+        proceso.join(timeout=120)
+    assert [p.exitcode for p in procesos] == [0, 0, 0, 0]
+    assert not [p for p in (tmp_path / "objetos").rglob("*") if p.is_file()]
+
+
+def test_flujo_excedido_no_deja_archivo(almacenamiento: LocalStorageService) -> None:
+    async def bloques():
+        for _ in range(10):
+            yield b"x" * 100
+
+    async def escenario():
+        with pytest.raises(ValidationError):
+            await almacenamiento.upload_stream(bloques(), "guias-estudio/g/a.pdf", max_size=450)
+        assert not await almacenamiento.file_exists("guias-estudio/g/a.pdf")
+        assert list((almacenamiento.raiz / "tmp").iterdir()) == []
+
+        archivo = await almacenamiento.upload_stream(bloques(), "guias-estudio/g/a.pdf", max_size=1000)
+        assert (archivo.tamano, archivo.sha256) == (1000, hashlib.sha256(b"x" * 1000).hexdigest())
+
+    asyncio.run(escenario())
+
+
+def test_claves_fuera_del_almacenamiento_se_rechazan(almacenamiento: LocalStorageService) -> None:
+    with pytest.raises(ValueError):
+        almacenamiento.ruta_clave("../../etc/passwd")
+
+
+@pytest.fixture
+def cliente(almacenamiento, monkeypatch) -> TestClient:
+    monkeypatch.setattr(archivos, "get_s3_service", lambda: almacenamiento)
+    app = FastAPI()
+    app.add_exception_handler(EBSException, ebs_exception_handler)
+    app.include_router(archivos.router, prefix="/api")
+    return TestClient(app)
+
+
+def _ruta(url: str) -> str:
+    partes = urlsplit(url)
+    return f"{partes.path}?{partes.query}"
+
+
+def test_urls_firmadas_de_descarga_con_rangos(almacenamiento: LocalStorageService, cliente: TestClient) -> None:
+    contenido = bytes(range(256)) * 40
+    asyncio.run(almacenamiento.upload_file(contenido, "certificados/x.pdf"))
+    url = _ruta(asyncio.run(almacenamiento.get_file_url("certificados/x.pdf")))
+
+    respuesta = cliente.get(url)
+    assert respuesta.status_code == 200
+    assert respuesta.content == contenido
+    assert respuesta.headers["content-type"] == "application/pdf"
+
+    parcial = cliente.get(url, headers={"Range": "bytes=100-199"})
+    assert parcial.status_code == 206
+    assert parcial.content == contenido[100:200]
+    assert parcial.headers["content-range"] == f"bytes 100-199/{len(contenido)}"
+
+    assert cliente.get(url.replace("certificados/x.pdf", "certificados/y.pdf")).status_code == 403
+    vencida = asyncio.run(almacenamiento.generate_presigned_url("certificados/x.pdf", expiration=-1))
+    assert cliente.get(_ruta(vencida)).status_code == 403
+
+
+def test_subida_con_url_firmada(almacenamiento: LocalStorageService, cliente: TestClient) -> None:
+    formulario = asyncio.run(
+        almacenamiento.generate_presigned_post("guias-estudio/g/b.pdf", "application/pdf", max_size=1000)
+    )
+    assert formulario["metodo"] == "PUT"
+    url = _ruta(formulario["url"])
+
+    assert cliente.put(url, content=b"%PDF-b", headers={"Content-Type": "text/plain"}).status_code == 422
+    assert cliente.put(url, content=b"x" * 1001, headers={"Content-Type": "application/pdf"}).status_code == 422
+    assert cliente.put(url, content=b"%PDF-b", headers={"Content-Type": "application/pdf"}).status_code == 204
+    assert asyncio.run(almacenamiento.get_file_size("guias-estudio/g/b.pdf")) == len(b"%PDF-b")
+
+    # La firma cubre el tamaño máximo: no se puede ampliar en la URL
+    assert cliente.put(url.replace("max=1000", "max=99999"), content=b"%PDF-b",
+                       headers={"Content-Type": "application/pdf"}).status_code == 403
@@ -0,0 +1,112 @@
+"""
+Pruebas de la paginación por cursor (keyset).
+
+La prueba contra base de datos requiere PostgreSQL inicializado con
+database/init.sql, indicado en TEST_DATABASE_URL; las demás no usan base de datos.
+"""
+
+import asyncio
+import os
+import uuid
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import models
+from app.services.curso_service import CursoService, KEYSET_CURSOS
+from app.utils.exceptions import ValidationError
+from app.utils.pagination import Keyset
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+KEYSET_COMENTARIOS = Keyset(models.ForoComentario.creado_en, models.ForoComentario.id, descendente=True)
+
+
+def test_cursor_roundtrip_preserves_types() -> None:
+    fila = SimpleNamespace(
+        creado_en=datetime(2025, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+        id=uuid.uuid4(),
+    )
+    cursor = KEYSET_COMENTARIOS.codificar(fila)
+    assert KEYSET_COMENTARIOS.decodificar(cursor) == [fila.creado_en, fila.id]
+
+
+@pytest.mark.parametrize("cursor", ["no-es-base64!", "W10", "WyJ4Il0"])
+def test_invalid_cursor_rejected(cursor: str) -> None:
+    with pytest.raises(ValidationError):
+        KEYSET_COMENTARIOS.decodificar(cursor)
+
+
+def test_cursor_replaces_offset() -> None:
+    fila = SimpleNamespace(creado_en=datetime.now(timezone.utc), id=uuid.uuid4())
+    stmt = KEYSET_COMENTARIOS.aplicar(
+        select(models.ForoComentario),
+        cursor=KEYSET_COMENTARIOS.codificar(fila),
+        skip=500,
+        limit=20,
+    )
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "OFFSET" not in sql
+    assert "(foro_comentario.creado_en, foro_comentario.id) <" in sql
+    assert "ORDER BY foro_comentario.creado_en DESC, foro_comentario.id DESC" in sql
+
+
+def test_siguiente_only_when_page_full() -> None:
+    filas = [SimpleNamespace(creado_en=datetime.now(timezone.utc), id=uuid.uuid4()) for _ in range(3)]
+    assert KEYSET_COMENTARIOS.siguiente(filas, limit=4) is None
+    assert KEYSET_COMENTARIOS.siguiente(filas, limit=3) == KEYSET_COMENTARIOS.codificar(filas[-1])
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL")
+def test_cursor_pages_match_full_listing_with_duplicate_keys() -> None:
+    async def escenario() -> None:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        modulo_id = uuid.uuid4()
+        # Títulos repetidos: el id debe desempatar sin perder ni repetir filas
+        curso_ids = [uuid.uuid4() for _ in range(7)]
+        try:
+            async with session_factory() as db:
+                db.add(models.Modulo(
+                    id=modulo_id,
+                    titulo="Módulo paginación",
+                    fecha_inicio=date(2020, 1, 1),
+                    fecha_fin=date(2099, 1, 1),
+                ))
+                for i, curso_id in enumerate(curso_ids):
+                    db.add(models.Curso(id=curso_id, titulo=f"Curso {i % 3}"))
+                await db.flush()
+                for slot, curso_id in enumerate(curso_ids, start=1):
+                    db.add(models.ModuloCurso(id=uuid.uuid4(), modulo_id=modulo_id, curso_id=curso_id, slot=slot))
+                await db.commit()
+
+            async with session_factory() as db:
+                service = CursoService(db)
+                completa = await service.list_cursos(modulo_id=modulo_id, limit=100)
+
+                paginas, cursor = [], None
+                while True:
+                    pagina = await service.list_cursos(modulo_id=modulo_id, limit=3, cursor=cursor)
+                    paginas.extend(pagina)
+                    cursor = KEYSET_CURSOS.siguiente(pagina, 3)
+                    if cursor is None:
+                        break
+
+                por_skip = await service.list_cursos(modulo_id=modulo_id, skip=3, limit=3)
+
+            assert [c.id for c in paginas] == [c.id for c in completa]
+            assert len(completa) == len(curso_ids)
+            assert [c.id for c in por_skip] == [c.id for c in completa[3:6]]
+        finally:
+            async with session_factory() as db:
+                await db.execute(delete(models.ModuloCurso).where(models.ModuloCurso.modulo_id == modulo_id))
+                await db.execute(delete(models.Modulo).where(models.Modulo.id == modulo_id))
+                await db.execute(delete(models.Curso).where(models.Curso.id.in_(curso_ids)))
+                await db.commit()
+            await engine.dispose()
+
+    asyncio.run(escenario())
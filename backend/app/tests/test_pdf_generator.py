@@ -0,0 +1,60 @@
+"""
+Pruebas de la plantilla compilada de certificados.
+"""
+
+import re
+import zlib
+from datetime import datetime
+
+from app.utils.pdf_generator import PlantillaCertificado, generar_pdf_certificado, obtener_plantilla
+
+FECHA = datetime(2025, 6, 30, 10, 0)
+
+
+def _objetos(pdf: bytes) -> dict:
+    return {int(n): cuerpo for n, cuerpo in re.findall(rb"(\d+) 0 obj\n(.*?)\nendobj\n", pdf, re.S)}
+
+
+def test_xref_apunta_a_cada_objeto() -> None:
+    pdf = generar_pdf_certificado("Ana", "López", "Curso de prueba", "CERT-20250630-ABC123", FECHA)
+    assert pdf.startswith(b"%PDF-1.4") and pdf.endswith(b"%%EOF\n")
+
+    inicio_xref = int(re.search(rb"startxref\n(\d+)\n", pdf).group(1))
+    assert pdf[inicio_xref:].startswith(b"xref\n0 10\n")
+    entradas = re.findall(rb"(\d{10}) 00000 n ", pdf[inicio_xref:])
+    assert len(entradas) == 9
+    for numero, desplazamiento in enumerate(entradas, start=1):
+        assert pdf[int(desplazamiento):].startswith(b"%d 0 obj\n" % numero)
+
+
+def test_campos_variables_en_la_capa_superpuesta() -> None:
+    pdf = generar_pdf_certificado("Ana", "López (hija)", "Curso de prueba", "CERT-1", FECHA)
+    objetos = _objetos(pdf)
+    capa = objetos[8]
+    # El nombre va en mayúsculas, en WinAnsi y con paréntesis escapados
+    assert "ANA LÓPEZ \\(HIJA\\)".encode("cp1252") in capa
+    assert b"(CERT-1)" in capa
+    assert FECHA.strftime("%d de %B de %Y").encode() in capa
+    # Con plantilla por curso, el título queda en la capa fija comprimida
+    assert b"Curso de prueba" not in capa
+    fija = zlib.decompress(re.search(rb"stream\n(.*)\nendstream", objetos[7], re.S).group(1))
+    assert b"(Curso de prueba)" in fija
+    assert b"CERTIFICADO DE ACREDITACI\xd3N" in fija
+
+
+def test_plantilla_global_estampa_el_curso() -> None:
+    pdf = PlantillaCertificado().estampar("Ana", "López", "Curso global", "CERT-2", FECHA)
+    assert b"(Curso global)" in _objetos(pdf)[8]
+
+
+def test_plantilla_cacheada_por_curso() -> None:
+    assert obtener_plantilla("Curso A") is obtener_plantilla("Curso A")
+    assert obtener_plantilla("Curso A") is not obtener_plantilla("Curso B")
+
+
+def test_titulo_largo_se_achica_para_caber() -> None:
+    titulo = "Historia y teología de los profetas mayores y menores del Antiguo Testamento " * 3
+    capa = _objetos(PlantillaCertificado().estampar("Ana", "López", titulo, "CERT-3", FECHA))[8]
+    lineas_curso = [linea for linea in capa.split(b"\n") if b"/F2" in linea and b"ANA" not in linea]
+    assert 1 <= len(lineas_curso) <= 3
+    assert float(re.search(rb"/F2 ([\d.]+) Tf", lineas_curso[0]).group(1)) < 14
@@ -0,0 +1,88 @@
+"""
+Pruebas del mapa en memoria de preferencias de notificación.
+
+La prueba de sincronización requiere una base de datos PostgreSQL inicializada
+con database/init.sql, indicada en TEST_DATABASE_URL.
+"""
+
+import asyncio
+import os
+import uuid
+
+import pytest
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import models
+from app.services.preferencia_service import MapaPreferencias
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def test_solo_se_guardan_usuarios_con_tipos_desactivados() -> None:
+    mapa = MapaPreferencias(intervalo_segundos=30, margen_segundos=60)
+    ana, beto = uuid.uuid4(), uuid.uuid4()
+    mapa.aplicar(ana, False, None, True)
+    mapa.aplicar(beto, None, None, None)
+
+    assert not mapa.acepta(ana, "email_recordatorios")
+    assert mapa.acepta(ana, "email_motivacion") and mapa.acepta(beto, "email_recordatorios")
+    assert mapa.preferencias(ana) == {"email_recordatorios": False, "email_motivacion": True, "email_resultados": True}
+    assert list(mapa._desactivados) == [ana]
+
+    mapa.aplicar(ana, True, None, None)
+    assert mapa.acepta(ana, "email_recordatorios") and not mapa._desactivados
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL")
+def test_sincronizar_carga_y_luego_lee_solo_los_cambios() -> None:
+    async def escenario() -> None:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        usuarios = {nombre: uuid.uuid4() for nombre in ("desactivo", "por_defecto")}
+        try:
+            async with session_factory() as db:
+                for nombre, usuario_id in usuarios.items():
+                    db.add(models.Usuario(id=usuario_id, nombre=nombre, apellido="Test", email=f"{usuario_id}@example.com"))
+                await db.flush()
+                db.add(models.PreferenciaNotificacion(usuario_id=usuarios["desactivo"], email_recordatorios=False))
+                db.add(models.PreferenciaNotificacion(usuario_id=usuarios["por_defecto"]))
+                await db.commit()
+
+            mapa = MapaPreferencias(intervalo_segundos=3600, margen_segundos=60)
+            async with session_factory() as db:
+                await mapa.sincronizar(db)
+            assert not mapa.acepta(usuarios["desactivo"], "email_recordatorios")
+            assert mapa.acepta(usuarios["por_defecto"], "email_recordatorios")
+
+            # Otro proceso cambia las preferencias
+            async with session_factory() as db:
+                await db.execute(
+                    update(models.PreferenciaNotificacion)
+                    .where(models.PreferenciaNotificacion.usuario_id == usuarios["desactivo"])
+                    .values(email_recordatorios=None)
+                )
+                await db.execute(
+                    update(models.PreferenciaNotificacion)
+                    .where(models.PreferenciaNotificacion.usuario_id == usuarios["por_defecto"])
+                    .values(email_resultados=False)
+                )
+                await db.commit()
+
+            async with session_factory() as db:
+                # Dentro del intervalo no se vuelve a leer
+                await mapa.sincronizar(db)
+                assert not mapa.acepta(usuarios["desactivo"], "email_recordatorios")
+                await mapa.sincronizar(db, forzar=True)
+            assert mapa.acepta(usuarios["desactivo"], "email_recordatorios")
+            assert not mapa.acepta(usuarios["por_defecto"], "email_resultados")
+        finally:
+            async with session_factory() as db:
+                await db.execute(delete(models.PreferenciaNotificacion).where(
+                    models.PreferenciaNotificacion.usuario_id.in_(usuarios.values())
+                ))
+                await db.execute(delete(models.Usuario).where(models.Usuario.id.in_(usuarios.values())))
+                await db.commit()
+            await engine.dispose()
+
+    asyncio.run(escenario())
@@ -0,0 +1,176 @@
+"""
+Pruebas de la campaña de recordatorios de progreso.
+
+Requieren una base de datos PostgreSQL inicializada con database/init.sql y
+database/trigger.init.sql, indicada en TEST_DATABASE_URL.
+"""
+
+import asyncio
+import os
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import models
+from app.database.enums import EstadoJob, ResultadoIntento
+from app.services.email_dispatcher import LimitadorTasa, MensajeEmail
+from app.services.email_service import EmailService
+from app.services.job_service import JobService
+from app.services.progreso_service import ProgresoService
+from app.tasks import email_tasks
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL,
+    reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL",
+)
+
+# alumno -> (días desde la inscripción, días desde su último intento aprobado, recibe recordatorios)
+ALUMNOS = {
+    "inactivo": (60, 30, None),
+    "sin_intentos": (30, None, None),
+    "activo": (60, 0, None),
+    "recien_inscrito": (0, None, None),
+    "sin_recordatorios": (30, None, False),
+}
+
+
+class _TransporteSimulado:
+    def __init__(self):
+        self.enviados = []
+
+    async def enviar(self, mensaje: MensajeEmail) -> str:
+        self.enviados.append(mensaje)
+        return f"id-{len(self.enviados)}"
+
+    def cerrar(self) -> None:
+        pass
+
+
+async def _crear_curso(session_factory) -> dict:
+    """Curso de dos lecciones con un quiz cada una y una inscripción por alumno de ALUMNOS."""
+    ids = {
+        "curso_id": uuid.uuid4(),
+        "modulo_id": uuid.uuid4(),
+        "leccion_ids": [uuid.uuid4(), uuid.uuid4()],
+        "quiz_ids": [uuid.uuid4(), uuid.uuid4()],
+        "usuarios": {alumno: uuid.uuid4() for alumno in ALUMNOS},
+    }
+    ahora = datetime.now(timezone.utc)
+    async with session_factory() as db:
+        db.add(models.Curso(id=ids["curso_id"], titulo="Curso recordatorios", publicado=True))
+        db.add(models.Modulo(
+            id=ids["modulo_id"],
+            titulo="Módulo recordatorios",
+            fecha_inicio=date(2020, 1, 1),
+            fecha_fin=date(2099, 1, 1),
+            publicado=True,
+        ))
+        for alumno, usuario_id in ids["usuarios"].items():
+            db.add(models.Usuario(id=usuario_id, nombre=alumno, apellido="Test", email=f"{alumno}-{usuario_id}@example.com"))
+        await db.flush()
+        db.add(models.ModuloCurso(modulo_id=ids["modulo_id"], curso_id=ids["curso_id"], slot=1))
+        for orden, (leccion_id, quiz_id) in enumerate(zip(ids["leccion_ids"], ids["quiz_ids"]), start=1):
+            db.add(models.Leccion(id=leccion_id, modulo_id=ids["modulo_id"], titulo=f"Lección {orden}", orden=orden, publicado=True))
+            await db.flush()
+            db.add(models.Quiz(id=quiz_id, leccion_id=leccion_id, titulo=f"Quiz {orden}", publicado=True))
+        for alumno, (dias_inscripcion, dias_intento, recordatorios) in ALUMNOS.items():
+            usuario_id = ids["usuarios"][alumno]
+            inscripcion_id = uuid.uuid4()
+            db.add(models.InscripcionCurso(
+                id=inscripcion_id,
+                usuario_id=usuario_id,
+                curso_id=ids["curso_id"],
+                fecha_inscripcion=date.today() - timedelta(days=dias_inscripcion),
+            ))
+            if recordatorios is not None:
+                db.add(models.PreferenciaNotificacion(usuario_id=usuario_id, email_recordatorios=recordatorios))
+            await db.flush()
+            if dias_intento is not None:
+                db.add(models.Intento(
+                    usuario_id=usuario_id,
+                    inscripcion_curso_id=inscripcion_id,
+                    quiz_id=ids["quiz_ids"][0],
+                    numero_intento=1,
+                    resultado=ResultadoIntento.APROBADO,
+                    finalizado_en=ahora - timedelta(days=dias_intento),
+                ))
+        await db.commit()
+    return ids
+
+
+async def _eliminar_curso(session_factory, ids: dict) -> None:
+    usuario_ids = list(ids["usuarios"].values())
+    async with session_factory() as db:
+        await db.execute(delete(models.Intento).where(models.Intento.quiz_id.in_(ids["quiz_ids"])))
+        await db.execute(delete(models.InscripcionCurso).where(models.InscripcionCurso.curso_id == ids["curso_id"]))
+        await db.execute(delete(models.Quiz).where(models.Quiz.id.in_(ids["quiz_ids"])))
+        await db.execute(delete(models.Leccion).where(models.Leccion.id.in_(ids["leccion_ids"])))
+        await db.execute(delete(models.ModuloCurso).where(models.ModuloCurso.modulo_id == ids["modulo_id"]))
+        await db.execute(delete(models.Modulo).where(models.Modulo.id == ids["modulo_id"]))
+        await db.execute(delete(models.Curso).where(models.Curso.id == ids["curso_id"]))
+        await db.execute(delete(models.Job).where(models.Job.parametros["curso_id"].astext == str(ids["curso_id"])))
+        await db.execute(delete(models.PreferenciaNotificacion).where(models.PreferenciaNotificacion.usuario_id.in_(usuario_ids)))
+        await db.execute(delete(models.Usuario).where(models.Usuario.id.in_(usuario_ids)))
+        await db.commit()
+
+
+def _run_con_curso(escenario, monkeypatch) -> None:
+    async def runner() -> None:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        monkeypatch.setattr(email_tasks, "get_background_db_session", session_factory)
+        ids = await _crear_curso(session_factory)
+        try:
+            await escenario(session_factory, ids)
+        finally:
+            await _eliminar_curso(session_factory, ids)
+            await engine.dispose()
+
+    asyncio.run(runner())
+
+
+def test_inscripciones_inactivas_filtra_y_calcula_progreso(monkeypatch) -> None:
+    async def escenario(session_factory, ids: dict) -> None:
+        inactivas_desde = datetime.now(timezone.utc) - timedelta(days=14)
+        async with session_factory() as db:
+            lotes = [
+                lote async for lote in ProgresoService(db).iterar_inscripciones_inactivas(
+                    inactivas_desde, ids["curso_id"], tamano_chunk=1
+                )
+            ]
+        assert all(len(lote) == 1 for lote in lotes)
+        progreso = {fila["nombre"]: float(fila["progreso_porcentaje"]) for lote in lotes for fila in lote}
+        # Una de dos lecciones y uno de dos quizzes aprobados
+        assert progreso == {"inactivo": 50.0, "sin_intentos": 0.0}
+
+    _run_con_curso(escenario, monkeypatch)
+
+
+def test_campana_envia_a_inactivos_y_registra_el_job(monkeypatch) -> None:
+    transporte = _TransporteSimulado()
+    monkeypatch.setattr(
+        email_tasks, "get_email_service",
+        lambda: EmailService(transporte=transporte, limitador=LimitadorTasa(tasa=1000)),
+    )
+
+    async def escenario(session_factory, ids: dict) -> None:
+        async with session_factory() as db:
+            job = await JobService(db).crear_job("campana_recordatorio_progreso", {"curso_id": str(ids["curso_id"])})
+
+        await email_tasks.campana_recordatorio_progreso(job.id, dias_inactividad=14, curso_id=ids["curso_id"], tamano_chunk=1)
+
+        async with session_factory() as db:
+            job = await JobService(db).get_job(job.id)
+        assert job.estado == EstadoJob.COMPLETADO
+        assert job.procesados == 2 and job.resultado == {"enviados": 2, "fallidos": 0}
+        enviados = {m.destinatario.split("-")[0]: m for m in transporte.enviados}
+        assert set(enviados) == {"inactivo", "sin_intentos"}
+        assert enviados["inactivo"].asunto == "Continúa tu progreso en Curso recordatorios"
+        assert "50.0%" in enviados["inactivo"].body_text
+
+    _run_con_curso(escenario, monkeypatch)
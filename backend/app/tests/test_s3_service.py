@@ -0,0 +1,295 @@
+"""
+Pruebas de la interfaz asíncrona de S3.
+
+Las pruebas de ida y vuelta requieren un endpoint compatible con S3 (MinIO del
+perfil s3-local de docker-compose, o moto_server) indicado en TEST_S3_ENDPOINT_URL;
+las demás usan un cliente simulado.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import httpx
+import pytest
+from botocore.config import Config
+
+from app.services.s3_service import S3Service
+from app.utils.exceptions import ValidationError
+
+TEST_S3_ENDPOINT_URL = os.getenv("TEST_S3_ENDPOINT_URL")
+
+
+class _ClienteLento:
+    """Cliente que bloquea el hilo como una llamada de red de boto3."""
+
+    def __init__(self, demora: float):
+        self.demora = demora
+        self.hilos = set()
+
+    def put_object(self, **kwargs):
+        self.hilos.add(threading.current_thread().name)
+        time.sleep(self.demora)
+        return {}
+
+
+def test_llamadas_al_sdk_no_bloquean_el_event_loop() -> None:
+    async def escenario():
+        cliente = _ClienteLento(demora=0.2)
+        executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="s3-prueba")
+        service = S3Service(s3_client=cliente, executor=executor)
+        latidos = 0
+
+        async def latir():
+            nonlocal latidos
+            while True:
+                await asyncio.sleep(0.01)
+                latidos += 1
+
+        latido = asyncio.create_task(latir())
+        inicio = time.perf_counter()
+        await asyncio.gather(*(service.upload_file(b"x", f"k{i}") for i in range(8)))
+        duracion = time.perf_counter() - inicio
+        latido.cancel()
+        executor.shutdown()
+        return cliente, duracion, latidos
+
+    cliente, duracion, latidos = asyncio.run(escenario())
+    # 8 llamadas de 0.2s con 4 hilos: dos tandas, y el loop siguió atendiendo mientras tanto
+    assert 0.35 < duracion < 0.7
+    assert latidos >= 20
+    assert cliente.hilos and all(nombre.startswith("s3-prueba") for nombre in cliente.hilos)
+
+
+@pytest.fixture
+def s3_local(monkeypatch):
+    if not TEST_S3_ENDPOINT_URL:
+        pytest.skip("TEST_S3_ENDPOINT_URL no configurada; se requiere un S3 compatible local")
+    bucket = f"ebs-prueba-{uuid.uuid4().hex[:8]}"
+    cliente = boto3.client(
+        "s3",
+        endpoint_url=TEST_S3_ENDPOINT_URL,
+        region_name="us-east-1",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID", "prueba"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY", "prueba"),
+        config=Config(signature_version="s3v4"),
+    )
+    cliente.create_bucket(Bucket=bucket)
+    service = S3Service(s3_client=cliente, executor=ThreadPoolExecutor(max_workers=4))
+    service.bucket_name = bucket
+    yield service
+    for objeto in cliente.list_objects_v2(Bucket=bucket).get("Contents", []):
+        cliente.delete_object(Bucket=bucket, Key=objeto["Key"])
+    cliente.delete_bucket(Bucket=bucket)
+    service._executor.shutdown()
+
+
+def test_ida_y_vuelta_contra_s3_local(s3_local: S3Service) -> None:
+    async def escenario():
+        clave = S3Service.build_certificate_key(str(uuid.uuid4()))
+        assert not await s3_local.file_exists(clave)
+        assert await s3_local.get_file_url(clave) is None
+
+        await s3_local.upload_file(b"%PDF-prueba", clave, content_type="application/pdf")
+        assert await s3_local.file_exists(clave)
+        url = await s3_local.get_file_url(clave)
+        async with httpx.AsyncClient() as http:
+            respuesta = await http.get(url)
+        assert respuesta.status_code == 200
+        assert respuesta.content == b"%PDF-prueba"
+
+        async def bloques():
+            for _ in range(3):
+                yield b"a" * 1024
+
+        archivo = await s3_local.upload_stream(bloques(), "reportes/prueba.csv")
+        assert archivo.tamano == 3 * 1024
+        assert archivo.sha256 == hashlib.sha256(b"a" * 3 * 1024).hexdigest()
+        assert await s3_local.file_exists("reportes/prueba.csv")
+
+        await s3_local.delete_file(clave)
+        assert not await s3_local.file_exists(clave)
+
+    asyncio.run(escenario())
+
+
+class _ClienteContador:
+    """Cliente que cuenta las llamadas al SDK."""
+
+    def __init__(self):
+        self.llamadas = []
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn):
+        self.llamadas.append(ClientMethod)
+        return f"https://s3.local/{Params['Key']}?firma={len(self.llamadas)}"
+
+    def head_object(self, **kwargs):
+        self.llamadas.append("head_object")
+        return {}
+
+    def delete_object(self, **kwargs):
+        self.llamadas.append("delete_object")
+        return {}
+
+
+def test_urls_prefirmadas_en_cache_sin_llamadas_al_sdk(monkeypatch) -> None:
+    reloj = [1_000_000.0]
+    monkeypatch.setattr("app.services.s3_service.time.time", lambda: reloj[0])
+
+    async def escenario():
+        cliente = _ClienteContador()
+        executor = ThreadPoolExecutor(max_workers=2)
+        service = S3Service(s3_client=cliente, executor=executor)
+        claves = [f"certificados/{i}.pdf" for i in range(5)]
+
+        primeras = [await service.get_file_url(clave) for clave in claves]
+        assert cliente.llamadas.count("head_object") == 5
+        assert cliente.llamadas.count("get_object") == 5
+
+        # Cache caliente: listar de nuevo no toca el SDK
+        cliente.llamadas.clear()
+        assert [await service.get_file_url(clave) for clave in claves] == primeras
+        assert [await service.generate_presigned_url(clave) for clave in claves] == primeras
+        assert cliente.llamadas == []
+
+        # El método es parte de la clave de la caché
+        put = await service.generate_presigned_url(claves[0], http_method="PUT")
+        assert put != primeras[0] and cliente.llamadas == ["put_object"]
+
+        # Cerca de vencer (menos de la mitad de la validez pedida) se vuelve a firmar
+        cliente.llamadas.clear()
+        reloj[0] += 1900
+        assert await service.generate_presigned_url(claves[1]) != primeras[1]
+        assert cliente.llamadas == ["get_object"]
+
+        # Eliminar el objeto invalida sus URLs
+        cliente.llamadas.clear()
+        await service.delete_file(claves[2])
+        await service.get_file_url(claves[2])
+        assert cliente.llamadas == ["delete_object", "head_object", "get_object"]
+        executor.shutdown()
+
+    asyncio.run(escenario())
+
+
+def test_cache_de_urls_acotada() -> None:
+    from app.services.s3_service import CacheUrlsPrefirmadas
+
+    cache = CacheUrlsPrefirmadas(capacidad=2)
+    vence = time.time() + 3600
+    for clave in ("a", "b", "c"):
+        cache.guardar(clave, "GET", f"url-{clave}", vence)
+    assert cache.obtener("a", "GET", 3600) is None
+    assert cache.obtener("c", "GET", 3600) == "url-c"
+
+
+class _ClienteMultipart:
+    """Cliente que registra las operaciones de subida."""
+
+    def __init__(self):
+        self.llamadas = []
+
+    def put_object(self, **kwargs):
+        self.llamadas.append("put_object")
+
+    def create_multipart_upload(self, **kwargs):
+        self.llamadas.append("create_multipart_upload")
+        return {"UploadId": "u1"}
+
+    def upload_part(self, PartNumber, Body, **kwargs):
+        self.llamadas.append(("upload_part", PartNumber, len(Body)))
+        return {"ETag": f"e{PartNumber}"}
+
+    def complete_multipart_upload(self, **kwargs):
+        self.llamadas.append("complete_multipart_upload")
+
+    def abort_multipart_upload(self, **kwargs):
+        self.llamadas.append("abort_multipart_upload")
+
+
+def test_subida_en_streaming_aplica_el_limite_mientras_lee() -> None:
+    leidos = 0
+
+    async def bloques(n: int):
+        nonlocal leidos
+        for _ in range(n):
+            leidos += 1
+            yield b"x" * 100
+
+    async def escenario():
+        nonlocal leidos
+        cliente = _ClienteMultipart()
+        executor = ThreadPoolExecutor(max_workers=2)
+        service = S3Service(s3_client=cliente, executor=executor)
+
+        # Cabe en una parte: un solo put_object
+        archivo = await service.upload_stream(bloques(3), "a", part_size=1000)
+        assert (archivo.tamano, archivo.sha256) == (300, hashlib.sha256(b"x" * 300).hexdigest())
+        assert cliente.llamadas == ["put_object"]
+
+        # Excede el límite antes de completar la primera parte: no se llama a S3
+        cliente.llamadas.clear()
+        leidos = 0
+        with pytest.raises(ValidationError):
+            await service.upload_stream(bloques(1000), "b", part_size=1000, max_size=450)
+        assert leidos == 5 and cliente.llamadas == []
+
+        # Excede el límite ya en multipart: se aborta la subida
+        cliente.llamadas.clear()
+        leidos = 0
+        with pytest.raises(ValidationError):
+            await service.upload_stream(bloques(1000), "c", part_size=200, max_size=450)
+        assert leidos == 5
+        assert cliente.llamadas == [
+            "create_multipart_upload",
+            ("upload_part", 1, 200),
+            ("upload_part", 2, 200),
+            "abort_multipart_upload",
+        ]
+
+        # Varias partes y una última más corta
+        cliente.llamadas.clear()
+        archivo = await service.upload_stream(bloques(5), "d", part_size=200)
+        assert archivo.tamano == 500
+        assert [l for l in cliente.llamadas if isinstance(l, tuple)] == [
+            ("upload_part", 1, 200), ("upload_part", 2, 200), ("upload_part", 3, 100)
+        ]
+        assert cliente.llamadas[-1] == "complete_multipart_upload"
+        executor.shutdown()
+
+    asyncio.run(escenario())
+
+
+def test_multipart_y_post_prefirmado_contra_s3_local(s3_local: S3Service) -> None:
+    parte = 5 * 1024 * 1024
+    contenido = os.urandom(64 * 1024) * 176  # 11 MB: dos partes completas y una menor
+
+    async def bloques():
+        for i in range(0, len(contenido), 64 * 1024):
+            yield contenido[i:i + 64 * 1024]
+
+    async def escenario():
+        archivo = await s3_local.upload_stream(bloques(), "guias-estudio/grande.pdf", part_size=parte)
+        assert archivo.tamano == len(contenido)
+        assert archivo.sha256 == hashlib.sha256(contenido).hexdigest()
+        assert await s3_local.get_file_size("guias-estudio/grande.pdf") == len(contenido)
+
+        formulario = await s3_local.generate_presigned_post(
+            "guias-estudio/directa.pdf", "application/pdf", max_size=1024
+        )
+        async with httpx.AsyncClient() as http:
+            respuesta = await http.post(
+                formulario["url"],
+                data=formulario["fields"],
+                files={"file": ("directa.pdf", b"%PDF-directa", "application/pdf")},
+            )
+        assert respuesta.status_code in (200, 201, 204)
+        assert await s3_local.get_file_size("guias-estudio/directa.pdf") == len(b"%PDF-directa")
+        assert await s3_local.get_file_size("guias-estudio/no-existe.pdf") is None
+
+    asyncio.run(escenario())
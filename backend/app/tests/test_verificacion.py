@@ -0,0 +1,98 @@
+"""
+Pruebas de la verificación pública de certificados por folio.
+
+La prueba de verificación en lote y revocación requiere PostgreSQL inicializado con
+database/init.sql, indicado en TEST_DATABASE_URL.
+"""
+
+import asyncio
+import os
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import models
+from app.services import verificacion_service
+from app.services.verificacion_service import CacheVerificaciones, CertificadoVerificable, VerificacionService, resultado_verificacion
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def _certificado(folio: str) -> CertificadoVerificable:
+    return CertificadoVerificable(folio=folio, hash_verificacion="abc", valido=True, emitido_en=None)
+
+
+def test_cache_acota_entradas_y_vence_negativos_antes(monkeypatch) -> None:
+    ahora = [1000.0]
+    monkeypatch.setattr(verificacion_service.time, "monotonic", lambda: ahora[0])
+    cache = CacheVerificaciones(capacidad=2, ttl_segundos=60, ttl_negativo_segundos=5)
+
+    cache.guardar("A", _certificado("A"))
+    cache.guardar("B", None)
+    assert cache.obtener("A") == (True, _certificado("A"))
+    cache.guardar("C", _certificado("C"))
+    # B era el menos usado
+    assert cache.obtener("B") == (False, None)
+
+    cache.guardar("D", None)
+    ahora[0] += 10
+    assert cache.obtener("D") == (False, None)
+    assert cache.obtener("C")[0]
+    cache.invalidar("C")
+    assert cache.obtener("C") == (False, None)
+
+
+def test_resultado_compara_hash_y_revocacion() -> None:
+    certificado = _certificado("CERT-1")
+    assert resultado_verificacion("CERT-1", certificado, "ABC ")["valido"]
+    assert resultado_verificacion("CERT-1", certificado, "otro")["mensaje"] == "El hash de verificación no coincide"
+    assert not resultado_verificacion("CERT-1", CertificadoVerificable("CERT-1", "abc", False, None))["valido"]
+    assert resultado_verificacion("CERT-X", None)["mensaje"] == "Certificado no encontrado"
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no configurada; se requiere PostgreSQL")
+def test_lote_usa_cache_y_revocar_la_invalida() -> None:
+    async def escenario() -> None:
+        engine = create_async_engine(TEST_DATABASE_URL)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        curso_id, usuario_id, inscripcion_id, certificado_id = (uuid.uuid4() for _ in range(4))
+        folio = f"CERT-VERIF-{certificado_id.hex[:8].upper()}"
+        cache = CacheVerificaciones(capacidad=100, ttl_segundos=60, ttl_negativo_segundos=60)
+        try:
+            async with session_factory() as db:
+                db.add(models.Curso(id=curso_id, titulo="Curso verificación", publicado=True))
+                db.add(models.Usuario(id=usuario_id, nombre="Verif", apellido="Test", email=f"verif-{usuario_id}@example.com"))
+                await db.flush()
+                db.add(models.InscripcionCurso(
+                    id=inscripcion_id, usuario_id=usuario_id, curso_id=curso_id, fecha_inscripcion=date.today()
+                ))
+                await db.flush()
+                db.add(models.Certificado(
+                    id=certificado_id, inscripcion_curso_id=inscripcion_id, folio=folio, hash_verificacion=f"h{certificado_id.hex}"
+                ))
+                await db.commit()
+
+            async with session_factory() as db:
+                encontrados = await VerificacionService(db, cache).buscar([folio.lower(), "CERT-NO-EXISTE", folio])
+                assert set(encontrados) == {folio, "CERT-NO-EXISTE"}
+                assert encontrados[folio].valido and encontrados["CERT-NO-EXISTE"] is None
+
+                # Otro proceso lo revoca: la caché local sigue respondiendo sin consultar
+                await db.execute(update(models.Certificado).where(models.Certificado.id == certificado_id).values(valido=False))
+                await db.commit()
+                assert (await VerificacionService(db, cache).buscar([folio]))[folio].valido
+
+                await VerificacionService(db, cache).revocar(certificado_id)
+                assert not (await VerificacionService(db, cache).buscar([folio]))[folio].valido
+        finally:
+            async with session_factory() as db:
+                await db.execute(delete(models.InscripcionCurso).where(models.InscripcionCurso.id == inscripcion_id))
+                await db.execute(delete(models.Curso).where(models.Curso.id == curso_id))
+                await db.execute(delete(models.Usuario).where(models.Usuario.id == usuario_id))
+                await db.commit()
+            await engine.dispose()
+
+    asyncio.run(escenario())
@@ -1,5 +1,5 @@
 """
-Helpers para BackgroundTasks de FastAPI.
+Helpers para tareas en background (worker de la cola y streaming).
 
 Proporciona utilidades para crear sesiones de BD independientes en background tasks,
 ya que las tareas NO deben usar la sesión del request (se cierra cuando termina).
@@ -2,32 +2,197 @@
 Templates de email para diferentes tipos de notificaciones.
 
 Todos los templates soportan HTML y texto plano.
+
+Cada template se compila una sola vez, al importar el módulo: el texto fuente se
+separa en segmentos fijos y campos `{{ campo }}` (o `{{ campo|filtro }}`) y se
+genera una función que solo sustituye los valores del destinatario. En el HTML
+los valores se escapan. Para un envío masivo, `renderizar_lote` fija primero los
+campos comunes a todos los destinatarios (p. ej. el curso) en la parte fija;
+esa versión se compila una vez y se cachea por valores comunes.
 """
 
-from typing import Tuple, Optional
+import html
+import re
+import textwrap
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
 
+_CAMPO = re.compile(r"\{\{\s*(\w+)(?:\|(\w+))?\s*\}\}")
 
-def template_bienvenida(usuario_nombre: str) -> Tuple[str, str]:
+
+def _enlace_descarga(url: Optional[str]) -> str:
+    if not url:
+        return ""
+    return (
+        f'<p><a href="{html.escape(url)}" style="background-color: #1a472a; color: white; padding: 10px 20px; '
+        'text-decoration: none; border-radius: 5px; display: inline-block;">Descargar Certificado</a></p>'
+    )
+
+
+def _linea_descarga(url: Optional[str]) -> str:
+    return f"\nPuedes descargar tu certificado en: {url}\n" if url else ""
+
+
+# filtro -> (función, si su resultado ya es HTML seguro y no se escapa)
+FILTROS: Dict[str, Tuple[Callable[[Any], str], bool]] = {
+    "decimal": (lambda valor: f"{float(valor):.1f}", True),
+    "enlace_descarga": (_enlace_descarga, True),
+    "linea_descarga": (_linea_descarga, False),
+}
+
+# Segmento de una plantilla: texto fijo o (campo, filtro)
+_Segmento = Union[str, Tuple[str, Optional[str]]]
+
+
+def _parsear(fuente: str, bloque: bool = True) -> List[_Segmento]:
+    """Separar `fuente` en segmentos; un bloque (cuerpo) pierde la sangría común y termina en salto de línea."""
+    if bloque:
+        fuente = textwrap.dedent(fuente).strip() + "\n"
+    segmentos: List[_Segmento] = []
+    posicion = 0
+    for campo in _CAMPO.finditer(fuente):
+        if campo.group(2) is not None and campo.group(2) not in FILTROS:
+            raise ValueError(f"Filtro de plantilla desconocido: {campo.group(2)}")
+        segmentos += [fuente[posicion:campo.start()], (campo.group(1), campo.group(2))]
+        posicion = campo.end()
+    segmentos.append(fuente[posicion:])
+    return segmentos
+
+
+class PlantillaEmail:
     """
-    Template de email de bienvenida para nuevos usuarios.
-    
+    Asunto, cuerpo HTML y cuerpo de texto de un tipo de email, compilados juntos.
+
+    Los tres se traducen a una sola función de Python generada (ver `_compilar`)
+    que calcula cada valor (convertido, filtrado y escapado) una vez por
+    destinatario y une los segmentos fijos con un solo ''.join por parte.
+
     Args:
-        usuario_nombre: Nombre del usuario
-        
-    Returns:
-        Tupla (body_html, body_text)
+        asunto: Asunto; puede tener campos
+        html_fuente: Cuerpo HTML; los valores se escapan salvo los filtros seguros
+        texto_fuente: Cuerpo de texto plano
+    """
+
+    def __init__(self, asunto: str, html_fuente: str, texto_fuente: str, _partes=None):
+        # (segmentos, escapar_html) del asunto, el HTML y el texto
+        self._partes = _partes or (
+            (_parsear(asunto, bloque=False), False),
+            (_parsear(html_fuente), True),
+            (_parsear(texto_fuente), False),
+        )
+        self.campos = frozenset(
+            s[0] for segmentos, _ in self._partes for s in segmentos if not isinstance(s, str)
+        )
+        self._renderizar = self._compilar()
+
+    def _compilar(self) -> Callable[[Mapping[str, Any]], Tuple[str, str, str]]:
+        lineas = ["def renderizar(v):"]
+        variables: Dict[str, str] = {}
+
+        def variable(expresion: str) -> str:
+            if expresion not in variables:
+                variables[expresion] = f"c{len(variables)}"
+                lineas.append(f"    {variables[expresion]} = {expresion}")
+            return variables[expresion]
+
+        cuerpos = []
+        for segmentos, escapar in self._partes:
+            piezas = []
+            for segmento in segmentos:
+                if isinstance(segmento, str):
+                    if segmento:
+                        piezas.append(repr(segmento))
+                    continue
+                campo, filtro = segmento
+                if filtro is None:
+                    valor = variable(f"str(v[{campo!r}])")
+                else:
+                    # Los campos con filtro son opcionales: el filtro recibe None si faltan
+                    valor = variable(f"_filtro_{filtro}(v.get({campo!r}))")
+                if escapar and (filtro is None or not FILTROS[filtro][1]):
+                    valor = variable(f"_escape({valor})")
+                piezas.append(valor)
+            if not piezas:
+                cuerpos.append("''")
+            elif len(piezas) == 1 and piezas[0].startswith(("'", '"')):
+                cuerpos.append(piezas[0])
+            else:
+                cuerpos.append(f"''.join(({', '.join(piezas)},))")
+        lineas.append(f"    return ({', '.join(cuerpos)})")
+        espacio = {"_escape": html.escape, **{f"_filtro_{nombre}": f for nombre, (f, _) in FILTROS.items()}}
+        exec(compile("\n".join(lineas), "<plantilla de email>", "exec"), espacio)
+        return espacio["renderizar"]
+
+    def renderizar(self, valores: Mapping[str, Any]) -> Tuple[str, str, str]:
+        """
+        Retorna (asunto, body_html, body_text).
+
+        Raises:
+            KeyError: Si falta un campo sin filtro
+        """
+        return self._renderizar(valores)
+
+    def renderizar_lote(
+        self,
+        destinatarios: Iterable[Mapping[str, Any]],
+        comunes: Optional[Mapping[str, Any]] = None,
+    ) -> List[Tuple[str, str, str]]:
+        """
+        Renderizar un email por destinatario.
+
+        Args:
+            destinatarios: Valores propios de cada destinatario
+            comunes: Valores iguales para todos; se sustituyen una sola vez
+
+        Returns:
+            Lista de (asunto, body_html, body_text), en el orden de `destinatarios`
+        """
+        plantilla = self.fijar(tuple(sorted(comunes.items()))) if comunes else self
+        renderizar = plantilla._renderizar
+        return [renderizar(valores) for valores in destinatarios]
+
+    @lru_cache(maxsize=256)
+    def fijar(self, comunes: Tuple[Tuple[str, Any], ...]) -> "PlantillaEmail":
+        """Plantilla con los campos de `comunes` (pares campo, valor) ya sustituidos en la parte fija."""
+        valores = dict(comunes)
+        partes = []
+        for segmentos, escapar in self._partes:
+            fijados: List[_Segmento] = []
+            for segmento in segmentos:
+                if not isinstance(segmento, str) and segmento[0] in valores:
+                    campo, filtro = segmento
+                    valor = valores[campo]
+                    if filtro is None:
+                        segmento = html.escape(str(valor)) if escapar else str(valor)
+                    else:
+                        funcion, seguro = FILTROS[filtro]
+                        segmento = funcion(valor)
+                        if escapar and not seguro:
+                            segmento = html.escape(segmento)
+                if isinstance(segmento, str) and fijados and isinstance(fijados[-1], str):
+                    fijados[-1] += segmento
+                else:
+                    fijados.append(segmento)
+            partes.append((fijados, escapar))
+        return PlantillaEmail("", "", "", _partes=tuple(partes))
+
+
+_ESTILO = """
+            body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+            .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+            .header { background-color: #1a472a; color: white; padding: 20px; text-align: center; }
+            .content { padding: 20px; background-color: #f9f9f9; }
+            .footer { text-align: center; padding: 20px; font-size: 12px; color: #666; }"""
+
+
+BIENVENIDA = PlantillaEmail(
+    "¡Bienvenido a Escuela Bíblica Salem!",
     """
-    html = f"""
     <!DOCTYPE html>
     <html>
     <head>
         <meta charset="UTF-8">
-        <style>
-            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-            .header {{ background-color: #1a472a; color: white; padding: 20px; text-align: center; }}
-            .content {{ padding: 20px; background-color: #f9f9f9; }}
-            .footer {{ text-align: center; padding: 20px; font-size: 12px; color: #666; }}
+        <style>""" + _ESTILO + """
         </style>
     </head>
     <body>
@@ -36,7 +201,7 @@ def template_bienvenida(usuario_nombre: str) -> Tuple[str, str]:
                 <h1>Bienvenido a Escuela Bíblica Salem</h1>
             </div>
             <div class="content">
-                <p>Hola {usuario_nombre},</p>
+                <p>Hola {{ usuario_nombre }},</p>
                 <p>¡Te damos la bienvenida a nuestra plataforma de aprendizaje en línea!</p>
                 <p>Estamos emocionados de que formes parte de nuestra comunidad educativa. Ahora puedes:</p>
                 <ul>
@@ -55,71 +220,41 @@ def template_bienvenida(usuario_nombre: str) -> Tuple[str, str]:
         </div>
     </body>
     </html>
+    """,
     """
-    
-    text = f"""
     Bienvenido a Escuela Bíblica Salem
-    
-    Hola {usuario_nombre},
-    
+
+    Hola {{ usuario_nombre }},
+
     ¡Te damos la bienvenida a nuestra plataforma de aprendizaje en línea!
-    
+
     Estamos emocionados de que formes parte de nuestra comunidad educativa. Ahora puedes:
     - Explorar nuestros cursos disponibles
     - Inscribirte en los cursos que te interesen
     - Acceder a lecciones, quizzes y materiales de estudio
     - Interactuar con otros estudiantes en el foro
-    
+
     Si tienes alguna pregunta, no dudes en contactarnos.
-    
+
     ¡Que tengas un excelente inicio en tu camino de aprendizaje!
-    
+
     Atentamente,
     El equipo de Escuela Bíblica Salem
-    
+
     ---
     Escuela Bíblica Salem - Plataforma de Aprendizaje en Línea
-    """
-    
-    return html, text
+    """,
+)
 
 
-def template_certificado_listo(
-    usuario_nombre: str,
-    curso_titulo: str,
-    folio: str,
-    certificado_url: Optional[str] = None
-) -> Tuple[str, str]:
-    """
-    Template de email notificando que el certificado está listo.
-    
-    Args:
-        usuario_nombre: Nombre del usuario
-        curso_titulo: Título del curso completado
-        folio: Folio del certificado
-        certificado_url: URL para descargar el certificado (opcional)
-        
-    Returns:
-        Tupla (body_html, body_text)
+CERTIFICADO_LISTO = PlantillaEmail(
+    "Tu certificado de {{ curso_titulo }} está listo",
     """
-    download_text = ""
-    download_html = ""
-    
-    if certificado_url:
-        download_text = f"\n\nPuedes descargar tu certificado en: {certificado_url}"
-        download_html = f'<p><a href="{certificado_url}" style="background-color: #1a472a; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Descargar Certificado</a></p>'
-    
-    html = f"""
     <!DOCTYPE html>
     <html>
     <head>
         <meta charset="UTF-8">
-        <style>
-            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-            .header {{ background-color: #1a472a; color: white; padding: 20px; text-align: center; }}
-            .content {{ padding: 20px; background-color: #f9f9f9; }}
-            .footer {{ text-align: center; padding: 20px; font-size: 12px; color: #666; }}
+        <style>""" + _ESTILO + """
         </style>
     </head>
     <body>
@@ -128,12 +263,12 @@ def template_certificado_listo(
                 <h1>¡Felicidades! Tu Certificado está Listo</h1>
             </div>
             <div class="content">
-                <p>Hola {usuario_nombre},</p>
+                <p>Hola {{ usuario_nombre }},</p>
                 <p>¡Excelente noticia! Has completado exitosamente el curso:</p>
-                <p><strong>{curso_titulo}</strong></p>
+                <p><strong>{{ curso_titulo }}</strong></p>
                 <p>Tu certificado de acreditación está listo y disponible para descargar.</p>
-                <p><strong>Folio del certificado:</strong> {folio}</p>
-                {download_html}
+                <p><strong>Folio del certificado:</strong> {{ folio }}</p>
+                {{ certificado_url|enlace_descarga }}
                 <p>Este certificado es válido y puede ser verificado mediante el código de verificación proporcionado.</p>
                 <p>¡Felicitaciones por tu logro académico!</p>
                 <p>Atentamente,<br>El equipo de Escuela Bíblica Salem</p>
@@ -144,65 +279,43 @@ def template_certificado_listo(
         </div>
     </body>
     </html>
+    """,
     """
-    
-    text = f"""
     ¡Felicidades! Tu Certificado está Listo
-    
-    Hola {usuario_nombre},
-    
+
+    Hola {{ usuario_nombre }},
+
     ¡Excelente noticia! Has completado exitosamente el curso:
-    
-    {curso_titulo}
-    
+
+    {{ curso_titulo }}
+
     Tu certificado de acreditación está listo y disponible para descargar.
-    
-    Folio del certificado: {folio}
-    {download_text}
-    
+
+    Folio del certificado: {{ folio }}
+    {{ certificado_url|linea_descarga }}
     Este certificado es válido y puede ser verificado mediante el código de verificación proporcionado.
-    
+
     ¡Felicitaciones por tu logro académico!
-    
+
     Atentamente,
     El equipo de Escuela Bíblica Salem
-    
+
     ---
     Escuela Bíblica Salem - Plataforma de Aprendizaje en Línea
-    """
-    
-    return html, text
+    """,
+)
 
 
-def template_recordatorio_progreso(
-    usuario_nombre: str,
-    curso_titulo: str,
-    progreso_porcentaje: float
-) -> Tuple[str, str]:
+RECORDATORIO_PROGRESO = PlantillaEmail(
+    "Continúa tu progreso en {{ curso_titulo }}",
     """
-    Template de email de recordatorio para continuar el progreso en un curso.
-    
-    Args:
-        usuario_nombre: Nombre del usuario
-        curso_titulo: Título del curso
-        progreso_porcentaje: Porcentaje de progreso (0-100)
-        
-    Returns:
-        Tupla (body_html, body_text)
-    """
-    html = f"""
     <!DOCTYPE html>
     <html>
     <head>
         <meta charset="UTF-8">
-        <style>
-            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-            .header {{ background-color: #1a472a; color: white; padding: 20px; text-align: center; }}
-            .content {{ padding: 20px; background-color: #f9f9f9; }}
-            .progress-bar {{ background-color: #e0e0e0; border-radius: 10px; height: 30px; margin: 20px 0; }}
-            .progress-fill {{ background-color: #1a472a; height: 100%; border-radius: 10px; width: {progreso_porcentaje}%; text-align: center; line-height: 30px; color: white; }}
-            .footer {{ text-align: center; padding: 20px; font-size: 12px; color: #666; }}
+        <style>""" + _ESTILO + """
+            .progress-bar { background-color: #e0e0e0; border-radius: 10px; height: 30px; margin: 20px 0; }
+            .progress-fill { background-color: #1a472a; height: 100%; border-radius: 10px; text-align: center; line-height: 30px; color: white; }
         </style>
     </head>
     <body>
@@ -211,12 +324,12 @@ def template_recordatorio_progreso(
                 <h1>¡Continúa tu Aprendizaje!</h1>
             </div>
             <div class="content">
-                <p>Hola {usuario_nombre},</p>
+                <p>Hola {{ usuario_nombre }},</p>
                 <p>Queremos recordarte que tienes un curso en progreso:</p>
-                <p><strong>{curso_titulo}</strong></p>
+                <p><strong>{{ curso_titulo }}</strong></p>
                 <p>Tu progreso actual:</p>
                 <div class="progress-bar">
-                    <div class="progress-fill">{progreso_porcentaje:.1f}%</div>
+                    <div class="progress-fill" style="width: {{ progreso_porcentaje|decimal }}%;">{{ progreso_porcentaje|decimal }}%</div>
                 </div>
                 <p>¡Estás haciendo un gran trabajo! Te animamos a continuar y completar el curso.</p>
                 <p>Recuerda que puedes acceder a tus cursos en cualquier momento desde la plataforma.</p>
@@ -229,31 +342,93 @@ def template_recordatorio_progreso(
         </div>
     </body>
     </html>
+    """,
     """
-    
-    text = f"""
     ¡Continúa tu Aprendizaje!
-    
-    Hola {usuario_nombre},
-    
+
+    Hola {{ usuario_nombre }},
+
     Queremos recordarte que tienes un curso en progreso:
-    
-    {curso_titulo}
-    
-    Tu progreso actual: {progreso_porcentaje:.1f}%
-    
+
+    {{ curso_titulo }}
+
+    Tu progreso actual: {{ progreso_porcentaje|decimal }}%
+
     ¡Estás haciendo un gran trabajo! Te animamos a continuar y completar el curso.
-    
+
     Recuerda que puedes acceder a tus cursos en cualquier momento desde la plataforma.
-    
+
     ¡Sigue adelante!
-    
+
     Atentamente,
     El equipo de Escuela Bíblica Salem
-    
+
     ---
     Escuela Bíblica Salem - Plataforma de Aprendizaje en Línea
+    """,
+)
+
+
+def template_bienvenida(usuario_nombre: str) -> Tuple[str, str]:
     """
-    
-    return html, text
+    Template de email de bienvenida para nuevos usuarios.
+
+    Args:
+        usuario_nombre: Nombre del usuario
 
+    Returns:
+        Tupla (body_html, body_text)
+    """
+    valores = {"usuario_nombre": usuario_nombre}
+    return BIENVENIDA.renderizar(valores)[1:]
+
+
+def template_certificado_listo(
+    usuario_nombre: str,
+    curso_titulo: str,
+    folio: str,
+    certificado_url: Optional[str] = None
+) -> Tuple[str, str]:
+    """
+    Template de email notificando que el certificado está listo.
+
+    Args:
+        usuario_nombre: Nombre del usuario
+        curso_titulo: Título del curso completado
+        folio: Folio del certificado
+        certificado_url: URL para descargar el certificado (opcional)
+
+    Returns:
+        Tupla (body_html, body_text)
+    """
+    valores = {
+        "usuario_nombre": usuario_nombre,
+        "curso_titulo": curso_titulo,
+        "folio": folio,
+        "certificado_url": certificado_url,
+    }
+    return CERTIFICADO_LISTO.renderizar(valores)[1:]
+
+
+def template_recordatorio_progreso(
+    usuario_nombre: str,
+    curso_titulo: str,
+    progreso_porcentaje: float
+) -> Tuple[str, str]:
+    """
+    Template de email de recordatorio para continuar el progreso en un curso.
+
+    Args:
+        usuario_nombre: Nombre del usuario
+        curso_titulo: Título del curso
+        progreso_porcentaje: Porcentaje de progreso (0-100)
+
+    Returns:
+        Tupla (body_html, body_text)
+    """
+    valores = {
+        "usuario_nombre": usuario_nombre,
+        "curso_titulo": curso_titulo,
+        "progreso_porcentaje": progreso_porcentaje,
+    }
+    return RECORDATORIO_PROGRESO.renderizar(valores)[1:]
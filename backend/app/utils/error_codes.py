@@ -68,6 +68,7 @@ class StorageErrorCodes:
     S3_UPLOAD_ERROR = "S3_UPLOAD_ERROR"
     S3_DOWNLOAD_ERROR = "S3_DOWNLOAD_ERROR"
     FILE_NOT_FOUND = "FILE_NOT_FOUND"
+    INVALID_SIGNATURE = "INVALID_SIGNATURE"
 
 
 class InternalErrorCodes:
@@ -0,0 +1,56 @@
+"""
+Codificación incremental de reportes.
+
+Convierte lotes de filas (mappings) en bytes CSV o JSONL a medida que llegan,
+con compresión gzip opcional, sin acumular el reporte completo en memoria.
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, Mapping, Sequence
+
+FORMATOS_EXPORTACION = ("csv", "jsonl")
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+async def codificar_filas(
+    lotes: AsyncIterator[Sequence[Mapping]],
+    columnas: Sequence[str],
+    formato: str,
+) -> AsyncIterator[bytes]:
+    """Codificar cada lote de filas como un bloque de bytes CSV (con encabezado) o JSONL."""
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+
+    if formato == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columnas)
+        yield buffer.getvalue().encode("utf-8")
+        async for lote in lotes:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([fila[columna] for columna in columnas] for fila in lote)
+            yield buffer.getvalue().encode("utf-8")
+    else:
+        async for lote in lotes:
+            yield "".join(
+                json.dumps({columna: fila[columna] for columna in columnas}, default=str, ensure_ascii=False) + "\n"
+                for fila in lote
+            ).encode("utf-8")
+
+
+async def comprimir_gzip(bloques: AsyncIterator[bytes], nivel: int = 6) -> AsyncIterator[bytes]:
+    """Comprimir un flujo de bytes en formato gzip, bloque a bloque."""
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for bloque in bloques:
+        comprimido = compresor.compress(bloque)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
@@ -0,0 +1,17 @@
+"""
+Utilidades para consumir colecciones síncronas y asíncronas con el mismo código.
+"""
+
+from typing import AsyncIterable, AsyncIterator, Iterable, TypeVar, Union
+
+T = TypeVar("T")
+
+
+async def iterar(items: Union[Iterable[T], AsyncIterable[T]]) -> AsyncIterator[T]:
+    """Recorrer con `async for` un iterable común o uno asíncrono."""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
@@ -0,0 +1,115 @@
+"""
+Paginación por cursor (keyset).
+
+En lugar de OFFSET, cada página continúa a partir de la clave de ordenamiento
+de la última fila entregada: `WHERE (clave, id) < (:clave, :id)`. Con un índice
+compuesto que coincida con el orden, el costo de una página no depende de su
+profundidad.
+
+El cursor que recibe el cliente es opaco: los valores de la última fila
+serializados en JSON y codificados en base64 url-safe. `skip` se conserva como
+alternativa de compatibilidad cuando no se envía cursor.
+"""
+
+import base64
+import binascii
+import json
+import uuid
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import Response
+from sqlalchemy import tuple_
+from sqlalchemy.sql import Select
+
+from app.utils.error_codes import ValidationErrorCodes
+from app.utils.exceptions import ValidationError
+
+# Encabezado de respuesta con el cursor de la página siguiente
+HEADER_CURSOR_SIGUIENTE = "X-Next-Cursor"
+
+
+def _serializar(valor: Any) -> Any:
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, uuid.UUID):
+        return str(valor)
+    if hasattr(valor, "value"):
+        return valor.value
+    return valor
+
+
+def _deserializar(valor: Any, tipo: type) -> Any:
+    if tipo is datetime:
+        return datetime.fromisoformat(valor)
+    if tipo is date:
+        return date.fromisoformat(valor)
+    if tipo is uuid.UUID:
+        return uuid.UUID(valor)
+    return tipo(valor)
+
+
+class Keyset:
+    """
+    Orden de una lista paginable por cursor.
+
+    Las columnas deben identificar una fila de forma única (la última suele ser
+    `id`) y compartir la misma dirección, para que la comparación de tuplas
+    aproveche un índice compuesto sobre esas columnas.
+    """
+
+    def __init__(self, *columnas, descendente: bool = False):
+        self.columnas = columnas
+        self.descendente = descendente
+        self._tipos = [columna.type.python_type for columna in columnas]
+
+    def codificar(self, fila: Any) -> str:
+        """Cursor opaco que apunta justo después de `fila`."""
+        valores = [_serializar(getattr(fila, columna.key)) for columna in self.columnas]
+        return base64.urlsafe_b64encode(json.dumps(valores).encode("utf-8")).decode("ascii").rstrip("=")
+
+    def decodificar(self, cursor: str) -> List[Any]:
+        """Valores de la clave contenidos en `cursor`."""
+        try:
+            relleno = "=" * (-len(cursor) % 4)
+            valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+            if not isinstance(valores, list) or len(valores) != len(self.columnas):
+                raise ValueError("cursor con número de valores incorrecto")
+            return [_deserializar(valor, tipo) for valor, tipo in zip(valores, self._tipos)]
+        except (ValueError, TypeError, binascii.Error) as e:
+            raise ValidationError("Cursor de paginación inválido", ValidationErrorCodes.INVALID_VALUE) from e
+
+    def aplicar(
+        self,
+        stmt: Select,
+        *,
+        cursor: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> Select:
+        """Ordenar `stmt` por la clave y limitarlo a la página pedida por cursor o, si no hay, por `skip`."""
+        if self.descendente:
+            stmt = stmt.order_by(*(columna.desc() for columna in self.columnas))
+        else:
+            stmt = stmt.order_by(*(columna.asc() for columna in self.columnas))
+
+        if cursor:
+            clave = tuple_(*self.columnas)
+            valores = tuple_(*self.decodificar(cursor))
+            stmt = stmt.where(clave < valores if self.descendente else clave > valores)
+        elif skip:
+            stmt = stmt.offset(skip)
+        return stmt.limit(limit)
+
+    def siguiente(self, items: Sequence[Any], limit: int) -> Optional[str]:
+        """Cursor de la página siguiente, o None si `items` fue la última."""
+        if len(items) < limit:
+            return None
+        return self.codificar(items[-1])
+
+
+def agregar_cursor_siguiente(response: Response, keyset: Keyset, items: Sequence[Any], limit: int) -> None:
+    """Exponer el cursor de la página siguiente en el encabezado X-Next-Cursor."""
+    siguiente = keyset.siguiente(items, limit)
+    if siguiente:
+        response.headers[HEADER_CURSOR_SIGUIENTE] = siguiente
@@ -1,24 +1,240 @@
 """
 Generador síncrono de PDFs de certificados.
 
-Esta es una función pura que no sabe de async y solo genera el PDF.
-Se ejecuta en un thread separado usando asyncio.to_thread() para no bloquear el event loop.
+Funciones puras que no saben de async y solo generan el PDF. Se ejecutan en
+el motor de renderizado (app.services.certificate_renderer), fuera del event loop.
+
+Todos los certificados comparten el mismo diseño y solo cambian nombre, curso,
+fecha y folio. Por eso la página se compila una vez como plantilla: el texto
+fijo se posiciona y se comprime en un content stream que se reutiliza, junto
+con el resto de objetos del PDF (catálogo, página, fuentes). Por certificado
+solo se genera un segundo content stream, pequeño, con los campos variables
+superpuestos, y la tabla de referencias (xref) del archivo.
+
+Se usan las fuentes estándar Helvetica (no se incrustan) con codificación
+WinAnsi; los caracteres fuera de ella se reemplazan por "?".
 """
 
-from datetime import datetime
-from typing import Optional
-from io import BytesIO
 import logging
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional
 
+from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase.pdfmetrics import stringWidth
 
 logger = logging.getLogger(__name__)
 
+ANCHO_PAGINA, ALTO_PAGINA = letter
+MARGEN = 72
+ANCHO_UTIL = ANCHO_PAGINA - 2 * MARGEN
+
+# Recursos de fuente de la página: nombre en el content stream -> fuente estándar
+_FUENTES = {
+    "F1": "Helvetica",
+    "F2": "Helvetica-Bold",
+    "F3": "Helvetica-Oblique",
+}
+_RECURSO_FUENTE = {nombre: recurso for recurso, nombre in _FUENTES.items()}
+
+VERDE = colors.HexColor("#1a472a")
+VERDE_CLARO = colors.HexColor("#2d5a3d")
+GRIS = colors.HexColor("#333333")
+GRIS_CLARO = colors.HexColor("#666666")
+
+# Tabla de fecha y folio: 2in + 3in centrada, con 12pt de padding por celda
+_TABLA_X = (ANCHO_PAGINA - 5 * inch) / 2
+_ETIQUETA_X_DERECHA = _TABLA_X + 2 * inch - 12
+_VALOR_X = _TABLA_X + 2 * inch + 12
+
+
+@dataclass(frozen=True)
+class _Campo:
+    """Área de texto centrada que puede ocupar varias líneas (se achica la fuente si no cabe)."""
+    fuente: str
+    tamano: float
+    color: colors.Color
+    y: float
+    max_lineas: int
+    interlineado: float
+    tamano_minimo: float = 8
+
+
+_CAMPO_NOMBRE = _Campo("Helvetica-Bold", 20, VERDE, y=515, max_lineas=2, interlineado=24)
+_CAMPO_CURSO = _Campo("Helvetica-Bold", 14, VERDE, y=415, max_lineas=3, interlineado=18)
+
+
+def _texto_pdf(texto: str) -> bytes:
+    """Cadena literal de PDF en WinAnsi, con paréntesis y barras escapados."""
+    crudo = texto.encode("cp1252", errors="replace")
+    return b"(" + crudo.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _color_pdf(color: colors.Color) -> bytes:
+    return b"%.3f %.3f %.3f rg" % (color.red, color.green, color.blue)
+
+
+def _linea(texto: str, fuente: str, tamano: float, color: colors.Color, x: float, y: float) -> bytes:
+    return b"BT /%s %g Tf %s %.2f %.2f Td %s Tj ET\n" % (
+        _RECURSO_FUENTE[fuente].encode(), tamano, _color_pdf(color), x, y, _texto_pdf(texto)
+    )
+
+
+def _centrada(texto: str, fuente: str, tamano: float, color: colors.Color, y: float) -> bytes:
+    x = (ANCHO_PAGINA - stringWidth(texto, fuente, tamano)) / 2
+    return _linea(texto, fuente, tamano, color, x, y)
+
+
+def _derecha(texto: str, fuente: str, tamano: float, color: colors.Color, x_derecha: float, y: float) -> bytes:
+    return _linea(texto, fuente, tamano, color, x_derecha - stringWidth(texto, fuente, tamano), y)
+
+
+def _parrafo(texto: str, fuente: str, tamano: float, color: colors.Color, y: float, interlineado: float) -> bytes:
+    return b"".join(
+        _centrada(linea, fuente, tamano, color, y - i * interlineado)
+        for i, linea in enumerate(simpleSplit(texto, fuente, tamano, ANCHO_UTIL))
+    )
+
+
+def _campo(texto: str, campo: _Campo) -> bytes:
+    tamano = campo.tamano
+    lineas = simpleSplit(texto, campo.fuente, tamano, ANCHO_UTIL)
+    while len(lineas) > campo.max_lineas and tamano > campo.tamano_minimo:
+        tamano -= 1
+        lineas = simpleSplit(texto, campo.fuente, tamano, ANCHO_UTIL)
+    interlineado = campo.interlineado * tamano / campo.tamano
+    return b"".join(
+        _centrada(linea, campo.fuente, tamano, campo.color, campo.y - i * interlineado)
+        for i, linea in enumerate(lineas)
+    )
+
+
+def _capa_fija(curso_titulo: Optional[str]) -> bytes:
+    """Texto fijo de la página (y el curso, si la plantilla es de un curso)."""
+    partes = [
+        _centrada("CERTIFICADO DE ACREDITACIÓN", "Helvetica-Bold", 24, VERDE, 650),
+        _centrada("Escuela Bíblica Salem", "Helvetica", 16, VERDE_CLARO, 610),
+        _centrada("Por medio del presente se certifica que", "Helvetica", 12, GRIS, 560),
+        _centrada("ha completado exitosamente el curso", "Helvetica", 12, GRIS, 455),
+        _centrada("cumpliendo con todos los requisitos académicos establecidos.", "Helvetica", 12, GRIS, 345),
+        _derecha("Fecha de emisión:", "Helvetica-Bold", 11, GRIS, _ETIQUETA_X_DERECHA, 300),
+        _derecha("Folio:", "Helvetica-Bold", 11, GRIS, _ETIQUETA_X_DERECHA, 280),
+        _parrafo(
+            "Este certificado es válido y puede ser verificado mediante "
+            "el código de verificación proporcionado.",
+            "Helvetica-Oblique", 9, GRIS_CLARO, 200, 11,
+        ),
+    ]
+    if curso_titulo is not None:
+        partes.append(_campo(curso_titulo, _CAMPO_CURSO))
+    return b"q\n" + b"".join(partes) + b"Q\n"
+
+
+def _objeto(numero: int, contenido: bytes) -> bytes:
+    return b"%d 0 obj\n%s\nendobj\n" % (numero, contenido)
+
+
+def _stream(datos: bytes, comprimir: bool) -> bytes:
+    if comprimir:
+        datos = zlib.compress(datos)
+        return b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(datos), datos)
+    return b"<< /Length %d >>\nstream\n%s\nendstream" % (len(datos), datos)
+
+
+class PlantillaCertificado:
+    """
+    Página de certificado compilada.
+
+    Los objetos 1-7 (catálogo, páginas, página, fuentes y capa fija) se serializan
+    al crear la plantilla; `estampar` agrega la capa variable (8), la información
+    del documento (9) y la xref.
+    """
+
+    # Objetos que genera `estampar`
+    _CAPA_VARIABLE = 8
+    _INFO = 9
+
+    def __init__(self, curso_titulo: Optional[str] = None):
+        self.curso_titulo = curso_titulo
+        objetos = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %g %g] "
+            b"/Resources << /Font << /F1 4 0 R /F2 5 0 R /F3 6 0 R >> /ProcSet [/PDF /Text] >> "
+            b"/Contents [7 0 R %d 0 R] >>" % (ANCHO_PAGINA, ALTO_PAGINA, self._CAPA_VARIABLE),
+            *(
+                b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % fuente.encode()
+                for fuente in _FUENTES.values()
+            ),
+            _stream(_capa_fija(curso_titulo), comprimir=True),
+        ]
+        # Encabezado con bytes binarios para que los lectores traten el archivo como binario
+        prefijo = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._desplazamientos: List[int] = []
+        for numero, contenido in enumerate(objetos, start=1):
+            self._desplazamientos.append(len(prefijo))
+            prefijo += _objeto(numero, contenido)
+        self._prefijo = bytes(prefijo)
+
+    def _capa_variable(self, nombre_completo: str, curso_titulo: str, fecha_str: str, folio: str) -> bytes:
+        partes = [_campo(nombre_completo.upper(), _CAMPO_NOMBRE)]
+        if self.curso_titulo is None:
+            partes.append(_campo(curso_titulo, _CAMPO_CURSO))
+        partes.append(_linea(fecha_str, "Helvetica", 11, GRIS, _VALOR_X, 300))
+        partes.append(_linea(folio, "Helvetica", 11, GRIS, _VALOR_X, 280))
+        return b"q\n" + b"".join(partes) + b"Q\n"
+
+    def estampar(
+        self,
+        usuario_nombre: str,
+        usuario_apellido: str,
+        curso_titulo: str,
+        folio: str,
+        fecha_emision: datetime,
+    ) -> bytes:
+        """PDF completo con los campos del certificado sobre la página compilada."""
+        nombre_completo = f"{usuario_nombre} {usuario_apellido}".strip()
+        fecha_str = fecha_emision.strftime("%d de %B de %Y")
+        capa = self._capa_variable(nombre_completo, curso_titulo, fecha_str, folio)
+        info = b"<< /Producer (EBS) /Title %s /CreationDate (D:%s) >>" % (
+            _texto_pdf(f"Certificado {folio}"), fecha_emision.strftime("%Y%m%d%H%M%S").encode()
+        )
+
+        partes = [self._prefijo]
+        desplazamientos = list(self._desplazamientos)
+        posicion = len(self._prefijo)
+        for numero, contenido in ((self._CAPA_VARIABLE, _stream(capa, comprimir=False)), (self._INFO, info)):
+            objeto = _objeto(numero, contenido)
+            desplazamientos.append(posicion)
+            partes.append(objeto)
+            posicion += len(objeto)
+
+        xref = [b"xref\n0 %d\n0000000000 65535 f \n" % (len(desplazamientos) + 1)]
+        xref.extend(b"%010d 00000 n \n" % desplazamiento for desplazamiento in desplazamientos)
+        partes.extend(xref)
+        partes.append(
+            b"trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(desplazamientos) + 1, self._INFO, posicion)
+        )
+        return b"".join(partes)
+
+
+@lru_cache(maxsize=256)
+def obtener_plantilla(curso_titulo: Optional[str] = None) -> PlantillaCertificado:
+    """
+    Plantilla compilada, cacheada por proceso.
+
+    Con `curso_titulo` el título del curso queda en la capa fija (útil al emitir
+    muchos certificados del mismo curso); sin él, la plantilla es global y el
+    curso se estampa con los demás campos.
+    """
+    return PlantillaCertificado(curso_titulo)
+
 
 def generar_pdf_certificado(
     usuario_nombre: str,
@@ -29,178 +245,23 @@ def generar_pdf_certificado(
 ) -> bytes:
     """
     Generar PDF de certificado de forma síncrona.
-    
-    Esta función es pura y síncrona, diseñada para ejecutarse en un thread
-    separado usando asyncio.to_thread(). No debe usar operaciones async.
-    
+
+    Usa la plantilla compilada del curso (ver obtener_plantilla), así que los
+    certificados siguientes del mismo curso solo estampan nombre, fecha y folio.
+
     Args:
         usuario_nombre: Nombre del usuario
         usuario_apellido: Apellido del usuario
         curso_titulo: Título del curso
         folio: Folio del certificado
         fecha_emision: Fecha de emisión (default: ahora)
-        
+
     Returns:
         Contenido del PDF en bytes
-        
-    Raises:
-        Exception: Si hay error generando el PDF
     """
     fecha_emision = fecha_emision or datetime.now()
-    fecha_str = fecha_emision.strftime("%d de %B de %Y")
-    
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=letter,
-        rightMargin=72,
-        leftMargin=72,
-        topMargin=72,
-        bottomMargin=18
-    )
-    
-    story = []
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle(
-        "CustomTitle",
-        parent=styles["Heading1"],
-        fontSize=24,
-        textColor=colors.HexColor("#1a472a"),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName="Helvetica-Bold"
-    )
-    
-    subtitle_style = ParagraphStyle(
-        "CustomSubtitle",
-        parent=styles["Heading2"],
-        fontSize=16,
-        textColor=colors.HexColor("#2d5a3d"),
-        spaceAfter=20,
-        alignment=TA_CENTER,
-        fontName="Helvetica"
-    )
-    
-    body_style = ParagraphStyle(
-        "CustomBody",
-        parent=styles["Normal"],
-        fontSize=12,
-        textColor=colors.HexColor("#333333"),
-        spaceAfter=12,
-        alignment=TA_JUSTIFY,
-        fontName="Helvetica"
-    )
-    
-    center_style = ParagraphStyle(
-        "CustomCenter",
-        parent=body_style,
-        alignment=TA_CENTER,
-        spaceAfter=20
-    )
-    
-    name_style = ParagraphStyle(
-        "CustomName",
-        parent=styles["Heading1"],
-        fontSize=20,
-        textColor=colors.HexColor("#1a472a"),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName="Helvetica-Bold",
-        textTransform="uppercase"
-    )
-    
-    story.append(Spacer(1, 0.5 * inch))
-    story.append(Paragraph("CERTIFICADO DE ACREDITACIÓN", title_style))
-    story.append(Spacer(1, 0.3 * inch))
-    story.append(Paragraph("Escuela Bíblica Salem", subtitle_style))
-    story.append(Spacer(1, 0.4 * inch))
-    
-    story.append(
-        Paragraph(
-            "Por medio del presente se certifica que",
-            center_style
-        )
-    )
-    story.append(Spacer(1, 0.2 * inch))
-    
-    nombre_completo = f"{usuario_nombre} {usuario_apellido}".strip()
-    story.append(Paragraph(nombre_completo, name_style))
-    story.append(Spacer(1, 0.2 * inch))
-    
-    story.append(
-        Paragraph(
-            "ha completado exitosamente el curso",
-            center_style
-        )
+    pdf_bytes = obtener_plantilla(curso_titulo).estampar(
+        usuario_nombre, usuario_apellido, curso_titulo, folio, fecha_emision
     )
-    story.append(Spacer(1, 0.3 * inch))
-    
-    course_style = ParagraphStyle(
-        "CustomCourse",
-        parent=body_style,
-        fontSize=14,
-        textColor=colors.HexColor("#1a472a"),
-        alignment=TA_CENTER,
-        fontName="Helvetica-Bold",
-        spaceAfter=30
-    )
-    story.append(Paragraph(curso_titulo, course_style))
-    story.append(Spacer(1, 0.3 * inch))
-    
-    story.append(
-        Paragraph(
-            "cumpliendo con todos los requisitos académicos establecidos.",
-            center_style
-        )
-    )
-    story.append(Spacer(1, 0.4 * inch))
-    
-    fecha_data = [
-        ["Fecha de emisión:", fecha_str],
-        ["Folio:", folio]
-    ]
-    
-    fecha_table = Table(fecha_data, colWidths=[2 * inch, 3 * inch])
-    fecha_table.setStyle(
-        TableStyle([
-            ("ALIGN", (0, 0), (0, -1), "RIGHT"),
-            ("ALIGN", (1, 0), (1, -1), "LEFT"),
-            ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
-            ("FONTNAME", (1, 0), (1, -1), "Helvetica"),
-            ("FONTSIZE", (0, 0), (-1, -1), 11),
-            ("TEXTCOLOR", (0, 0), (-1, -1), colors.HexColor("#333333")),
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ("LEFTPADDING", (0, 0), (-1, -1), 12),
-            ("RIGHTPADDING", (0, 0), (-1, -1), 12),
-            ("TOPPADDING", (0, 0), (-1, -1), 6),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-        ])
-    )
-    
-    story.append(fecha_table)
-    story.append(Spacer(1, 0.8 * inch))
-    
-    story.append(
-        Paragraph(
-            "Este certificado es válido y puede ser verificado mediante "
-            "el código de verificación proporcionado.",
-            ParagraphStyle(
-                "CustomFooter",
-                parent=styles["Normal"],
-                fontSize=9,
-                textColor=colors.HexColor("#666666"),
-                alignment=TA_CENTER,
-                fontName="Helvetica-Oblique"
-            )
-        )
-    )
-    
-    doc.build(story)
-    buffer.seek(0)
-    pdf_bytes = buffer.read()
-    buffer.close()
-    
-    logger.info(f"Certificate PDF generated for folio: {folio}")
+    logger.debug(f"Certificate PDF generated for folio: {folio}")
     return pdf_bytes
-
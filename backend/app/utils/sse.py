@@ -0,0 +1,67 @@
+"""
+Utilidades para respuestas Server-Sent Events (text/event-stream).
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+MEDIA_TYPE_SSE = "text/event-stream"
+
+# Sin caché y sin buffer en proxies (nginx) para que cada evento llegue al enviarse
+HEADERS_SSE = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+_COMENTARIO_KEEPALIVE = ": keepalive\n\n"
+
+
+def evento_sse(datos: Any, evento: Optional[str] = None, id: Optional[str] = None) -> str:
+    """Formatear un evento SSE con `datos` en JSON."""
+    lineas = []
+    if id is not None:
+        lineas.append(f"id: {id}")
+    if evento is not None:
+        lineas.append(f"event: {evento}")
+    lineas.append("data: " + json.dumps(jsonable_encoder(datos), ensure_ascii=False))
+    return "\n".join(lineas) + "\n\n"
+
+
+async def flujo_sse(
+    cola: asyncio.Queue,
+    evento: str,
+    keepalive_segundos: float,
+    duracion_segundos: float,
+    es_ultimo: Callable[[Any], bool] = lambda datos: False,
+    formatear: Optional[Callable[[Any], Awaitable[Optional[str]]]] = None,
+) -> AsyncIterator[str]:
+    """
+    Eventos SSE con los datos que llegan a `cola` (ver BusEventos.suscribir).
+
+    Sin eventos, envía un comentario cada `keepalive_segundos` para que los proxies
+    no cierren la conexión. Termina tras `duracion_segundos`, al recibir None de la
+    cola o después de enviar los datos para los que `es_ultimo` es verdadero. Con
+    `formatear`, cada dato se envía como el texto que retorna (se omite si es None)
+    en lugar de como un evento `evento` con el dato en JSON.
+    """
+    loop = asyncio.get_running_loop()
+    limite = loop.time() + duracion_segundos
+    while True:
+        restante = limite - loop.time()
+        if restante <= 0:
+            return
+        try:
+            datos = await asyncio.wait_for(cola.get(), min(keepalive_segundos, restante))
+        except asyncio.TimeoutError:
+            yield _COMENTARIO_KEEPALIVE
+            continue
+        if datos is None:
+            return
+        if formatear is None:
+            yield evento_sse(datos, evento)
+        else:
+            texto = await formatear(datos)
+            if texto is not None:
+                yield texto
+        if es_ultimo(datos):
+            return
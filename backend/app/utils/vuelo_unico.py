@@ -0,0 +1,36 @@
+"""
+Ejecución única por clave dentro del proceso ("single-flight").
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class VueloUnico:
+    """
+    Ejecuta a lo sumo una corrutina a la vez por clave.
+
+    Quien pide una clave que ya está en curso espera el resultado (o la excepción)
+    de esa ejecución en lugar de lanzar otra. Cancelar a quien espera no cancela la
+    ejecución compartida. Solo coordina dentro del proceso; entre procesos hace
+    falta otro mecanismo (p. ej. un advisory lock). Solo se usa desde el event loop.
+    """
+
+    def __init__(self):
+        self._en_curso: Dict[Hashable, asyncio.Future] = {}
+
+    async def ejecutar(self, clave: Hashable, funcion: Callable[[], Awaitable[T]]) -> T:
+        futuro = self._en_curso.get(clave)
+        if futuro is None:
+            futuro = asyncio.ensure_future(funcion())
+            self._en_curso[clave] = futuro
+            futuro.add_done_callback(lambda f: self._terminar(clave, f))
+        return await asyncio.shield(futuro)
+
+    def _terminar(self, clave: Hashable, futuro: asyncio.Future) -> None:
+        self._en_curso.pop(clave, None)
+        # Leer la excepción evita el aviso de excepción no recuperada si nadie esperaba ya
+        if not futuro.cancelled():
+            futuro.exception()
@@ -0,0 +1,239 @@
+"""
+Worker de la cola durable de tareas.
+
+Proceso separado de la API que toma tareas de la tabla `job` con
+FOR UPDATE SKIP LOCKED y las ejecuta con una concurrencia máxima por cola.
+Se pueden correr varios workers (en la misma o en distintas máquinas) sin
+coordinación adicional. Los que consumen la cola emails además vacían la
+bandeja de salida de emails (tabla email_outbox).
+
+Uso, desde backend/:
+
+    python -m app.worker                                # colas de settings.worker_queues
+    python -m app.worker --colas certificados:4,emails:16
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import signal
+import socket
+import uuid
+from typing import Dict, Optional, Set
+
+from app.config import settings
+from app.database.enums import EstadoJob
+from app.services.certificate_renderer import cerrar_motor_renderizado
+from app.services.email_outbox_service import EmailOutboxService
+from app.services.email_service import cerrar_email_service, get_email_service
+from app.services.job_service import JobService
+from app.services.s3_service import cerrar_cliente_s3
+from app.tasks.cola import COLA_EMAILS, TAREAS
+from app.utils.background_tasks import get_background_db_session
+from app.utils.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def parsear_colas(valor: str) -> Dict[str, int]:
+    """Convertir "cola:concurrencia,cola2:concurrencia" en un diccionario."""
+    colas = {}
+    for parte in valor.split(","):
+        parte = parte.strip()
+        if not parte:
+            continue
+        nombre, _, concurrencia = parte.partition(":")
+        colas[nombre.strip()] = int(concurrencia or 1)
+        if colas[nombre.strip()] < 1:
+            raise ValueError(f"La concurrencia de la cola {nombre} debe ser al menos 1")
+    return colas
+
+
+class Worker:
+    """Consume una o más colas; cada tarea corre como una corrutina con su propio bloqueo."""
+
+    def __init__(
+        self,
+        colas: Dict[str, int],
+        worker_id: Optional[str] = None,
+        intervalo_sondeo: Optional[float] = None,
+        bloqueo_segundos: Optional[float] = None,
+        reintento_base: Optional[float] = None,
+        reintento_max: Optional[float] = None,
+    ):
+        self.colas = colas
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.intervalo_sondeo = intervalo_sondeo if intervalo_sondeo is not None else settings.worker_poll_interval_seconds
+        self.bloqueo_segundos = bloqueo_segundos if bloqueo_segundos is not None else settings.worker_lease_seconds
+        self.reintento_base = reintento_base if reintento_base is not None else settings.worker_retry_base_seconds
+        self.reintento_max = reintento_max if reintento_max is not None else settings.worker_retry_max_seconds
+        self._detener = asyncio.Event()
+        self._en_curso: Set[asyncio.Task] = set()
+
+    def detener(self) -> None:
+        """Dejar de tomar tareas; las que están en curso terminan (ver ejecutar)."""
+        self._detener.set()
+
+    def espera_reintento(self, intento: int) -> float:
+        """Backoff exponencial con tope y jitter para el reintento número `intento`."""
+        espera = min(self.reintento_base * 2 ** (intento - 1), self.reintento_max)
+        return espera * random.uniform(0.5, 1.0)
+
+    async def ejecutar(self, timeout_apagado: Optional[float] = None) -> None:
+        """Consumir las colas hasta que se llame a detener()."""
+        if timeout_apagado is None:
+            timeout_apagado = settings.worker_shutdown_timeout_seconds
+        logger.info(f"Worker {self.worker_id} consumiendo colas {self.colas}")
+        consumidores = [
+            asyncio.create_task(self._consumir(cola, concurrencia))
+            for cola, concurrencia in self.colas.items()
+        ]
+        consumidores.append(asyncio.create_task(self._liberar_vencidos()))
+        if COLA_EMAILS in self.colas:
+            consumidores.append(asyncio.create_task(self._despachar_outbox()))
+        await self._detener.wait()
+
+        logger.info(f"Worker {self.worker_id} deteniéndose; {len(self._en_curso)} tareas en curso")
+        for consumidor in consumidores:
+            consumidor.cancel()
+        await asyncio.gather(*consumidores, return_exceptions=True)
+        if self._en_curso:
+            _, pendientes = await asyncio.wait(self._en_curso, timeout=timeout_apagado)
+            # Las que no terminaron a tiempo se devuelven a la cola (ver _procesar)
+            for tarea in pendientes:
+                tarea.cancel()
+            await asyncio.gather(*pendientes, return_exceptions=True)
+        logger.info(f"Worker {self.worker_id} detenido")
+
+    async def _consumir(self, cola: str, concurrencia: int) -> None:
+        activas: Set[asyncio.Task] = set()
+        detener = asyncio.ensure_future(self._detener.wait())
+        try:
+            while True:
+                libres = concurrencia - len(activas)
+                if libres > 0:
+                    try:
+                        async with get_background_db_session() as db:
+                            jobs = await JobService(db).reclamar(cola, self.worker_id, libres, self.bloqueo_segundos)
+                    except Exception as e:
+                        logger.error(f"Error reclamando tareas de la cola {cola}: {e}", exc_info=True)
+                        jobs = []
+                    for job in jobs:
+                        tarea = asyncio.create_task(self._procesar(job))
+                        for conjunto in (activas, self._en_curso):
+                            conjunto.add(tarea)
+                            tarea.add_done_callback(conjunto.discard)
+                    if jobs and len(jobs) < libres:
+                        # Quedan lugares: se vuelve a sondear enseguida por si llegó más trabajo
+                        continue
+                # Esperar a que se libere un lugar, se pida detener o pase el intervalo
+                await asyncio.wait({detener, *activas}, timeout=self.intervalo_sondeo, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            detener.cancel()
+
+    async def _liberar_vencidos(self) -> None:
+        while True:
+            try:
+                async with get_background_db_session() as db:
+                    await JobService(db).liberar_bloqueos_vencidos()
+            except Exception as e:
+                logger.error(f"Error liberando tareas con bloqueo vencido: {e}", exc_info=True)
+            await asyncio.sleep(self.bloqueo_segundos / 2)
+
+    async def _despachar_outbox(self) -> None:
+        """Vaciar la bandeja de salida por lotes; sondear cuando queda vacía."""
+        limite = settings.email_outbox_batch_size
+        while True:
+            try:
+                async with get_background_db_session() as db:
+                    reclamados = await EmailOutboxService(db).despachar_lote(
+                        get_email_service(),
+                        limite,
+                        settings.email_outbox_lease_seconds,
+                        settings.email_outbox_max_attempts,
+                        self.espera_reintento,
+                    )
+            except Exception as e:
+                logger.error(f"Error despachando la bandeja de salida de emails: {e}", exc_info=True)
+                reclamados = 0
+            if reclamados < limite:
+                await asyncio.sleep(self.intervalo_sondeo)
+
+    async def _mantener_bloqueo(self, job_id: uuid.UUID, ejecucion: asyncio.Task) -> None:
+        """Renovar el bloqueo mientras la tarea corre; si otro worker la tomó, cancelarla."""
+        while True:
+            await asyncio.sleep(self.bloqueo_segundos / 3)
+            try:
+                async with get_background_db_session() as db:
+                    renovado = await JobService(db).renovar_bloqueo(job_id, self.worker_id, self.bloqueo_segundos)
+            except Exception as e:
+                logger.warning(f"No se pudo renovar el bloqueo del job {job_id}: {e}")
+                continue
+            if not renovado:
+                logger.error(f"El worker {self.worker_id} perdió el bloqueo del job {job_id}; se cancela")
+                ejecucion.cancel()
+                return
+
+    async def _procesar(self, job) -> None:
+        tarea = TAREAS.get(job.tipo)
+        if tarea is None:
+            async with get_background_db_session() as db:
+                await JobService(db).registrar_fallo(
+                    job.id, self.worker_id, f"Tipo de tarea no registrado: {job.tipo}", 0, reintentar=False
+                )
+            return
+
+        logger.info(f"Job {job.id} ({job.tipo}) intento {job.intentos}/{job.max_intentos}")
+        ejecucion = asyncio.create_task(tarea.ejecutar(job.id, job.parametros))
+        latido = asyncio.create_task(self._mantener_bloqueo(job.id, ejecucion))
+        try:
+            await asyncio.shield(ejecucion)
+        except asyncio.CancelledError:
+            # Apagado del worker (o bloqueo perdido): la ejecución se cancela y, si
+            # el worker aún tiene la tarea, vuelve a la cola sin gastar un intento.
+            ejecucion.cancel()
+            await asyncio.gather(ejecucion, return_exceptions=True)
+            async with get_background_db_session() as db:
+                await JobService(db).devolver(job.id, self.worker_id)
+            raise
+        except Exception as e:
+            espera = self.espera_reintento(job.intentos)
+            async with get_background_db_session() as db:
+                estado = await JobService(db).registrar_fallo(job.id, self.worker_id, str(e) or repr(e), espera)
+            if estado == EstadoJob.PENDIENTE:
+                logger.warning(f"Job {job.id} ({job.tipo}) falló en el intento {job.intentos}: {e!r}; reintento en {espera:.0f}s")
+            else:
+                logger.error(f"Job {job.id} ({job.tipo}) falló en el intento {job.intentos}: {e!r}; queda {estado}")
+        else:
+            async with get_background_db_session() as db:
+                await JobService(db).completar(job.id, self.worker_id)
+            logger.info(f"Job {job.id} ({job.tipo}) terminado")
+        finally:
+            latido.cancel()
+
+
+async def main(colas: Dict[str, int]) -> None:
+    worker = Worker(colas)
+    loop = asyncio.get_running_loop()
+    for senal in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(senal, worker.detener)
+    try:
+        await worker.ejecutar()
+    finally:
+        # El pool de procesos de certificados y los executors de S3 y email se crean al primer uso
+        cerrar_motor_renderizado()
+        cerrar_cliente_s3()
+        cerrar_email_service()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Worker de la cola durable de tareas")
+    parser.add_argument(
+        "--colas",
+        default=settings.worker_queues,
+        help='Colas a consumir con su concurrencia, p. ej. "certificados:2,emails:8"',
+    )
+    asyncio.run(main(parsear_colas(parser.parse_args().colas)))
@@ -0,0 +1,70 @@
+"""
+Benchmark del motor de renderizado de certificados: hilos vs procesos.
+
+Renderiza --certificados PDFs con MotorRenderizado usando un pool de hilos y
+luego uno de procesos del mismo tamaño, y reporta certificados por segundo.
+El renderizado con reportlab es CPU en Python puro, así que con hilos el GIL
+deja el throughput cerca de un núcleo; con procesos debería escalar con los
+núcleos disponibles. No usa base de datos ni S3.
+
+Uso, desde backend/:
+
+    python -m benchmarks.bench_certificados --certificados 2000 --trabajadores 8
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from app.services.certificate_renderer import DatosCertificado, MotorRenderizado
+
+
+def _datos(n: int):
+    fecha = datetime(2025, 6, 30)
+    for i in range(n):
+        yield DatosCertificado(
+            usuario_nombre="Alumno",
+            usuario_apellido=f"Benchmark {i}",
+            curso_titulo="Introducción al Antiguo Testamento",
+            folio=f"CERT-BENCH-{i:06d}",
+            fecha_emision=fecha,
+        )
+
+
+async def _medir(usar_procesos: bool, trabajadores: int, certificados: int, max_pendientes: int) -> float:
+    motor = MotorRenderizado(procesos=trabajadores, max_pendientes=max_pendientes, usar_procesos=usar_procesos)
+    try:
+        # Calentar el pool (arranque de procesos e imports) fuera de la medición
+        await asyncio.gather(*(motor.renderizar(d) for d in _datos(trabajadores)))
+        inicio = time.perf_counter()
+        total_bytes = errores = 0
+        async for resultado in motor.renderizar_lote(_datos(certificados)):
+            if resultado.error is not None:
+                errores += 1
+            else:
+                total_bytes += len(resultado.pdf)
+        duracion = time.perf_counter() - inicio
+    finally:
+        motor.cerrar()
+    por_segundo = certificados / duracion
+    print(
+        f"{'procesos' if usar_procesos else 'hilos':>8} x{trabajadores}: {certificados} certificados en "
+        f"{duracion:.1f}s = {por_segundo:.0f}/s ({total_bytes / 1e6:.1f} MB, {errores} errores)"
+    )
+    return por_segundo
+
+
+async def main(args: argparse.Namespace) -> None:
+    hilos = await _medir(False, args.trabajadores, args.certificados, args.max_pendientes)
+    procesos = await _medir(True, args.trabajadores, args.certificados, args.max_pendientes)
+    print(f"procesos / hilos: {procesos / hilos:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--certificados", type=int, default=1000)
+    parser.add_argument("--trabajadores", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-pendientes", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,110 @@
+"""
+Benchmark del renderizado de un certificado: plantilla compilada vs flowables.
+
+Mide el tiempo por certificado de generar_pdf_certificado (plantilla compilada
+por curso, solo se estampan los campos variables), de la plantilla global (el
+curso también se estampa) y del armado anterior con platypus, que construía
+estilos, story y tabla en cada certificado. Corre en un solo hilo, sin pool.
+
+Uso, desde backend/:
+
+    python -m benchmarks.bench_plantilla_certificado --certificados 2000
+"""
+
+import argparse
+import time
+from datetime import datetime
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from app.utils.pdf_generator import generar_pdf_certificado, obtener_plantilla
+
+CURSO = "Introducción al Antiguo Testamento"
+
+
+def _generar_con_flowables(nombre: str, apellido: str, curso: str, folio: str, fecha: datetime) -> bytes:
+    """Armado anterior a la plantilla (referencia del benchmark)."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+    styles = getSampleStyleSheet()
+    verde = colors.HexColor("#1a472a")
+    title = ParagraphStyle("T", parent=styles["Heading1"], fontSize=24, textColor=verde, spaceAfter=30,
+                           alignment=TA_CENTER, fontName="Helvetica-Bold")
+    subtitle = ParagraphStyle("S", parent=styles["Heading2"], fontSize=16, textColor=colors.HexColor("#2d5a3d"),
+                              spaceAfter=20, alignment=TA_CENTER, fontName="Helvetica")
+    body = ParagraphStyle("B", parent=styles["Normal"], fontSize=12, textColor=colors.HexColor("#333333"),
+                          spaceAfter=12, alignment=TA_JUSTIFY, fontName="Helvetica")
+    center = ParagraphStyle("C", parent=body, alignment=TA_CENTER, spaceAfter=20)
+    name = ParagraphStyle("N", parent=styles["Heading1"], fontSize=20, textColor=verde, spaceAfter=30,
+                          alignment=TA_CENTER, fontName="Helvetica-Bold", textTransform="uppercase")
+    course = ParagraphStyle("K", parent=body, fontSize=14, textColor=verde, alignment=TA_CENTER,
+                            fontName="Helvetica-Bold", spaceAfter=30)
+    footer = ParagraphStyle("F", parent=styles["Normal"], fontSize=9, textColor=colors.HexColor("#666666"),
+                            alignment=TA_CENTER, fontName="Helvetica-Oblique")
+    tabla = Table([["Fecha de emisión:", fecha.strftime("%d de %B de %Y")], ["Folio:", folio]],
+                  colWidths=[2 * inch, 3 * inch])
+    tabla.setStyle(TableStyle([
+        ("ALIGN", (0, 0), (0, -1), "RIGHT"),
+        ("ALIGN", (1, 0), (1, -1), "LEFT"),
+        ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
+        ("FONTNAME", (1, 0), (1, -1), "Helvetica"),
+        ("FONTSIZE", (0, 0), (-1, -1), 11),
+        ("TEXTCOLOR", (0, 0), (-1, -1), colors.HexColor("#333333")),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("LEFTPADDING", (0, 0), (-1, -1), 12),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 12),
+        ("TOPPADDING", (0, 0), (-1, -1), 6),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+    ]))
+    doc.build([
+        Spacer(1, 0.5 * inch), Paragraph("CERTIFICADO DE ACREDITACIÓN", title),
+        Spacer(1, 0.3 * inch), Paragraph("Escuela Bíblica Salem", subtitle),
+        Spacer(1, 0.4 * inch), Paragraph("Por medio del presente se certifica que", center),
+        Spacer(1, 0.2 * inch), Paragraph(f"{nombre} {apellido}".strip(), name),
+        Spacer(1, 0.2 * inch), Paragraph("ha completado exitosamente el curso", center),
+        Spacer(1, 0.3 * inch), Paragraph(curso, course),
+        Spacer(1, 0.3 * inch), Paragraph("cumpliendo con todos los requisitos académicos establecidos.", center),
+        Spacer(1, 0.4 * inch), tabla, Spacer(1, 0.8 * inch),
+        Paragraph("Este certificado es válido y puede ser verificado mediante "
+                  "el código de verificación proporcionado.", footer),
+    ])
+    return buffer.getvalue()
+
+
+def _medir(nombre: str, generar, certificados: int) -> float:
+    fecha = datetime(2025, 6, 30)
+    generar("Alumno", "Calentamiento", CURSO, "CERT-BENCH-CALIENTE", fecha)
+    inicio = time.perf_counter()
+    total_bytes = 0
+    for i in range(certificados):
+        total_bytes += len(generar("Alumno", f"Benchmark {i}", CURSO, f"CERT-BENCH-{i:06d}", fecha))
+    por_certificado = (time.perf_counter() - inicio) / certificados
+    print(
+        f"{nombre:>18}: {por_certificado * 1e3:.3f} ms/certificado, "
+        f"{1 / por_certificado:.0f}/s, {total_bytes / certificados / 1024:.1f} KB promedio"
+    )
+    return por_certificado
+
+
+def main(args: argparse.Namespace) -> None:
+    plantilla_global = obtener_plantilla()
+
+    def con_plantilla_global(nombre, apellido, curso, folio, fecha):
+        return plantilla_global.estampar(nombre, apellido, curso, folio, fecha)
+
+    flowables = _medir("flowables", _generar_con_flowables, args.certificados)
+    por_curso = _medir("plantilla curso", generar_pdf_certificado, args.certificados)
+    global_ = _medir("plantilla global", con_plantilla_global, args.certificados)
+    print(f"aceleración: {flowables / por_curso:.0f}x por curso, {flowables / global_:.0f}x global")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--certificados", type=int, default=1000)
+    main(parser.parse_args())
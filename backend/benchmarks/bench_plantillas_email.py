@@ -0,0 +1,130 @@
+"""
+Benchmark del renderizado de emails: plantillas compiladas vs f-strings.
+
+Mide el tiempo por email del recordatorio de progreso (asunto, HTML y texto)
+con el armado anterior (f-strings con todo el documento en cada llamada, sin
+escapar), con la plantilla compilada renderizando uno por uno y con
+renderizar_lote fijando el curso, común a toda la campaña. Corre en un solo hilo.
+
+Uso, desde backend/:
+
+    python -m benchmarks.bench_plantillas_email --emails 100000
+"""
+
+import argparse
+import time
+
+from app.utils.email_templates import RECORDATORIO_PROGRESO
+
+CURSO = "Introducción al Antiguo Testamento"
+
+
+def _recordatorio_con_fstrings(usuario_nombre: str, curso_titulo: str, progreso_porcentaje: float):
+    """Armado anterior a las plantillas compiladas (referencia del benchmark)."""
+    html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <style>
+            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+            .header {{ background-color: #1a472a; color: white; padding: 20px; text-align: center; }}
+            .content {{ padding: 20px; background-color: #f9f9f9; }}
+            .progress-bar {{ background-color: #e0e0e0; border-radius: 10px; height: 30px; margin: 20px 0; }}
+            .progress-fill {{ background-color: #1a472a; height: 100%; border-radius: 10px; width: {progreso_porcentaje}%; text-align: center; line-height: 30px; color: white; }}
+            .footer {{ text-align: center; padding: 20px; font-size: 12px; color: #666; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>¡Continúa tu Aprendizaje!</h1>
+            </div>
+            <div class="content">
+                <p>Hola {usuario_nombre},</p>
+                <p>Queremos recordarte que tienes un curso en progreso:</p>
+                <p><strong>{curso_titulo}</strong></p>
+                <p>Tu progreso actual:</p>
+                <div class="progress-bar">
+                    <div class="progress-fill">{progreso_porcentaje:.1f}%</div>
+                </div>
+                <p>¡Estás haciendo un gran trabajo! Te animamos a continuar y completar el curso.</p>
+                <p>Recuerda que puedes acceder a tus cursos en cualquier momento desde la plataforma.</p>
+                <p>¡Sigue adelante!</p>
+                <p>Atentamente,<br>El equipo de Escuela Bíblica Salem</p>
+            </div>
+            <div class="footer">
+                <p>Escuela Bíblica Salem - Plataforma de Aprendizaje en Línea</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    text = f"""
+    ¡Continúa tu Aprendizaje!
+
+    Hola {usuario_nombre},
+
+    Queremos recordarte que tienes un curso en progreso:
+
+    {curso_titulo}
+
+    Tu progreso actual: {progreso_porcentaje:.1f}%
+
+    ¡Estás haciendo un gran trabajo! Te animamos a continuar y completar el curso.
+
+    Recuerda que puedes acceder a tus cursos en cualquier momento desde la plataforma.
+
+    ¡Sigue adelante!
+
+    Atentamente,
+    El equipo de Escuela Bíblica Salem
+
+    ---
+    Escuela Bíblica Salem - Plataforma de Aprendizaje en Línea
+    """
+    return f"Continúa tu progreso en {curso_titulo}", html, text
+
+
+def _medir(nombre: str, renderizar, emails: int) -> float:
+    destinatarios = [
+        {"usuario_nombre": f"Alumno {i}", "curso_titulo": CURSO, "progreso_porcentaje": (i * 7) % 100}
+        for i in range(emails)
+    ]
+    renderizar(destinatarios[:100])
+    inicio = time.perf_counter()
+    renderizados = renderizar(destinatarios)
+    por_email = (time.perf_counter() - inicio) / emails
+    total_bytes = sum(len(html) + len(texto) for _, html, texto in renderizados)
+    print(
+        f"{nombre:>18}: {por_email * 1e6:.2f} µs/email, "
+        f"{1 / por_email:,.0f}/s, {total_bytes / emails / 1024:.2f} KB promedio"
+    )
+    return por_email
+
+
+def main(args: argparse.Namespace) -> None:
+    def con_fstrings(destinatarios):
+        return [
+            _recordatorio_con_fstrings(d["usuario_nombre"], d["curso_titulo"], d["progreso_porcentaje"])
+            for d in destinatarios
+        ]
+
+    def uno_por_uno(destinatarios):
+        return [RECORDATORIO_PROGRESO.renderizar(d) for d in destinatarios]
+
+    def en_lote(destinatarios):
+        # El curso, común a la campaña, se sustituye una vez; el de cada destinatario se ignora
+        return RECORDATORIO_PROGRESO.renderizar_lote(destinatarios, comunes={"curso_titulo": CURSO})
+
+    fstrings = _medir("f-strings", con_fstrings, args.emails)
+    compilada = _medir("compilada", uno_por_uno, args.emails)
+    lote = _medir("compilada en lote", en_lote, args.emails)
+    print(f"relación: {fstrings / compilada:.2f}x uno por uno, {fstrings / lote:.2f}x en lote")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--emails", type=int, default=100_000)
+    main(parser.parse_args())
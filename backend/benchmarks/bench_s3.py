@@ -0,0 +1,110 @@
+"""
+Benchmark de latencia de S3 bajo solicitudes concurrentes.
+
+Lanza --solicitudes subidas + verificaciones (put_object + head_object) de
+objetos pequeños, con --concurrencia en vuelo, contra el endpoint indicado en
+BENCH_S3_ENDPOINT_URL (MinIO del perfil s3-local o moto_server). Compara:
+
+- bloqueante: boto3 llamado directamente desde la corrutina, como antes; cada
+  llamada detiene el event loop.
+- executor: S3Service, con el cliente compartido y el executor acotado.
+
+Reporta latencia por solicitud (p50/p95/máx), solicitudes por segundo y el
+retraso máximo del event loop (cuánto tardó en despertar un temporizador de 10 ms).
+
+Uso, desde backend/:
+
+    BENCH_S3_ENDPOINT_URL=http://localhost:9000 AWS_ACCESS_KEY_ID=ebs_local \\
+        AWS_SECRET_ACCESS_KEY=ebs_local_secret \\
+        python -m benchmarks.bench_s3 --solicitudes 2000 --concurrencia 64
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+
+from app.services.s3_service import S3Service
+
+
+async def _retraso_loop(detener: asyncio.Event, retrasos: list) -> None:
+    while not detener.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(0.01)
+        retrasos.append(time.perf_counter() - inicio - 0.01)
+
+
+async def _medir(nombre: str, operacion, solicitudes: int, concurrencia: int) -> None:
+    latencias = []
+    retrasos = []
+    detener = asyncio.Event()
+    limite = asyncio.Semaphore(concurrencia)
+
+    async def solicitud(i: int) -> None:
+        async with limite:
+            inicio = time.perf_counter()
+            await operacion(f"bench/{uuid.uuid4().hex}-{i}")
+            latencias.append(time.perf_counter() - inicio)
+
+    monitor = asyncio.create_task(_retraso_loop(detener, retrasos))
+    inicio = time.perf_counter()
+    await asyncio.gather(*(solicitud(i) for i in range(solicitudes)))
+    duracion = time.perf_counter() - inicio
+    detener.set()
+    await monitor
+
+    latencias.sort()
+    print(
+        f"{nombre:>10}: {solicitudes / duracion:7.0f} sol/s | latencia p50 "
+        f"{statistics.median(latencias) * 1e3:6.1f} ms, p95 {latencias[int(len(latencias) * 0.95)] * 1e3:6.1f} ms, "
+        f"máx {latencias[-1] * 1e3:6.1f} ms | retraso máx del loop {max(retrasos, default=0) * 1e3:6.1f} ms"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    cliente = boto3.client(
+        "s3",
+        endpoint_url=os.environ["BENCH_S3_ENDPOINT_URL"],
+        region_name=os.getenv("AWS_REGION", "us-east-1"),
+        config=Config(max_pool_connections=args.conexiones, signature_version="s3v4"),
+    )
+    bucket = f"ebs-bench-{uuid.uuid4().hex[:8]}"
+    cliente.create_bucket(Bucket=bucket)
+    executor = ThreadPoolExecutor(max_workers=args.conexiones, thread_name_prefix="s3")
+    service = S3Service(s3_client=cliente, executor=executor)
+    service.bucket_name = bucket
+    contenido = os.urandom(args.tamano)
+
+    async def bloqueante(clave: str) -> None:
+        cliente.put_object(Bucket=bucket, Key=clave, Body=contenido)
+        cliente.head_object(Bucket=bucket, Key=clave)
+
+    async def con_executor(clave: str) -> None:
+        await service.upload_file(contenido, clave)
+        await service.file_exists(clave)
+
+    try:
+        await _medir("bloqueante", bloqueante, args.solicitudes, args.concurrencia)
+        await _medir("executor", con_executor, args.solicitudes, args.concurrencia)
+    finally:
+        executor.shutdown()
+        paginas = cliente.get_paginator("list_objects_v2").paginate(Bucket=bucket)
+        for pagina in paginas:
+            for objeto in pagina.get("Contents", []):
+                cliente.delete_object(Bucket=bucket, Key=objeto["Key"])
+        cliente.delete_bucket(Bucket=bucket)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--solicitudes", type=int, default=1000)
+    parser.add_argument("--concurrencia", type=int, default=64)
+    parser.add_argument("--conexiones", type=int, default=32)
+    parser.add_argument("--tamano", type=int, default=16 * 1024, help="Bytes por objeto")
+    asyncio.run(main(parser.parse_args()))
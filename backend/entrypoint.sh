@@ -9,6 +9,13 @@ set -e
 # Activar entorno virtual explícitamente (por seguridad)
 . /opt/venv/bin/activate
 
+# Worker de la cola durable de tareas: `entrypoint.sh worker [--colas ...]`
+if [ "$1" = "worker" ]; then
+    shift
+    echo "⚙️ Iniciando worker de la cola de tareas"
+    exec python -m app.worker "$@"
+fi
+
 if [ "$ENVIRONMENT" = "development" ]; then
     echo "🚀 Modo DESARROLLO detectado"
     # Reload activo, escucha en 0.0.0.0
@@ -13,6 +13,8 @@ CREATE TYPE tipo_contenido AS ENUM ('TEXTO', 'PDF', 'VIDEO', 'LINK');
 CREATE TYPE estado_inscripcion AS ENUM ('ACTIVA', 'PAUSADA', 'CONCLUIDA', 'REPROBADA');
 CREATE TYPE resultado_intento AS ENUM ('APROBADO', 'NO_APROBADO');
 CREATE TYPE tipo_pregunta AS ENUM ('ABIERTA', 'OPCION_MULTIPLE', 'VERDADERO_FALSO');
+CREATE TYPE estado_job AS ENUM ('PENDIENTE', 'EN_PROCESO', 'COMPLETADO', 'FALLIDO', 'CANCELADO');
+CREATE TYPE estado_email AS ENUM ('PENDIENTE', 'ENVIADO', 'FALLIDO');
 
 -- =====================================================
 -- Tablas de Usuarios y Acceso
@@ -135,6 +137,7 @@ CREATE TABLE quiz (
   publicado BOOLEAN,
   aleatorio BOOLEAN,
   guarda_calificacion BOOLEAN,
+  tiempo_limite_minutos INT CHECK (tiempo_limite_minutos IS NULL OR tiempo_limite_minutos > 0),
   creado_en TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
   actualizado_en TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
@@ -148,6 +151,7 @@ CREATE TABLE examen_final (
   publicado BOOLEAN,
   aleatorio BOOLEAN,
   guarda_calificacion BOOLEAN,
+  tiempo_limite_minutos INT CHECK (tiempo_limite_minutos IS NULL OR tiempo_limite_minutos > 0),
   creado_en TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
   actualizado_en TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
@@ -241,6 +245,7 @@ CREATE TABLE intento (
   resultado resultado_intento,
   iniciado_en TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
   finalizado_en TIMESTAMPTZ,
+  expira_en TIMESTAMPTZ,
   permitir_nuevo_intento BOOLEAN NOT NULL DEFAULT FALSE,
   creado_en TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
   actualizado_en TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
@@ -251,6 +256,7 @@ CREATE TABLE intento (
 );
 -- Permite múltiples intentos por quiz/examen.
 -- El instructor controla nuevos intentos mediante permitir_nuevo_intento.
+-- expira_en se fija al iniciar si el quiz/examen tiene tiempo_limite_minutos.
 -- NO ACTION en usuario_id preserva historial si se elimina el usuario.
 
 CREATE TABLE intento_pregunta (
@@ -330,6 +336,69 @@ CREATE TABLE preferencia_notificacion (
   actualizado_en TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 
+-- =====================================================
+-- Tablas de Operación
+-- =====================================================
+
+CREATE TABLE job (
+  id UUID PRIMARY KEY,
+  tipo VARCHAR(100) NOT NULL,
+  estado estado_job NOT NULL DEFAULT 'PENDIENTE',
+  parametros JSONB,
+  total INT,
+  procesados INT NOT NULL DEFAULT 0,
+  cancelacion_solicitada BOOLEAN NOT NULL DEFAULT FALSE,
+  checkpoint JSONB,
+  resultado JSONB,
+  error TEXT,
+  cola VARCHAR(50) NOT NULL DEFAULT 'default',
+  intentos INT NOT NULL DEFAULT 0,
+  max_intentos INT NOT NULL DEFAULT 1 CHECK (max_intentos >= 1),
+  disponible_en TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  bloqueado_por VARCHAR(200),
+  bloqueado_hasta TIMESTAMPTZ,
+  clave_unica VARCHAR(255),
+  creado_por UUID REFERENCES usuario(id) ON DELETE SET NULL ON UPDATE CASCADE,
+  creado_en TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+  iniciado_en TIMESTAMPTZ,
+  finalizado_en TIMESTAMPTZ,
+  actualizado_en TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+-- Cola durable de tareas en background y su estado y progreso.
+-- Un worker (python -m app.worker) toma las tareas PENDIENTE de su cola cuyo
+-- disponible_en ya pasó, con FOR UPDATE SKIP LOCKED, y las bloquea hasta
+-- bloqueado_hasta, que renueva mientras la tarea corre. Si falla, vuelve a
+-- PENDIENTE con disponible_en diferido (backoff) hasta agotar max_intentos y
+-- entonces queda FALLIDO (cola de mensajes muertos). Un bloqueo vencido indica
+-- un worker caído y la tarea se libera.
+-- La tarea consulta cancelacion_solicitada entre lotes y guarda en checkpoint
+-- el punto desde el cual reanudar.
+-- Una tarea con clave_unica (p. ej. la generación del certificado de una
+-- inscripción) no se duplica mientras haya otra pendiente o en proceso con la misma.
+
+CREATE TABLE email_outbox (
+  id UUID PRIMARY KEY,
+  plantilla VARCHAR(100) NOT NULL,
+  destinatario VARCHAR(255) NOT NULL,
+  parametros JSONB NOT NULL DEFAULT '{}',
+  clave_idempotencia VARCHAR(255) NOT NULL UNIQUE,
+  estado estado_email NOT NULL DEFAULT 'PENDIENTE',
+  intentos INT NOT NULL DEFAULT 0,
+  disponible_en TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  message_id VARCHAR(255),
+  error TEXT,
+  creado_en TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+  enviado_en TIMESTAMPTZ
+);
+-- Bandeja de salida de emails (patrón outbox). El email se inserta en la misma
+-- transacción que el cambio que lo origina (p. ej. el certificado emitido), así
+-- que existe si y solo si el cambio se confirmó. clave_idempotencia evita
+-- duplicados cuando la operación se repite (ON CONFLICT DO NOTHING).
+-- El worker de la cola emails la vacía por lotes con FOR UPDATE SKIP LOCKED;
+-- reclamar un email suma un intento y lo difiere (disponible_en) mientras se
+-- envía, de modo que si el worker cae vuelve a estar disponible sin otra marca.
+-- parametros guarda todo lo necesario para renderizar la plantilla.
+
 -- =====================================================
 -- Índices en claves foráneas
 -- =====================================================
@@ -359,10 +428,13 @@ CREATE INDEX idx_respuesta_opcion_id ON respuesta(opcion_id);
 CREATE INDEX idx_regla_acreditacion_curso_id ON regla_acreditacion(curso_id);
 CREATE INDEX idx_regla_acreditacion_quiz_id ON regla_acreditacion(quiz_id);
 CREATE INDEX idx_regla_acreditacion_examen_final_id ON regla_acreditacion(examen_final_id);
-CREATE INDEX idx_certificado_inscripcion_curso_id ON certificado(inscripcion_curso_id);
+-- Un certificado por inscripción: la emisión por curso crea los pendientes con ON CONFLICT DO NOTHING
+CREATE UNIQUE INDEX idx_certificado_inscripcion_curso_id ON certificado(inscripcion_curso_id);
 CREATE INDEX idx_certificado_quiz_id ON certificado(quiz_id);
 CREATE INDEX idx_certificado_examen_final_id ON certificado(examen_final_id);
 CREATE INDEX idx_certificado_intento_id ON certificado(intento_id);
+-- Verificación pública por folio (uno o muchos por consulta)
+CREATE UNIQUE INDEX idx_certificado_folio ON certificado(folio);
 CREATE INDEX idx_foro_comentario_usuario_id ON foro_comentario(usuario_id);
 CREATE INDEX idx_foro_comentario_curso_id ON foro_comentario(curso_id);
 CREATE INDEX idx_foro_comentario_leccion_id ON foro_comentario(leccion_id);
@@ -381,6 +453,16 @@ CREATE INDEX idx_inscripcion_curso_estado ON inscripcion_curso(estado);
 CREATE INDEX idx_inscripcion_curso_acreditado ON inscripcion_curso(acreditado) WHERE acreditado = TRUE;
 CREATE INDEX idx_intento_resultado ON intento(resultado);
 
+-- Sincronización por deltas del mapa de preferencias de notificación (ver PreferenciaService)
+CREATE INDEX idx_preferencia_notificacion_actualizado ON preferencia_notificacion(actualizado_en);
+
+CREATE INDEX idx_job_tipo_creado ON job(tipo, creado_en DESC);
+CREATE INDEX idx_job_estado_creado ON job(estado, creado_en DESC, id DESC);
+CREATE INDEX idx_job_cola_disponible ON job(cola, disponible_en) WHERE estado = 'PENDIENTE';
+CREATE INDEX idx_job_bloqueo_vencido ON job(bloqueado_hasta) WHERE estado = 'EN_PROCESO';
+CREATE UNIQUE INDEX idx_job_clave_unica_activa ON job(clave_unica) WHERE estado IN ('PENDIENTE', 'EN_PROCESO');
+CREATE INDEX idx_email_outbox_disponible ON email_outbox(disponible_en) WHERE estado = 'PENDIENTE';
+
 -- =====================================================
 -- Índices compuestos para consultas comunes
 -- =====================================================
@@ -404,6 +486,18 @@ CREATE INDEX idx_opcion_pregunta_orden ON opcion(pregunta_id, orden);
 CREATE INDEX idx_foro_comentario_leccion_creado ON foro_comentario(leccion_id, creado_en DESC);
 CREATE INDEX idx_intento_inscripcion_finalizado ON intento(inscripcion_curso_id, finalizado_en DESC);
 
+-- Paginación por cursor (keyset): cada índice coincide con el ORDER BY del
+-- listado, con id como desempate, para que WHERE (clave, id) < (:clave, :id)
+-- recorra el índice desde el cursor sin OFFSET.
+CREATE INDEX idx_usuario_creado_id ON usuario(creado_en DESC, id DESC);
+CREATE INDEX idx_curso_titulo_id ON curso(titulo, id);
+CREATE INDEX idx_inscripcion_curso_creado_id ON inscripcion_curso(creado_en DESC, id DESC);
+CREATE INDEX idx_inscripcion_curso_usuario_fecha ON inscripcion_curso(usuario_id, fecha_inscripcion DESC, id DESC);
+CREATE INDEX idx_intento_creado_id ON intento(creado_en DESC, id DESC);
+CREATE INDEX idx_intento_quiz_numero ON intento(quiz_id, numero_intento DESC, id DESC);
+CREATE INDEX idx_intento_examen_final_numero ON intento(examen_final_id, numero_intento DESC, id DESC);
+CREATE INDEX idx_foro_comentario_curso_leccion_creado ON foro_comentario(curso_id, leccion_id, creado_en, id);
+
 -- =====================================================
 -- Restricciones UNIQUE parciales
 -- =====================================================
@@ -424,6 +518,31 @@ CREATE UNIQUE INDEX idx_certificado_valido_unico
 ON certificado (inscripcion_curso_id)
 WHERE valido = TRUE;
 
+-- Numeración de intentos y un solo intento activo por inscripción y quiz/examen.
+-- Permiten asignar numero_intento con INSERT ... SELECT ... ON CONFLICT DO NOTHING
+-- sin SELECT FOR UPDATE.
+CREATE UNIQUE INDEX uq_intento_numero_quiz
+ON intento (inscripcion_curso_id, quiz_id, numero_intento)
+WHERE quiz_id IS NOT NULL;
+
+CREATE UNIQUE INDEX uq_intento_numero_examen
+ON intento (inscripcion_curso_id, examen_final_id, numero_intento)
+WHERE examen_final_id IS NOT NULL;
+
+CREATE UNIQUE INDEX uq_intento_activo_quiz
+ON intento (inscripcion_curso_id, quiz_id)
+WHERE quiz_id IS NOT NULL AND finalizado_en IS NULL;
+
+CREATE UNIQUE INDEX uq_intento_activo_examen
+ON intento (inscripcion_curso_id, examen_final_id)
+WHERE examen_final_id IS NOT NULL AND finalizado_en IS NULL;
+
+-- Intentos abiertos con tiempo límite; el barrido de intentos expirados
+-- recorre solo este índice en orden de expiración.
+CREATE INDEX idx_intento_expira_activo
+ON intento (expira_en)
+WHERE finalizado_en IS NULL AND expira_en IS NOT NULL;
+
 -- =====================================================
 -- Vistas para datos calculados
 -- =====================================================
@@ -91,6 +91,9 @@ ALTER TABLE regla_acreditacion ENABLE ROW LEVEL SECURITY;
 ALTER TABLE certificado ENABLE ROW LEVEL SECURITY;
 ALTER TABLE foro_comentario ENABLE ROW LEVEL SECURITY;
 ALTER TABLE preferencia_notificacion ENABLE ROW LEVEL SECURITY;
+-- job y email_outbox son colas internas sin RLS: las escriben peticiones de
+-- cualquier usuario (p. ej. POST /certificados) y el worker, que no tiene usuario
+-- en sesión. Solo se exponen por rutas de administración.
 
 -- =====================================================
 -- Políticas para tabla usuario
@@ -228,27 +228,32 @@ DECLARE
   intentos_previos INT;
   ultimo_intento_permitir BOOLEAN;
 BEGIN
-  -- Contar intentos previos
+  -- Contar intentos previos y leer permitir_nuevo_intento del último
   IF NEW.quiz_id IS NOT NULL THEN
-    SELECT COUNT(*), COALESCE(MAX(permitir_nuevo_intento), FALSE)
+    SELECT COUNT(*) OVER (), permitir_nuevo_intento
     INTO intentos_previos, ultimo_intento_permitir
     FROM intento
     WHERE usuario_id = NEW.usuario_id
       AND quiz_id = NEW.quiz_id
-      AND inscripcion_curso_id = NEW.inscripcion_curso_id;
+      AND inscripcion_curso_id = NEW.inscripcion_curso_id
+    ORDER BY numero_intento DESC
+    LIMIT 1;
   ELSIF NEW.examen_final_id IS NOT NULL THEN
-    SELECT COUNT(*), COALESCE(MAX(permitir_nuevo_intento), FALSE)
+    SELECT COUNT(*) OVER (), permitir_nuevo_intento
     INTO intentos_previos, ultimo_intento_permitir
     FROM intento
     WHERE usuario_id = NEW.usuario_id
       AND examen_final_id = NEW.examen_final_id
-      AND inscripcion_curso_id = NEW.inscripcion_curso_id;
+      AND inscripcion_curso_id = NEW.inscripcion_curso_id
+    ORDER BY numero_intento DESC
+    LIMIT 1;
   ELSE
     RETURN NEW;
   END IF;
   
-  -- Si hay intentos previos, el último debe tener permitir_nuevo_intento = TRUE
-  IF intentos_previos > 0 AND NOT ultimo_intento_permitir THEN
+  -- Si hay intentos previos, el último (el de mayor numero_intento) debe tener
+  -- permitir_nuevo_intento = TRUE; sin intentos previos la consulta no asigna nada
+  IF COALESCE(intentos_previos, 0) > 0 AND NOT ultimo_intento_permitir THEN
     RAISE EXCEPTION 'No se puede crear un nuevo intento. El instructor debe permitir un nuevo intento estableciendo permitir_nuevo_intento = TRUE en el intento anterior';
   END IF;
   